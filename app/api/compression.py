@@ -0,0 +1,272 @@
+"""
+Сжатие ответов и распаковка сжатых тел запросов (ASGI middleware).
+
+Ответы:
+- алгоритм выбирается по Accept-Encoding: zstd (если установлен пакет zstandard
+  и включён в настройках), затем gzip;
+- сжимаются только текстовые и JSON-ответы не меньше minimum_size байт;
+- ответы с Content-Encoding, Content-Range (206), без тела (204, 304) и объявляющие
+  Accept-Ranges: bytes не сжимаются — смещения диапазонов относятся к несжатому телу,
+  и докачка по Range не должна склеивать их со сжатым;
+- у сжатого ответа ETag становится слабым (W/"..."): сжатое и несжатое тело —
+  разные представления, строгий ETag у них совпадать не должен; If-None-Match
+  сравнивается слабо, поэтому ответы 304 продолжают работать;
+- потоковые ответы сжимаются по мере передачи.
+
+Запросы: тело с Content-Encoding gzip/zstd распаковывается на лету для путей
+из decompress_paths. Размер распакованного тела ограничен max_request_size
+(защита от «zip-бомб»), превышение → 413, неизвестная кодировка → 415.
+"""
+
+import zlib
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import zstandard
+except ImportError:  # zstd не обязателен: без пакета zstandard доступен только gzip
+    zstandard = None
+
+GZIP_WBITS = 31  # zlib с заголовком gzip
+
+# Типы содержимого, которые имеет смысл сжимать
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/problem+json")
+
+
+class RequestTooLargeError(HTTPException):
+    """
+    Распакованное тело запроса превышает допустимый размер (HTTP 413).
+    """
+
+    def __init__(self, detail: str = "Request body is too large"):
+        super().__init__(status_code=413, detail=detail)
+
+
+def negotiate(accept_encoding: str, zstd_enabled: bool) -> Optional[str]:
+    """
+    Выбирает кодировку ответа по заголовку Accept-Encoding.
+
+    :param accept_encoding: Значение заголовка Accept-Encoding
+    :param zstd_enabled: Разрешено ли сжатие zstd
+    :return: "zstd", "gzip" или None (без сжатия)
+    """
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    if zstd_enabled and zstandard is not None and accepted.get("zstd", wildcard) > 0:
+        return "zstd"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+class _Decompressor:
+    """
+    Потоковая распаковка тела запроса с ограничением размера результата.
+    """
+
+    def __init__(self, encoding: str, max_size: int):
+        self.encoding = encoding
+        self.remaining = max_size
+        if encoding == "gzip":
+            self._obj = zlib.decompressobj(GZIP_WBITS)
+        else:
+            self._obj = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data: bytes) -> bytes:
+        """
+        Распаковывает очередной блок.
+
+        :raises RequestTooLargeError: если распакованные данные превышают лимит
+        """
+        if self.encoding == "gzip":
+            # Распаковка не больше remaining + 1 байт за шаг: «бомба» не разворачивается в памяти
+            chunks = [self._obj.decompress(data, self.remaining + 1)]
+            self._consume(chunks[-1])
+            while self._obj.unconsumed_tail:
+                chunks.append(self._obj.decompress(self._obj.unconsumed_tail, self.remaining + 1))
+                self._consume(chunks[-1])
+            return b"".join(chunks)
+
+        chunk = self._obj.decompress(data)
+        self._consume(chunk)
+        return chunk
+
+    def _consume(self, chunk: bytes) -> None:
+        self.remaining -= len(chunk)
+        if self.remaining < 0:
+            raise RequestTooLargeError("Decompressed request body is too large")
+
+
+class _CompressingSender:
+    """
+    Обёртка над send, сжимающая тело ответа.
+    """
+
+    def __init__(self, send: Send, encoding: str, minimum_size: int,
+                 gzip_level: int, zstd_level: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+        self.started = False
+
+        self._start: Optional[Message] = None
+        self._compressor = None
+        self._passthrough = False
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self._start = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._start is not None:
+            start, self._start = self._start, None
+            self._passthrough = not self._compressible(start, body, more_body)
+            if self._passthrough:
+                await self._send_start(start)
+                await self.send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            self._compressor = self._make_compressor()
+            if not more_body:
+                body = self._compressor.compress(body) + self._compressor.flush()
+                headers["Content-Length"] = str(len(body))
+            else:
+                del headers["Content-Length"]
+                body = self._compressor.compress(body)
+            await self._send_start(start)
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        if self._passthrough:
+            await self.send(message)
+            return
+
+        body = self._compressor.compress(body)
+        if not more_body:
+            body += self._compressor.flush()
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    async def _send_start(self, start: Message) -> None:
+        self.started = True
+        await self.send(start)
+
+    def _compressible(self, start: Message, body: bytes, more_body: bool) -> bool:
+        """ Нужно ли сжимать ответ. """
+        headers = Headers(raw=start["headers"])
+        if start["status"] in (204, 206, 304) or "content-encoding" in headers \
+                or "content-range" in headers \
+                or headers.get("accept-ranges", "none").strip().lower() != "none":
+            return False
+        content_type = headers.get("content-type", "")
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        return more_body or len(body) >= self.minimum_size
+
+    def _make_compressor(self):
+        """ Создаёт потоковый компрессор выбранного алгоритма. """
+        if self.encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.zstd_level).compressobj()
+        return zlib.compressobj(self.gzip_level, zlib.DEFLATED, GZIP_WBITS)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware: сжатие ответов и распаковка тел запросов.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6,
+                 zstd: bool = False, zstd_level: int = 3,
+                 decompress_paths: Tuple[str, ...] = ("/submit",),
+                 max_request_size: int = 10 * 1024 * 1024):
+        """
+        :param app: ASGI-приложение
+        :param minimum_size: Минимальный размер ответа для сжатия (байты)
+        :param gzip_level: Уровень сжатия gzip (1..9)
+        :param zstd: Разрешить zstd (требуется пакет zstandard)
+        :param zstd_level: Уровень сжатия zstd
+        :param decompress_paths: Пути, для которых принимаются сжатые тела запросов
+        :param max_request_size: Максимальный размер распакованного тела запроса (байты)
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd = zstd and zstandard is not None
+        self.zstd_level = zstd_level
+        self.decompress_paths = tuple(decompress_paths)
+        self.max_request_size = max_request_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_encoding = headers.get("content-encoding", "").strip().lower()
+        if content_encoding and content_encoding != "identity" \
+                and scope["path"] in self.decompress_paths:
+            if content_encoding not in self._request_encodings():
+                await JSONResponse({"detail": f"Unsupported Content-Encoding '{content_encoding}'"},
+                                   status_code=415)(scope, receive, send)
+                return
+            scope, receive = self._decompressing(scope, receive, content_encoding)
+
+        encoding = negotiate(headers.get("accept-encoding", ""), self.zstd)
+        sender = _CompressingSender(send, encoding, self.minimum_size, self.gzip_level,
+                                    self.zstd_level) if encoding else None
+        try:
+            await self.app(scope, receive, sender or send)
+        except RequestTooLargeError as e:
+            # Тело читалось вне обработчика FastAPI (иначе он сам вернул бы 413)
+            if sender is not None and sender.started:
+                raise
+            await JSONResponse({"detail": e.detail}, status_code=413)(scope, receive, send)
+
+    def _request_encodings(self) -> Tuple[str, ...]:
+        """ Поддерживаемые кодировки тела запроса. """
+        return ("gzip", "zstd") if zstandard is not None else ("gzip",)
+
+    def _decompressing(self, scope: Scope, receive: Receive,
+                       encoding: str) -> Tuple[Scope, Receive]:
+        """ Подменяет receive распаковывающим и убирает заголовки сжатого тела. """
+        decompressor = _Decompressor(encoding, self.max_request_size)
+
+        async def decompressing_receive() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                message = dict(message)
+                message["body"] = decompressor.decompress(message.get("body", b""))
+            return message
+
+        scope = dict(scope)
+        scope["headers"] = [(name, value) for name, value in scope["headers"]
+                            if name not in (b"content-encoding", b"content-length")]
+        return scope, decompressing_receive
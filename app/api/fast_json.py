@@ -0,0 +1,96 @@
+"""
+Быстрая сериализация ответов TaskRouter.
+
+По умолчанию FastAPI обрабатывает возвращённую pydantic-модель так:
+повторная валидация по response_model (для синхронных обработчиков — ещё
+и с переходом в пул потоков) → преобразование в словарь → json.dumps.
+Модели в ответах TaskRouter строятся самим сервисом, поэтому здесь модель
+сериализуется в байты напрямую сериализатором pydantic-core, минуя
+промежуточный словарь и повторную валидацию.
+
+Схема OpenAPI по-прежнему строится по response_model маршрута.
+"""
+
+import asyncio
+import functools
+import json
+from typing import Any, Callable, Optional
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from starlette.responses import Response
+from starlette.routing import request_response
+
+try:
+    import orjson
+except ImportError:  # orjson не обязателен: для словарей используется json
+    orjson = None
+
+# Заголовки вспомогательного Response, которые не переносятся в итоговый ответ
+_SKIPPED_HEADERS = {b"content-length", b"content-type"}
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Сериализует содержимое ответа в JSON-байты.
+
+    :param content: pydantic-модель или JSON-совместимое значение
+    :return: JSON в UTF-8
+    """
+    if isinstance(content, BaseModel):
+        return content.__pydantic_serializer__.to_json(content)
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class ModelJSONResponse(Response):
+    """
+    JSON-ответ, сериализующий pydantic-модель напрямую в байты.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class ModelJSONRoute(APIRoute):
+    """
+    Маршрут, отдающий возвращённую обработчиком pydantic-модель через ModelJSONResponse.
+    Обработчик, вызванный напрямую (route.endpoint), по-прежнему возвращает модель.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        super().__init__(path, endpoint, **kwargs)
+        self.dependant.call = self._wrap(endpoint)
+        self.app = request_response(self.get_route_handler())
+
+    def _to_response(self, result: Any, values: dict) -> Any:
+        """
+        Превращает модель в готовый ответ с заголовками и статусом
+        вспомогательного Response обработчика (если он объявлен параметром).
+        """
+        if not isinstance(result, BaseModel):
+            return result
+
+        response = ModelJSONResponse(result, status_code=self.status_code or 200)
+        name = self.dependant.response_param_name
+        sub_response: Optional[Response] = values.get(name) if name else None
+        if sub_response is not None:
+            response.raw_headers.extend(header for header in sub_response.raw_headers
+                                        if header[0] not in _SKIPPED_HEADERS)
+            if sub_response.status_code:
+                response.status_code = sub_response.status_code
+        return response
+
+    def _wrap(self, endpoint: Callable[..., Any]) -> Callable[..., Any]:
+        """ Оборачивает обработчик с сохранением его синхронности/асинхронности. """
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def async_wrapper(**values: Any) -> Any:
+                return self._to_response(await endpoint(**values), values)
+            return async_wrapper
+
+        @functools.wraps(endpoint)
+        def wrapper(**values: Any) -> Any:
+            return self._to_response(endpoint(**values), values)
+        return wrapper
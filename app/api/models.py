@@ -4,18 +4,17 @@
 """
 from datetime import datetime
 from enum import Enum
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from uuid import UUID
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
+from app.api.task_types import get_task_registry
 
-class TaskType(str, Enum):
-    """
-    Перечисление допустимых типов задач.
-    Добавляй новые типы задач по мере необходимости.
-    """
-    CALC_HASH = "calc_hash"
-    RESIZE_IMAGE = "resize_image"
+
+# Перечисление допустимых типов задач.
+# Строится по реестру типов задач (секция "task_types" в config.json).
+TaskType = get_task_registry().build_enum()
+TaskType.__doc__ = "Перечисление допустимых типов задач (строится по реестру типов задач)."
 
 class TaskStatus(str, Enum):
     """
@@ -25,16 +24,19 @@ class TaskStatus(str, Enum):
     PENDING = "pending"
     DONE = "done"
     ERROR = "error"
+    CANCELLED = "cancelled"
 
 
 class TaskInput(BaseModel):
     """
     Модель входящей задачи.
-    Содержит внешний идентификатор (опция), тип задачи и словарь параметров.
+    Содержит внешний идентификатор (опция), тип задачи, словарь параметров
+    и URL для webhook о завершении (опция).
     """
     ExternalId: Optional[str] = None
     type: TaskType
     upload: Dict[str, Any]
+    callback_url: Optional[str] = Field(default=None, max_length=2048)
 
 
 class TaskResponse(BaseModel):
@@ -46,6 +48,8 @@ class TaskResponse(BaseModel):
     type: TaskType
     uuid: UUID
     created: datetime
+    estimated_start: Optional[datetime] = None  # оценка начала обработки
+    estimated_completion: Optional[datetime] = None  # оценка завершения
 
     model_config = ConfigDict(ser_json_timedelta='iso8601')
 
@@ -58,16 +62,63 @@ class TaskInfo(BaseModel):
     ExternalId: Optional[str] = None
     type: TaskType
     uuid: UUID
-    status: TaskStatus  # created, pending, done, error
+    status: TaskStatus  # created, pending, done, error, cancelled
     created: Optional[datetime] = None
     processed: Optional[datetime] = None
+    enqueued_at: Optional[datetime] = None  # постановка в очередь (в т.ч. повторная)
+    dequeued_at: Optional[datetime] = None  # извлечение воркером
+    processed_at: Optional[datetime] = None  # переход в конечный статус
+    estimated_start: Optional[datetime] = None  # оценка начала (не хранится, считается при запросе)
+    estimated_completion: Optional[datetime] = None  # оценка завершения (не хранится)
     code: int
     message: str
     result: Optional[Dict[str, Any]] = None
+    version: int = Field(default=0, exclude=True)  # счётчик изменений задачи (для ETag)
 
     model_config = ConfigDict(ser_json_timedelta='iso8601')
 
 
+class TaskPage(BaseModel):
+    """
+    Страница списка задач клиента.
+    Содержит задачи (от новых к старым) и курсор следующей страницы (None — последняя страница).
+    """
+    items: List[TaskInfo]
+    next_cursor: Optional[str] = None
+
+
+class CancelRequest(BaseModel):
+    """
+    Запрос на отмену задач.
+    """
+    uuids: List[UUID] = Field(..., min_length=1, max_length=1000)
+
+
+class CancelResult(BaseModel):
+    """
+    Итог отмены одной задачи.
+    """
+    uuid: UUID
+    outcome: str  # accepted, not_found, forbidden, invalid_transition (задача уже завершена)
+
+
+class CancelResponse(BaseModel):
+    """
+    Итоги отмены задач.
+    Содержит итог по каждой задаче и число отменённых.
+    """
+    cancelled: int
+    results: List[CancelResult]
+
+
+class RevokeResponse(BaseModel):
+    """
+    Итог отзыва клиента: удалены ли закэшированные результаты его аутентификации.
+    """
+    client_id: str
+    auth_cache: bool  # False — кэш не настроен, каждый запрос и так проверяется в Vault
+
+
 class ErrorResponse(BaseModel):
     """
     Модель ошибки в формате JSON.
@@ -75,3 +126,179 @@ class ErrorResponse(BaseModel):
     """
     code: int
     message: str
+
+
+class VaultHealth(BaseModel):
+    """
+    Состояние подключения к Vault.
+    Содержит состояние автомата защиты и число решений, принятых в режиме отсрочки.
+    """
+    state: str  # closed, open, half_open, disabled
+    consecutive_failures: int
+    opened_at: Optional[datetime] = None
+    grace_decisions: int
+
+
+class ProfileEntry(BaseModel):
+    """
+    Строка таблицы профиля: функция и число выборок.
+    """
+    function: str
+    self_samples: int  # выборки, в которых функция — верхний кадр стека
+    self_pct: float
+    total_samples: int  # выборки, в которых функция есть в стеке
+    total_pct: float
+
+
+class ProfileReport(BaseModel):
+    """
+    Результат сеанса профилирования CPU.
+    Содержит таблицу top-N функций и стеки в collapsed-формате (для flamegraph).
+    """
+    seconds: float
+    interval_ms: float
+    samples: int
+    stacks: int
+    top: List[ProfileEntry]
+    collapsed: str
+
+
+class ProcessReading(BaseModel):
+    """
+    Замер состояния процесса: RSS, сборщик мусора, потоки.
+    """
+    time: datetime
+    rss_bytes: int
+    gc_counts: List[int]  # объектов в поколениях GC (0, 1, 2) с последней сборки
+    gc_collections: List[int]  # число сборок по поколениям
+    gc_collected: int
+    gc_uncollectable: int
+    threads: int
+
+
+class MemoryReport(BaseModel):
+    """
+    Диагностика памяти процесса.
+    Содержит текущий замер, скорость роста RSS, живые модели API и очередь логов.
+    """
+    process: ProcessReading
+    rss_growth_bytes_per_hour: Optional[float] = None
+    live_objects: Optional[Dict[str, int]] = None
+    logger_backlog_bytes: Dict[str, int]
+    tracing: bool
+    snapshots: List[int]
+
+
+class MemoryTracingStatus(BaseModel):
+    """
+    Состояние трассировки выделений памяти.
+    """
+    tracing: bool
+    snapshots: List[int]
+
+
+class MemorySnapshot(BaseModel):
+    """
+    Снимок выделений памяти.
+    """
+    id: int
+    traced_bytes: int
+    peak_bytes: int
+
+
+class AllocationDiff(BaseModel):
+    """
+    Изменение выделений памяти в одном месте кода (file:line) между снимками.
+    """
+    location: str
+    size_diff: int
+    count_diff: int
+    size: int
+    count: int
+
+
+class MemoryDiff(BaseModel):
+    """
+    Разница двух снимков выделений памяти (по убыванию прироста).
+    """
+    first: int
+    second: int
+    entries: List[AllocationDiff]
+
+
+class RedisPoolStats(BaseModel):
+    """
+    Статистика пула соединений Redis.
+    """
+    shard: str
+    purpose: str  # requests или dequeue
+    max_connections: int
+    in_use: int
+    open: int
+    utilization: float
+    acquired: int
+    waits: int
+    timeouts: int
+    wait_ms_total: float
+    wait_ms_max: float
+
+
+class TaskMemoryGroup(BaseModel):
+    """
+    Оценка памяти Redis для задач одного типа в одном статусе.
+    """
+    type: str
+    status: str
+    tasks: int
+    bytes: int
+    avg_bytes: int
+
+
+class TaskMemoryReport(BaseModel):
+    """
+    Выборочная оценка памяти Redis, занятой задачами.
+    """
+    sampled_at: datetime
+    sample_size: int
+    tasks: int
+    bytes: int
+    groups: List[TaskMemoryGroup]
+
+
+class LatencyStat(BaseModel):
+    """
+    Распределение длительностей одного этапа задач за окно.
+    histogram — кумулятивные счётчики корзин: верхняя граница (мс) или "+Inf" → число задач.
+    """
+    count: int
+    rate_per_minute: float
+    mean_ms: Optional[float] = None
+    p50_ms: Optional[float] = None
+    p90_ms: Optional[float] = None
+    p99_ms: Optional[float] = None
+    histogram: Dict[str, int]
+
+
+class TaskTypeLatency(BaseModel):
+    """
+    Ожидание в очереди и время обработки задач одного типа.
+    """
+    queue_wait: LatencyStat
+    processing: LatencyStat
+
+
+class LatencyReport(BaseModel):
+    """
+    Задержки задач по типам за окно.
+    """
+    window_seconds: int
+    bucket_seconds: int
+    types: Dict[str, TaskTypeLatency]
+
+
+class RedisHealth(BaseModel):
+    """
+    Состояние пулов соединений Redis и оценка памяти задач (если замеры включены).
+    """
+    pools: List[RedisPoolStats]
+    memory: Optional[TaskMemoryReport] = None
@@ -0,0 +1,126 @@
+"""
+Потоковый приём файла из тела HTTP-запроса в хранилище blob-объектов.
+
+Поддерживаются два формата тела:
+- multipart/form-data — сохраняется первая часть с именем файла (filename),
+  остальные поля формы пропускаются;
+- любое другое (например, application/octet-stream, image/png) — тело целиком.
+
+Тело читается блоками по мере поступления и сразу дописывается в BlobWriter,
+SHA-256 вычисляется на лету. В памяти одновременно находится не больше
+одного блока запроса, поэтому потребление памяти не зависит от размера файла.
+"""
+
+from typing import List, Optional, Tuple
+from fastapi import Request
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from app.storage.blob_store import BlobWriter
+
+
+class PayloadTooLargeError(ValueError):
+    """
+    Размер загружаемого файла превышает допустимый для типа задачи.
+    """
+
+
+class _MultipartFileSink:
+    """
+    Обработчик событий потокового парсера multipart: собирает данные файловой части.
+    """
+
+    def __init__(self):
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.pending: List[bytes] = []  # данные файла из последнего блока запроса
+        self.found = False
+
+        self._headers = {}
+        self._field = b""
+        self._value = b""
+        self._active = False
+
+    def callbacks(self) -> dict:
+        """ Callbacks для MultipartParser. """
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._field.lower()] = self._value
+        self._field, self._value = b"", b""
+
+    def _on_headers_finished(self) -> None:
+        _, params = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if not self.found and b"filename" in params:
+            self._active = self.found = True
+            self.filename = params[b"filename"].decode("utf-8", "replace")
+            self.content_type = self._headers.get(
+                b"content-type", b"application/octet-stream").decode("latin-1")
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._active:
+            self.pending.append(data[start:end])
+
+    def _on_part_end(self) -> None:
+        self._active = False
+
+
+async def _write(writer: BlobWriter, chunks: List[bytes], max_size: int) -> None:
+    """ Дописывает блоки в хранилище, проверяя лимит размера. """
+    for chunk in chunks:
+        if writer.size + len(chunk) > max_size:
+            raise PayloadTooLargeError(f"Upload is too large: more than {max_size} bytes")
+        if chunk:
+            await run_in_threadpool(writer.write, chunk)
+
+
+async def receive_upload(request: Request, writer: BlobWriter,
+                         max_size: int) -> Tuple[Optional[str], str]:
+    """
+    Читает файл из тела запроса в хранилище blob-объектов.
+
+    :param request: HTTP-запрос
+    :param writer: Открытая запись blob-объекта (commit/abort — на стороне вызывающего)
+    :param max_size: Максимальный размер файла (байты)
+    :return: Кортеж (имя файла или None, MIME-тип файла)
+    :raises PayloadTooLargeError: если файл больше max_size
+    :raises ValueError: если в multipart нет файловой части
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data":
+        media_type = content_type.decode("latin-1") or "application/octet-stream"
+        async for chunk in request.stream():
+            await _write(writer, [chunk], max_size)
+        return None, media_type
+
+    if b"boundary" not in params:
+        raise ValueError("Multipart boundary is missing")
+
+    sink = _MultipartFileSink()
+    parser = MultipartParser(params[b"boundary"], sink.callbacks())
+    async for chunk in request.stream():
+        parser.write(chunk)
+        pending, sink.pending = sink.pending, []
+        await _write(writer, pending, max_size)
+    parser.finalize()
+
+    if not sink.found:
+        raise ValueError("Multipart body has no file part")
+    return sink.filename, sink.content_type
@@ -3,16 +3,126 @@
 Объединяет доступ к Redis и Vault, предоставляет REST-методы для работы с задачами.
 """
 
+import io
+import json
+import math
+import re
+import time
 from datetime import datetime, timezone
 from uuid import UUID, uuid4
-import inspect
-from fastapi import APIRouter, HTTPException, Header
+from typing import Annotated, BinaryIO, Iterator, List, Optional, Tuple, TypeVar
+from fastapi import APIRouter, HTTPException, Header, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from loguru import logger
 
 from app.api.models import TaskInput, TaskResponse, TaskInfo
-from app.api.models import ErrorResponse, TaskType
+from app.api.models import ErrorResponse, TaskType, TaskPage, TaskStatus, VaultHealth
+from app.api.models import CancelRequest, CancelResponse, CancelResult, RevokeResponse
+from app.api.models import LatencyReport, ProfileReport, RedisHealth
+from app.api.models import MemoryDiff, MemoryReport, MemorySnapshot, MemoryTracingStatus
+from app.api.task_types import TaskTypeRegistry, TaskTypeSpec, get_task_registry
+from app.api.fast_json import ModelJSONRoute
+from app.api.stream_upload import PayloadTooLargeError, receive_upload
+from app.auth.policy import WILDCARD
 from app.auth.security import VaultClient
-from app.queue.redis_queue import RedisQueue
+from app.diagnostics.memory import MemoryTracer, ProcessSampler, live_model_counts, logger_backlog
+from app.diagnostics.profiler import ProfileInProgressError, SamplingProfiler
+from app.queue.eta import CompletionEstimator
+from app.queue.latency import LatencyStats
+from app.queue.memory_sampler import TaskMemorySampler
+from app.queue.redis_queue import RedisQueue, TERMINAL_STATUSES
+from app.queue.redis_queue import ACCEPTED, REJECTED_FORBIDDEN, REJECTED_NOT_FOUND
+from app.queue.redis_queue import REJECTED_TRANSITION
+from app.storage.blob_store import BlobStore, CHUNK_SIZE, parse_ref
+from app.webhooks.dispatcher import CallbackAllowList
+
+ModelT = TypeVar("ModelT", TaskResponse, TaskInfo)  # ответы с оценкой сроков задачи
+
+ESTIMATE_ETAG_SECONDS = 10  # Точность оценки сроков, которую различает ETag (секунды)
+_BYTE_RANGE = re.compile(r"([0-9]*)-([0-9]*)")  # first-last, -suffix или first- (RFC 9110)
+
+
+def task_etag(info: TaskInfo) -> str:
+    """
+    Формирует ETag задачи по её счётчику версий.
+    Ответ с оценкой сроков получает слабый ETag с интервалом ESTIMATE_ETAG_SECONDS,
+    в который попадает оценка: опрос с If-None-Match видит сдвиг оценки.
+
+    :param info: Задача
+    :return: Значение заголовка ETag
+    """
+    estimate = info.estimated_completion or info.estimated_start
+    if estimate is None:
+        return f'"{info.uuid}.{info.version}"'
+    bucket = int(estimate.timestamp()) // ESTIMATE_ETAG_SECONDS
+    return f'W/"{info.uuid}.{info.version}.{bucket}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Проверяет заголовок If-None-Match (слабое сравнение, RFC 9110).
+
+    :param if_none_match: Значение заголовка If-None-Match
+    :param etag: Текущий ETag задачи
+    :return: True, если у клиента актуальная версия
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Разбирает заголовок Range с одним диапазоном байтов (RFC 9110).
+    Несколько диапазонов, другие единицы и синтаксически неверные диапазоны
+    (в том числе с последним байтом меньше первого) игнорируются — отдаётся весь объект.
+
+    :param range_header: Значение заголовка Range
+    :param size: Размер объекта в байтах
+    :return: Кортеж (первый байт, последний байт) включительно или None — весь объект
+    :raises ValueError: если диапазон не пересекается с объектом (HTTP 416)
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    match = _BYTE_RANGE.fullmatch(range_header[len("bytes="):].strip())
+    if match is None or match.group() == "-":
+        return None
+
+    first, last = match.groups()
+    if not first:  # bytes=-N: последние N байт
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(f"Range not satisfiable: {range_header}")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(f"Range not satisfiable: {range_header}")
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def iter_file(blob: BinaryIO, start: int, length: int) -> Iterator[bytes]:
+    """
+    Читает диапазон файла блоками фиксированного размера и закрывает файл.
+
+    :param blob: Файловый объект
+    :param start: Смещение первого байта
+    :param length: Число байт
+    :return: Итератор блоков
+    """
+    with blob:
+        blob.seek(start)
+        while length > 0:
+            chunk = blob.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
 
 
 class TaskRouter(APIRouter):
@@ -21,24 +131,143 @@ class TaskRouter(APIRouter):
     Реализует отправку задач, получение статуса задачи и проверку состояния сервиса.
     """
 
-    def __init__(self, redis_queue: RedisQueue, vault_client: VaultClient):
+    def __init__(self, redis_queue: RedisQueue, vault_client: VaultClient,
+                 task_registry: Optional[TaskTypeRegistry] = None,
+                 cache_max_age: int = 60, shared_cache: bool = False,
+                 blob_store: Optional[BlobStore] = None,
+                 memory_sampler: Optional[TaskMemorySampler] = None,
+                 profiler: Optional[SamplingProfiler] = None,
+                 process_sampler: Optional[ProcessSampler] = None,
+                 latency_stats: Optional[LatencyStats] = None,
+                 completion_estimator: Optional[CompletionEstimator] = None,
+                 callback_allowlist: Optional[CallbackAllowList] = None):
         """
         Инициализация маршрутизатора с передачей зависимостей.
 
         :param redis_queue: Класс работы с Redis очередью и задачами
         :param vault_client: Клиент Vault для аутентификации
+        :param task_registry: Реестр типов задач (по умолчанию — из config.json)
+        :param cache_max_age: max-age в Cache-Control для задач в конечных статусах (секунды)
+        :param shared_cache: Разрешить кэширование завершённых задач на CDN/прокси (public)
+        :param blob_store: Хранилище крупных результатов задач (для /taskresult)
+        :param memory_sampler: Оценка памяти задач в Redis (для /health/redis)
+        :param profiler: Профилировщик CPU для /debug/profile (по умолчанию — выборочный)
+        :param process_sampler: Периодические замеры RSS и GC для /debug/memory
+                                (по умолчанию — только замер по запросу)
+        :param latency_stats: Задержки задач по типам (для /stats/latency)
+        :param completion_estimator: Оценка сроков задач и интервала опроса (Retry-After)
+                                     для /submit и /taskinfo (None — без оценки)
+        :param callback_allowlist: Разрешённые клиентам callback_url (None — webhook выключены)
         """
-        super().__init__()
+        # Модели в ответах сериализуются напрямую в JSON-байты (см. fast_json)
+        super().__init__(route_class=ModelJSONRoute)
         self.queue = redis_queue
         self.vault = vault_client
+        self.task_types = task_registry or get_task_registry()
+        self.cache_max_age = cache_max_age
+        self.shared_cache = shared_cache
+        self.blob_store = blob_store
+        self.memory_sampler = memory_sampler
+        self.profiler = profiler or SamplingProfiler()
+        self.process_sampler = process_sampler or ProcessSampler()
+        self.memory_tracer = MemoryTracer()
+        self.latency_stats = latency_stats
+        self.completion_estimator = completion_estimator
+        self.callback_allowlist = callback_allowlist
         self._add_routes()
 
-    def who_called_me(self) -> str:
-        """ Определяет имя вызывающей функции. """
-        frame = inspect.currentframe()
-        caller_frame = frame.f_back
-        caller_name = caller_frame.f_code.co_name
-        return caller_name
+    def _cache_headers(self, info: TaskInfo) -> dict:
+        """
+        Заголовки ETag и Cache-Control для ответа /taskinfo.
+        Задача в конечном статусе больше не меняется и может кэшироваться на max-age;
+        остальные ответы клиент и прокси обязаны перепроверять (дёшево — через 304).
+
+        :param info: Задача
+        :return: Словарь заголовков
+        """
+        headers = {"ETag": task_etag(info)}
+        if info.status in TERMINAL_STATUSES:
+            scope = "public" if self.shared_cache else "private"
+            headers["Cache-Control"] = f"{scope}, max-age={self.cache_max_age}"
+            if self.shared_cache:
+                headers["Vary"] = "Authorization"
+        else:
+            headers["Cache-Control"] = "no-cache"
+        return headers
+
+    def _with_estimate(self, model: ModelT, task_type: str, status: TaskStatus,
+                       dequeued_at: Optional[datetime] = None) -> Tuple[ModelT, dict]:
+        """
+        Дополняет ответ оценкой сроков незавершённой задачи и предлагает интервал опроса.
+        Исходная модель не меняется (задача может лежать в локальном кэше).
+
+        :param model: TaskResponse или TaskInfo
+        :param task_type: Тип задачи
+        :param status: Статус задачи
+        :param dequeued_at: Момент извлечения задачи воркером
+        :return: Кортеж (модель с оценкой, заголовки с Retry-After)
+        """
+        if self.completion_estimator is None or status in TERMINAL_STATUSES:
+            return model, {}
+        estimate = self.completion_estimator.estimate(task_type, dequeued_at)
+        retry_after = estimate.pop("retry_after")
+        return model.model_copy(update=estimate), {"Retry-After": str(retry_after)}
+
+    def _check_callback(self, client_id: str, callback_url: Optional[str]) -> None:
+        """
+        Проверяет, что callback_url разрешён клиенту.
+
+        :param client_id: Идентификатор клиента
+        :param callback_url: URL для webhook (None — не задан)
+        :raises ValueError: если webhook выключены или URL не в списке разрешённых клиента
+        """
+        if callback_url is None:
+            return
+        if self.callback_allowlist is None:
+            raise ValueError("Webhooks are not enabled")
+        if not self.callback_allowlist.is_allowed(client_id, callback_url):
+            raise ValueError(f"Callback URL is not allowed for client '{client_id}'")
+
+    def _create_task(self, task: TaskInput, client_id: str) -> Tuple[TaskResponse, TaskTypeSpec]:
+        """
+        Проверяет upload и callback_url, сохраняет задачу и ставит её в очередь.
+
+        :param task: Входная задача
+        :param client_id: Идентификатор клиента — владельца задачи
+        :return: Кортеж (ответ с UUID задачи, описание типа задачи)
+        :raises ValueError: если upload не прошёл проверку типа задачи или callback_url запрещён
+        """
+        # Проверяем upload по предкомпилированной схеме типа задачи
+        spec = self.task_types.validate_upload(task.type.value, task.upload)
+        self._check_callback(client_id, task.callback_url)
+
+        # Извлекаем данные задачи
+        data = task.model_dump(mode="json")
+        if data["callback_url"] is None:
+            del data["callback_url"]  # наличие поля в задаче включает доставку webhook
+
+        task_uuid = str(uuid4()) # Генерируем новый UUID для задачи
+        created_date = datetime.now(timezone.utc).isoformat()  # ISO 8601 формат
+
+        data["uuid"] = task_uuid
+        data["status"] = "created" # Начальный статус задачи
+        data["created"] = created_date
+        data["code"] = 0
+        data["message"] = "Task created"
+        data["client_id"] = client_id # Владелец задачи (для индексов)
+
+        # Задача, индексы клиента и очередь — за одно обращение к Redis
+        self.queue.submit_task(task_uuid, data, spec.queue,
+                               ttl_seconds=spec.ttl_for(TaskStatus.CREATED.value),
+                               index_ttl=spec.max_ttl())
+
+        response = TaskResponse(
+            ExternalId=task.ExternalId,
+            type=task.type,
+            uuid=task_uuid,
+            created = created_date
+        )
+        return response, spec
 
     def _add_routes(self) -> None:
         """
@@ -51,93 +280,113 @@ class TaskRouter(APIRouter):
             403: {"model": ErrorResponse},
             500: {"model": ErrorResponse}
         })
-        def submit_task(task: TaskInput, authorization: str = Header(...)) -> TaskResponse:
+        def submit_task(task: TaskInput, authorization: str = Header(...),
+                        response: Response = None) -> TaskResponse:
             """
             Принять задачу, проверить авторизацию и отправить в очередь.
 
             :param task: Входная задача от клиента
             :param authorization: JWT или Basic заголовок
-            :return: Ответ с UUID задачи
+            :param response: Ответ FastAPI (для заголовка Retry-After)
+            :return: Ответ с UUID задачи и оценкой сроков
             """
+            started = time.perf_counter()
             logger.debug("submit_task is being called")
-            auth_info = self.vault.authenticate_user(authorization, action=self.who_called_me())
-            logger.info(f"Received task of type '{task.type}' \
-                        from user '{auth_info[0]}' with role '{auth_info[1]}'")
+            auth_info = self.vault.authenticate_user(authorization, endpoint="submit",
+                                                     task_type=task.type.value)
+            logger.debug("Received task of type '{type}' from user '{client_id}' with role '{role}'",
+                         type=task.type.value, client_id=auth_info[0], role=auth_info[1])
 
             try:
-                # Извлекаем данные задачи
-                data = task.model_dump()
-
-                task_uuid = str(uuid4()) # Генерируем новый UUID для задачи
-                created_date = datetime.now(timezone.utc).isoformat()  # ISO 8601 формат
-
-                data["uuid"] = task_uuid
-                data["status"] = "created" # Начальный статус задачи
-                data["created"] = created_date
+                created, spec = self._create_task(task, client_id=auth_info[0])
+                created, headers = self._with_estimate(created, task.type.value, TaskStatus.CREATED)
+                if response is not None:
+                    response.headers.update(headers)
 
-                self.queue.save_task(task_uuid, data)
-                self.queue.enqueue(f"{task.type.value}_INPUT", task_uuid)
-
-                logger.debug(f"Task {task_uuid}/{task.ExternalId} \
-                             enqueued to {task.type.value}_INPUT")
-
-                return TaskResponse(
-                    ExternalId=task.ExternalId,
-                    type=task.type,
-                    uuid=task_uuid,
-                    created = created_date
-                )
+                logger.info("Task {task_uuid} of type '{type}' from '{client_id}' enqueued to {queue}",
+                            task_uuid=created.uuid, external_id=task.ExternalId,
+                            type=task.type.value, client_id=auth_info[0], queue=spec.queue,
+                            latency_ms=round((time.perf_counter() - started) * 1000, 3),
+                            sampled=True)
+                return created
             except ValueError as ve:
-                logger.error(f"Task validation error: {ve}")
+                logger.error("Task validation error: {error}", error=str(ve),
+                             type=task.type.value, client_id=auth_info[0])
                 raise HTTPException(status_code=400, detail=str(ve)) from ve
             except Exception as e:
                 logger.exception("Error while processing submit")
                 raise HTTPException(status_code=500, detail="Internal server error") from e
 
         @self.get("/taskinfo", response_model=TaskInfo, responses={
+            304: {"description": "Задача не изменилась (If-None-Match)"},
             400: {"model": ErrorResponse},
             401: {"model": ErrorResponse},
+            403: {"model": ErrorResponse},
             500: {"model": ErrorResponse}
         })
-        def task_info(taskid: UUID, authorization: str = Header(...)) -> TaskInfo:
+        def task_info(taskid: UUID, authorization: str = Header(...),
+                      if_none_match: Annotated[Optional[str], Header()] = None,
+                      response: Response = None) -> TaskInfo:
             """
             Получить информацию по задаче по UUID.
+            Поддерживает условные запросы: ETag строится по счётчику версий задачи,
+            при совпадении If-None-Match возвращается 304 без тела.
 
             :param taskid: UUID задачи
             :param authorization: JWT или Basic заголовок
-            :return: Статус задачи и результат
+            :param if_none_match: ETag версии задачи, которая уже есть у клиента
+            :param response: Ответ FastAPI (для заголовков ETag, Cache-Control и Retry-After)
+            :return: Статус задачи, результат и оценка сроков незавершённой задачи
             """
-            logger.debug(f"task_info is being called for task {taskid}")
+            started = time.perf_counter()
+            logger.debug("task_info is being called for task {task_uuid}", task_uuid=taskid)
             # Проверяем авторизацию пользователя
             # и получаем информацию о нём
-            auth_info = self.vault.authenticate_user(authorization, action=self.who_called_me())
-            logger.debug(f"User '{auth_info[0]}' \
-                         with role '{auth_info[1]}' requests status for task {taskid}")
+            auth_info = self.vault.authenticate_user(authorization, endpoint="taskinfo")
+            logger.debug("User '{client_id}' with role '{role}' requests status for task {task_uuid}",
+                         client_id=auth_info[0], role=auth_info[1], task_uuid=taskid)
 
             try:
-                # Извлекаем задачу из очереди по UUID
-                task_data = self.queue.get_task(taskid)
-                if not task_data:
+                # Извлекаем задачу по UUID (конечные статусы — из локального кэша)
+                info = self.queue.get_task(taskid)
+                if not info:
                     raise HTTPException(status_code=400, detail="Invalid task ID")
 
-                return TaskInfo(
-                    ExternalId=task_data.get("ExternalId"),
-                    uuid=task_data["uuid"],
-                    type=TaskType(task_data["type"]),
-                    status=task_data["status"],
-                    created=task_data["created"],
-                    processed=task_data.get("processed"),
-                    code=task_data.get("code"),
-                    message=task_data.get("message"),
-                    result=task_data.get("result")
-                )
+                # Проверяем право роли на просмотр задач этого типа
+                if not self.vault.is_authorized(auth_info[1], "taskinfo", info.type.value):
+                    logger.error("Client {client_id} with role {role} "
+                                 "is not allowed to read tasks of type '{type}'",
+                                 client_id=auth_info[0], role=auth_info[1],
+                                 type=info.type.value, task_uuid=taskid)
+                    raise HTTPException(status_code=403, detail="Not allowed")
+
+                info, retry_headers = self._with_estimate(info, info.type.value, info.status,
+                                                          info.dequeued_at)
+                headers = self._cache_headers(info)
+                headers.update(retry_headers)
+                if etag_matches(if_none_match, headers["ETag"]):
+                    logger.info("Task {task_uuid} not modified for '{client_id}'",
+                                task_uuid=taskid, type=info.type.value, client_id=auth_info[0],
+                                latency_ms=round((time.perf_counter() - started) * 1000, 3),
+                                sampled=True)
+                    return Response(status_code=304, headers=headers)
+                if response is not None:
+                    response.headers.update(headers)
+
+                logger.info("Task {task_uuid} status '{status}' returned to '{client_id}'",
+                            task_uuid=taskid, status=info.status.value, type=info.type.value,
+                            client_id=auth_info[0],
+                            latency_ms=round((time.perf_counter() - started) * 1000, 3),
+                            sampled=True)
+                return info
             except ValueError as ve:
                 # Строго говоря, это ошибка обратной совместимости.
                 # В обычной ситуации произойти не может.
                 # Кто положил в очередь задачу и проверка типа прошла,
                 # а потом список типов или статусов изменился
                 # и когда мы вычитываем задачу, то не можем её обработать
-                logger.error(f"Task validation error for {taskid} by type or status: {ve}")
+                logger.error("Task validation error for {task_uuid} by type or status: {error}",
+                             task_uuid=taskid, error=str(ve))
                 raise HTTPException(status_code=400, detail="Invalid task type") from ve
             except HTTPException as he:
                 raise he  # Переправляем HTTP исключения без изменений
@@ -161,3 +410,524 @@ class TaskRouter(APIRouter):
             except Exception as e:
                 logger.exception("Health check error")
                 raise HTTPException(status_code=500, detail={"message": str(e), "code": -1}) from e
+
+        @self.get("/health/vault", response_model=VaultHealth, responses={
+            401: {"model": ErrorResponse},
+            403: {"model": ErrorResponse}
+        })
+        def vault_health(authorization: str = Header(...)) -> VaultHealth:
+            """
+            Состояние подключения к Vault: автомат защиты и режим отсрочки (только право "debug").
+
+            :param authorization: JWT или Basic заголовок
+            :return: Состояние автомата защиты и число решений в режиме отсрочки
+            """
+            logger.debug("Vault health check is being called")
+            self.vault.authenticate_user(authorization, endpoint="debug")
+            return VaultHealth(**self.vault.status())
+
+        @self.get("/tasks", response_model=TaskPage, responses={
+            400: {"model": ErrorResponse},
+            401: {"model": ErrorResponse},
+            403: {"model": ErrorResponse},
+            500: {"model": ErrorResponse}
+        })
+        def list_tasks(authorization: str = Header(...),
+                       task_type: Optional[TaskType] = Query(None, alias="type"),
+                       status: Optional[TaskStatus] = None,
+                       external_id: Optional[str] = Query(None, alias="ExternalId"),
+                       cursor: Optional[str] = None,
+                       limit: int = Query(50, ge=1, le=100)) -> TaskPage:
+            """
+            Список задач клиента от новых к старым с постраничной выдачей.
+            Возвращаются только задачи вызывающего клиента и только тех типов,
+            которые его роль может просматривать (право "taskinfo").
+
+            :param authorization: JWT или Basic заголовок
+            :param task_type: Фильтр по типу задачи
+            :param status: Фильтр по статусу задачи
+            :param external_id: Поиск задачи по внешнему идентификатору
+            :param cursor: Курсор следующей страницы из предыдущего ответа
+            :param limit: Размер страницы (1..100)
+            :return: Страница задач и курсор следующей страницы
+            """
+            started = time.perf_counter()
+            logger.debug("list_tasks is being called")
+            client_id, role = self.vault.authenticate_user(authorization, endpoint="taskinfo")
+
+            types: List[str] = [task_type.value] if task_type else self.task_types.names()
+            types = [name for name in types if self.vault.is_authorized(role, "taskinfo", name)]
+            if task_type and not types:
+                raise HTTPException(status_code=403, detail="Not allowed")
+
+            try:
+                if external_id is not None:
+                    task_uuid = self.queue.find_by_external_id(client_id, external_id)
+                    task = self.queue.get_task(task_uuid) if task_uuid else None
+                    items = [task] if task and task.type.value in types \
+                        and (status is None or task.status == status) else []
+                    page = TaskPage(items=items, next_cursor=None)
+                else:
+                    # курсор — время создания последней задачи страницы
+                    if cursor is not None and not math.isfinite(float(cursor)):
+                        raise ValueError(f"Non-finite cursor: {cursor}")
+                    items, next_cursor = self.queue.list_tasks(
+                        client_id, types, limit=limit, cursor=cursor,
+                        status=status.value if status else None)
+                    page = TaskPage(items=items, next_cursor=next_cursor)
+            except ValueError as ve:
+                logger.error("Invalid task list request from '{client_id}': {error}",
+                             client_id=client_id, error=str(ve))
+                raise HTTPException(status_code=400, detail="Invalid cursor") from ve
+            except Exception as e:
+                logger.exception("Error while processing list_tasks")
+                raise HTTPException(status_code=500, detail="Internal server error") from e
+
+            logger.info("Task list of {count} items returned to '{client_id}'",
+                        count=len(page.items), client_id=client_id,
+                        latency_ms=round((time.perf_counter() - started) * 1000, 3),
+                        sampled=True)
+            return page
+
+        @self.get("/taskresult/{taskid}", response_class=StreamingResponse, responses={
+            200: {"description": "Результат задачи целиком"},
+            206: {"description": "Запрошенный диапазон байтов результата (Range)"},
+            400: {"model": ErrorResponse},
+            401: {"model": ErrorResponse},
+            403: {"model": ErrorResponse},
+            404: {"model": ErrorResponse},
+            416: {"model": ErrorResponse},
+            500: {"model": ErrorResponse}
+        })
+        def task_result(taskid: UUID, authorization: str = Header(...),
+                        range_header: Annotated[Optional[str], Header(alias="Range")] = None
+                        ) -> StreamingResponse:
+            """
+            Скачать результат задачи потоком, с поддержкой Range.
+            Крупные результаты читаются из хранилища blob-объектов блоками,
+            без загрузки в память целиком.
+
+            :param taskid: UUID задачи
+            :param authorization: JWT или Basic заголовок
+            :param range_header: Диапазон байтов (например, "bytes=0-1023")
+            :return: Поток байтов результата
+            """
+            logger.debug("task_result is being called for task {task_uuid}", task_uuid=taskid)
+            client_id, role = self.vault.authenticate_user(authorization, endpoint="taskinfo")
+
+            try:
+                info = self.queue.get_task(taskid)
+                if not info:
+                    raise HTTPException(status_code=400, detail="Invalid task ID")
+                if not self.vault.is_authorized(role, "taskinfo", info.type.value):
+                    logger.error("Client {client_id} with role {role} "
+                                 "is not allowed to read tasks of type '{type}'",
+                                 client_id=client_id, role=role, type=info.type.value,
+                                 task_uuid=taskid)
+                    raise HTTPException(status_code=403, detail="Not allowed")
+                if info.result is None:
+                    raise HTTPException(status_code=404, detail="Result is not available")
+
+                digest = parse_ref(info.result)
+                if digest is None:
+                    # Небольшой результат хранится в задаче
+                    body = json.dumps(info.result).encode()
+                    blob, size, content_type = io.BytesIO(body), len(body), "application/json"
+                    etag = f'"{info.uuid}.{info.version}"'
+                elif self.blob_store is None:
+                    logger.error("Result of task {task_uuid} is offloaded, "
+                                 "but blob store is not configured", task_uuid=taskid)
+                    raise HTTPException(status_code=404, detail="Result is not available")
+                else:
+                    blob = self.blob_store.open(digest)
+                    size = info.result["size"]
+                    content_type = info.result.get("content_type", "application/octet-stream")
+                    etag = f'"{digest}"'
+            except HTTPException as he:
+                raise he  # Переправляем HTTP исключения без изменений
+            except FileNotFoundError as fe:
+                logger.error("Result blob of task {task_uuid} not found", task_uuid=taskid)
+                raise HTTPException(status_code=404, detail="Result is not available") from fe
+            except ValueError as ve:
+                logger.error("Task validation error for {task_uuid}: {error}",
+                             task_uuid=taskid, error=str(ve))
+                raise HTTPException(status_code=400, detail="Invalid task type") from ve
+            except Exception as e:
+                logger.exception("Error while processing task_result")
+                raise HTTPException(status_code=500, detail="Internal server error") from e
+
+            headers = {"Accept-Ranges": "bytes", "ETag": etag}
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError as ve:
+                blob.close()
+                raise HTTPException(status_code=416, detail="Range not satisfiable",
+                                    headers={"Content-Range": f"bytes */{size}"}) from ve
+
+            start, end = byte_range or (0, size - 1)
+            headers["Content-Length"] = str(end - start + 1)
+            if byte_range:
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+            logger.info("Result of task {task_uuid} ({length} bytes) sent to '{client_id}'",
+                        task_uuid=taskid, length=end - start + 1, client_id=client_id,
+                        sampled=True)
+            return StreamingResponse(iter_file(blob, start, end - start + 1),
+                                     status_code=206 if byte_range else 200,
+                                     media_type=content_type, headers=headers)
+
+        @self.post("/submit/stream", response_model=TaskResponse, responses={
+            400: {"model": ErrorResponse},
+            401: {"model": ErrorResponse},
+            403: {"model": ErrorResponse},
+            413: {"model": ErrorResponse},
+            500: {"model": ErrorResponse},
+            501: {"model": ErrorResponse}
+        })
+        async def submit_stream(request: Request,
+                                task_type: TaskType = Query(..., alias="type"),
+                                authorization: str = Header(...),
+                                external_id: Optional[str] = Query(None, alias="ExternalId"),
+                                filename: Optional[str] = None,
+                                callback_url: Optional[str] = None,
+                                response: Response = None) -> TaskResponse:
+            """
+            Принять задачу с файлом в теле запроса (multipart/form-data или «сырое» тело).
+            Файл потоком записывается в хранилище blob-объектов, в upload задачи
+            попадает ссылка на него: {"blob": {...}, "filename": ...}.
+
+            :param request: HTTP-запрос с файлом в теле
+            :param task_type: Тип задачи
+            :param authorization: JWT или Basic заголовок
+            :param external_id: Внешний идентификатор задачи
+            :param filename: Имя файла (для «сырого» тела; в multipart берётся из части)
+            :param callback_url: URL для webhook о завершении задачи
+            :param response: Ответ FastAPI (для заголовка Retry-After)
+            :return: Ответ с UUID задачи и оценкой сроков
+            """
+            started = time.perf_counter()
+            logger.debug("submit_stream is being called")
+            if self.blob_store is None:
+                raise HTTPException(status_code=501, detail="Streaming upload is not enabled")
+
+            # Обращения к Vault и Redis блокирующие — выполняем их вне цикла событий
+            client_id, role = await run_in_threadpool(
+                self.vault.authenticate_user, authorization, endpoint="submit",
+                task_type=task_type.value)
+            logger.debug("Received stream of type '{type}' from user '{client_id}' with role '{role}'",
+                         type=task_type.value, client_id=client_id, role=role)
+
+            spec = self.task_types.get(task_type.value)
+            if spec is None:
+                raise HTTPException(status_code=400, detail=f"Unknown task type '{task_type.value}'")
+            try:
+                self._check_callback(client_id, callback_url)  # до приёма файла
+            except ValueError as ve:
+                raise HTTPException(status_code=400, detail=str(ve)) from ve
+            declared_size = request.headers.get("content-length")
+            if declared_size and declared_size.isdigit() and int(declared_size) > spec.max_upload_size:
+                raise HTTPException(status_code=413, detail="Upload is too large")
+
+            writer = await run_in_threadpool(self.blob_store.writer)
+            try:
+                part_filename, media_type = await receive_upload(request, writer,
+                                                                 spec.max_upload_size)
+                writer.content_type = media_type
+                ref = await run_in_threadpool(writer.commit)
+            except PayloadTooLargeError as pe:
+                await run_in_threadpool(writer.abort)
+                logger.error("Stream upload from '{client_id}' is too large: {error}",
+                             client_id=client_id, error=str(pe), type=task_type.value)
+                raise HTTPException(status_code=413, detail=str(pe)) from pe
+            except ValueError as ve:
+                await run_in_threadpool(writer.abort)
+                logger.error("Invalid stream upload from '{client_id}': {error}",
+                             client_id=client_id, error=str(ve), type=task_type.value)
+                raise HTTPException(status_code=400, detail=str(ve)) from ve
+            except Exception as e:
+                await run_in_threadpool(writer.abort)
+                logger.exception("Error while receiving stream upload")
+                raise HTTPException(status_code=500, detail="Internal server error") from e
+
+            upload = {"blob": ref}
+            if part_filename or filename:
+                upload["filename"] = part_filename or filename
+
+            try:
+                task = TaskInput(ExternalId=external_id, type=task_type, upload=upload,
+                                 callback_url=callback_url)
+                created, spec = await run_in_threadpool(self._create_task, task, client_id)
+            except ValueError as ve:
+                # Задача не записана: удаляем объект, если его создал этот запрос
+                # (тот же объект, найденный готовым, может принадлежать другим задачам)
+                if writer.created:
+                    await run_in_threadpool(self.blob_store.delete, parse_ref(ref))
+                logger.error("Task validation error: {error}", error=str(ve),
+                             type=task_type.value, client_id=client_id)
+                raise HTTPException(status_code=400, detail=str(ve)) from ve
+            except Exception as e:
+                logger.exception("Error while processing submit_stream")
+                raise HTTPException(status_code=500, detail="Internal server error") from e
+
+            logger.info("Task {task_uuid} of type '{type}' with {size} bytes file "
+                        "from '{client_id}' enqueued to {queue}",
+                        task_uuid=created.uuid, external_id=external_id, size=ref["size"],
+                        type=task_type.value, client_id=client_id, queue=spec.queue,
+                        latency_ms=round((time.perf_counter() - started) * 1000, 3),
+                        sampled=True)
+            created, headers = self._with_estimate(created, task_type.value, TaskStatus.CREATED)
+            if response is not None:
+                response.headers.update(headers)
+            return created
+
+        @self.get("/health/redis", response_model=RedisHealth, responses={
+            401: {"model": ErrorResponse},
+            403: {"model": ErrorResponse}
+        })
+        def redis_health(authorization: str = Header(...)) -> RedisHealth:
+            """
+            Состояние пулов соединений Redis: загрузка и ожидание свободных соединений,
+            а также последняя оценка памяти задач по типам и статусам (только право "debug").
+
+            :param authorization: JWT или Basic заголовок
+            :return: Статистика пулов запросов и dequeue по шардам и оценка памяти
+            """
+            logger.debug("Redis health check is being called")
+            self.vault.authenticate_user(authorization, endpoint="debug")
+            memory = self.memory_sampler.report if self.memory_sampler is not None else None
+            return RedisHealth(pools=self.queue.pool_stats(), memory=memory)
+
+        @self.post("/debug/profile", response_model=ProfileReport, responses={
+            400: {"model": ErrorResponse},
+            401: {"model": ErrorResponse},
+            403: {"model": ErrorResponse},
+            409: {"model": ErrorResponse}
+        })
+        def debug_profile(authorization: str = Header(...),
+                          seconds: float = Query(5, gt=0),
+                          top: int = Query(30, ge=1, le=500),
+                          output: str = Query("json", alias="format", pattern="^(json|collapsed)$"),
+                          include_idle: bool = False):
+            """
+            Профилирование CPU процесса в течение seconds секунд (только право "debug").
+            Обработчик занимает один поток пула на время сеанса; цикл событий и остальные
+            потоки продолжают обслуживать запросы и попадают в профиль.
+
+            :param authorization: JWT или Basic заголовок
+            :param seconds: Длительность сеанса (секунды)
+            :param top: Число строк в таблице функций
+            :param output: json — отчёт с таблицей и стеками, collapsed — только стеки (text/plain)
+            :param include_idle: Учитывать стеки простаивающих потоков
+            :return: Отчёт профилирования
+            """
+            client_id, _ = self.vault.authenticate_user(authorization, endpoint="debug")
+            logger.warning("CPU profile for {seconds} s requested by '{client_id}'",
+                           seconds=seconds, client_id=client_id)
+            try:
+                report = self.profiler.profile(seconds, top=top, include_idle=include_idle)
+            except ProfileInProgressError as e:
+                raise HTTPException(status_code=409, detail=str(e)) from e
+            except ValueError as ve:
+                raise HTTPException(status_code=400, detail=str(ve)) from ve
+
+            if output == "collapsed":
+                return PlainTextResponse(report["collapsed"] + "\n")
+            return ProfileReport(**report)
+
+        @self.get("/debug/memory", response_model=MemoryReport, responses={
+            401: {"model": ErrorResponse},
+            403: {"model": ErrorResponse}
+        })
+        def debug_memory(authorization: str = Header(...), objects: bool = True) -> MemoryReport:
+            """
+            Диагностика памяти: RSS и GC, скорость роста RSS, живые модели API,
+            объём очереди логов Loguru и состояние трассировки (только право "debug").
+
+            :param authorization: JWT или Basic заголовок
+            :param objects: Подсчитать живые модели API (перебор объектов GC)
+            :return: Отчёт о памяти процесса
+            """
+            self.vault.authenticate_user(authorization, endpoint="debug")
+            return MemoryReport(
+                process=self.process_sampler.read(),
+                rss_growth_bytes_per_hour=self.process_sampler.rss_growth_per_hour(),
+                live_objects=live_model_counts() if objects else None,
+                logger_backlog_bytes=logger_backlog(),
+                tracing=self.memory_tracer.tracing,
+                snapshots=self.memory_tracer.snapshot_ids)
+
+        @self.post("/debug/memory/tracing", response_model=MemoryTracingStatus, responses={
+            401: {"model": ErrorResponse},
+            403: {"model": ErrorResponse}
+        })
+        def debug_memory_tracing(authorization: str = Header(...), enabled: bool = True,
+                                 frames: int = Query(1, ge=1, le=25)) -> MemoryTracingStatus:
+            """
+            Включает или выключает трассировку выделений памяти (только право "debug").
+            Выключение удаляет снятые снимки.
+
+            :param authorization: JWT или Basic заголовок
+            :param enabled: Включить (true) или выключить (false)
+            :param frames: Глубина сохраняемого стека выделения
+            :return: Состояние трассировки
+            """
+            client_id, _ = self.vault.authenticate_user(authorization, endpoint="debug")
+            logger.warning("Memory tracing {action} requested by '{client_id}'",
+                           action="start" if enabled else "stop", client_id=client_id)
+            if enabled:
+                self.memory_tracer.start(frames)
+            else:
+                self.memory_tracer.stop()
+            return MemoryTracingStatus(tracing=self.memory_tracer.tracing,
+                                       snapshots=self.memory_tracer.snapshot_ids)
+
+        @self.post("/debug/memory/snapshot", response_model=MemorySnapshot, responses={
+            401: {"model": ErrorResponse},
+            403: {"model": ErrorResponse},
+            409: {"model": ErrorResponse}
+        })
+        def debug_memory_snapshot(authorization: str = Header(...)) -> MemorySnapshot:
+            """
+            Снимает снимок выделений памяти (только право "debug").
+
+            :param authorization: JWT или Basic заголовок
+            :return: Идентификатор снимка и объём отслеживаемой памяти
+            """
+            self.vault.authenticate_user(authorization, endpoint="debug")
+            try:
+                return MemorySnapshot(**self.memory_tracer.snapshot())
+            except RuntimeError as e:
+                raise HTTPException(status_code=409, detail=str(e)) from e
+
+        @self.get("/debug/memory/diff", response_model=MemoryDiff, responses={
+            401: {"model": ErrorResponse},
+            403: {"model": ErrorResponse},
+            404: {"model": ErrorResponse},
+            409: {"model": ErrorResponse}
+        })
+        def debug_memory_diff(authorization: str = Header(...), first: int = Query(...),
+                              second: Optional[int] = None,
+                              top: int = Query(30, ge=1, le=500)) -> MemoryDiff:
+            """
+            Разница двух снимков выделений по file:line (только право "debug").
+
+            :param authorization: JWT или Basic заголовок
+            :param first: Идентификатор более раннего снимка
+            :param second: Идентификатор более позднего снимка (нет — снимается новый)
+            :param top: Число строк с наибольшим приростом
+            :return: Места выделения с приростом объёма и числа блоков
+            """
+            self.vault.authenticate_user(authorization, endpoint="debug")
+            try:
+                return MemoryDiff(**self.memory_tracer.diff(first, second, top=top))
+            except KeyError as e:
+                raise HTTPException(status_code=404, detail=f"Snapshot {e} not found") from e
+            except RuntimeError as e:
+                raise HTTPException(status_code=409, detail=str(e)) from e
+
+        @self.get("/stats/latency", response_model=LatencyReport, responses={
+            401: {"model": ErrorResponse},
+            403: {"model": ErrorResponse},
+            404: {"model": ErrorResponse}
+        })
+        def latency_stats(authorization: str = Header(...), window: int = Query(3600, ge=60),
+                          task_type: Optional[str] = Query(None, alias="type")) -> LatencyReport:
+            """
+            Ожидание в очереди и время обработки задач по типам за последние window секунд:
+            число задач, темп, среднее, p50/p90/p99 и кумулятивная гистограмма
+            (только право "debug").
+
+            :param authorization: JWT или Basic заголовок
+            :param window: Окно сводки (секунды, не больше срока хранения)
+            :param task_type: Только указанный тип задачи
+            :return: Задержки по типам задач
+            """
+            self.vault.authenticate_user(authorization, endpoint="debug")
+            if self.latency_stats is None:
+                raise HTTPException(status_code=404, detail="Latency statistics are disabled")
+            names = self.task_types.names()
+            if task_type is not None:
+                if task_type not in names:
+                    raise HTTPException(status_code=404, detail=f"Unknown task type '{task_type}'")
+                names = [task_type]
+            window = min(window, self.latency_stats.retention)
+            return LatencyReport(window_seconds=window,
+                                 bucket_seconds=self.latency_stats.bucket_seconds,
+                                 types=self.latency_stats.summary(names, window))
+
+        @self.post("/cancel", response_model=CancelResponse, responses={
+            400: {"model": ErrorResponse},
+            401: {"model": ErrorResponse},
+            403: {"model": ErrorResponse},
+            409: {"model": ErrorResponse},
+            500: {"model": ErrorResponse}
+        })
+        def cancel_tasks(authorization: str = Header(...), taskid: Optional[UUID] = None,
+                         cancel: Optional[CancelRequest] = None) -> CancelResponse:
+            """
+            Отменить задачи в статусе created или pending: одну (taskid) или пачку (тело запроса).
+            Задачи получают статус cancelled за одно обращение к Redis на шард, из очереди
+            их не удаляют — воркеры пропускают отменённые задачи при извлечении.
+            Отменять можно свои задачи типов, на которые у роли есть право "cancel";
+            роль с правом "cancel" на любой тип ("*") отменяет задачи любых клиентов.
+
+            :param authorization: JWT или Basic заголовок
+            :param taskid: UUID одной задачи
+            :param cancel: UUID задач для пакетной отмены
+            :return: Число отменённых задач и итог по каждой
+            """
+            started = time.perf_counter()
+            logger.debug("cancel_tasks is being called")
+            client_id, role = self.vault.authenticate_user(authorization, endpoint="cancel")
+
+            task_uuids = ([taskid] if taskid else []) + (cancel.uuids if cancel else [])
+            if not task_uuids:
+                raise HTTPException(status_code=400, detail="No task ID to cancel")
+            types = [name for name in self.task_types.names()
+                     if self.vault.is_authorized(role, "cancel", name)]
+            owner = None if self.vault.is_authorized(role, "cancel", WILDCARD) else client_id
+
+            try:
+                outcomes = self.queue.cancel_tasks(task_uuids, types, client_id=owner)
+            except Exception as e:
+                logger.exception("Error while processing cancel_tasks")
+                raise HTTPException(status_code=500, detail="Internal server error") from e
+
+            # Отмена одной задачи по taskid отвечает кодом ошибки, как /taskinfo
+            if cancel is None:
+                outcome = outcomes[str(taskid)]
+                if outcome == REJECTED_NOT_FOUND:
+                    raise HTTPException(status_code=400, detail="Invalid task ID")
+                if outcome == REJECTED_FORBIDDEN:
+                    raise HTTPException(status_code=403, detail="Not allowed")
+                if outcome == REJECTED_TRANSITION:
+                    raise HTTPException(status_code=409, detail="Task is already finished")
+
+            results = [CancelResult(uuid=task_uuid, outcome=outcome)
+                       for task_uuid, outcome in outcomes.items()]
+            cancelled = sum(result.outcome == ACCEPTED for result in results)
+            logger.info("{cancelled} of {count} task(s) cancelled by '{client_id}'",
+                        cancelled=cancelled, count=len(results), client_id=client_id,
+                        latency_ms=round((time.perf_counter() - started) * 1000, 3))
+            return CancelResponse(cancelled=cancelled, results=results)
+
+        @self.post("/admin/revoke", response_model=RevokeResponse, responses={
+            401: {"model": ErrorResponse},
+            403: {"model": ErrorResponse}
+        })
+        def revoke_client(authorization: str = Header(...),
+                          client_id: str = Query(..., min_length=1)) -> RevokeResponse:
+            """
+            Отзыв клиента (только право "admin"): записи кэша аутентификации клиента
+            удаляются во всех репликах (L2), логины, начатые до отзыва, не возвращают их.
+            Сам доступ отзывается в Vault; в L1 других процессов запись живёт не дольше local_ttl.
+
+            :param authorization: JWT или Basic заголовок
+            :param client_id: Идентификатор отзываемого клиента
+            :return: Идентификатор клиента и признак очистки кэша
+            """
+            admin_id, _ = self.vault.authenticate_user(authorization, endpoint="admin")
+            logger.warning("Auth cache entries of client '{client_id}' revoked by '{admin_id}'",
+                           client_id=client_id, admin_id=admin_id)
+            return RevokeResponse(client_id=client_id,
+                                  auth_cache=self.vault.revoke_client(client_id))
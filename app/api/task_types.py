@@ -0,0 +1,202 @@
+"""
+Реестр типов задач CT Task Router.
+
+Типы задач описываются в секции "task_types" файла config.json:
+- queue: имя входной очереди Redis;
+- ttl: время жизни задачи в секундах;
+- status_ttl: время жизни по статусам (created, pending, done, error) — TTL ключа
+  задачи заменяется при переходе в статус; для статусов без значения действует ttl;
+- max_payload_size: максимальный размер upload (в байтах сериализованного JSON);
+- max_upload_size: максимальный размер файла, загружаемого потоком (POST /submit/stream);
+- schema: JSON-схема для проверки поля upload.
+
+JSON-схемы компилируются один раз при загрузке реестра, поэтому проверка
+входящей задачи не требует повторного разбора схемы.
+Если конфигурация недоступна, используется набор типов по умолчанию.
+"""
+
+import json
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from jsonschema import Draft7Validator, SchemaError
+from loguru import logger
+
+from app.config.loader import get_config
+
+DEFAULT_TTL = 3600  # TTL задачи по умолчанию (секунды)
+DEFAULT_MAX_PAYLOAD_SIZE = 1024 * 1024  # Максимальный размер upload по умолчанию (байты)
+DEFAULT_MAX_UPLOAD_SIZE = 64 * 1024 * 1024  # Максимальный размер файла в потоке (байты)
+
+# Типы задач, доступные без явной настройки в config.json
+DEFAULT_TASK_TYPES: Dict[str, dict] = {
+    "calc_hash": {
+        "queue": "calc_hash_INPUT",
+        "ttl": DEFAULT_TTL,
+        "max_payload_size": DEFAULT_MAX_PAYLOAD_SIZE,
+        "schema": {"type": "object", "minProperties": 1}
+    },
+    "resize_image": {
+        "queue": "resize_image_INPUT",
+        "ttl": DEFAULT_TTL,
+        "max_payload_size": DEFAULT_MAX_PAYLOAD_SIZE,
+        "schema": {"type": "object", "minProperties": 1}
+    }
+}
+
+
+class TaskTypeSpec:
+    """
+    Описание одного типа задачи с предкомпилированным валидатором upload.
+    """
+
+    def __init__(self, name: str, spec: dict):
+        """
+        Создаёт описание типа задачи и компилирует JSON-схему upload.
+
+        :param name: Имя типа задачи (например, "calc_hash")
+        :param spec: Параметры типа из конфигурации
+        :raises ValueError: если JSON-схема некорректна
+        """
+        self.name = name
+        self.queue = spec.get("queue", f"{name}_INPUT")
+        self.ttl = spec.get("ttl", DEFAULT_TTL)
+        self.max_payload_size = spec.get("max_payload_size", DEFAULT_MAX_PAYLOAD_SIZE)
+        self.max_upload_size = spec.get("max_upload_size", DEFAULT_MAX_UPLOAD_SIZE)
+        self.status_ttl: Dict[str, int] = dict(spec.get("status_ttl", {}))
+        schema = spec.get("schema", {"type": "object"})
+
+        try:
+            Draft7Validator.check_schema(schema)
+        except SchemaError as e:
+            raise ValueError(f"Invalid upload schema for task type '{name}': {e.message}") from e
+
+        self.validator = Draft7Validator(schema)
+
+    def ttl_for(self, status: str) -> int:
+        """
+        Время жизни задачи в указанном статусе.
+
+        :param status: Статус задачи
+        :return: TTL в секундах
+        """
+        return self.status_ttl.get(status, self.ttl)
+
+    def max_ttl(self) -> int:
+        """
+        Наибольшее время жизни задачи среди статусов — TTL записей индексов задачи.
+
+        :return: TTL в секундах
+        """
+        return max([self.ttl, *self.status_ttl.values()])
+
+    def validate_upload(self, upload: Dict[str, Any]) -> None:
+        """
+        Проверяет размер и структуру upload.
+
+        :param upload: Параметры задачи от клиента
+        :raises ValueError: если upload превышает лимит или не соответствует схеме
+        """
+        size = len(json.dumps(upload, separators=(",", ":")))
+        if size > self.max_payload_size:
+            raise ValueError(f"Upload for task type '{self.name}' is too large: "
+                             f"{size} > {self.max_payload_size} bytes")
+
+        error = next(self.validator.iter_errors(upload), None)
+        if error is not None:
+            path = " → ".join([str(p) for p in error.path])
+            raise ValueError(f"Upload validation error for task type '{self.name}': "
+                             f"{error.message} (field: {path})")
+
+
+class TaskTypeRegistry:
+    """
+    Реестр допустимых типов задач.
+    Содержит параметры каждого типа и скомпилированные валидаторы upload.
+    """
+
+    def __init__(self, task_types: Dict[str, dict]):
+        """
+        Создаёт реестр и компилирует схемы всех типов задач.
+
+        :param task_types: Словарь "имя типа → параметры типа"
+        :raises ValueError: если реестр пуст или схема типа некорректна
+        """
+        if not task_types:
+            raise ValueError("Task type registry is empty")
+
+        self._types = {name: TaskTypeSpec(name, spec) for name, spec in task_types.items()}
+
+    def names(self) -> List[str]:
+        """ Возвращает имена зарегистрированных типов задач. """
+        return list(self._types)
+
+    def get(self, name: str) -> Optional[TaskTypeSpec]:
+        """
+        Возвращает описание типа задачи.
+
+        :param name: Имя типа задачи
+        :return: TaskTypeSpec или None, если тип не зарегистрирован
+        """
+        return self._types.get(name)
+
+    def ttl_for(self, name: str, status: str) -> Optional[int]:
+        """
+        Время жизни задачи указанного типа в указанном статусе.
+
+        :param name: Имя типа задачи
+        :param status: Статус задачи
+        :return: TTL в секундах или None, если тип не зарегистрирован
+        """
+        spec = self._types.get(name)
+        return spec.ttl_for(status) if spec is not None else None
+
+    def validate_upload(self, name: str, upload: Dict[str, Any]) -> TaskTypeSpec:
+        """
+        Проверяет upload задачи указанного типа.
+
+        :param name: Имя типа задачи
+        :param upload: Параметры задачи от клиента
+        :return: Описание типа задачи
+        :raises ValueError: если тип неизвестен или upload невалиден
+        """
+        spec = self._types.get(name)
+        if spec is None:
+            raise ValueError(f"Unknown task type '{name}'")
+        spec.validate_upload(upload)
+        return spec
+
+    def build_enum(self) -> type:
+        """
+        Строит перечисление TaskType по именам зарегистрированных типов.
+
+        :return: Класс перечисления (str, Enum)
+        """
+        return Enum("TaskType", {name.upper(): name for name in self._types},
+                    type=str, module="app.api.models")
+
+
+def load_task_types() -> Dict[str, dict]:
+    """
+    Загружает описания типов задач из config.json.
+    Если конфигурация недоступна или секция не задана — возвращает типы по умолчанию.
+
+    :return: Словарь "имя типа → параметры типа"
+    """
+    try:
+        task_types = get_config().get("task_types")
+    except RuntimeError as e:
+        logger.debug(f"Task types are taken from defaults: {e}")
+        return DEFAULT_TASK_TYPES
+
+    return task_types or DEFAULT_TASK_TYPES
+
+
+@lru_cache()
+def get_task_registry() -> TaskTypeRegistry:
+    """
+    Возвращает реестр типов задач (создаётся один раз на процесс).
+
+    :return: TaskTypeRegistry
+    """
+    return TaskTypeRegistry(load_task_types())
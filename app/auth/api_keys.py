@@ -0,0 +1,142 @@
+"""
+Реестр статических API-ключей для внутренних сервисов.
+
+Заголовок: "Authorization: ApiKey <key_id>.<secret>".
+
+Реестр целиком читается из KV-хранилища Vault одним запросом и периодически
+обновляется в фоновом потоке; каждый запрос проверяется локально, без обращения
+к Vault. В Vault хранится не сам секрет, а его HMAC-SHA256:
+
+    digest = HMAC-SHA256(key=secret, msg=key_id) в hex
+
+Формат секрета в KV (v2):
+    { "<key_id>": {"client_id": "...", "role": "...", "digest": "..."}, ... }
+
+Отзыв ключа (удаление из KV) вступает в силу при следующем успешном обновлении —
+обычно не позднее чем через refresh_interval. Пока Vault недоступен, прежний реестр
+продолжает принимать удалённый ключ до max_staleness с последнего успешного обновления;
+после этого проверка всех ключей отклоняется до восстановления связи с Vault.
+"""
+
+import hashlib
+import hmac
+import json
+import threading
+import time
+from typing import Dict, Optional, Tuple
+import hvac
+from loguru import logger
+
+# Дайджест для несуществующих ключей: сравнение выполняется всегда,
+# чтобы время ответа не выдавало наличие key_id в реестре
+_DUMMY_DIGEST = "0" * 64
+
+
+def api_key_digest(key_id: str, secret: str) -> str:
+    """
+    Вычисляет дайджест API-ключа для хранения в Vault.
+
+    :param key_id: Идентификатор ключа
+    :param secret: Секретная часть ключа
+    :return: HMAC-SHA256 в hex
+    """
+    return hmac.new(secret.encode(), key_id.encode(), hashlib.sha256).hexdigest()
+
+
+class ApiKeyRegistry:
+    """
+    Локальная копия реестра API-ключей из Vault KV.
+    """
+
+    def __init__(self, client: hvac.Client, path: str, mount_point: str = "secret",
+                 refresh_interval: int = 60, max_staleness: int = 300):
+        """
+        Инициализирует реестр (без загрузки — см. refresh() и start()).
+
+        :param client: Клиент Vault
+        :param path: Путь секрета с реестром ключей в KV v2
+        :param mount_point: Точка монтирования KV v2
+        :param refresh_interval: Период обновления реестра (секунды)
+        :param max_staleness: Максимальный возраст реестра, после которого ключи не принимаются
+        """
+        self.client = client
+        self.path = path
+        self.mount_point = mount_point
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+
+        self._keys: Dict[str, Tuple[str, str, str]] = {}  # key_id → (client_id, role, digest)
+        self._loaded_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self) -> bool:
+        """
+        Загружает реестр ключей из Vault одним запросом.
+        При ошибке сохраняется предыдущая версия реестра.
+
+        :return: True, если реестр обновлён
+        """
+        try:
+            response = self.client.secrets.kv.v2.read_secret_version(
+                path=self.path, mount_point=self.mount_point)
+            data = response["data"]["data"]
+
+            keys = {}
+            for key_id, entry in data.items():
+                if isinstance(entry, str):
+                    entry = json.loads(entry)
+                keys[key_id] = (entry["client_id"], entry["role"], entry["digest"].lower())
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning(f"API key registry refresh failed: {e}")
+            return False
+
+        # Замена ссылки атомарна: читающие потоки видят старый или новый реестр целиком
+        self._keys = keys
+        self._loaded_at = time.monotonic()
+        logger.debug(f"API key registry refreshed: {len(keys)} keys")
+        return True
+
+    def is_fresh(self) -> bool:
+        """ Проверяет, что реестр загружен и не старше max_staleness. """
+        return self._loaded_at is not None \
+            and time.monotonic() - self._loaded_at <= self.max_staleness
+
+    def verify(self, key_id: str, secret: str) -> Optional[Tuple[str, str]]:
+        """
+        Проверяет API-ключ локально (сравнение за постоянное время).
+
+        :param key_id: Идентификатор ключа
+        :param secret: Секретная часть ключа
+        :return: Кортеж (client_id, role) или None, если ключ неверен или реестр устарел
+        """
+        if not self.is_fresh():
+            logger.error("API key registry is stale, API key authentication is rejected")
+            return None
+
+        entry = self._keys.get(key_id)
+        digest = api_key_digest(key_id, secret)
+        matched = hmac.compare_digest(digest, entry[2] if entry else _DUMMY_DIGEST)
+        if entry is None or not matched:
+            return None
+        return entry[0], entry[1]
+
+    def start(self) -> None:
+        """ Запускает фоновое обновление реестра. """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="api-key-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ Останавливает фоновое обновление реестра. """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """ Цикл фонового обновления. """
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
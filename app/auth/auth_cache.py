@@ -0,0 +1,370 @@
+"""
+Двухуровневый кэш результатов аутентификации VaultClient.
+
+- L1: локальный кэш процесса (ограничен по размеру и короткому TTL);
+- L2: общий кэш в Redis для всех воркеров uvicorn и реплик (опционально).
+
+В кэше хранятся только (client_id, role, expiry) под ключом HMAC-SHA256
+от учётных данных — сами учётные данные никуда не записываются.
+Одновременные промахи по одним и тем же учётным данным объединяются:
+внутри процесса — блокировкой по ключу, между процессами — блокировкой
+в Redis (SET NX), так что логин в Vault выполняется один раз на кластер.
+
+Режим отсрочки (grace_ttl > 0): после истечения TTL запись хранится ещё
+grace_ttl секунд и используется, только если Vault недоступен
+(VaultUnavailableError) — но не дольше срока действия самих учётных данных.
+Каждое такое решение логируется и учитывается в счётчике grace_decisions.
+
+Отзыв клиента (invalidate_client) увеличивает счётчик отзывов и запоминает его значение
+для клиента (поколение отзыва). Логин, начатый до отзыва, сравнивает поколение клиента
+со снимком счётчика после записи в L2 и удаляет свою запись — отозванный клиент
+не возвращается в кэш завершившимся позже логином.
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from uuid import uuid4
+import redis
+from loguru import logger
+
+from app.auth.circuit_breaker import VaultUnavailableError
+
+KEY_PREFIX = "authcache"
+REVOCATIONS_KEY = f"{KEY_PREFIX}:revocations"  # Счётчик отзывов клиентов в кластере
+LOCK_POLL_INTERVAL = 0.05  # Интервал опроса L2 при ожидании чужого логина (секунды)
+
+# Освобождает блокировку, только если она принадлежит вызывающему
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Результат загрузки: client_id, роль и момент истечения учётных данных (unix time) или None
+LoadResult = Tuple[str, str, Optional[float]]
+
+# Запись кэша: client_id, роль, "свежа до", "допустима в режиме отсрочки до" (unix time)
+Entry = Tuple[str, str, float, float]
+
+
+def _revoked_key(client_id: str) -> str:
+    """ Ключ поколения последнего отзыва клиента. """
+    return f"{KEY_PREFIX}:revoked:{client_id}"
+
+
+class AuthCache:
+    """
+    Кэш решений аутентификации "учётные данные → (client_id, role)".
+    """
+
+    def __init__(self, secret: Optional[bytes] = None, ttl: int = 300, local_ttl: int = 30,
+                 max_entries: int = 10000, redis_client: Optional[redis.Redis] = None,
+                 lock_timeout: float = 5.0, grace_ttl: int = 0):
+        """
+        Инициализирует кэш.
+
+        :param secret: Ключ HMAC для хэширования учётных данных
+                       (обязателен при общем кэше, иначе генерируется на процесс)
+        :param ttl: Время жизни записи в секундах
+        :param local_ttl: Время жизни записи в L1 (ограничивает задержку отзыва между процессами)
+        :param max_entries: Максимальное число записей в L1
+        :param redis_client: Redis-клиент для общего кэша L2 (None — только L1)
+        :param lock_timeout: Время удержания блокировки логина в Redis (секунды)
+        :param grace_ttl: Сколько секунд после истечения TTL запись используется
+                          при недоступности Vault (0 — режим отсрочки отключён)
+        :raises ValueError: если для общего кэша не задан ключ HMAC
+        """
+        if redis_client is not None and not secret:
+            raise ValueError("Shared auth cache requires an HMAC secret")
+
+        self.secret = secret or os.urandom(32)
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.max_entries = max_entries
+        self.redis = redis_client
+        self.lock_timeout = lock_timeout
+        self.grace_ttl = grace_ttl
+        self.grace_decisions = 0  # Число решений, принятых в режиме отсрочки
+        self._revocations = 0  # Счётчик отзывов в процессе
+        self._revoked: Dict[str, int] = {}  # client_id → значение счётчика при отзыве
+
+        self._local: "OrderedDict[str, Entry]" = OrderedDict()
+        self._local_guard = threading.Lock()
+        self._locks: Dict[str, list] = {}  # ключ → [блокировка, число ожидающих]
+        self._locks_guard = threading.Lock()
+        self._release_lock = redis_client.register_script(RELEASE_LOCK_SCRIPT) \
+            if redis_client is not None else None
+
+    def digest(self, credential: str) -> str:
+        """
+        Вычисляет ключ кэша по учётным данным.
+
+        :param credential: Учётные данные (например, значение заголовка Authorization)
+        :return: HMAC-SHA256 в hex
+        """
+        return hmac.new(self.secret, credential.encode(), hashlib.sha256).hexdigest()
+
+    def get_or_load(self, credential: str, loader: Callable[[], LoadResult]) -> Tuple[str, str]:
+        """
+        Возвращает (client_id, role) из кэша или загружает через loader.
+
+        :param credential: Учётные данные
+        :param loader: Функция аутентификации в Vault, возвращает (client_id, role, expiry)
+        :return: Кортеж (client_id, role)
+        """
+        key = self.digest(credential)
+
+        identity = self._get_local(key)
+        if identity:
+            return identity
+
+        with self._key_lock(key):
+            # Пока ждали блокировку, другой поток мог уже загрузить запись
+            identity = self._get_local(key) or self._get_shared(key)
+            if identity:
+                return identity
+            return self._load(key, loader)
+
+    def invalidate_client(self, client_id: str) -> None:
+        """
+        Удаляет все записи клиента (при отзыве доступа) и запоминает поколение отзыва:
+        логины клиента, начатые раньше, не запишут результат в кэш.
+        В других процессах запись L1 живёт не дольше local_ttl.
+
+        :param client_id: Идентификатор клиента
+        """
+        with self._local_guard:
+            self._revocations += 1
+            self._revoked[client_id] = self._revocations
+            for key in [k for k, v in self._local.items() if v[0] == client_id]:
+                del self._local[key]
+
+        if self.redis is None:
+            return
+
+        try:
+            # Поколение отзыва записывается до удаления записей (см. _put_shared)
+            generation = self.redis.incr(REVOCATIONS_KEY)
+            self.redis.set(_revoked_key(client_id), generation,
+                           ex=self.ttl + self.grace_ttl + int(self.lock_timeout) + 1)
+            index_key = f"{KEY_PREFIX}:client:{client_id}"
+            keys = [f"{KEY_PREFIX}:{k.decode()}" for k in self.redis.smembers(index_key)]
+            self.redis.delete(index_key, *keys)
+        except redis.RedisError as e:
+            logger.warning("Auth cache invalidation failed for client {client_id}: {error}",
+                           client_id=client_id, error=str(e))
+            return
+
+        logger.info("Auth cache entries of client {client_id} invalidated", client_id=client_id)
+
+    def _get_local(self, key: str, stale: bool = False) -> Optional[Tuple[str, str]]:
+        """
+        Читает запись из L1.
+
+        :param stale: Допускать запись с истёкшим TTL в пределах отсрочки
+        """
+        now = time.time()
+        with self._local_guard:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if entry[3] <= now:
+                del self._local[key]
+                return None
+            if entry[2] <= now and not stale:
+                return None
+            self._local.move_to_end(key)
+            return entry[0], entry[1]
+
+    def _put_local(self, key: str, client_id: str, role: str,
+                   expiry: float, stale_until: float, generation: Optional[int] = None) -> None:
+        """
+        Записывает запись в L1 с вытеснением самых старых.
+
+        :param generation: Снимок счётчика отзывов процесса перед логином (None — без проверки)
+        """
+        with self._local_guard:
+            if generation is not None and self._revoked.get(client_id, 0) > generation:
+                return
+            self._local[key] = (client_id, role,
+                                min(expiry, time.time() + self.local_ttl), stale_until)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def _get_shared(self, key: str, stale: bool = False) -> Optional[Tuple[str, str]]:
+        """
+        Читает запись из L2 и переносит её в L1.
+
+        :param stale: Допускать запись с истёкшим TTL в пределах отсрочки
+        """
+        if self.redis is None:
+            return None
+
+        try:
+            raw = self.redis.hgetall(f"{KEY_PREFIX}:{key}")
+        except redis.RedisError as e:
+            logger.warning("Auth cache read failed: {error}", error=str(e))
+            return None
+
+        if not raw:
+            return None
+
+        now = time.time()
+        expiry = float(raw[b"expiry"])
+        stale_until = float(raw.get(b"stale_until", expiry))
+        if stale_until <= now or (expiry <= now and not stale):
+            return None
+
+        client_id, role = raw[b"client_id"].decode(), raw[b"role"].decode()
+        self._put_local(key, client_id, role, expiry, stale_until)
+        return client_id, role
+
+    def _generations(self) -> Tuple[int, int]:
+        """
+        Снимки счётчиков отзывов перед логином: в процессе и в Redis
+        (при ошибке Redis — 0: отозванные клиенты не записываются).
+        """
+        with self._local_guard:
+            local = self._revocations
+        if self.redis is None:
+            return local, 0
+        try:
+            return local, int(self.redis.get(REVOCATIONS_KEY) or 0)
+        except redis.RedisError as e:
+            logger.warning("Auth cache revocation counter read failed: {error}", error=str(e))
+            return local, 0
+
+    def _put_shared(self, key: str, client_id: str, role: str,
+                    expiry: float, stale_until: float, generation: int) -> bool:
+        """
+        Записывает запись в L2 и индекс записей клиента, если клиент не отозван
+        после снимка счётчика generation.
+
+        Поколение отзыва читается после записи: отзыв, записанный раньше, виден здесь —
+        запись удаляется; отзыв, записанный позже, сам удалит её по индексу клиента.
+
+        :return: True, если запись сохранена (или L2 не используется)
+        """
+        if self.redis is None:
+            return True
+
+        entry_key = f"{KEY_PREFIX}:{key}"
+        index_key = f"{KEY_PREFIX}:client:{client_id}"
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(entry_key, mapping={"client_id": client_id, "role": role,
+                                          "expiry": expiry, "stale_until": stale_until})
+            pipe.expireat(entry_key, int(stale_until) + 1)
+            pipe.sadd(index_key, key)
+            pipe.expire(index_key, self.ttl + self.grace_ttl)
+            pipe.get(_revoked_key(client_id))
+            revoked = pipe.execute()[-1]
+            if revoked and int(revoked) > generation:
+                self.redis.delete(entry_key)
+                logger.info("Auth cache entry of client {client_id} dropped: "
+                            "client was revoked during login", client_id=client_id)
+                return False
+        except redis.RedisError as e:
+            logger.warning("Auth cache write failed: {error}", error=str(e))
+        return True
+
+    def _grace(self, key: str, error: VaultUnavailableError) -> Tuple[str, str]:
+        """
+        Решение в режиме отсрочки: при недоступности Vault используется
+        запись с истёкшим TTL, если она ещё в пределах grace_ttl.
+
+        :raises VaultUnavailableError: если подходящей записи нет
+        """
+        identity = self._get_local(key, stale=True) or self._get_shared(key, stale=True)
+        if identity is None:
+            logger.error("Grace mode: no recent auth decision, request rejected: {error}",
+                         error=str(error))
+            raise error
+
+        with self._local_guard:
+            self.grace_decisions += 1
+        logger.warning("Grace mode: Vault is unavailable, honouring recent auth decision "
+                       "for client {client_id} with role {role}: {error}",
+                       client_id=identity[0], role=identity[1], error=str(error))
+        return identity
+
+    def _load(self, key: str, loader: Callable[[], LoadResult]) -> Tuple[str, str]:
+        """
+        Выполняет логин в Vault, объединяя одновременные промахи в кластере.
+        """
+        lock_key = f"{KEY_PREFIX}:lock:{key}"
+        lock_token = uuid4().hex
+        locked = False
+
+        if self.redis is not None:
+            try:
+                locked = bool(self.redis.set(lock_key, lock_token, nx=True,
+                                             px=int(self.lock_timeout * 1000)))
+            except redis.RedisError as e:
+                logger.warning("Auth cache lock failed: {error}", error=str(e))
+
+            if not locked:
+                # Логин уже выполняет другой процесс — ждём его результат в L2
+                identity = self._wait_shared(key, lock_key)
+                if identity:
+                    return identity
+
+        try:
+            local_generation, shared_generation = self._generations()
+            client_id, role, not_after = loader()
+            not_after = not_after or float("inf")
+            expiry = min(not_after, time.time() + self.ttl)
+            stale_until = min(not_after, expiry + self.grace_ttl)
+            if self._put_shared(key, client_id, role, expiry, stale_until, shared_generation):
+                self._put_local(key, client_id, role, expiry, stale_until, local_generation)
+            return client_id, role
+        except VaultUnavailableError as e:
+            return self._grace(key, e)
+        finally:
+            if locked:
+                try:
+                    self._release_lock(keys=[lock_key], args=[lock_token])
+                except redis.RedisError as e:
+                    logger.warning("Auth cache unlock failed: {error}", error=str(e))
+
+    def _wait_shared(self, key: str, lock_key: str) -> Optional[Tuple[str, str]]:
+        """
+        Ожидает появления записи в L2 не дольше lock_timeout.
+        Прекращает ожидание, если чужая блокировка снята без записи (логин не удался).
+        """
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            identity = self._get_shared(key)
+            if identity:
+                return identity
+            try:
+                if not self.redis.exists(lock_key):
+                    return None
+            except redis.RedisError:
+                return None
+        return None
+
+    @contextmanager
+    def _key_lock(self, key: str) -> Iterator[None]:
+        """ Блокировка по ключу кэша внутри процесса. """
+        with self._locks_guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
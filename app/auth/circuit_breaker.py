@@ -0,0 +1,152 @@
+"""
+Автомат защиты (circuit breaker) для обращений к Vault.
+
+Пока Vault недоступен, вызовы не блокируют потоки запросов до таймаута,
+а сразу завершаются ошибкой VaultUnavailableError:
+- CLOSED: вызовы проходят; после failure_threshold сбоев подряд — OPEN;
+- OPEN: вызовы отклоняются; через reset_timeout — HALF_OPEN;
+- HALF_OPEN: проходит один пробный вызов; успех — CLOSED, сбой — снова OPEN.
+
+Сбоем считается только недоступность Vault (таймаут, ошибка соединения, 5xx).
+Отказ в аутентификации означает, что Vault ответил, и сбоем не считается.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional, Tuple, TypeVar
+import hvac.exceptions
+import requests.exceptions
+from loguru import logger
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Исключения, означающие недоступность Vault
+VAULT_UNAVAILABLE_ERRORS: Tuple[type, ...] = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    hvac.exceptions.VaultDown,
+    hvac.exceptions.VaultNotInitialized,
+    hvac.exceptions.InternalServerError,
+    hvac.exceptions.BadGateway,
+)
+
+
+class VaultUnavailableError(Exception):
+    """
+    Vault недоступен: автомат разомкнут или вызов завершился сбоем доступности.
+    """
+
+
+class CircuitBreaker:
+    """
+    Потокобезопасный автомат защиты для вызовов Vault.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 name: str = "vault"):
+        """
+        Инициализирует автомат в состоянии CLOSED.
+
+        :param failure_threshold: Число сбоев подряд до размыкания
+        :param reset_timeout: Время в состоянии OPEN до пробного вызова (секунды)
+        :param name: Имя автомата для логов
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None  # time.monotonic() момента размыкания
+        self._opened_wall: Optional[float] = None  # time.time() момента размыкания
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """ Текущее состояние автомата (с учётом истечения reset_timeout). """
+        with self._lock:
+            if self._state == OPEN and self._reset_elapsed():
+                return HALF_OPEN
+            return self._state
+
+    def snapshot(self) -> dict:
+        """
+        Возвращает состояние автомата для мониторинга.
+
+        :return: Словарь с состоянием, числом сбоев подряд и моментом размыкания
+        """
+        state = self.state
+        with self._lock:
+            opened_at = datetime.fromtimestamp(self._opened_wall, tz=timezone.utc) \
+                if self._opened_wall is not None else None
+            return {"state": state, "consecutive_failures": self._failures,
+                    "opened_at": opened_at}
+
+    def call(self, func: Callable[[], T]) -> T:
+        """
+        Выполняет вызов Vault через автомат.
+
+        :param func: Вызов Vault без аргументов
+        :return: Результат вызова
+        :raises VaultUnavailableError: если автомат разомкнут или Vault недоступен
+        """
+        self._before_call()
+        try:
+            result = func()
+        except VAULT_UNAVAILABLE_ERRORS as e:
+            self._on_failure(e)
+            raise VaultUnavailableError(f"Vault is unavailable: {e}") from e
+        except Exception:
+            # Vault ответил (например, отказом в аутентификации) — он доступен
+            self._on_success()
+            raise
+        self._on_success()
+        return result
+
+    def _reset_elapsed(self) -> bool:
+        """ Истёк ли reset_timeout с момента размыкания (вызывается под блокировкой). """
+        return self._opened_at is not None \
+            and time.monotonic() - self._opened_at >= self.reset_timeout
+
+    def _before_call(self) -> None:
+        """ Пропускает вызов или отклоняет его без обращения к Vault. """
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN and self._reset_elapsed():
+                self._state = HALF_OPEN
+                logger.warning(f"Circuit breaker '{self.name}' is half-open, probing Vault")
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+        raise VaultUnavailableError(f"Circuit breaker '{self.name}' is open")
+
+    def _on_success(self) -> None:
+        """ Учитывает успешный вызов. """
+        with self._lock:
+            if self._state != CLOSED:
+                logger.warning(f"Circuit breaker '{self.name}' is closed, Vault is available")
+            self._state = CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._opened_wall = None
+            self._trial_in_flight = False
+
+    def _on_failure(self, error: Exception) -> None:
+        """ Учитывает сбой доступности Vault. """
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.error(f"Circuit breaker '{self.name}' is open after "
+                                 f"{self._failures} failures: {error}")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._opened_wall = time.time()
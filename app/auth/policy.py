@@ -0,0 +1,117 @@
+"""
+Политика доступа (RBAC) CT Task Router.
+
+Политика описывается в секции "rbac" файла config.json:
+роль → эндпоинт → список разрешённых типов задач.
+Символ "*" вместо эндпоинта или типа задачи означает "любой".
+
+При загрузке политика компилируется в множества кортежей,
+поэтому проверка права выполняется за константное время.
+"""
+
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+from loguru import logger
+
+from app.api.task_types import get_task_registry
+from app.config.loader import get_config
+
+WILDCARD = "*"
+
+# Эндпоинты, к которым применяется политика доступа
+ENDPOINTS = ("submit", "taskinfo", "cancel", "debug", "admin")
+
+# Политика по умолчанию (используется, если секция "rbac" не задана)
+DEFAULT_POLICY: Dict[str, Dict[str, List[str]]] = {
+    "admin": {WILDCARD: [WILDCARD]},
+    "service": {
+        "submit": ["calc_hash", "resize_image"],
+        "taskinfo": ["calc_hash", "resize_image"],
+        "cancel": ["calc_hash", "resize_image"]
+    },
+    "copytrust_site": {
+        "submit": ["calc_hash"],
+        "taskinfo": ["calc_hash"],
+        "cancel": ["calc_hash"]
+    }
+}
+
+
+class AccessPolicy:
+    """
+    Скомпилированная политика доступа "роль → (эндпоинт, тип задачи)".
+    """
+
+    def __init__(self, rules: Dict[str, Dict[str, List[str]]],
+                 task_types: Optional[Iterable[str]] = None):
+        """
+        Компилирует правила доступа.
+
+        :param rules: Словарь "роль → эндпоинт → список типов задач"
+        :param task_types: Известные типы задач (для проверки правил)
+        :raises ValueError: если правило ссылается на неизвестный эндпоинт или тип задачи
+        """
+        known_types = set(task_types) if task_types is not None else None
+        allowed: List[Tuple[str, str, str]] = []
+        endpoints: List[Tuple[str, str]] = []
+
+        for role, role_rules in rules.items():
+            for endpoint, types in role_rules.items():
+                if endpoint != WILDCARD and endpoint not in ENDPOINTS:
+                    raise ValueError(f"Unknown endpoint '{endpoint}' in policy for role '{role}'")
+                for task_type in types:
+                    if task_type != WILDCARD and known_types is not None \
+                            and task_type not in known_types:
+                        raise ValueError(f"Unknown task type '{task_type}' "
+                                         f"in policy for role '{role}'")
+                    allowed.append((role, endpoint, task_type))
+                if types:
+                    endpoints.append((role, endpoint))
+
+        self._allowed: FrozenSet[Tuple[str, str, str]] = frozenset(allowed)
+        self._endpoints: FrozenSet[Tuple[str, str]] = frozenset(endpoints)
+
+    def is_allowed(self, role: str, endpoint: str, task_type: Optional[str] = None) -> bool:
+        """
+        Проверяет, разрешён ли роли доступ к эндпоинту для типа задачи.
+
+        :param role: Роль клиента (например, "admin", "service")
+        :param endpoint: Эндпоинт (например, "submit", "taskinfo")
+        :param task_type: Тип задачи; None — проверка доступа к эндпоинту хотя бы для одного типа
+        :return: True, если доступ разрешён
+        """
+        if task_type is None:
+            return (role, endpoint) in self._endpoints \
+                or (role, WILDCARD) in self._endpoints
+
+        allowed = self._allowed
+        return (role, endpoint, task_type) in allowed \
+            or (role, endpoint, WILDCARD) in allowed \
+            or (role, WILDCARD, task_type) in allowed \
+            or (role, WILDCARD, WILDCARD) in allowed
+
+
+def load_policy_rules() -> Dict[str, Dict[str, List[str]]]:
+    """
+    Загружает правила доступа из config.json.
+    Если конфигурация недоступна или секция не задана — возвращает политику по умолчанию.
+
+    :return: Словарь "роль → эндпоинт → список типов задач"
+    """
+    try:
+        rules = get_config().get("rbac")
+    except RuntimeError as e:
+        logger.debug(f"Access policy is taken from defaults: {e}")
+        return DEFAULT_POLICY
+
+    return rules or DEFAULT_POLICY
+
+
+@lru_cache()
+def get_access_policy() -> AccessPolicy:
+    """
+    Возвращает скомпилированную политику доступа (создаётся один раз на процесс).
+
+    :return: AccessPolicy
+    """
+    return AccessPolicy(load_policy_rules(), task_types=get_task_registry().names())
@@ -1,18 +1,27 @@
 """
-Модуль авторизации пользователей с помощью JWT или Basic, сверяясь с Vault.
+Модуль авторизации пользователей с помощью JWT, Basic или API-ключа, сверяясь с Vault.
 
 Vault настраивается как внутренний механизм аутентификации клиентов 
 (через JWT и логин/пароль), с использованием:
 - одной универсальной JWT-роли (dynamic);
 - метаданных токена для определения прав клиента;
-- userpass для сервисов без поддержки JWT.
+- userpass для сервисов без поддержки JWT;
+- реестра API-ключей в KV для внутренних сервисов (проверка локально, без запроса в Vault).
 """
 
 import base64
+import time
+from typing import Callable, Optional
 import hvac
 from fastapi import HTTPException
+from jose import jwt as jose_jwt
 from loguru import logger
 
+from app.auth.api_keys import ApiKeyRegistry
+from app.auth.auth_cache import AuthCache
+from app.auth.circuit_breaker import CircuitBreaker, VaultUnavailableError
+from app.auth.policy import AccessPolicy, get_access_policy
+
 class VaultClient:
     """
     Клиент для проверки авторизации через Vault.
@@ -20,84 +29,114 @@ class VaultClient:
     Поддерживает:
     - JWT-токены (через endpoint Vault)
     - Basic-аутентификацию (через KV хранилище Vault)
+    - API-ключи (через локальную копию реестра ключей из Vault KV)
 
     Exceptions:
     - 401, Missing credentials
     - 401, Authentication failed
     - 403, Not allowed
     - 400, Client ID or Role not found in Vault response metadata
+    - 503, Vault unavailable (автомат защиты разомкнут или Vault не отвечает)
     """
 
-    def __init__(self, client: hvac.Client, vault_url: str, auth_path: str):
+    def __init__(self, client: hvac.Client, vault_url: str, auth_path: str,
+                 policy: Optional[AccessPolicy] = None, auth_cache: Optional[AuthCache] = None,
+                 api_keys: Optional[ApiKeyRegistry] = None,
+                 breaker: Optional[CircuitBreaker] = None):
         """
         Инициализирует клиента Vault с явными параметрами.
 
         :param client: экземпляр Vault-сервера
         :param vault_url: URL Vault-сервера (например, "http://localhost:8200")
         :param auth_path: Путь для JWT аутентификации (по умолчанию "auth/jwt")
+        :param policy: Политика доступа (по умолчанию — из config.json)
+        :param auth_cache: Кэш результатов аутентификации (None — каждый запрос идёт в Vault)
+        :param api_keys: Реестр API-ключей (None — схема ApiKey отключена)
+        :param breaker: Автомат защиты для вызовов Vault (None — вызовы без защиты)
         """
         self.client = client
         self.vault_url = vault_url
         self.auth_path = auth_path
+        self.policy = policy or get_access_policy()
+        self.auth_cache = auth_cache
+        self.api_keys = api_keys
+        self.breaker = breaker
 
         # Аутентификация в Vault не нужна -> client.auth.jwt.login(mount_point=auth_path)
 
-    def authenticate_user(self, authorization: str, action: str) -> tuple:
+    def authenticate_user(self, authorization: str, endpoint: str,
+                          task_type: Optional[str] = None) -> tuple:
         """
         Проверяет заголовок авторизации и возвращает имя пользователя.
 
         :param authorization: Строка из HTTP-заголовка Authorization
+        :param endpoint: Эндпоинт, к которому обращается клиент (например, "submit")
+        :param task_type: Тип задачи (None — проверяется только доступ к эндпоинту)
         :return: Имя пользователя, если аутентификация успешна
         :raises HTTPException: 401 при ошибке
         """
         try:
             if authorization.startswith("Bearer "):
                 jwt_token = authorization.split(" ", 1)[1]
-                return self.verify_jwt(jwt_token, action)
+                return self.verify_jwt(jwt_token, endpoint, task_type)
             elif authorization.startswith("Basic "):
                 credentials = base64.b64decode(authorization.split(" ", 1)[1]).decode()
                 username, password = credentials.split(":", 1)
-                return self.verify_basic(username, password, action)
+                return self.verify_basic(username, password, endpoint, task_type)
+            elif authorization.startswith("ApiKey "):
+                key_id, secret = authorization.split(" ", 1)[1].split(".", 1)
+                return self.verify_api_key(key_id, secret, endpoint, task_type)
             else:
                 logger.warning("Missing credentials")
                 raise HTTPException(status_code=401, detail="Missing credentials")
         except HTTPException:
             raise  # Необрабатываем собственные ошибки, чтобы не скрывать их
+        except VaultUnavailableError as e:
+            raise HTTPException(status_code=503, detail="Vault unavailable") from e
         except Exception as e:
             raise HTTPException(status_code=401, detail="Authentication failed") from e
 
-    def verify_jwt(self, token: str, action: str) -> tuple:
+    def verify_jwt(self, token: str, endpoint: str, task_type: Optional[str] = None) -> tuple:
         """
         Проверяет JWT через Vault и возвращает имя пользователя из метаданных.
 
         :param token: JWT, полученный от клиента.
-        :param action: Действие, которое нужно проверить (например, "calc_hash", "water_marks").
+        :param endpoint: Эндпоинт, к которому обращается клиент (например, "submit").
+        :param task_type: Тип задачи (например, "calc_hash") или None.
         :return: Имя пользователя, извлечённое из метаданных Vault.
         :raises ValueError: если аутентификация не удалась или нет метаданных.
         """
         client_id = "<unknown>"
         role = "<unknown>"
         try:
-            # Проверяем JWT-токен через Vault
-            auth_info = self.client.auth.jwt_login(jwt=token, role="dynamic")
-            # Извлекаем client_id и роль из метаданных и проверяем права
-            client_id, role = self._verify(auth_info, action)
+            # Проверяем JWT-токен через Vault (или берём результат из кэша)
+            client_id, role = self._login(
+                f"Bearer {token}",
+                lambda: self.client.auth.jwt_login(jwt=token, role="dynamic"),
+                not_after=self._token_expiry(token)
+            )
+            # Проверяем права клиента
+            self._authorize(client_id, role, endpoint, task_type)
 
             # Возвращаем client_id и роль
-            logger.debug(f"JWT authentication succeeded for client_id {client_id} with role {role}")
+            logger.debug("JWT authentication succeeded for client_id {client_id} with role {role}",
+                         client_id=client_id, role=role)
             return client_id, role
 
         except Exception as e:
-            logger.warning(f"Client authentication error for {client_id} with JWT: {str(e)}")
+            logger.warning("Client authentication error for {client_id} with JWT: {error}",
+                           client_id=client_id, error=str(e))
             raise e
 
-    def verify_basic(self, username: str, password: str, action: str) -> tuple:
+    def verify_basic(self, username: str, password: str, endpoint: str,
+                     task_type: Optional[str] = None) -> tuple:
         """
         Проверяет логин и пароль через KV-хранилище Vault.
 
         :param username: Имя пользователя
         :param password: Пароль
-        :param action: Действие, которое нужно проверить (например, "calc_hash", "water_marks")
+        :param endpoint: Эндпоинт, к которому обращается клиент (например, "submit")
+        :param task_type: Тип задачи (например, "calc_hash") или None
         :return: Имя пользователя при успехе
         :raises HTTPException: 401 при ошибке аутентификации
         """
@@ -113,20 +152,127 @@ class VaultClient:
 
             # Выполняем аутентификацию через userpass
             # (предполагается, что userpass настроен в Vault)
-            auth_info = self.client.userpass_login(username=username, password=password)
-            # Извлекаем client_id и роль из метаданных и проверяем права
-            client_id, role = self._verify(auth_info, action)
+            client_id, role = self._login(
+                f"Basic {username}:{password}",
+                lambda: self.client.userpass_login(username=username, password=password)
+            )
+            # Проверяем права клиента
+            self._authorize(client_id, role, endpoint, task_type)
 
-            logger.debug(f"Basic authentication succeeded for user {client_id} with role {role}")
+            logger.debug("Basic authentication succeeded for user {client_id} with role {role}",
+                         client_id=client_id, role=role)
             return client_id, role
 
         except Exception as e:
-            logger.warning(f"Client authentication error for {client_id} with Basic: {str(e)}")
+            logger.warning("Client authentication error for {client_id} with Basic: {error}",
+                           client_id=client_id, error=str(e))
             raise e
 
-    def _verify(self, auth_info, action) -> tuple:
+    def verify_api_key(self, key_id: str, secret: str, endpoint: str,
+                       task_type: Optional[str] = None) -> tuple:
+        """
+        Проверяет API-ключ по локальной копии реестра (без запроса в Vault).
+
+        :param key_id: Идентификатор ключа
+        :param secret: Секретная часть ключа
+        :param endpoint: Эндпоинт, к которому обращается клиент (например, "submit")
+        :param task_type: Тип задачи (например, "calc_hash") или None
+        :return: Кортеж с client_id и ролью
+        :raises HTTPException: 401 при неверном ключе, 403 при отсутствии прав
+        """
+        if self.api_keys is None:
+            logger.warning("API key authentication is disabled")
+            raise HTTPException(status_code=401, detail="Authentication failed")
+
+        identity = self.api_keys.verify(key_id, secret)
+        if identity is None:
+            logger.warning("Client authentication error for API key {key_id}", key_id=key_id)
+            raise HTTPException(status_code=401, detail="Authentication failed")
+
+        client_id, role = identity
+        self._authorize(client_id, role, endpoint, task_type)
+        logger.debug("API key authentication succeeded for client_id {client_id} with role {role}",
+                     client_id=client_id, role=role)
+        return client_id, role
+
+    def revoke_client(self, client_id: str) -> bool:
+        """
+        Удаляет закэшированные результаты аутентификации клиента (при отзыве доступа).
+
+        :param client_id: Идентификатор клиента
+        :return: True, если кэш аутентификации настроен и записи клиента удалены
         """
-        Вспомогательный метод для проверки аутентификации.
+        if self.auth_cache is None:
+            return False
+        self.auth_cache.invalidate_client(client_id)
+        return True
+
+    def _login(self, credential: str, login: Callable[[], dict],
+               not_after: Optional[float] = None) -> tuple:
+        """
+        Выполняет логин в Vault через кэш аутентификации (если он настроен).
+
+        :param credential: Учётные данные (ключ кэша, хранится только их HMAC)
+        :param login: Функция логина в Vault, возвращает ответ Vault
+        :param not_after: Момент, после которого учётные данные недействительны (unix time)
+        :return: Кортеж с client_id и ролью
+        """
+        if self.auth_cache is None:
+            return self._identity(self._call_vault(login))
+
+        def load() -> tuple:
+            auth_info = self._call_vault(login)
+            client_id, role = self._identity(auth_info)
+            expiry = not_after
+            lease = auth_info.get("lease_duration")
+            if lease:
+                expiry = min(expiry or float("inf"), time.time() + lease)
+            return client_id, role, expiry
+
+        return self.auth_cache.get_or_load(credential, load)
+
+    def _call_vault(self, call: Callable[[], dict]) -> dict:
+        """
+        Выполняет вызов Vault через автомат защиты (если он настроен).
+
+        :param call: Вызов Vault
+        :return: Ответ Vault
+        :raises VaultUnavailableError: если Vault недоступен
+        """
+        if self.breaker is None:
+            return call()
+        return self.breaker.call(call)
+
+    def status(self) -> dict:
+        """
+        Возвращает состояние подключения к Vault для мониторинга.
+
+        :return: Словарь с состоянием автомата защиты и числом решений в режиме отсрочки
+        """
+        status = self.breaker.snapshot() if self.breaker is not None \
+            else {"state": "disabled", "consecutive_failures": 0, "opened_at": None}
+        status["grace_decisions"] = self.auth_cache.grace_decisions \
+            if self.auth_cache is not None else 0
+        return status
+
+    @staticmethod
+    def _token_expiry(token: str) -> Optional[float]:
+        """
+        Извлекает срок действия JWT (claim "exp") без проверки подписи.
+        Используется только для ограничения времени жизни записи в кэше.
+
+        :param token: JWT
+        :return: Момент истечения (unix time) или None
+        """
+        try:
+            exp = jose_jwt.get_unverified_claims(token).get("exp")
+            return float(exp) if exp is not None else None
+        except Exception:  # pylint: disable=broad-except
+            return None
+
+    def _identity(self, auth_info) -> tuple:
+        """
+        Извлекает client_id и роль из ответа Vault.
 
         :param auth_info: Информация о пользователе из Vault
         :return: Кортеж с client_id и ролью
@@ -142,23 +288,32 @@ class VaultClient:
             raise HTTPException(status_code=400, \
                                 detail="Client ID or Role not found in Vault response metadata.")
 
+        return client_id, role
+
+    def _authorize(self, client_id: str, role: str, endpoint: str,
+                   task_type: Optional[str]) -> None:
+        """
+        Проверяет права клиента по политике доступа.
+
+        :param client_id: Идентификатор клиента
+        :param role: Роль клиента
+        :param endpoint: Эндпоинт, к которому обращается клиент
+        :param task_type: Тип задачи или None
+        :raises HTTPException: 403, если доступ запрещён
+        """
         # Проверяем права клиента на выполнение действия
-        if not self.is_authorized(role, action):
-            logger.error(f"Client {client_id} with role \
-                         {role} is not allowed to perform action '{action}'")
+        if not self.is_authorized(role, endpoint, task_type):
+            logger.error("Client {client_id} with role {role} "
+                         "is not allowed to call '{endpoint}' for task type '{type}'",
+                         client_id=client_id, role=role, endpoint=endpoint, type=task_type)
             raise HTTPException(status_code=403, detail="Not allowed")
 
-        return client_id, role
-
-    def is_authorized(self, role: str, action: str) -> bool:
+    def is_authorized(self, role: str, endpoint: str, task_type: Optional[str] = None) -> bool:
         """
-        Проверяет, имеет ли пользователь право на выполнение действия.
+        Проверяет, имеет ли пользователь право на обращение к эндпоинту для типа задачи.
         :param role: Роль пользователя (например, "admin", "service", "copytrust_site")
-        :param action: Действие, которое нужно проверить (например, "calc_hash", "water_marks")
-        :return: True, если действие разрешено для роли, иначе False
-        """
-        return {
-            "admin": lambda: True,
-            "service": lambda: action in ["calc_hash", "water_marks"],
-            "copytrust_site": lambda: action == "calc_hash"
-        }.get(role, lambda: False)()
+        :param endpoint: Эндпоинт (например, "submit", "taskinfo")
+        :param task_type: Тип задачи (например, "calc_hash"); None — доступ к эндпоинту
+        :return: True, если доступ разрешён для роли, иначе False
+        """
+        return self.policy.is_allowed(role, endpoint, task_type)
@@ -0,0 +1,238 @@
+"""
+Диагностика памяти процесса.
+
+- MemoryTracer — трассировка выделений памяти (tracemalloc) по запросу: снимки
+  и их разница по file:line. Вне сеанса трассировка выключена и ничего не стоит;
+  при включённой каждое выделение памяти замедляется, поэтому сеанс следует
+  останавливать сразу после снятия снимков.
+- ProcessSampler — периодические замеры RSS и сборщика мусора; история замеров
+  позволяет оценить скорость роста RSS.
+- live_model_counts — число живых экземпляров pydantic-моделей API (задержанные
+  TaskInput/TaskInfo с крупными upload/result).
+- logger_backlog — объём записей Loguru, ожидающих вывода (enqueue=True): записи
+  передаются потоку вывода через канал, его заполненность видна через FIONREAD.
+"""
+
+import fcntl
+import gc
+import itertools
+import os
+import resource
+import struct
+import termios
+import threading
+import tracemalloc
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional
+from loguru import logger
+from pydantic import BaseModel
+
+MAX_SNAPSHOTS = 4  # Хранимых снимков tracemalloc (старые вытесняются)
+
+# Кадры самой трассировки и импорта не интересны при поиске утечек
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+class MemoryTracer:
+    """
+    Снимки выделений памяти (tracemalloc) и их сравнение.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._snapshots: "OrderedDict[int, tracemalloc.Snapshot]" = OrderedDict()
+
+    @property
+    def tracing(self) -> bool:
+        """ Включена ли трассировка. """
+        return tracemalloc.is_tracing()
+
+    @property
+    def snapshot_ids(self) -> List[int]:
+        """ Идентификаторы хранимых снимков. """
+        return list(self._snapshots)
+
+    def start(self, frames: int = 1) -> None:
+        """
+        Включает трассировку выделений.
+
+        :param frames: Глубина сохраняемого стека выделения (1 — только file:line)
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            logger.warning("Memory allocation tracing started ({frames} frame(s))", frames=frames)
+
+    def stop(self) -> None:
+        """ Выключает трассировку и удаляет снимки. """
+        with self._lock:
+            self._snapshots.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.warning("Memory allocation tracing stopped")
+
+    def snapshot(self) -> Dict[str, int]:
+        """
+        Снимает и сохраняет снимок выделений.
+
+        :return: Идентификатор снимка, текущий и пиковый объём отслеживаемой памяти
+        :raises RuntimeError: если трассировка не включена
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Memory allocation tracing is not started")
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        traced, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            snapshot_id = next(self._ids)
+            self._snapshots[snapshot_id] = snapshot
+            while len(self._snapshots) > MAX_SNAPSHOTS:
+                self._snapshots.popitem(last=False)
+        return {"id": snapshot_id, "traced_bytes": traced, "peak_bytes": peak}
+
+    def diff(self, first: int, second: Optional[int] = None, top: int = 30) -> Dict:
+        """
+        Разница двух снимков, сгруппированная по file:line.
+
+        :param first: Идентификатор более раннего снимка
+        :param second: Идентификатор более позднего снимка (None — снять новый)
+        :param top: Число строк с наибольшим приростом
+        :return: Идентификаторы снимков и строки: место выделения, прирост объёма
+                 и числа блоков, итоговые значения
+        :raises KeyError: если снимок не найден
+        :raises RuntimeError: если нужен новый снимок, а трассировка не включена
+        """
+        if second is None:
+            second = self.snapshot()["id"]
+        with self._lock:
+            old, new = self._snapshots[first], self._snapshots[second]
+
+        stats = new.compare_to(old, "lineno")
+        return {"first": first, "second": second, "entries": [{
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_diff": stat.size_diff,
+            "count_diff": stat.count_diff,
+            "size": stat.size,
+            "count": stat.count,
+        } for stat in stats[:top]]}
+
+
+def read_rss() -> int:
+    """ Текущий RSS процесса в байтах (/proc; иначе пиковый RSS из getrusage). """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ProcessSampler:
+    """
+    Периодические замеры RSS и сборщика мусора.
+    """
+
+    def __init__(self, interval: float = 60, history: int = 120):
+        """
+        :param interval: Период замеров (секунды)
+        :param history: Число хранимых замеров
+        """
+        self.interval = interval
+        self.history: Deque[Dict] = deque(maxlen=history)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def read(self) -> Dict:
+        """
+        Один замер состояния процесса.
+
+        :return: RSS, счётчики поколений GC, число сборок и собранных объектов, число потоков
+        """
+        stats = gc.get_stats()
+        return {
+            "time": datetime.now(timezone.utc),
+            "rss_bytes": read_rss(),
+            "gc_counts": list(gc.get_count()),
+            "gc_collections": [generation["collections"] for generation in stats],
+            "gc_collected": sum(generation["collected"] for generation in stats),
+            "gc_uncollectable": sum(generation["uncollectable"] for generation in stats),
+            "threads": threading.active_count(),
+        }
+
+    def sample(self) -> Dict:
+        """ Замер с сохранением в историю. """
+        reading = self.read()
+        self.history.append(reading)
+        return reading
+
+    def rss_growth_per_hour(self) -> Optional[float]:
+        """ Скорость роста RSS по истории замеров (байт в час) или None, если замеров мало. """
+        if len(self.history) < 2:
+            return None
+        first, last = self.history[0], self.history[-1]
+        hours = (last["time"] - first["time"]).total_seconds() / 3600
+        return (last["rss_bytes"] - first["rss_bytes"]) / hours if hours > 0 else None
+
+    def start(self) -> None:
+        """ Запускает замеры в фоновом потоке. """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="process-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ Останавливает замеры. """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """ Цикл замеров. """
+        while True:
+            reading = self.sample()
+            logger.info("Process RSS {rss_bytes} bytes, GC counts {gc_counts}, "
+                        "{threads} threads", **reading)
+            if self._stop.wait(self.interval):
+                return
+
+
+def live_model_counts() -> Dict[str, int]:
+    """
+    Число живых экземпляров pydantic-моделей по именам классов.
+    Перебирает все объекты под наблюдением GC — вызывать только по запросу.
+
+    :return: Словарь "имя модели → число экземпляров"
+    """
+    # type(), а не isinstance: isinstance обращается к __class__, а ленивые прокси-модули
+    # в gc.get_objects() при этом импортируют свою цель
+    counts = Counter(type(obj).__name__ for obj in gc.get_objects()
+                     if issubclass(type(obj), BaseModel))
+    return dict(counts.most_common())
+
+
+def logger_backlog() -> Dict[str, int]:
+    """
+    Объём записей, ожидающих вывода в обработчиках Loguru с enqueue=True.
+    Использует внутренние атрибуты Loguru; недоступные обработчики пропускаются.
+
+    :return: Словарь "имя обработчика → байт в канале"
+    """
+    backlog = {}
+    handlers = getattr(getattr(logger, "_core", None), "handlers", {})
+    for handler in list(handlers.values()):
+        queue = getattr(handler, "_queue", None)
+        reader = getattr(queue, "_reader", None)
+        if reader is None:
+            continue
+        try:
+            pending = fcntl.ioctl(reader.fileno(), termios.FIONREAD, struct.pack("i", 0))
+            backlog[str(getattr(handler, "_name", handler))] = struct.unpack("i", pending)[0]
+        except (OSError, ValueError):
+            continue
+    return backlog
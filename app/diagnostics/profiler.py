@@ -0,0 +1,132 @@
+"""
+Выборочный (sampling) профилировщик CPU по запросу.
+
+Во время сеанса вызвавший поток раз в interval секунд снимает стеки всех
+остальных потоков процесса (sys._current_frames): цикла событий, пула потоков
+FastAPI, фоновых потоков. Частота попадания функции в стеки пропорциональна времени,
+проведённому в ней. Вне сеанса профилировщик ничего не делает — накладных
+расходов нет; одновременно может идти только один сеанс.
+
+Результат:
+- collapsed stacks — строки "поток;внешняя функция;...;внутренняя функция N",
+  формат flamegraph.pl / speedscope / inferno;
+- таблица top-N функций по собственному (self) и полному (total) числу выборок.
+
+Стеки ожидания (простаивающие потоки пула, select цикла событий) по умолчанию
+отбрасываются, чтобы профиль показывал работу, а не ожидание.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# Функции стандартной библиотеки, в которых потоки простаивают: (файл, функция)
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"), ("queue.py", "get"), ("thread.py", "_worker"),
+    ("socket.py", "accept"), ("socketserver.py", "serve_forever"),
+}
+
+
+class ProfileInProgressError(RuntimeError):
+    """
+    Сеанс профилирования уже выполняется.
+    """
+
+
+def _frame_label(code) -> str:
+    """ Подпись кадра стека: функция (файл:строка начала). """
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Выборочный профилировщик всех потоков процесса.
+    """
+
+    def __init__(self, interval: float = 0.005, max_seconds: float = 60):
+        """
+        :param interval: Период снятия стеков (секунды)
+        :param max_seconds: Максимальная длительность сеанса (секунды)
+        """
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        """ Идёт ли сеанс профилирования. """
+        return self._lock.locked()
+
+    def profile(self, seconds: float, top: int = 30, include_idle: bool = False) -> dict:
+        """
+        Профилирует процесс в течение seconds секунд (блокирует вызывающий поток).
+
+        :param seconds: Длительность сеанса (не больше max_seconds)
+        :param top: Число строк в таблице функций
+        :param include_idle: Учитывать стеки простаивающих потоков
+        :return: Отчёт: число выборок, таблица top-N и collapsed stacks
+        :raises ProfileInProgressError: если сеанс уже идёт
+        :raises ValueError: если длительность вне допустимого диапазона
+        """
+        if not 0 < seconds <= self.max_seconds:
+            raise ValueError(f"Profile duration must be in (0, {self.max_seconds}] seconds")
+        if not self._lock.acquire(blocking=False):
+            raise ProfileInProgressError("Another profile session is running")
+        try:
+            stacks, samples = self._sample(seconds, include_idle)
+        finally:
+            self._lock.release()
+        return self._report(stacks, samples, seconds, top)
+
+    def _sample(self, seconds: float, include_idle: bool) -> Tuple[Counter, int]:
+        """ Снимает стеки всех потоков, кроме собственного, до истечения seconds. """
+        own = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():  # pylint: disable=protected-access
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if not include_idle and \
+                        (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                stacks[tuple(reversed(stack))] += 1
+            samples += 1
+            time.sleep(self.interval)
+        return stacks, samples
+
+    def _report(self, stacks: Counter, samples: int, seconds: float, top: int) -> dict:
+        """ Сводит стеки в collapsed-формат и таблицу функций. """
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack[1:]):
+                total[label] += count
+
+        observed = sum(stacks.values())
+        table: List[Dict] = [{
+            "function": label,
+            "self_samples": own[label],
+            "self_pct": round(own[label] / observed * 100, 2) if observed else 0.0,
+            "total_samples": count,
+            "total_pct": round(count / observed * 100, 2) if observed else 0.0,
+        } for label, count in total.most_common()]
+        table.sort(key=lambda row: (row["self_samples"], row["total_samples"]), reverse=True)
+
+        collapsed = "\n".join(f"{';'.join(stack)} {count}"
+                              for stack, count in sorted(stacks.items()))
+        return {"seconds": seconds, "interval_ms": self.interval * 1000, "samples": samples,
+                "stacks": observed, "top": table[:top], "collapsed": collapsed}
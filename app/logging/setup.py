@@ -1,12 +1,67 @@
 """
 Настройка логирования с ротацией файлов для CT Task Router.
 Логгирование основано на Loguru и управляется через config.json.
+
+Соглашения для кода на горячем пути запроса:
+- сообщения не строятся через f-строки, а передаются шаблоном с аргументами:
+  logger.debug("Task {task_uuid} saved", task_uuid=task_uuid) — Loguru форматирует
+  сообщение, только если уровень записи проходит порог;
+- именованные аргументы попадают в record["extra"] и становятся полями
+  структурированной записи (task_uuid, client_id, type, latency_ms);
+- массовые события одного запроса помечаются sampled=True и пишутся
+  с вероятностью logging.sample_rate.
 """
 
+import json
 import os
+import random
 from datetime import timedelta
 from loguru import logger
 
+# Поля extra, не попадающие в структурированную запись
+_SERVICE_FIELDS = {"sampled", "serialized"}
+
+
+def _json_format(record: dict) -> str:
+    """
+    Формирует компактную JSON-запись для Loguru.
+
+    :param record: Запись Loguru
+    :return: Шаблон вывода, ссылающийся на сериализованную запись
+    """
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "message": record["message"],
+        "logger": f"{record['name']}:{record['function']}:{record['line']}",
+    }
+    entry.update({k: v for k, v in record["extra"].items() if k not in _SERVICE_FIELDS})
+    if record["exception"] is not None:
+        entry["exception"] = repr(record["exception"].value)
+
+    record["extra"]["serialized"] = json.dumps(entry, default=str, ensure_ascii=False)
+    return "{extra[serialized]}\n"
+
+
+def make_sampling_filter(sample_rate: float):
+    """
+    Создаёт фильтр, пропускающий записи с sampled=True с вероятностью sample_rate.
+    Остальные записи пропускаются всегда.
+
+    :param sample_rate: Доля сохраняемых массовых записей (0..1)
+    :return: Функция-фильтр для Loguru
+    """
+    if sample_rate >= 1.0:
+        return None
+
+    def sampling_filter(record: dict) -> bool:
+        if not record["extra"].get("sampled"):
+            return True
+        return random.random() < sample_rate
+
+    return sampling_filter
+
+
 def setup_logging(full_config : dict) -> None:
     """
     Инициализирует логирование с параметрами из конфигурационного файла.
@@ -17,6 +72,10 @@ def setup_logging(full_config : dict) -> None:
         - rotation: объект с полями:
             - when: строка (например, "1 day", "00:00")
             - backupCount: количество дней хранения (используется как retention)
+        - format: "text" (по умолчанию) или "json" — структурированные записи
+        - sample_rate: доля сохраняемых массовых записей (по умолчанию 1.0)
+        - backtrace, diagnose: расширенные трассировки исключений
+          (по умолчанию выключены: diagnose раскрывает значения переменных)
     """
     config = full_config["logging"]
 
@@ -32,16 +91,23 @@ def setup_logging(full_config : dict) -> None:
     if log_dir and not os.path.exists(log_dir):
         os.makedirs(log_dir)
 
+    # Структурированные записи — только в режиме "json", иначе формат Loguru по умолчанию
+    sink_options = {}
+    if config.get("format", "text") == "json":
+        sink_options["format"] = _json_format
+
     # Очистка стандартных обработчиков и добавление своего
     logger.remove()
     logger.add(
         log_file,
         level=log_level,
+        filter=make_sampling_filter(config.get("sample_rate", 1.0)),
         rotation=when,
         retention=timedelta(days=backup_days),
         enqueue=True,
-        backtrace=True,
-        diagnose=True
+        backtrace=config.get("backtrace", False),
+        diagnose=config.get("diagnose", False),
+        **sink_options
     )
 
     logger.info("Logging initialized")
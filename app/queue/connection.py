@@ -0,0 +1,116 @@
+"""
+Создание Redis-клиентов с настраиваемым пулом соединений.
+
+Используется блокирующий пул: при исчерпании соединений поток ждёт
+освобождения не дольше wait_timeout, а не открывает новые соединения
+без ограничения. Пул считает ожидания и их длительность — эти данные
+отдаются в /health/redis.
+
+Для блокирующего BRPOP (dequeue) создаётся отдельный пул без таймаута
+чтения: долгие ожидания воркеров не занимают соединения обработчиков запросов.
+
+Команды при таймауте чтения не повторяются: MULTI/EXEC и скрипты очереди
+(submit_task, complete_tasks) не идемпотентны — повтор уже выполненной на
+сервере транзакции ставит задачу в очередь дважды и повторно увеличивает version.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+from redis import ConnectionError as RedisConnectionError, Redis
+from redis.connection import BlockingConnectionPool
+from loguru import logger
+
+# Значения по умолчанию для config["queue"]["pool"]
+DEFAULT_POOL_CONFIG = {
+    "max_connections": 50,
+    "wait_timeout": 2.0,
+    "connect_timeout": 2.0,
+    "socket_timeout": 5.0,
+    "keepalive": True,
+    "health_check_interval": 30,
+    "retry_on_timeout": False,  # не поддерживается: команды очереди не идемпотентны
+    "dequeue_max_connections": 10,
+}
+
+
+class InstrumentedConnectionPool(BlockingConnectionPool):
+    """
+    Блокирующий пул соединений со статистикой использования.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.acquired = 0      # выдано соединений
+        self.waits = 0         # выдач, которым пришлось ждать свободного соединения
+        self.timeouts = 0      # отказов по wait_timeout
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def get_connection(self, command_name, *keys, **options):
+        exhausted = self.pool.empty()
+        started = time.perf_counter()
+        try:
+            connection = super().get_connection(command_name, *keys, **options)
+        except RedisConnectionError:
+            if exhausted:
+                with self._stats_lock:
+                    self.timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._stats_lock:
+            self.acquired += 1
+            if exhausted:
+                self.waits += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return connection
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Снимок статистики пула.
+
+        :return: Размер пула, занятые и открытые соединения, ожидания
+        """
+        with self._stats_lock:
+            in_use = self.max_connections - self.pool.qsize()
+            return {
+                "max_connections": self.max_connections,
+                "in_use": in_use,
+                "open": len(self._connections),
+                "utilization": round(in_use / self.max_connections, 3),
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "wait_ms_total": round(self.wait_seconds * 1000, 3),
+                "wait_ms_max": round(self.max_wait_seconds * 1000, 3),
+            }
+
+
+def create_redis_client(url: str, pool_config: Optional[dict] = None,
+                        blocking: bool = False) -> Redis:
+    """
+    Создаёт Redis-клиент с пулом соединений по настройкам config["queue"]["pool"].
+
+    :param url: URL подключения (с паролем, если он нужен)
+    :param pool_config: Настройки пула (отсутствующие берутся из DEFAULT_POOL_CONFIG)
+    :param blocking: Пул для блокирующих команд (BRPOP): без таймаута чтения,
+                     размер — dequeue_max_connections
+    :return: Redis-клиент
+    """
+    settings = {**DEFAULT_POOL_CONFIG, **(pool_config or {})}
+    if settings["retry_on_timeout"]:
+        logger.warning("queue.pool.retry_on_timeout is ignored: Redis transactions and scripts "
+                       "of the task queue are not idempotent and must not be retried")
+    pool = InstrumentedConnectionPool.from_url(
+        url,
+        max_connections=settings["dequeue_max_connections" if blocking else "max_connections"],
+        timeout=settings["wait_timeout"],
+        socket_connect_timeout=settings["connect_timeout"],
+        socket_timeout=None if blocking else settings["socket_timeout"],
+        socket_keepalive=settings["keepalive"],
+        health_check_interval=settings["health_check_interval"],
+        retry_on_timeout=False,
+    )
+    return Redis(connection_pool=pool)
@@ -0,0 +1,155 @@
+"""
+Оценка сроков начала и завершения задач.
+
+Фоновый поток раз в interval секунд снимает по каждому типу задач:
+- глубину очереди {type}_INPUT (LLEN по всем шардам);
+- темп извлечения воркерами — число замеров queue_wait за окно (LatencyStats);
+- медиану и p90 времени обработки за то же окно.
+
+Оценка для запроса считается по этому снимку без обращений к Redis:
+- задача в очереди начнётся через "глубина / темп извлечения";
+- задача в обработке начата в dequeued_at;
+- завершение — начало плюс медиана времени обработки (для задачи, которая
+  обрабатывается дольше медианы, — плюс p90).
+
+Вместе с оценкой предлагается интервал опроса (Retry-After): время до ожидаемого
+события в пределах [min_retry_after, max_retry_after].
+"""
+
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.queue.latency import LatencyStats
+from app.queue.redis_queue import RedisQueue
+
+
+class CompletionEstimator:
+    """
+    Снимок состояния очередей по типам задач и оценка сроков по нему.
+    """
+
+    def __init__(self, queue: RedisQueue, latency_stats: LatencyStats, queues: Dict[str, str],
+                 interval: float = 15, window: int = 900,
+                 min_retry_after: int = 1, max_retry_after: int = 60):
+        """
+        :param queue: Очередь задач (глубина очередей)
+        :param latency_stats: Гистограммы задержек (темп извлечения и время обработки)
+        :param queues: Тип задачи → имя очереди
+        :param interval: Период обновления снимка (секунды)
+        :param window: Окно статистики задержек (секунды)
+        :param min_retry_after: Минимальный предлагаемый интервал опроса (секунды)
+        :param max_retry_after: Максимальный предлагаемый интервал опроса (секунды),
+                                он же — при отсутствии оценки
+        """
+        self.queue = queue
+        self.latency_stats = latency_stats
+        self.queues = queues
+        self.interval = interval
+        self.window = window
+        self.min_retry_after = min_retry_after
+        self.max_retry_after = max_retry_after
+        self.snapshot: Dict[str, dict] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self) -> Dict[str, dict]:
+        """
+        Обновляет снимок: глубина очереди, темп извлечения (задач в секунду),
+        медиана и p90 времени обработки (секунды) по каждому типу задач.
+
+        :return: Новый снимок
+        """
+        depths = self.queue.queue_depths(list(self.queues.values()))
+        window = min(self.window, self.latency_stats.retention)  # как в summary
+        summary = self.latency_stats.summary(list(self.queues), window)
+        snapshot = {}
+        for task_type, queue_name in self.queues.items():
+            stats = summary.get(task_type, {})
+            wait, processing = stats.get("queue_wait", {}), stats.get("processing", {})
+            snapshot[task_type] = {
+                "depth": depths.get(queue_name, 0),
+                "dequeue_rate": wait.get("count", 0) / window,
+                "processing_p50": _seconds(processing.get("p50_ms")),
+                "processing_p90": _seconds(processing.get("p90_ms")),
+            }
+        self.snapshot = snapshot
+        return snapshot
+
+    def estimate(self, task_type: str, dequeued_at: Optional[datetime] = None) -> dict:
+        """
+        Оценка сроков незавершённой задачи по текущему снимку.
+
+        :param task_type: Тип задачи
+        :param dequeued_at: Момент извлечения воркером (None — задача ещё в очереди)
+        :return: estimated_start, estimated_completion (datetime или None) и retry_after (секунды)
+        """
+        now = time.time()
+        snap = self.snapshot.get(task_type)
+        start: Optional[float] = None
+        if dequeued_at is not None:
+            start = dequeued_at.timestamp()
+        elif snap is not None:
+            if snap["depth"] == 0:
+                start = now
+            elif snap["dequeue_rate"] > 0:
+                start = now + snap["depth"] / snap["dequeue_rate"]
+
+        completion: Optional[float] = None
+        if start is not None and snap is not None and snap["processing_p50"] is not None:
+            # Задача, обрабатываемая дольше медианы, ожидается к p90 (но не раньше, чем сейчас)
+            completion = start + snap["processing_p50"]
+            if completion < now and snap["processing_p90"] is not None:
+                completion = start + snap["processing_p90"]
+            completion = max(completion, now)
+
+        target = completion if completion is not None else start
+        if target is None:
+            retry_after = self.max_retry_after
+        else:
+            retry_after = min(max(math.ceil(target - now), self.min_retry_after),
+                              self.max_retry_after)
+        return {"estimated_start": _datetime(start),
+                "estimated_completion": _datetime(completion),
+                "retry_after": retry_after}
+
+    def start(self) -> None:
+        """ Запускает обновление снимка в фоновом потоке. """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="completion-estimator",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ Останавливает обновление снимка. """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """ Цикл обновления снимка; ошибки Redis оставляют прежний снимок. """
+        while True:
+            try:
+                self.refresh()
+            except RedisError as e:
+                logger.warning("Completion estimate snapshot was not refreshed: {error}",
+                               error=str(e))
+            if self._stop.wait(self.interval):
+                return
+
+
+def _seconds(ms: Optional[float]) -> Optional[float]:
+    """ Миллисекунды в секунды (None сохраняется). """
+    return ms / 1000 if ms is not None else None
+
+
+def _datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    """ Unix-время в datetime (UTC). """
+    return datetime.fromtimestamp(timestamp, timezone.utc) if timestamp is not None else None
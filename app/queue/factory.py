@@ -0,0 +1,114 @@
+"""
+Сборка RedisQueue по конфигурации — общая для API (main.create_app) и воркеров.
+
+Очередь получает шарды и отдельные пулы для dequeue, хранилище blob-объектов,
+гистограммы задержек (queue.latency_stats) и TTL статусов из реестра типов задач.
+Воркер, собранный иначе, не пишет задержки (пустые /stats/latency и оценки сроков)
+и не продлевает TTL задач при переходах в pending, done и error.
+
+    queue = create_redis_queue(get_config(), get_secrets())
+"""
+
+from urllib.parse import urlparse, urlunparse
+from typing import Optional
+from loguru import logger
+
+from app.api.task_types import TaskTypeRegistry, get_task_registry
+from app.queue.connection import create_redis_client
+from app.queue.latency import LatencyStats
+from app.queue.redis_queue import RedisQueue
+from app.queue.sharding import ShardRing
+from app.queue.task_cache import TerminalTaskCache
+from app.storage.blob_store import create_blob_store
+
+
+def with_password(redis_url: str, redis_password: str) -> str:
+    """
+    Подставляет пароль в URL подключения к Redis.
+
+    :param redis_url: URL из конфигурации
+    :param redis_password: Пароль из секретов (пустой — URL не меняется)
+    :return: URL с паролем
+    """
+    if not redis_password:
+        return redis_url
+    parsed_url = urlparse(redis_url)
+    netloc = f":{redis_password}@{parsed_url.hostname}"
+    if parsed_url.port:
+        netloc += f":{parsed_url.port}"
+    return urlunparse(parsed_url._replace(netloc=netloc))
+
+
+def create_redis_queue(config: dict, secrets: dict,
+                       task_registry: Optional[TaskTypeRegistry] = None,
+                       task_cache: bool = False) -> RedisQueue:
+    """
+    Создаёт очередь задач по конфигурации. Фоновые потоки (очистка blob_store,
+    отслеживание кэша задач) не запускаются — это делает вызывающий код.
+
+    :param config: Полная конфигурация (секции queue и blob_store)
+    :param secrets: Секреты (redis.password)
+    :param task_registry: Реестр типов задач для TTL статусов (по умолчанию — общий реестр)
+    :param task_cache: Создать локальный кэш задач в конечных статусах (queue.task_cache, для API)
+    :return: Очередь задач
+    :raises ConnectionError: если Redis или один из шардов не отвечает на ping
+    """
+    queue_config = config["queue"]
+    registry = task_registry or get_task_registry()
+    redis_url = queue_config["url"]
+    redis_password = secrets.get("redis", {}).get("password")
+
+    pool_config = queue_config.get("pool", {})
+    redis_client = create_redis_client(with_password(redis_url, redis_password), pool_config)
+    if not redis_client.ping():
+        raise ConnectionError("Redis не отвечает на ping")
+
+    # Шарды для хранения задач (по умолчанию — единственный экземпляр url)
+    shard_urls = queue_config.get("shards") or [redis_url]
+    shard_clients, dequeue_clients = [], []
+    for shard_url in shard_urls:
+        shard_client = redis_client if shard_url == redis_url \
+            else create_redis_client(with_password(shard_url, redis_password), pool_config)
+        if not shard_client.ping():
+            raise ConnectionError(f"Redis shard {shard_url} не отвечает на ping")
+        shard_clients.append(shard_client)
+        # Отдельный пул для BRPOP: блокирующие ожидания не занимают соединения запросов
+        dequeue_clients.append(create_redis_client(with_password(shard_url, redis_password),
+                                                   pool_config, blocking=True))
+    shards = ShardRing(shard_clients, names=shard_urls)
+
+    # Локальный кэш задач в конечных статусах (опционально)
+    terminal_cache = None
+    task_cache_config = queue_config.get("task_cache", {})
+    if task_cache and task_cache_config.get("enabled", False):
+        tracking = task_cache_config.get("tracking", False)
+        if tracking and len(shards) > 1:
+            # Отслеживание ведётся одним соединением — с несколькими шардами только TTL
+            logger.warning("Task cache tracking is not supported with several Redis shards, "
+                           "falling back to TTL-only caching")
+            tracking = False
+        terminal_cache = TerminalTaskCache(
+            max_entries=task_cache_config.get("max_entries", 10000),
+            max_bytes=task_cache_config.get("max_bytes", 64 * 1024 * 1024),
+            redis_client=shard_clients[0] if tracking else None
+        )
+
+    # Хранилище крупных upload/result вне Redis (опционально)
+    blob_store = None
+    blob_config = config.get("blob_store", {})
+    if blob_config.get("enabled", False):
+        blob_store = create_blob_store(blob_config)
+
+    # Гистограммы ожидания в очереди и времени обработки по типам задач
+    latency_stats = None
+    latency_config = queue_config.get("latency_stats", {})
+    if latency_config.get("enabled", True):
+        latency_stats = LatencyStats(shards,
+                                     bucket_seconds=latency_config.get("bucket_seconds", 60),
+                                     retention=latency_config.get("retention", 86400))
+
+    return RedisQueue(client=redis_client, task_cache=terminal_cache, blob_store=blob_store,
+                      offload_threshold=blob_config.get("offload_threshold", 64 * 1024),
+                      shards=shards, dequeue_clients=dequeue_clients,
+                      ttl_policy=registry.ttl_for, latency_stats=latency_stats,
+                      task_types=registry.names())
@@ -0,0 +1,186 @@
+"""
+Распределения задержек задач по типам: ожидание в очереди и время обработки.
+
+RedisQueue отмечает в задаче enqueued_at (постановка в очередь), dequeued_at
+(извлечение воркером) и processed_at (переход в конечный статус) и передаёт
+длительности сюда:
+- queue_wait — от enqueued_at до dequeued_at (сколько задача ждала воркера);
+- processing — от dequeued_at до processed_at (сколько воркер её обрабатывал).
+
+Длительности накапливаются в Redis гистограммами по интервалам времени фиксированной
+длины — ключ latency:{тип}:{метрика}:{начало интервала} (hash: count, sum_ms и
+счётчики корзин le_<граница, мс>) с TTL retention. Сводка за окно складывает
+интервалы, перцентили оцениваются линейной интерполяцией внутри корзины
+(как histogram_quantile в Prometheus). Замеры одного вызова RedisQueue (пачки
+обновлений или извлечённых задач) записываются одним конвейером на шард,
+замеры одного интервала складываются в одну запись.
+"""
+
+import math
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.queue.sharding import ShardRing
+
+METRICS = ("queue_wait", "processing")
+
+# Верхние границы корзин гистограммы (миллисекунды); последняя корзина — +Inf
+BOUNDS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000,
+             300000, 900000, 3600000)
+
+QUANTILES = {"p50_ms": 0.5, "p90_ms": 0.9, "p99_ms": 0.99}
+
+# Замер: тип задачи, метрика, длительность (секунды), момент окончания (unix-время)
+Sample = Tuple[str, str, float, float]
+
+
+def latency_key(task_type: str, metric: str, bucket: int) -> str:
+    """ Ключ гистограммы типа задачи за интервал, начинающийся в bucket (unix-секунды). """
+    return f"latency:{task_type}:{metric}:{bucket}"
+
+
+def _field(ms: float) -> str:
+    """ Поле корзины гистограммы для длительности ms. """
+    for bound in BOUNDS_MS:
+        if ms <= bound:
+            return f"le_{bound}"
+    return "le_inf"
+
+
+def _quantile(q: float, buckets: List[Tuple[float, int]], count: int) -> Optional[float]:
+    """
+    Оценка квантиля по некумулятивным корзинам [(верхняя граница, число)].
+    Для последней корзины (+Inf) возвращается наибольшая конечная граница.
+    """
+    if not count:
+        return None
+    rank = q * count
+    lower, seen = 0.0, 0
+    for upper, in_bucket in buckets:
+        if in_bucket and seen + in_bucket >= rank:
+            if math.isinf(upper):
+                return lower
+            return round(lower + (upper - lower) * (rank - seen) / in_bucket, 1)
+        seen += in_bucket
+        lower = upper
+    return lower
+
+
+class LatencyStats:
+    """
+    Гистограммы задержек задач по типам в Redis с окнами фиксированной длины.
+    """
+
+    def __init__(self, shards: ShardRing, bucket_seconds: int = 60, retention: int = 86400):
+        """
+        :param shards: Шарды Redis (ключи интервалов распределяются по кольцу)
+        :param bucket_seconds: Длина интервала гистограммы (секунды)
+        :param retention: Срок хранения интервалов и максимальное окно сводки (секунды)
+        """
+        self.shards = shards
+        self.bucket_seconds = bucket_seconds
+        self.retention = retention
+
+    def _bucket(self, at: float) -> int:
+        """ Начало интервала, в который попадает момент at. """
+        return int(at) // self.bucket_seconds * self.bucket_seconds
+
+    def record(self, task_type: str, metric: str, seconds: float,
+               at: Optional[float] = None) -> None:
+        """
+        Учитывает длительность в гистограмме текущего интервала.
+        Ошибки Redis не прерывают работу с задачей — замер теряется с предупреждением.
+
+        :param task_type: Тип задачи
+        :param metric: queue_wait или processing
+        :param seconds: Длительность (секунды)
+        :param at: Момент окончания (unix-время; по умолчанию — сейчас)
+        """
+        self.record_many([(task_type, metric, seconds, time.time() if at is None else at)])
+
+    def record_many(self, samples: Iterable[Sample]) -> None:
+        """
+        Учитывает несколько длительностей: один конвейер на шард, замеры одного
+        интервала складываются в одну запись (HINCRBY на сумму).
+        Ошибки Redis не прерывают работу с задачами — замеры теряются с предупреждением.
+
+        :param samples: Замеры (тип задачи, метрика, секунды, момент окончания)
+        """
+        increments: Dict[str, Counter] = defaultdict(Counter)
+        for task_type, metric, seconds, at in samples:
+            ms = max(seconds * 1000, 0.0)
+            counters = increments[latency_key(task_type, metric, self._bucket(at))]
+            counters.update({"count": 1, "sum_ms": round(ms), _field(ms): 1})
+
+        by_shard: Dict[int, List[str]] = defaultdict(list)
+        for key in increments:
+            by_shard[self.shards.index_for(key)].append(key)
+        for shard, keys in by_shard.items():
+            pipe = self.shards.clients[shard].pipeline(transaction=False)
+            for key in keys:
+                for field, amount in increments[key].items():
+                    pipe.hincrby(key, field, amount)
+                pipe.expire(key, self.retention + self.bucket_seconds)
+            try:
+                pipe.execute()
+            except RedisError as e:
+                logger.warning("Task latency samples were not recorded: {error}",
+                               error=str(e), keys=keys)
+
+    def summary(self, task_types: Iterable[str], window: int = 3600) -> Dict[str, Dict[str, dict]]:
+        """
+        Сводка задержек по типам задач за последние window секунд.
+
+        :param task_types: Типы задач
+        :param window: Окно сводки (не больше retention)
+        :return: "тип → метрика → count, rate_per_minute, mean_ms, p50/p90/p99_ms, histogram"
+        """
+        window = min(window, self.retention)
+        last = self._bucket(time.time())
+        buckets = range(last - window + self.bucket_seconds, last + 1, self.bucket_seconds)
+        series = [(task_type, metric) for task_type in task_types for metric in METRICS]
+
+        # Все интервалы читаются одним конвейером на шард
+        keys_by_shard: Dict[int, List[Tuple[Tuple[str, str], str]]] = defaultdict(list)
+        for item in series:
+            for bucket in buckets:
+                key = latency_key(item[0], item[1], bucket)
+                keys_by_shard[self.shards.index_for(key)].append((item, key))
+
+        totals: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+        for shard, entries in keys_by_shard.items():
+            pipe = self.shards.clients[shard].pipeline(transaction=False)
+            for _, key in entries:
+                pipe.hgetall(key)
+            for (item, _), raw in zip(entries, pipe.execute()):
+                totals[item].update({field.decode(): int(value) for field, value in raw.items()})
+
+        report: Dict[str, Dict[str, dict]] = defaultdict(dict)
+        for task_type, metric in series:
+            report[task_type][metric] = self._stat(totals[(task_type, metric)], window)
+        return dict(report)
+
+    @staticmethod
+    def _stat(counters: Counter, window: int) -> dict:
+        """ Показатели одной гистограммы за окно. """
+        count = counters["count"]
+        buckets = [(float(bound), counters[f"le_{bound}"]) for bound in BOUNDS_MS]
+        buckets.append((math.inf, counters["le_inf"]))
+
+        histogram, cumulative = {}, 0
+        for bound, in_bucket in buckets:
+            cumulative += in_bucket
+            histogram["+Inf" if math.isinf(bound) else str(int(bound))] = cumulative
+
+        stat = {
+            "count": count,
+            "rate_per_minute": round(count / window * 60, 3),
+            "mean_ms": round(counters["sum_ms"] / count, 1) if count else None,
+            "histogram": histogram,
+        }
+        for name, q in QUANTILES.items():
+            stat[name] = _quantile(q, buckets, count)
+        return stat
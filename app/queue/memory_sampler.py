@@ -0,0 +1,126 @@
+"""
+Оценка памяти Redis, занятой задачами, в разрезе типа и статуса.
+
+Перебор всех ключей (SCAN) на большой базе дорог, поэтому используется
+случайная выборка: sample_size вызовов RANDOMKEY на шард, для попавших
+в выборку ключей задач — MEMORY USAGE и тип/статус из hash задачи.
+Доля группы в выборке, умноженная на DBSIZE, даёт оценку числа задач
+группы, а средний размер в выборке — оценку занимаемой памяти.
+Точность растёт с sample_size; для небольших групп оценка грубая.
+"""
+
+import json
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+from loguru import logger
+from redis import RedisError
+
+from app.queue.sharding import ShardRing
+
+
+class TaskMemorySampler:
+    """
+    Периодическая выборочная оценка памяти задач в Redis.
+    """
+
+    def __init__(self, shards: ShardRing, sample_size: int = 200, interval: float = 300,
+                 key_prefix: str = "task:"):
+        """
+        :param shards: Шарды Redis с задачами
+        :param sample_size: Число случайных ключей на шард за один замер
+        :param interval: Период замеров (секунды)
+        :param key_prefix: Префикс ключей задач
+        """
+        self.shards = shards
+        self.sample_size = sample_size
+        self.interval = interval
+        self.key_prefix = key_prefix.encode()
+        self.report: Optional[Dict[str, Any]] = None  # Результат последнего замера
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self) -> Dict[str, Any]:
+        """
+        Выполняет один замер по всем шардам.
+
+        :return: Отчёт: число и объём задач в целом и по группам (тип, статус)
+        """
+        groups: Dict[Tuple[str, str], Dict[str, float]] = {}
+        for client in self.shards.clients:
+            pipe = client.pipeline(transaction=False)
+            pipe.dbsize()
+            for _ in range(self.sample_size):
+                pipe.randomkey()
+            dbsize, *keys = pipe.execute()
+            if not dbsize:
+                continue
+
+            task_keys = [key for key in keys if key and key.startswith(self.key_prefix)]
+            pipe = client.pipeline(transaction=False)
+            for key in task_keys:
+                pipe.memory_usage(key)
+                pipe.hmget(key, "type", "status")
+            results = pipe.execute() if task_keys else []
+
+            # Каждый ключ выборки представляет dbsize / sample_size ключей шарда
+            weight = dbsize / len(keys)
+            for usage, (task_type, status) in zip(results[::2], results[1::2]):
+                if usage is None or task_type is None:
+                    continue  # ключ удалён между RANDOMKEY и чтением
+                group = groups.setdefault((self._decode(task_type), self._decode(status)),
+                                          {"tasks": 0.0, "bytes": 0.0, "sampled": 0})
+                group["tasks"] += weight
+                group["bytes"] += usage * weight
+                group["sampled"] += 1
+
+        report = {
+            "sampled_at": datetime.now(timezone.utc),
+            "sample_size": self.sample_size * len(self.shards),
+            "tasks": round(sum(group["tasks"] for group in groups.values())),
+            "bytes": round(sum(group["bytes"] for group in groups.values())),
+            "groups": [{"type": task_type, "status": status, "tasks": round(group["tasks"]),
+                        "bytes": round(group["bytes"]),
+                        "avg_bytes": round(group["bytes"] / group["tasks"])}
+                       for (task_type, status), group in sorted(groups.items())],
+        }
+        self.report = report
+        return report
+
+    @staticmethod
+    def _decode(value: Optional[bytes]) -> str:
+        """ Значение поля hash задачи (JSON-строка). """
+        if value is None:
+            return "unknown"
+        try:
+            return str(json.loads(value))
+        except ValueError:
+            return value.decode("utf-8", "replace")
+
+    def start(self) -> None:
+        """ Запускает периодические замеры в фоновом потоке. """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="task-memory-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ Останавливает замеры. """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """ Цикл замеров. """
+        while not self._stop.wait(self.interval):
+            try:
+                report = self.sample()
+            except RedisError as e:
+                logger.warning("Task memory sampling failed: {error}", error=str(e))
+                continue
+            for group in report["groups"]:
+                logger.info("Redis memory for {type}/{status}: ~{tasks} tasks, ~{bytes} bytes",
+                            **group)
@@ -1,29 +1,297 @@
 """
 Обёртка над Redis-клиентом для работы с задачами и очередями.
 Обеспечивает сохранение задач, обновление, извлечение и работу с очередями.
+
+Вторичные индексы задач (пишутся в одном обращении к Redis вместе с задачей):
+- tasks:client:{client_id}:{type} — sorted set UUID задач клиента по времени создания;
+- tasks:ext:{client_id}:{ExternalId} — UUID задачи по внешнему идентификатору.
+Записи индексов живут не меньше задачи: их TTL — наибольший из TTL статусов типа задачи.
+
+Метки времени жизненного цикла задачи ставятся автоматически:
+- enqueued_at — submit_task и enqueue (постановка в очередь);
+- dequeued_at — dequeue (извлечение воркером);
+- processed_at — update_task при переходе в конечный статус (и processed,
+  если воркер не передал его сам).
+По ним LatencyStats (app/queue/latency.py) накапливает ожидание в очереди
+и время обработки по типам задач.
+
+При нескольких шардах (см. app/queue/sharding.py) задача и все её записи
+хранятся на шарде, выбранном по UUID; индексы и очереди разбиты на партиции
+по шардам, чтение списков объединяет партиции.
 """
 
+import itertools
 import json
+import time
+from datetime import datetime, timezone
 from uuid import UUID
-from typing import Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 import redis
 from loguru import logger
-from app.api.models import TaskInfo
+from app.api.models import TaskInfo, TaskStatus
+from app.queue.connection import InstrumentedConnectionPool
+from app.queue.latency import LatencyStats, Sample
+from app.queue.sharding import ShardRing, redact
+from app.queue.task_cache import TerminalTaskCache
+from app.storage.blob_store import BlobStore, parse_ref
+
+# Во сколько раз окно просмотра индекса больше страницы при фильтрации по статусу
+STATUS_SCAN_FACTOR = 4
+
+# Поля задачи, которые при превышении порога размера выносятся в хранилище blob-объектов
+OFFLOAD_FIELDS = frozenset({"upload", "result"})
+
+# Время ожидания одной партиции очереди при блокирующем извлечении из нескольких шардов (секунды)
+PARTITION_WAIT = 0.2
+
+# Конечные статусы: запись задачи больше не меняется
+TERMINAL_STATUSES = frozenset({TaskStatus.DONE, TaskStatus.ERROR, TaskStatus.CANCELLED})
+
+# Допустимые переходы статусов для complete_tasks и cancel_tasks
+# (pending → pending — обновление хода работы)
+STATUS_TRANSITIONS = {
+    TaskStatus.CREATED: frozenset({TaskStatus.PENDING, TaskStatus.DONE, TaskStatus.ERROR,
+                                   TaskStatus.CANCELLED}),
+    TaskStatus.PENDING: frozenset({TaskStatus.PENDING, TaskStatus.DONE, TaskStatus.ERROR,
+                                   TaskStatus.CANCELLED}),
+}
+
+# Итоги complete_tasks по задаче
+ACCEPTED = "accepted"
+REJECTED_NOT_FOUND = "not_found"  # задача удалена по TTL
+REJECTED_LEASE = "lease_lost"  # задачу извлёк другой воркер (или она возвращена в очередь)
+REJECTED_TRANSITION = "invalid_transition"  # переход из текущего статуса запрещён
+REJECTED_FORBIDDEN = "forbidden"  # отмена задач этого типа не разрешена
+
+# Надгробия отменённых задач на каждом шарде: sorted set "UUID → срок хранения (unix-время)".
+# dequeue пропускает UUID из надгробий, не удаляя их из списка очереди (LREM — O(N))
+CANCELLED_KEY = "cancelled_tasks"
+
+# Задачи с callback_url, перешедшие в конечный статус, на каждом шарде: sorted set
+# "UUID → время следующей попытки доставки" (см. app/webhooks/dispatcher.py).
+# Запись ставится в той же транзакции или скрипте, что и конечный статус
+WEBHOOKS_DUE_KEY = "webhooks:due"
+
+# Постановка доставки webhook задачи, если клиент указал callback_url.
+# KEYS[1] — WEBHOOKS_DUE_KEY, KEYS[2] — ключ задачи; ARGV[1] — текущее unix-время
+SCHEDULE_WEBHOOK_SCRIPT = """
+if redis.call('HEXISTS', KEYS[2], 'callback_url') == 1 then
+    redis.call('ZADD', KEYS[1], ARGV[1], string.sub(KEYS[2], 6))
+end
+return 0
+"""
+
+# TTL нового статуса по типу задачи, сохранённому в hash, — для обновлений без типа.
+# KEYS[1] — ключ задачи; ARGV[1] — TTL статуса по типам (JSON: тип → TTL, как в hash)
+STATUS_TTL_SCRIPT = """
+local task_type = redis.call('HGET', KEYS[1], 'type')
+local ttl = task_type and cjson.decode(ARGV[1])[task_type]
+if ttl and ttl > 0 then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+return 0
+"""
+
+# Пакетное обновление статусов с проверкой перехода и аренды — одно обращение на шард.
+# KEYS[1] — WEBHOOKS_DUE_KEY, далее ключи задач; ARGV[1] — допустимые переходы (JSON:
+# статус → {статус: true}, статусы в том виде, в котором хранятся в hash), ARGV[2] —
+# воркер-владелец аренды ("" — без проверки), ARGV[3] — текущее unix-время, ARGV[4] — TTL
+# по статусам и типам (JSON: статус → тип → TTL; "" — нет) для задач без TTL; далее по каждой
+# задаче: поля (JSON-объект), TTL (0 — по ARGV[4] или не менять) и 1, если статус конечный
+# (webhook).
+# Ответ по задаче: {итог, type, dequeued_at} для принятых, {итог, текущий статус} для отклонённых.
+COMPLETE_TASKS_SCRIPT = """
+local transitions = cjson.decode(ARGV[1])
+local status_ttl = ARGV[4] ~= '' and cjson.decode(ARGV[4]) or {}
+local results = {}
+for i = 2, #KEYS do
+    local key = KEYS[i]
+    local fields = cjson.decode(ARGV[i * 3 - 1])
+    local ttl = tonumber(ARGV[i * 3])
+    local current = redis.call('HMGET', key, 'status', 'worker', 'type', 'dequeued_at')
+    local allowed = current[1] and transitions[current[1]]
+    if not current[1] then
+        results[i - 1] = {'not_found'}
+    elseif ARGV[2] ~= '' and current[2] ~= ARGV[2] then
+        results[i - 1] = {'lease_lost', current[1]}
+    elseif not (allowed and allowed[fields['status']]) then
+        results[i - 1] = {'invalid_transition', current[1]}
+    else
+        local mapping = {}
+        for field, value in pairs(fields) do
+            mapping[#mapping + 1] = field
+            mapping[#mapping + 1] = value
+        end
+        redis.call('HSET', key, unpack(mapping))
+        redis.call('HINCRBY', key, 'version', 1)
+        if ttl == 0 and status_ttl[fields['status']] then
+            ttl = status_ttl[fields['status']][current[3]] or 0
+        end
+        if ttl > 0 then
+            redis.call('EXPIRE', key, ttl)
+        end
+        if ARGV[i * 3 + 1] == '1' and redis.call('HEXISTS', key, 'callback_url') == 1 then
+            redis.call('ZADD', KEYS[1], ARGV[3], string.sub(key, 6))
+        end
+        results[i - 1] = {'accepted', current[3], current[4]}
+    end
+end
+return results
+"""
+
+# Отмена задач одного шарда за одно обращение: статус cancelled и надгробие.
+# KEYS[1] — надгробия шарда, KEYS[2] — WEBHOOKS_DUE_KEY, далее ключи задач;
+# ARGV[1] — допустимые переходы (как в
+# COMPLETE_TASKS_SCRIPT), ARGV[2] — типы, которые разрешено отменять (JSON: тип → TTL
+# отменённой задачи, 0 — не менять; "" — любые типы без смены TTL), ARGV[3] — поля отмены
+# (JSON-объект), ARGV[4] — текущее unix-время, ARGV[5] — срок надгробия задачи без TTL,
+# ARGV[6] — client_id владельца: чужие задачи получают forbidden ("" — любой владелец).
+# Надгробие хранится, пока жива задача; истёкшие удаляются при каждой отмене.
+CANCEL_TASKS_SCRIPT = """
+local transitions = cjson.decode(ARGV[1])
+local types = ARGV[2] ~= '' and cjson.decode(ARGV[2]) or nil
+local fields = cjson.decode(ARGV[3])
+local now = tonumber(ARGV[4])
+local owner = ARGV[6] ~= '' and ARGV[6] or nil
+local mapping = {}
+for field, value in pairs(fields) do
+    mapping[#mapping + 1] = field
+    mapping[#mapping + 1] = value
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local results = {}
+for i = 3, #KEYS do
+    local key = KEYS[i]
+    local current = redis.call('HMGET', key, 'status', 'type', 'client_id')
+    local allowed = current[1] and transitions[current[1]]
+    if not current[1] then
+        results[i - 2] = {'not_found'}
+    elseif (types and not types[current[2]]) or (owner and current[3] ~= owner) then
+        results[i - 2] = {'forbidden', current[1]}
+    elseif not (allowed and allowed[fields['status']]) then
+        results[i - 2] = {'invalid_transition', current[1]}
+    else
+        redis.call('HSET', key, unpack(mapping))
+        redis.call('HINCRBY', key, 'version', 1)
+        local ttl = types and types[current[2]] or 0
+        if ttl > 0 then
+            redis.call('EXPIRE', key, ttl)
+        end
+        local pttl = redis.call('PTTL', key)
+        local expires = now + (pttl > 0 and math.ceil(pttl / 1000) or tonumber(ARGV[5]))
+        redis.call('ZADD', KEYS[1], expires, string.sub(key, 6))
+        if redis.call('HEXISTS', key, 'callback_url') == 1 then
+            redis.call('ZADD', KEYS[2], now, string.sub(key, 6))
+        end
+        results[i - 2] = {'accepted', current[2]}
+    end
+end
+return results
+"""
+
+_TRANSITIONS_ARG = json.dumps({
+    json.dumps(source.value): {json.dumps(target.value): True for target in targets}
+    for source, targets in STATUS_TRANSITIONS.items()})
+
+
+def _timestamp() -> str:
+    """ Текущее время (UTC) в формате ISO 8601, сериализованное для Redis Hash. """
+    return json.dumps(datetime.now(timezone.utc).isoformat())
+
+
+def _parse_timestamp(raw: Optional[bytes]) -> Optional[datetime]:
+    """ Метка времени из Redis Hash (None, если её нет или она не разбирается). """
+    if not raw:
+        return None
+    try:
+        return datetime.fromisoformat(json.loads(raw))
+    except (TypeError, ValueError):
+        return None
+
+
+def index_key(client_id: str, task_type: str) -> str:
+    """ Ключ индекса задач клиента по типу задачи. """
+    return f"tasks:client:{client_id}:{task_type}"
+
+
+def external_id_key(client_id: str, external_id: str) -> str:
+    """ Ключ соответствия (client_id, ExternalId) → UUID задачи. """
+    return f"tasks:ext:{client_id}:{external_id}"
+
 
 class RedisQueue:
     """
     Класс-обёртка для взаимодействия с Redis как с брокером задач и хранилищем состояний.
     """
 
-    def __init__(self, client: redis.Redis, default_ttl: int = 3600):
+    def __init__(self, client: redis.Redis, default_ttl: int = 3600,
+                 task_cache: Optional[TerminalTaskCache] = None,
+                 blob_store: Optional[BlobStore] = None, offload_threshold: int = 64 * 1024,
+                 shards: Optional[ShardRing] = None,
+                 dequeue_clients: Optional[List[redis.Redis]] = None,
+                 ttl_policy: Optional[Callable[[str, str], Optional[int]]] = None,
+                 latency_stats: Optional[LatencyStats] = None,
+                 task_types: Optional[Iterable[str]] = None):
         """
         Инициализация очереди.
 
-        :param client: Подключённый Redis клиент
+        :param client: Подключённый Redis клиент (единственный шард, если shards не заданы)
         :param default_ttl: TTL (в секундах) для хранения задач
+        :param task_cache: Локальный кэш задач в конечных статусах (None — без кэша)
+        :param blob_store: Хранилище крупных upload/result (None — всё хранится в Redis)
+        :param offload_threshold: Размер сериализованного поля, начиная с которого
+                                  оно выносится в blob_store (байты)
+        :param shards: Кольцо шардов для хранения задач (None — все задачи в client)
+        :param dequeue_clients: Клиенты отдельного пула для блокирующего dequeue,
+                                по одному на шард в порядке shards (None — клиенты шардов)
+        :param ttl_policy: TTL задачи по (тип, статус), например TaskTypeRegistry.ttl_for;
+                           применяется в update_task при смене статуса
+        :param latency_stats: Гистограммы ожидания в очереди и времени обработки
+                              (None — метки времени ставятся, но не агрегируются)
+        :param task_types: Известные типы задач: по ним ttl_policy применяется к обновлению
+                           без типа — по типу, сохранённому в задаче (None — не применяется)
         """
         self.client = client
+        self.shards = shards or ShardRing([client])
+        self.dequeue_clients = list(dequeue_clients or self.shards.clients)
+        if len(self.dequeue_clients) != len(self.shards):
+            raise ValueError("dequeue_clients must match the Redis shards")
+        self._partition_counter = itertools.count()
         self.default_ttl = default_ttl
+        self.task_cache = task_cache
+        self.blob_store = blob_store
+        self.offload_threshold = offload_threshold
+        self.ttl_policy = ttl_policy
+        self.latency_stats = latency_stats
+        self._scripts: Dict[Tuple[str, int], Any] = {}  # серверные скрипты по шардам
+        self._status_ttl: Dict[str, Dict[str, int]] = {}
+        if ttl_policy is not None and task_types is not None:
+            # Таблица "статус → тип → TTL" в том виде, в котором статус и тип хранятся в hash
+            for status in TaskStatus:
+                ttls = {json.dumps(task_type): ttl_policy(task_type, status.value)
+                        for task_type in task_types}
+                self._status_ttl[json.dumps(status.value)] = \
+                    {task_type: ttl for task_type, ttl in ttls.items() if ttl}
+
+    def _encode(self, data: dict) -> dict:
+        """
+        Сериализует поля задачи в JSON для Redis Hash.
+        Крупные upload/result сохраняются в blob_store, в hash остаётся ссылка.
+
+        :param data: Поля задачи
+        :return: Словарь "поле → JSON"
+        """
+        mapping = {}
+        for field, value in data.items():
+            encoded = json.dumps(value)
+            if self.blob_store is not None and field in OFFLOAD_FIELDS \
+                    and len(encoded) > self.offload_threshold:
+                ref = self.blob_store.put(encoded.encode())
+                logger.debug("Task field '{field}' of {size} bytes offloaded to blob store",
+                             field=field, size=len(encoded))
+                encoded = json.dumps(ref)
+            mapping[field] = encoded
+        return mapping
 
     def save_task(self, task_uuid: UUID, data: dict, ttl_seconds: Optional[int] = None) -> None:
         """
@@ -34,63 +302,650 @@ class RedisQueue:
         :param ttl_seconds: Время жизни задачи в секундах
         """
         key = f"task:{task_uuid}" # ключ для хранения задачи
+        client = self.shards.client_for(str(task_uuid))
         # сохраняем данные задачи в виде JSON
-        self.client.hset(key, mapping={k: json.dumps(v) for k, v in data.items()})
+        client.hset(key, mapping=self._encode(data))
         # устанавливаем время жизни задачи
-        self.client.expire(key, ttl_seconds or self.default_ttl)
+        client.expire(key, ttl_seconds or self.default_ttl)
 
-        logger.debug(f"Task {task_uuid} saved with TTL {ttl_seconds or self.default_ttl} seconds")
+        logger.debug("Task {task_uuid} saved with TTL {ttl} seconds",
+                     task_uuid=task_uuid, ttl=ttl_seconds or self.default_ttl)
 
-    def get_task(self, task_uuid: UUID) -> Optional[dict]:
+    def submit_task(self, task_uuid: UUID, data: dict, queue_name: str,
+                    ttl_seconds: Optional[int] = None, index_ttl: Optional[int] = None) -> None:
+        """
+        Сохраняет задачу, обновляет индексы клиента и ставит задачу в очередь
+        за одно обращение к Redis (транзакция MULTI/EXEC на шарде задачи).
+
+        :param task_uuid: Идентификатор задачи
+        :param data: Данные задачи (client_id, type, created, ExternalId используются индексами)
+        :param queue_name: Имя очереди
+        :param ttl_seconds: Время жизни задачи (секунды)
+        :param index_ttl: Время жизни записей задачи в индексах — не меньше, чем задача
+                          проживёт в любом статусе (по умолчанию — ttl_seconds)
+        """
+        ttl = ttl_seconds or self.default_ttl
+        index_ttl = max(index_ttl or ttl, ttl)
+        key = f"task:{task_uuid}"
+        client_id = data.get("client_id")
+
+        mapping = self._encode(data)
+        mapping["version"] = 1  # счётчик изменений задачи, увеличивается update_task
+        mapping["enqueued_at"] = _timestamp()
+
+        pipe = self.shards.client_for(str(task_uuid)).pipeline(transaction=True)
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, ttl)
+        if client_id:
+            created = datetime.fromisoformat(data["created"]).timestamp()
+            tasks_key = index_key(client_id, data["type"])
+            pipe.zadd(tasks_key, {str(task_uuid): created})
+            # Удаляем из индекса записи задач, срок жизни которых уже истёк
+            pipe.zremrangebyscore(tasks_key, "-inf", f"({created - index_ttl}")
+            pipe.expire(tasks_key, index_ttl)
+            if data.get("ExternalId"):
+                pipe.set(external_id_key(client_id, data["ExternalId"]), str(task_uuid),
+                         ex=index_ttl)
+        pipe.lpush(queue_name, str(task_uuid))
+        pipe.execute()
+
+        logger.debug("Task {task_uuid} saved with TTL {ttl} seconds and enqueued to {queue}",
+                     task_uuid=task_uuid, ttl=ttl, queue=queue_name)
+
+    def find_by_external_id(self, client_id: str, external_id: str) -> Optional[str]:
+        """
+        Находит UUID задачи клиента по внешнему идентификатору.
+        Соответствие хранится на шарде задачи, поэтому после повторной постановки
+        с тем же ExternalId их может быть несколько — выбирается последняя созданная задача.
+
+        :param client_id: Идентификатор клиента
+        :param external_id: Внешний идентификатор задачи
+        :return: UUID задачи или None
+        """
+        key = external_id_key(client_id, external_id)
+        found = [(client, raw.decode()) for client in self.shards.clients
+                 for raw in [client.get(key)] if raw]
+        if len(found) < 2:
+            return found[0][1] if found else None
+
+        # Время создания каждой из задач читается с её шарда
+        candidates = []
+        for client, task_uuid in found:
+            created = _parse_timestamp(client.hget(f"task:{task_uuid}", "created"))
+            if created is not None:
+                candidates.append((created, task_uuid))
+        return max(candidates)[1] if candidates else None
+
+    def list_tasks(self, client_id: str, task_types: List[str], limit: int = 50,
+                   cursor: Optional[str] = None,
+                   status: Optional[str] = None) -> Tuple[List[TaskInfo], Optional[str]]:
+        """
+        Возвращает страницу задач клиента (от новых к старым) по индексам.
+        Стоимость страницы зависит только от limit и числа типов задач,
+        но не от общего числа ключей в Redis.
+
+        :param client_id: Идентификатор клиента
+        :param task_types: Типы задач, по индексам которых выполняется поиск
+        :param limit: Размер страницы
+        :param cursor: Курсор следующей страницы (из предыдущего ответа)
+        :param status: Фильтр по статусу задачи
+        :return: Кортеж (задачи, курсор следующей страницы или None)
+        """
+        max_score = f"({cursor}" if cursor else "+inf"
+        window = limit * STATUS_SCAN_FACTOR if status else limit
+
+        # Партиции индекса: по одной на каждый тип задачи на каждом шарде
+        partitions = []
+        for shard, client in enumerate(self.shards.clients):
+            pipe = client.pipeline(transaction=False)
+            for task_type in task_types:
+                pipe.zrevrangebyscore(index_key(client_id, task_type), max_score, "-inf",
+                                      start=0, num=window, withscores=True)
+            partitions.extend([(member, score, shard) for member, score in found]
+                              for found in pipe.execute())
+
+        # Слияние партиций по времени создания, от новых к старым
+        entries = sorted((entry for found in partitions for entry in found),
+                         key=lambda entry: entry[1], reverse=True)
+        has_more = len(entries) > window or any(len(found) == window for found in partitions)
+        entries = entries[:window]
+
+        # Данные задач читаются одним конвейером на шард
+        records = {}
+        for shard, client in enumerate(self.shards.clients):
+            members = [member for member, _, entry_shard in entries if entry_shard == shard]
+            if not members:
+                continue
+            pipe = client.pipeline(transaction=False)
+            for member in members:
+                pipe.hgetall(f"task:{member.decode()}")
+            records.update(zip(members, pipe.execute()))
+
+        tasks: List[TaskInfo] = []
+        for member, score, _ in entries:
+            raw = records.get(member)
+            if not raw:
+                continue  # задача уже удалена по TTL
+            try:
+                task = TaskInfo.model_validate({k.decode(): json.loads(v) for k, v in raw.items()})
+            except ValueError as e:
+                logger.warning("Task {task_uuid} in index is not valid: {error}",
+                               task_uuid=member.decode(), error=str(e))
+                continue
+            if status and task.status.value != status:
+                continue
+            tasks.append(task)
+            if len(tasks) == limit:
+                return tasks, repr(score)
+
+        return tasks, repr(entries[-1][1]) if has_more and entries else None
+
+    def get_task(self, task_uuid: UUID) -> Optional[TaskInfo]:
         """
         Извлекает задачу по UUID.
+        Задачи в конечных статусах берутся из локального кэша (если он задан).
 
         :param task_uuid: Идентификатор задачи
-        :return: Словарь с данными задачи или None
+        :return: Задача или None
         """
+        if self.task_cache is not None:
+            task = self.task_cache.get(str(task_uuid))
+            if task is not None:
+                logger.debug("Task {task_uuid} retrieved from local cache", task_uuid=task_uuid)
+                return task
+
         key = f"task:{task_uuid}" # ключ для хранения задачи
+        client = self.shards.client_for(str(task_uuid))
         # читаем (не удаляя) данные задачи из Redis Hash
-        raw = self.client.hgetall(key)
+        if self.task_cache is not None:
+            # Вместе с данными читаем оставшийся TTL — срок жизни записи в кэше
+            pipe = client.pipeline(transaction=False)
+            pipe.hgetall(key)
+            pipe.pttl(key)
+            raw, pttl = pipe.execute()
+        else:
+            raw, pttl = client.hgetall(key), None
         if not raw:
-            logger.warning(f"Task {task_uuid} not found in Redis")
+            logger.warning("Task {task_uuid} not found in Redis", task_uuid=task_uuid)
             return None
-        logger.debug(f"Task {task_uuid} retrieved")
-        # было return {k.decode(): json.loads(v) for k, v in raw.items()}
-        return TaskInfo.model_validate({k.decode(): json.loads(v) for k, v in raw.items()})
+        logger.debug("Task {task_uuid} retrieved", task_uuid=task_uuid)
+        task = TaskInfo.model_validate({k.decode(): json.loads(v) for k, v in raw.items()})
+
+        if pttl is not None and pttl > 0 and task.status in TERMINAL_STATUSES:
+            size = sum(len(k) + len(v) for k, v in raw.items())
+            self.task_cache.put(str(task_uuid), task, size, pttl / 1000)
+        return task
 
 
-    def update_task(self, task_uuid: UUID, updates: dict) -> None:
+    def update_task(self, task_uuid: UUID, updates: dict, task_type: Optional[str] = None,
+                    ttl_seconds: Optional[int] = None) -> None:
         """
-        Обновляет поля задачи в Redis.
+        Обновляет поля задачи в Redis и увеличивает её счётчик версий (ETag).
+        При смене статуса TTL задачи заменяется по ttl_policy в той же транзакции.
+        При переходе в конечный статус ставится processed_at, учитывается время обработки
+        и ставится в очередь доставка webhook (если у задачи есть callback_url).
 
         :param task_uuid: Идентификатор задачи
         :param updates: Поля для обновления
+        :param task_type: Тип задачи для выбора TTL по ttl_policy (None — по типу,
+                          сохранённому в задаче, если очередь знает task_types)
+        :param ttl_seconds: Новый TTL задачи (имеет приоритет над ttl_policy)
+        """
+        self.update_tasks([(task_uuid, updates, task_type)], ttl_seconds=ttl_seconds)
+
+    def update_tasks(self, items: List[Tuple[Any, dict, Optional[str]]],
+                     ttl_seconds: Optional[int] = None) -> None:
+        """
+        Обновляет несколько задач: одна транзакция MULTI/EXEC на шард.
+        Для каждой задачи действует то же, что в update_task.
+
+        :param items: Кортежи (UUID задачи, поля для обновления, тип задачи)
+        :param ttl_seconds: Новый TTL задач (имеет приоритет над ttl_policy)
+        """
+        by_shard: Dict[int, list] = {}
+        for task_uuid, updates, task_type in items:
+            by_shard.setdefault(self.shards.index_for(str(task_uuid)), []).append(
+                (task_uuid, updates, task_type))
+
+        samples: List[Sample] = []
+        for shard, shard_items in by_shard.items():
+            pipe = self.shards.clients[shard].pipeline(transaction=True)
+            tracked = []  # (позиция ответа HMGET, processed_at) для учёта времени обработки
+            commands = 0
+            for task_uuid, updates, task_type in shard_items:
+                commands, processed_at = self._queue_update(pipe, commands, task_uuid, updates,
+                                                            task_type, ttl_seconds)
+                if processed_at is not None:
+                    tracked.append((commands - 1, processed_at))
+            results = pipe.execute()
+
+            if self.task_cache is not None:
+                for task_uuid, _, _ in shard_items:
+                    self.task_cache.invalidate(str(task_uuid))
+            for position, processed_at in tracked:
+                raw_type, raw_dequeued = results[position]
+                self._latency_sample(samples, raw_type, "processing",
+                                     _parse_timestamp(raw_dequeued),
+                                     _parse_timestamp(processed_at.encode()))
+            for task_uuid, updates, _ in shard_items:
+                logger.debug("Task {task_uuid} updated with fields: {fields}",
+                             task_uuid=task_uuid, fields=list(updates))
+        self._record_latency(samples)
+
+    def _queue_update(self, pipe, commands: int, task_uuid, updates: dict,
+                      task_type: Optional[str],
+                      ttl_seconds: Optional[int]) -> Tuple[int, Optional[str]]:
+        """
+        Добавляет в транзакцию команды обновления одной задачи.
+
+        :return: Кортеж (число команд в транзакции, processed_at, если последней
+                 добавлена команда HMGET для учёта времени обработки, иначе None)
         """
         key = f"task:{task_uuid}"
-        self.client.hset(key, mapping={k: json.dumps(v) for k, v in updates.items()})
-        logger.debug(f"Task {task_uuid} updated with fields: {list(updates.keys())}")
+        mapping, ttl_seconds, finished = self._prepare_update(updates, task_type, ttl_seconds)
+        pipe.hset(key, mapping=mapping)
+        pipe.hincrby(key, "version", 1)
+        commands += 2
+        if ttl_seconds:
+            pipe.expire(key, ttl_seconds)
+            commands += 1
+        elif task_type is None and "status" in updates and self._status_ttl:
+            # Тип задачи неизвестен вызывающему — TTL выбирается по типу из hash
+            status_ttl = self._status_ttl.get(mapping["status"], {})
+            self._script(STATUS_TTL_SCRIPT, self.shards.index_for(str(task_uuid)))(
+                keys=[key], args=[json.dumps(status_ttl)], client=pipe)
+            commands += 1
+        if finished:
+            self._script(SCHEDULE_WEBHOOK_SCRIPT, self.shards.index_for(str(task_uuid)))(
+                keys=[WEBHOOKS_DUE_KEY, key], args=[int(time.time())], client=pipe)
+            commands += 1
+        if finished and self.latency_stats is not None:
+            pipe.hmget(key, "type", "dequeued_at")
+            return commands + 1, mapping["processed_at"]
+        return commands, None
+
+    def _prepare_update(self, updates: dict, task_type: Optional[str],
+                        ttl_seconds: Optional[int]) -> Tuple[dict, Optional[int], bool]:
+        """
+        Готовит поля обновления задачи: сериализация, processed_at для конечных статусов, TTL.
+
+        :return: Кортеж (поля для hash, TTL или None, переходит ли задача в конечный статус)
+        """
+        status = getattr(updates.get("status"), "value", updates.get("status"))
+        if ttl_seconds is None and status is not None and task_type and self.ttl_policy:
+            ttl_seconds = self.ttl_policy(task_type, status)
+
+        mapping = self._encode(updates)
+        finished = status in {terminal.value for terminal in TERMINAL_STATUSES}
+        if finished:
+            mapping["processed_at"] = _timestamp()
+            mapping.setdefault("processed", mapping["processed_at"])
+        return mapping, ttl_seconds, finished
+
+    def complete_tasks(self, items: List[Tuple[Any, dict, Optional[str]]],
+                       worker_id: Optional[str] = None) -> Dict[str, str]:
+        """
+        Пакетная смена статусов задач серверным скриптом: одно обращение на шард.
+        Обновление применяется, только если переход из текущего статуса допустим
+        (STATUS_TRANSITIONS) и — при заданном worker_id — задачу извлёк этот воркер.
+        Иначе задача не меняется: опоздавший воркер не вернёт готовую задачу в pending.
+        Принятый конечный статус в том же скрипте ставит в очередь доставку webhook.
+
+        :param items: Кортежи (UUID задачи, поля с обязательным status, тип задачи)
+        :param worker_id: Идентификатор воркера, переданный в dequeue/dequeue_batch
+        :return: Словарь "UUID → итог": accepted, not_found, lease_lost или invalid_transition
+        :raises ValueError: если в обновлении нет статуса
+        """
+        by_shard: Dict[int, list] = {}
+        for task_uuid, updates, task_type in items:
+            if updates.get("status") is None:
+                raise ValueError(f"Status is required to complete task {task_uuid}")
+            by_shard.setdefault(self.shards.index_for(str(task_uuid)), []).append(
+                (str(task_uuid), updates, task_type))
+
+        outcomes, samples = {}, []
+        for shard, shard_items in by_shard.items():
+            keys, prepared = [WEBHOOKS_DUE_KEY], []
+            args: List[Any] = [_TRANSITIONS_ARG, json.dumps(worker_id) if worker_id else "",
+                               int(time.time()),
+                               json.dumps(self._status_ttl) if self._status_ttl else ""]
+            for task_uuid, updates, task_type in shard_items:
+                mapping, ttl_seconds, finished = self._prepare_update(updates, task_type, None)
+                keys.append(f"task:{task_uuid}")
+                args.extend([json.dumps(mapping), ttl_seconds or 0, int(finished)])
+                prepared.append((task_uuid, mapping, finished))
+
+            replies = self._script(COMPLETE_TASKS_SCRIPT, shard)(keys=keys, args=args)
+            for (task_uuid, mapping, finished), reply in zip(prepared, replies):
+                outcome = reply[0].decode()
+                outcomes[task_uuid] = outcome
+                if outcome != ACCEPTED:
+                    logger.warning("Task {task_uuid} update to '{status}' rejected: {reason}",
+                                   task_uuid=task_uuid, status=json.loads(mapping["status"]),
+                                   reason=outcome,
+                                   current=json.loads(reply[1]) if len(reply) > 1 else None)
+                    continue
+                if self.task_cache is not None:
+                    self.task_cache.invalidate(task_uuid)
+                if finished:
+                    self._latency_sample(samples, reply[1], "processing",
+                                         _parse_timestamp(reply[2]),
+                                         _parse_timestamp(mapping["processed_at"].encode()))
+        self._record_latency(samples)
+        return outcomes
+
+    def cancel_tasks(self, task_uuids: Iterable[Any], task_types: Optional[Iterable[str]] = None,
+                     message: str = "Task cancelled",
+                     client_id: Optional[str] = None) -> Dict[str, str]:
+        """
+        Отмена задач: статус cancelled в задаче и надгробие UUID на её шарде — один вызов
+        скрипта на шард. Отменить можно только задачу в статусе created или pending.
+        UUID из списка очереди не удаляется: dequeue пропускает его по надгробию.
+        Задача в обработке дорабатывается, но её итог отклоняется complete_tasks;
+        воркер может прервать её раньше, опрашивая cancelled().
+
+        :param task_uuids: UUID задач
+        :param task_types: Типы задач, которые разрешено отменять (None — любые);
+                           для них применяется TTL статуса cancelled из ttl_policy
+        :param message: Сообщение в отменённой задаче
+        :param client_id: Отменять только задачи этого клиента (None — любого владельца)
+        :return: Словарь "UUID → итог": accepted, not_found, forbidden (тип не разрешён
+                 или задача другого клиента) или invalid_transition
+        """
+        types_arg = ""
+        if task_types is not None:
+            types_arg = json.dumps({
+                json.dumps(task_type): (self.ttl_policy(task_type, TaskStatus.CANCELLED.value)
+                                        if self.ttl_policy else None) or 0
+                for task_type in task_types})
+        mapping, _, _ = self._prepare_update(
+            {"status": TaskStatus.CANCELLED, "message": message}, None, None)
+
+        by_shard: Dict[int, List[str]] = {}
+        for task_uuid in dict.fromkeys(str(task_uuid) for task_uuid in task_uuids):
+            by_shard.setdefault(self.shards.index_for(task_uuid), []).append(task_uuid)
+
+        outcomes = {}
+        for shard, shard_uuids in by_shard.items():
+            replies = self._script(CANCEL_TASKS_SCRIPT, shard)(
+                keys=[CANCELLED_KEY, WEBHOOKS_DUE_KEY] +
+                [f"task:{task_uuid}" for task_uuid in shard_uuids],
+                args=[_TRANSITIONS_ARG, types_arg, json.dumps(mapping), int(time.time()),
+                      self.default_ttl, json.dumps(client_id) if client_id is not None else ""])
+            for task_uuid, reply in zip(shard_uuids, replies):
+                outcome = reply[0].decode()
+                outcomes[task_uuid] = outcome
+                if outcome == ACCEPTED:
+                    if self.task_cache is not None:
+                        self.task_cache.invalidate(task_uuid)
+                    logger.info("Task {task_uuid} cancelled", task_uuid=task_uuid,
+                                type=json.loads(reply[1]))
+                else:
+                    logger.info("Task {task_uuid} was not cancelled: {reason}",
+                                task_uuid=task_uuid, reason=outcome,
+                                current=json.loads(reply[1]) if len(reply) > 1 else None)
+        return outcomes
+
+    def cancelled(self, task_uuids: Iterable[Any]) -> Set[str]:
+        """
+        Какие из задач отменены — для воркеров, опрашивающих задачи в обработке.
+        Одна команда ZMSCORE на шард по надгробиям, без чтения самих задач.
+
+        :param task_uuids: UUID задач
+        :return: UUID отменённых задач
+        """
+        by_shard: Dict[int, List[str]] = {}
+        for task_uuid in task_uuids:
+            by_shard.setdefault(self.shards.index_for(str(task_uuid)), []).append(str(task_uuid))
+
+        now = time.time()
+        result = set()
+        for shard, shard_uuids in by_shard.items():
+            scores = self.shards.clients[shard].zmscore(CANCELLED_KEY, shard_uuids)
+            result.update(task_uuid for task_uuid, score in zip(shard_uuids, scores)
+                          if score is not None and score > now)
+        return result
+
+    def _script(self, script: str, shard: int):
+        """ Серверный скрипт, зарегистрированный на клиенте шарда. """
+        if (script, shard) not in self._scripts:
+            self._scripts[(script, shard)] = self.shards.clients[shard].register_script(script)
+        return self._scripts[(script, shard)]
 
     def enqueue(self, queue_name: str, task_uuid: UUID) -> None:
         """
-        Помещает UUID задачи в указанную очередь Redis.
+        Помещает UUID задачи в указанную очередь Redis (в партицию на шарде задачи),
+        обновляет её enqueued_at и снимает аренду воркера.
 
         :param queue_name: Имя очереди
         :param task_uuid: Идентификатор задачи
         """
-        self.client.lpush(queue_name, task_uuid)
-        logger.debug(f"Task {task_uuid} enqueued to {queue_name}")
+        pipe = self.shards.client_for(str(task_uuid)).pipeline(transaction=True)
+        pipe.hset(f"task:{task_uuid}", "enqueued_at", _timestamp())
+        pipe.hdel(f"task:{task_uuid}", "worker")
+        pipe.lpush(queue_name, str(task_uuid))
+        pipe.execute()
+        logger.debug("Task {task_uuid} enqueued to {queue}", task_uuid=task_uuid, queue=queue_name)
 
-    def dequeue(self, queue_name: str, timeout: int = 0) -> Optional[str]:
+    def dequeue(self, queue_name: str, timeout: int = 0,
+                worker_id: Optional[str] = None) -> Optional[str]:
         """
         Блокирующее извлечение UUID задачи из очереди.
+        При нескольких шардах партиции очереди обходятся по кругу, каждый вызов
+        начинает со следующей партиции — воркеры разбирают партиции равномерно.
 
         :param queue_name: Имя очереди
         :param timeout: Таймаут ожидания (0 = бесконечно)
+        :param worker_id: Идентификатор воркера — владельца аренды задачи (для complete_tasks)
         :return: UUID задачи или None
         """
-        result = self.client.brpop(queue_name, timeout=timeout)
-        if result:
-            task_uuid = result[1].decode()
-            logger.debug(f"Task {task_uuid} dequeued from {queue_name}")
-            return task_uuid
-        return None
+        # Отменённые задачи пропускаются; ожидание продолжается до исходного таймаута
+        deadline = time.monotonic() + timeout if timeout else None
+        wait = timeout
+        while True:
+            raw_uuid = self._pop(queue_name, wait)
+            if raw_uuid is None:
+                return None
+            task_uuids = self._dequeued(queue_name, [raw_uuid], worker_id)
+            if task_uuids:
+                return task_uuids[0]
+            if deadline is not None:
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    return None
+
+    def _pop(self, queue_name: str, timeout: float) -> Optional[bytes]:
+        """
+        Извлечение одного UUID из партиций очереди (см. dequeue).
+
+        :param queue_name: Имя очереди
+        :param timeout: Таймаут ожидания (0 = бесконечно)
+        :return: UUID из ответа BRPOP/RPOP или None
+        """
+        if len(self.shards) == 1:
+            result = self.dequeue_clients[0].brpop(queue_name, timeout=timeout)
+            return result[1] if result else None
+
+        order = self._partition_order()
+        # Сначала неблокирующий проход по всем партициям
+        for client in order:
+            task_uuid = client.rpop(queue_name)
+            if task_uuid:
+                return task_uuid
+
+        # Затем поочерёдное короткое ожидание на каждой партиции до истечения таймаута
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            for client in order:
+                wait = PARTITION_WAIT
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        return None
+                result = client.brpop(queue_name, timeout=wait)
+                if result:
+                    return result[1]
+
+    def dequeue_batch(self, queue_name: str, count: int, timeout: int = 0,
+                      worker_id: Optional[str] = None) -> List[str]:
+        """
+        Извлечение до count UUID задач из очереди.
+        Сначала задачи забираются без ожидания (RPOP с count по партициям); если очередь
+        пуста (или в ней были только отменённые задачи) — ожидается одна задача, как в dequeue.
+
+        :param queue_name: Имя очереди
+        :param count: Максимальное число задач
+        :param timeout: Таймаут ожидания первой задачи (0 = бесконечно)
+        :param worker_id: Идентификатор воркера — владельца аренды задач (для complete_tasks)
+        :return: UUID задач (пустой список по таймауту)
+        """
+        popped: List[bytes] = []
+        for client in self._partition_order():
+            if len(popped) == count:
+                break
+            popped.extend(client.rpop(queue_name, count - len(popped)) or [])
+        task_uuids = self._dequeued(queue_name, popped, worker_id) if popped else []
+        if task_uuids:
+            return task_uuids
+        task_uuid = self.dequeue(queue_name, timeout=timeout, worker_id=worker_id)
+        return [task_uuid] if task_uuid else []
+
+    def _partition_order(self) -> List[redis.Redis]:
+        """ Клиенты dequeue в порядке обхода партиций: каждый вызов — со следующего шарда. """
+        count = len(self.dequeue_clients)
+        first = next(self._partition_counter) % count
+        return [self.dequeue_clients[(first + i) % count] for i in range(count)]
+
+    def _dequeued(self, queue_name: str, raw_uuids: List[bytes],
+                  worker_id: Optional[str] = None) -> List[str]:
+        """
+        Ставит извлечённым задачам dequeued_at и воркера-владельца аренды (транзакция на шард).
+        В той же транзакции снимаются надгробия: отменённые задачи пропускаются.
+        Ожидание в очереди учитывается в latency_stats.
+
+        :param queue_name: Имя очереди
+        :param raw_uuids: UUID задач из ответа BRPOP/RPOP
+        :param worker_id: Идентификатор воркера (None — аренда не ставится)
+        :return: UUID неотменённых задач строками
+        """
+        lease = {"worker": json.dumps(worker_id)} if worker_id else None
+        task_uuids = [raw.decode() for raw in raw_uuids]
+        by_shard: Dict[int, List[str]] = {}
+        for task_uuid in task_uuids:
+            by_shard.setdefault(self.shards.index_for(task_uuid), []).append(task_uuid)
+
+        dequeued_at = _timestamp()
+        skipped = set()
+        samples: List[Sample] = []
+        for shard, shard_uuids in by_shard.items():
+            client = self.shards.clients[shard]
+            pipe = client.pipeline(transaction=True)
+            for task_uuid in shard_uuids:
+                pipe.zrem(CANCELLED_KEY, task_uuid)
+                pipe.hset(f"task:{task_uuid}", "dequeued_at", dequeued_at, mapping=lease)
+                pipe.hmget(f"task:{task_uuid}", "type", "enqueued_at")
+            replies = pipe.execute()
+
+            expired, cancelled = [], []
+            for task_uuid, tombstone, (raw_type, raw_enqueued) in \
+                    zip(shard_uuids, replies[0::3], replies[2::3]):
+                if tombstone:
+                    cancelled.append(task_uuid)
+                    logger.debug("Cancelled task {task_uuid} skipped in {queue}",
+                                 task_uuid=task_uuid, queue=queue_name)
+                    continue
+                if raw_type is None:
+                    # Задача удалена по TTL, пока ждала в очереди, — HSET создал пустую запись
+                    expired.append(f"task:{task_uuid}")
+                    logger.warning("Task {task_uuid} dequeued from {queue} has expired",
+                                   task_uuid=task_uuid, queue=queue_name)
+                    continue
+                self._latency_sample(samples, raw_type, "queue_wait",
+                                     _parse_timestamp(raw_enqueued),
+                                     _parse_timestamp(dequeued_at.encode()))
+                logger.debug("Task {task_uuid} dequeued from {queue}",
+                             task_uuid=task_uuid, queue=queue_name)
+            if expired:
+                client.delete(*expired)
+            if cancelled:
+                # Отменённая задача не извлекалась: снимаем отметки, поставленные транзакцией
+                cleanup = client.pipeline(transaction=False)
+                for task_uuid in cancelled:
+                    cleanup.hdel(f"task:{task_uuid}", "dequeued_at", "worker")
+                cleanup.execute()
+                skipped.update(cancelled)
+        self._record_latency(samples)
+        return [task_uuid for task_uuid in task_uuids if task_uuid not in skipped]
+
+    def load_tasks(self, task_uuids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Читает полные записи задач (включая upload) для обработки воркером:
+        один конвейер на шард. Поля, вынесенные в blob_store, подставляются обратно.
+
+        :param task_uuids: UUID задач
+        :return: Словарь "UUID → поля задачи"; задачи, удалённые по TTL, пропускаются
+        """
+        by_shard: Dict[int, List[str]] = {}
+        for task_uuid in task_uuids:
+            by_shard.setdefault(self.shards.index_for(task_uuid), []).append(task_uuid)
+
+        tasks = {}
+        for shard, shard_uuids in by_shard.items():
+            pipe = self.shards.clients[shard].pipeline(transaction=False)
+            for task_uuid in shard_uuids:
+                pipe.hgetall(f"task:{task_uuid}")
+            for task_uuid, raw in zip(shard_uuids, pipe.execute()):
+                if not raw:
+                    logger.warning("Task {task_uuid} not found in Redis", task_uuid=task_uuid)
+                    continue
+                fields = {k.decode(): json.loads(v) for k, v in raw.items()}
+                for field in OFFLOAD_FIELDS & fields.keys():
+                    digest = parse_ref(fields[field])
+                    if digest is not None and self.blob_store is not None:
+                        fields[field] = json.loads(self.blob_store.read(digest))
+                tasks[task_uuid] = fields
+        return tasks
+
+    def _latency_sample(self, samples: List[Sample], raw_type: Optional[bytes], metric: str,
+                        started: Optional[datetime], finished: Optional[datetime]) -> None:
+        """ Добавляет длительность этапа к замерам вызова (если обе метки известны). """
+        if self.latency_stats is None or raw_type is None or started is None or finished is None:
+            return
+        samples.append((json.loads(raw_type), metric, (finished - started).total_seconds(),
+                        finished.timestamp()))
+
+    def _record_latency(self, samples: List[Sample]) -> None:
+        """ Записывает замеры вызова в latency_stats: один конвейер на шард. """
+        if samples and self.latency_stats is not None:
+            self.latency_stats.record_many(samples)
+
+    def queue_depths(self, queue_names: List[str]) -> Dict[str, int]:
+        """
+        Число задач в очередях (сумма партиций на всех шардах).
+
+        :param queue_names: Имена очередей
+        :return: Словарь "очередь → число задач"
+        """
+        depths = dict.fromkeys(queue_names, 0)
+        for client in self.shards.clients:
+            pipe = client.pipeline(transaction=False)
+            for queue_name in queue_names:
+                pipe.llen(queue_name)
+            for queue_name, length in zip(queue_names, pipe.execute()):
+                depths[queue_name] += length
+        return depths
+
+    def pool_stats(self) -> List[Dict[str, Any]]:
+        """
+        Статистика пулов соединений: по пулу запросов и пулу dequeue каждого шарда
+        (имена шардов — без учётных данных).
+
+        :return: Список снимков статистики (только для пулов со статистикой)
+        """
+        stats = []
+        for purpose, clients in (("requests", self.shards.clients), ("dequeue", self.dequeue_clients)):
+            for name, client in zip(self.shards.names, clients):
+                pool = client.connection_pool
+                if isinstance(pool, InstrumentedConnectionPool):
+                    stats.append({"shard": redact(name), "purpose": purpose, **pool.stats()})
+        return stats
@@ -0,0 +1,95 @@
+"""
+Распределение задач по нескольким независимым экземплярам Redis (шардам).
+
+Используется согласованное хэширование на стороне клиента: шард задачи
+определяется по её UUID на кольце с виртуальными узлами. Все ключи одной
+задачи — hash задачи, записи в индексах клиента, соответствие ExternalId и
+элемент очереди — лежат на одном шарде, поэтому запись задачи остаётся
+одной транзакцией MULTI/EXEC на одном сервере. Каждая очередь {type}_INPUT
+существует на каждом шарде (партиция), воркеры обходят партиции по кругу.
+
+Имена шардов (обычно URL) определяют положение на кольце: при добавлении
+шарда на новое место переходит примерно 1/N задач, остальные не сдвигаются.
+"""
+
+import hashlib
+from bisect import bisect
+from typing import List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit, urlunsplit
+import redis
+
+VIRTUAL_NODES = 160  # Число точек шарда на кольце
+
+
+def _point(label: str) -> int:
+    """ Позиция метки на кольце (64 бита). """
+    return int.from_bytes(hashlib.blake2b(label.encode(), digest_size=8).digest(), "big")
+
+
+def redact(name: str) -> str:
+    """
+    Имя шарда без учётных данных (пользователь и пароль из URL удаляются).
+
+    :param name: Имя шарда (обычно URL)
+    :return: Имя, пригодное для вывода в ответах и логах
+    """
+    parts = urlsplit(name)
+    if not parts.netloc or "@" not in parts.netloc:
+        return name
+    return urlunsplit(parts._replace(netloc=parts.netloc.rpartition("@")[2]))
+
+
+class ShardRing:
+    """
+    Кольцо согласованного хэширования над Redis-клиентами.
+    """
+
+    def __init__(self, clients: Sequence[redis.Redis], names: Optional[Sequence[str]] = None,
+                 virtual_nodes: int = VIRTUAL_NODES):
+        """
+        Строит кольцо.
+
+        :param clients: Redis-клиенты шардов
+        :param names: Устойчивые имена шардов (по умолчанию — порядковые номера)
+        :param virtual_nodes: Число точек каждого шарда на кольце
+        :raises ValueError: если шардов нет или имена не уникальны
+        """
+        if not clients:
+            raise ValueError("At least one Redis shard is required")
+        names = list(names) if names is not None else [str(i) for i in range(len(clients))]
+        if len(names) != len(clients) or len(set(names)) != len(names):
+            raise ValueError("Shard names must be unique and match the shard clients")
+
+        self.clients: List[redis.Redis] = list(clients)
+        self.names = names
+
+        points: List[Tuple[int, int]] = []
+        for index, name in enumerate(names):
+            points.extend((_point(f"{name}#{vnode}"), index) for vnode in range(virtual_nodes))
+        points.sort()
+        self._points = [point for point, _ in points]
+        self._owners = [index for _, index in points]
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def index_for(self, key: str) -> int:
+        """
+        Номер шарда для ключа.
+
+        :param key: Ключ шардирования (UUID задачи)
+        :return: Индекс шарда в clients
+        """
+        if len(self.clients) == 1:
+            return 0
+        position = bisect(self._points, _point(key)) % len(self._points)
+        return self._owners[position]
+
+    def client_for(self, key: str) -> redis.Redis:
+        """
+        Redis-клиент шарда для ключа.
+
+        :param key: Ключ шардирования (UUID задачи)
+        :return: Redis-клиент
+        """
+        return self.clients[self.index_for(key)]
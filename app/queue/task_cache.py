@@ -0,0 +1,204 @@
+"""
+Локальный кэш задач в конечных статусах (done, error) для RedisQueue.get_task.
+
+Запись задачи в конечном статусе больше не меняется, поэтому повторные опросы
+/taskinfo можно обслуживать без HGETALL и декодирования JSON:
+- кэш ограничен числом записей и суммарным размером (вытесняются давно не читанные);
+- запись живёт не дольше, чем ключ задачи в Redis (по PTTL в момент чтения);
+- задачи в промежуточных статусах в кэш не попадают и всегда читаются из Redis.
+
+Опционально (tracking=True) кэш подписывается на инвалидации Redis
+(CLIENT TRACKING ... BCAST PREFIX task:): любое изменение или удаление ключа
+задачи в Redis сразу удаляет её из кэша. Пока подписка не работает,
+кэш не используется.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+import redis
+from loguru import logger
+
+from app.api.models import TaskInfo
+
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+TRACKING_RETRY_INTERVAL = 1.0  # Пауза перед повторным подключением подписки (секунды)
+
+# Запись кэша: задача, размер в байтах, момент истечения (time.monotonic())
+Entry = Tuple[TaskInfo, int, float]
+
+
+class TerminalTaskCache:
+    """
+    Ограниченный LRU-кэш задач в конечных статусах.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 redis_client: Optional[redis.Redis] = None, key_prefix: str = "task:"):
+        """
+        Инициализирует кэш.
+
+        :param max_entries: Максимальное число задач в кэше
+        :param max_bytes: Максимальный суммарный размер записей задач (байты)
+        :param redis_client: Redis-клиент для точной инвалидации (None — только по TTL)
+        :param key_prefix: Префикс ключей задач в Redis
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[str, Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Без подписки на инвалидации кэш доступен сразу, с подпиской — после её установки
+        self._tracking_ready = threading.Event()
+        if redis_client is None:
+            self._tracking_ready.set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def size_bytes(self) -> int:
+        """ Суммарный размер записей в кэше (байты). """
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, task_uuid: str) -> Optional[TaskInfo]:
+        """
+        Возвращает задачу из кэша.
+
+        :param task_uuid: Идентификатор задачи
+        :return: Задача или None, если её нет в кэше или запись истекла
+        """
+        if not self._tracking_ready.is_set():
+            return None
+
+        with self._lock:
+            entry = self._entries.get(task_uuid)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[2] <= time.monotonic():
+                self._remove(task_uuid)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(task_uuid)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, task_uuid: str, task: TaskInfo, size: int, ttl_seconds: float) -> None:
+        """
+        Помещает задачу в конечном статусе в кэш.
+
+        :param task_uuid: Идентификатор задачи
+        :param task: Задача
+        :param size: Размер записи задачи в Redis (байты)
+        :param ttl_seconds: Оставшееся время жизни ключа задачи в Redis (секунды)
+        """
+        if ttl_seconds <= 0 or size > self.max_bytes or not self._tracking_ready.is_set():
+            return
+
+        with self._lock:
+            self._remove(task_uuid)
+            self._entries[task_uuid] = (task, size, time.monotonic() + ttl_seconds)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def invalidate(self, task_uuid: str) -> None:
+        """
+        Удаляет задачу из кэша.
+
+        :param task_uuid: Идентификатор задачи
+        """
+        with self._lock:
+            self._remove(task_uuid)
+
+    def clear(self) -> None:
+        """ Очищает кэш. """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def start(self) -> None:
+        """ Запускает подписку на инвалидации Redis (если задан redis_client). """
+        if self.redis is None or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="task-cache-tracking", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ Останавливает подписку на инвалидации. """
+        self._stop.set()
+        self._thread = None
+
+    def _remove(self, task_uuid: str) -> None:
+        """ Удаляет запись (вызывается под блокировкой). """
+        entry = self._entries.pop(task_uuid, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _on_invalidate(self, keys) -> None:
+        """
+        Обрабатывает сообщение об инвалидации.
+
+        :param keys: Список изменённых ключей или None (FLUSHDB/FLUSHALL)
+        """
+        if keys is None:
+            self.clear()
+            return
+        for key in keys:
+            key = key.decode() if isinstance(key, bytes) else key
+            if key.startswith(self.key_prefix):
+                self.invalidate(key[len(self.key_prefix):])
+
+    def _run(self) -> None:
+        """
+        Цикл подписки на инвалидации с переподключением.
+        На время отсутствия подписки кэш очищается и не используется.
+        """
+        while not self._stop.is_set():
+            listener = tracker = None
+            try:
+                pool = self.redis.connection_pool
+                listener = pool.make_connection()
+                listener.send_command("CLIENT", "ID")
+                listener_id = listener.read_response()
+                listener.send_command("SUBSCRIBE", INVALIDATE_CHANNEL)
+                listener.read_response()
+
+                # Отслеживание ключей задач выполняет отдельное соединение,
+                # уведомления перенаправляются в соединение подписки
+                tracker = pool.make_connection()
+                tracker.send_command("CLIENT", "TRACKING", "ON", "REDIRECT", listener_id,
+                                     "BCAST", "PREFIX", self.key_prefix)
+                tracker.read_response()
+
+                self.clear()
+                self._tracking_ready.set()
+                logger.info("Task cache tracking enabled for prefix '{prefix}'",
+                            prefix=self.key_prefix)
+
+                while not self._stop.is_set():
+                    if not listener.can_read(timeout=TRACKING_RETRY_INTERVAL):
+                        continue
+                    message = listener.read_response()
+                    if message and message[0] in (b"message", "message"):
+                        self._on_invalidate(message[2])
+            except (redis.RedisError, OSError) as e:
+                logger.warning("Task cache tracking lost, cache disabled: {error}", error=str(e))
+            finally:
+                self._tracking_ready.clear()
+                self.clear()
+                for connection in (listener, tracker):
+                    if connection is not None:
+                        connection.disconnect()
+            self._stop.wait(TRACKING_RETRY_INTERVAL)
@@ -0,0 +1,323 @@
+"""
+Хранилище крупных полезных нагрузок задач (upload, result) вне Redis.
+
+Поле задачи, сериализованный размер которого превышает порог, сохраняется
+в хранилище blob-объектов, а в hash задачи остаётся только ссылка:
+
+    {"$blob": "sha256:<hex>", "size": <байты>, "content_type": "application/json"}
+
+Первая реализация — локальная файловая система с адресацией по содержимому:
+объект хранится по пути <root>/<hex[:2]>/<hex[2:4]>/<hex>, одинаковые данные
+хранятся один раз. Объекты старше max_age удаляются фоновой очисткой;
+повторная запись существующего объекта продлевает его срок.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterable, Optional
+from loguru import logger
+
+BLOB_REF_KEY = "$blob"
+DIGEST_ALGORITHM = "sha256"
+CHUNK_SIZE = 64 * 1024  # Размер блока чтения/записи (байты)
+
+
+def make_ref(digest: str, size: int, content_type: str) -> dict:
+    """
+    Формирует ссылку на blob-объект для хранения в задаче.
+
+    :param digest: SHA-256 содержимого в hex
+    :param size: Размер объекта в байтах
+    :param content_type: MIME-тип содержимого
+    :return: Словарь-ссылка
+    """
+    return {BLOB_REF_KEY: f"{DIGEST_ALGORITHM}:{digest}", "size": size,
+            "content_type": content_type}
+
+
+def parse_ref(value) -> Optional[str]:
+    """
+    Извлекает digest из ссылки на blob-объект.
+
+    :param value: Значение поля задачи
+    :return: SHA-256 в hex или None, если значение не является ссылкой
+    """
+    if not isinstance(value, dict) or not isinstance(value.get(BLOB_REF_KEY), str):
+        return None
+    algorithm, _, digest = value[BLOB_REF_KEY].partition(":")
+    if algorithm != DIGEST_ALGORITHM or len(digest) != 64:
+        return None
+    return digest
+
+
+class BlobWriter(ABC):
+    """
+    Запись blob-объекта по частям с вычислением SHA-256 на лету.
+    """
+
+    def __init__(self, content_type: str):
+        self.content_type = content_type
+        self.size = 0
+        self.created = False  # commit() опубликовал новый объект (а не нашёл готовый)
+        self._hasher = hashlib.sha256()
+
+    def write(self, chunk: bytes) -> None:
+        """
+        Дописывает блок содержимого.
+
+        :param chunk: Блок содержимого
+        """
+        self._hasher.update(chunk)
+        self._write(chunk)
+        self.size += len(chunk)
+
+    @abstractmethod
+    def _write(self, chunk: bytes) -> None:
+        """ Записывает блок в хранилище. """
+
+    @abstractmethod
+    def commit(self) -> dict:
+        """
+        Завершает запись и публикует объект под его digest.
+
+        :return: Ссылка на объект (см. make_ref)
+        """
+
+    @abstractmethod
+    def abort(self) -> None:
+        """ Отменяет запись и удаляет частично записанные данные. """
+
+
+class BlobStore(ABC):
+    """
+    Интерфейс хранилища blob-объектов с адресацией по содержимому.
+    """
+
+    def put(self, data: bytes, content_type: str = "application/json") -> dict:
+        """
+        Сохраняет объект.
+
+        :param data: Содержимое
+        :param content_type: MIME-тип содержимого
+        :return: Ссылка на объект (см. make_ref)
+        """
+        return self.put_stream([data], content_type)
+
+    def put_stream(self, chunks: Iterable[bytes], content_type: str = "application/json") -> dict:
+        """
+        Сохраняет объект, читая его блоками (память не зависит от размера объекта).
+
+        :param chunks: Блоки содержимого
+        :param content_type: MIME-тип содержимого
+        :return: Ссылка на объект (см. make_ref)
+        """
+        writer = self.writer(content_type)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    @abstractmethod
+    def writer(self, content_type: str = "application/json") -> "BlobWriter":
+        """
+        Открывает запись нового объекта по частям (например, из потока HTTP-запроса).
+
+        :param content_type: MIME-тип содержимого
+        :return: Объект записи; завершается commit() или abort()
+        """
+
+    @abstractmethod
+    def open(self, digest: str) -> BinaryIO:
+        """
+        Открывает объект на чтение.
+
+        :param digest: SHA-256 содержимого в hex
+        :return: Файловый объект
+        :raises FileNotFoundError: если объекта нет
+        """
+
+    @abstractmethod
+    def size(self, digest: str) -> int:
+        """
+        Возвращает размер объекта.
+
+        :param digest: SHA-256 содержимого в hex
+        :return: Размер в байтах
+        :raises FileNotFoundError: если объекта нет
+        """
+
+    @abstractmethod
+    def delete(self, digest: str) -> None:
+        """
+        Удаляет объект (отсутствующий объект не считается ошибкой).
+
+        :param digest: SHA-256 содержимого в hex
+        """
+
+    def read(self, digest: str) -> bytes:
+        """
+        Читает объект целиком.
+
+        :param digest: SHA-256 содержимого в hex
+        :return: Содержимое
+        """
+        with self.open(digest) as blob:
+            return blob.read()
+
+    def start(self) -> None:
+        """ Запускает фоновое обслуживание хранилища (если оно требуется). """
+
+    def stop(self) -> None:
+        """ Останавливает фоновое обслуживание хранилища. """
+
+
+class FileBlobStore(BlobStore):
+    """
+    Хранилище blob-объектов в локальной файловой системе.
+    """
+
+    def __init__(self, root: str, max_age: Optional[int] = None, cleanup_interval: int = 3600):
+        """
+        Инициализирует хранилище и создаёт корневой каталог.
+
+        :param root: Корневой каталог хранилища
+        :param max_age: Время хранения объекта с последней записи (секунды, None — без очистки)
+        :param cleanup_interval: Период фоновой очистки (секунды)
+        """
+        self.root = root
+        self.max_age = max_age
+        self.cleanup_interval = cleanup_interval
+        os.makedirs(root, exist_ok=True)
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def path(self, digest: str) -> str:
+        """ Путь к файлу объекта. """
+        if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+            raise ValueError(f"Invalid blob digest: {digest}")
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def writer(self, content_type: str = "application/json") -> BlobWriter:
+        return FileBlobWriter(self, content_type)
+
+    def open(self, digest: str) -> BinaryIO:
+        return open(self.path(digest), "rb")  # pylint: disable=consider-using-with
+
+    def size(self, digest: str) -> int:
+        return os.path.getsize(self.path(digest))
+
+    def delete(self, digest: str) -> None:
+        try:
+            os.unlink(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def cleanup(self) -> int:
+        """
+        Удаляет объекты, которые не записывались дольше max_age.
+
+        :return: Число удалённых объектов
+        """
+        if self.max_age is None:
+            return 0
+
+        deadline = time.time() - self.max_age
+        removed = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                file_path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(file_path) < deadline:
+                        os.unlink(file_path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        if removed:
+            logger.info("Blob store cleanup removed {count} objects", count=removed)
+        return removed
+
+    def start(self) -> None:
+        """ Запускает фоновую очистку (если задан max_age). """
+        if self.max_age is None or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="blob-store-cleanup", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ Останавливает фоновую очистку. """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """ Цикл фоновой очистки. """
+        while not self._stop.wait(self.cleanup_interval):
+            try:
+                self.cleanup()
+            except OSError as e:
+                logger.warning("Blob store cleanup failed: {error}", error=str(e))
+
+
+class FileBlobWriter(BlobWriter):
+    """
+    Запись объекта во временный файл в каталоге хранилища.
+    При commit() файл атомарно переименовывается в путь по digest.
+    """
+
+    def __init__(self, store: FileBlobStore, content_type: str):
+        super().__init__(content_type)
+        self.store = store
+        fd, self.tmp_path = tempfile.mkstemp(dir=store.root, prefix=".upload-")
+        self._file = os.fdopen(fd, "wb")
+
+    def _write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+
+    def commit(self) -> dict:
+        self._file.close()
+        digest = self._hasher.hexdigest()
+        try:
+            target = self.store.path(digest)
+            if os.path.exists(target):
+                os.utime(target)  # объект уже есть — продлеваем срок хранения
+                os.unlink(self.tmp_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(self.tmp_path, target)
+                self.created = True
+        except BaseException:
+            self.abort()
+            raise
+
+        logger.debug("Blob {digest} stored ({size} bytes)", digest=digest, size=self.size)
+        return make_ref(digest, self.size, self.content_type)
+
+    def abort(self) -> None:
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.unlink(self.tmp_path)
+
+
+def create_blob_store(config: dict) -> BlobStore:
+    """
+    Создаёт хранилище blob-объектов по секции "blob_store" конфигурации.
+
+    :param config: Секция blob_store
+    :return: Хранилище
+    :raises ValueError: если тип хранилища не поддерживается
+    """
+    store_type = config.get("type", "file")
+    if store_type == "file":
+        return FileBlobStore(root=config["root"], max_age=config.get("max_age"),
+                             cleanup_interval=config.get("cleanup_interval", 3600))
+    raise ValueError(f"Unsupported blob store type '{store_type}'")
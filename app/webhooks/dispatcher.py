@@ -0,0 +1,458 @@
+"""
+Доставка webhook о завершении задач.
+
+Клиент передаёт в /submit callback_url (из разрешённых для его client_id префиксов,
+см. CallbackAllowList). Когда задача переходит в конечный статус (done, error,
+cancelled), RedisQueue в той же транзакции или скрипте добавляет её UUID в sorted set
+webhooks:due шарда задачи — ни update_task, ни запросы API не ждут клиентские сервисы.
+
+WebhookDispatcher в фоновом потоке:
+- забирает наступившие доставки скриптом на шард: UUID получают срок аренды (lease),
+  поэтому доставку, потерянную вместе с процессом, повторит этот или другой диспетчер;
+- отправляет POST с TaskInfo в пуле потоков; соединения с каждым хостом
+  переиспользуются (keep-alive), одновременных запросов к хосту — не больше per_host;
+  доставки к занятому хосту откладываются без учёта попытки;
+- при ошибке сети или ответе 408, 429, 5xx повторяет доставку с экспоненциальной
+  задержкой (счётчик попыток — в hash webhooks:attempts), после max_attempts или
+  при ином ответе 4xx переносит её в список webhooks:dead.
+
+Тело подписывается HMAC-SHA256 ключом клиента — владельца задачи: заголовок
+X-Webhook-Signature — "sha256=" + hex(HMAC(ключ, "{X-Webhook-Timestamp}.{тело}")).
+Ключ клиента выводится из общего секрета: client_secret(secret, client_id); каждому
+клиенту выдаётся только его ключ, поэтому подделать webhook для получателя другого
+клиента нельзя. Получатель проверяет подпись и отклоняет запросы со старой меткой
+времени. Доставка — не менее одного раза: повтор с тем же X-Webhook-Id возможен.
+"""
+
+import hashlib
+import hmac
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.queue.redis_queue import RedisQueue, WEBHOOKS_DUE_KEY
+
+WEBHOOKS_ATTEMPTS_KEY = "webhooks:attempts"  # hash "UUID → число неудачных попыток"
+WEBHOOKS_DEAD_KEY = "webhooks:dead"  # список недоставленных webhook (JSON), новые — в начале
+
+# Ответы, после которых доставка повторяется; остальные 4xx — ошибка клиента, без повтора
+RETRY_STATUSES = frozenset({408, 425, 429})
+
+# Итоги попытки доставки
+DELIVERED = "delivered"  # 2xx или задача уже удалена
+RETRY = "retry"  # ошибка сети, 408, 425, 429, 5xx
+REJECTED = "rejected"  # иной ответ 4xx — повтор бесполезен
+
+# Забор наступивших доставок шарда с арендой.
+# KEYS[1] — WEBHOOKS_DUE_KEY, KEYS[2] — WEBHOOKS_ATTEMPTS_KEY; ARGV[1] — текущее unix-время,
+# ARGV[2] — срок аренды (секунды), ARGV[3] — максимум доставок.
+# Ответ: {UUID, callback_url или nil, число прошлых попыток или nil, client_id или nil}
+# по каждой доставке.
+CLAIM_SCRIPT = """
+local now = tonumber(ARGV[1])
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, tonumber(ARGV[3]))
+local jobs = {}
+for i, task_uuid in ipairs(due) do
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), task_uuid)
+    local task = redis.call('HMGET', 'task:' .. task_uuid, 'callback_url', 'client_id')
+    jobs[i] = {task_uuid, task[1], redis.call('HGET', KEYS[2], task_uuid), task[2]}
+end
+return jobs
+"""
+
+Origin = Tuple[str, str, int]  # схема, хост, порт
+
+
+def client_secret(secret: bytes, client_id: str) -> bytes:
+    """
+    Ключ подписи webhook клиента, выведенный из общего секрета.
+
+    :param secret: Общий секрет (webhooks.secret)
+    :param client_id: Идентификатор клиента — владельца задач
+    :return: Ключ клиента (hex-строка в байтах — в таком виде он выдаётся клиенту)
+    """
+    return hmac.new(secret, b"webhook:" + client_id.encode(), hashlib.sha256).hexdigest().encode()
+
+
+def sign_payload(secret: bytes, timestamp: int, body: bytes) -> str:
+    """
+    Подпись тела webhook.
+
+    :param secret: Ключ клиента (см. client_secret)
+    :param timestamp: Unix-время отправки (заголовок X-Webhook-Timestamp)
+    :param body: Тело запроса
+    :return: Значение заголовка X-Webhook-Signature
+    """
+    digest = hmac.new(secret, str(timestamp).encode() + b"." + body, hashlib.sha256)
+    return f"sha256={digest.hexdigest()}"
+
+
+def origin_of(url: str) -> Origin:
+    """
+    Схема, хост и порт URL — ключ пула соединений.
+
+    :raises ValueError: если URL не http(s) или без хоста
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Callback URL must be an absolute http(s) URL: {url}")
+    default_port = 443 if parts.scheme == "https" else 80
+    return parts.scheme, parts.hostname.lower(), parts.port or default_port
+
+
+class CallbackAllowList:
+    """
+    Разрешённые callback_url по клиентам: client_id → список префиксов URL.
+    """
+
+    def __init__(self, rules: Dict[str, List[str]]):
+        """
+        :param rules: Словарь "client_id → префиксы URL" ("*" вместо client_id — для всех)
+        :raises ValueError: если префикс — не абсолютный http(s) URL
+        """
+        self._rules: Dict[str, List[Tuple[Origin, str]]] = {
+            client_id: [(origin_of(prefix), urlsplit(prefix).path) for prefix in prefixes]
+            for client_id, prefixes in rules.items()}
+
+    def is_allowed(self, client_id: str, url: str) -> bool:
+        """
+        Разрешён ли URL клиенту: совпадают схема, хост и порт, путь начинается с пути префикса.
+
+        :param client_id: Идентификатор клиента
+        :param url: callback_url из задачи
+        :return: True, если URL подходит под один из префиксов клиента
+        """
+        try:
+            origin = origin_of(url)
+        except ValueError:
+            return False
+        parts = urlsplit(url)
+        if parts.username or parts.password:
+            return False
+        path = parts.path or "/"
+        prefixes = self._rules.get(client_id, []) + self._rules.get("*", [])
+        return any(origin == allowed and path.startswith(prefix or "/")
+                   for allowed, prefix in prefixes)
+
+
+class HostConnectionPool:
+    """
+    Keep-alive соединения HTTP(S) по хостам с ограничением одновременных запросов к хосту.
+    """
+
+    def __init__(self, per_host: int = 4, timeout: float = 10.0):
+        """
+        :param per_host: Максимум одновременных запросов (и хранимых соединений) на хост
+        :param timeout: Таймаут подключения и чтения ответа (секунды)
+        """
+        self.per_host = per_host
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._busy: Dict[Origin, int] = {}
+        self._idle: Dict[Origin, List[http.client.HTTPConnection]] = {}
+
+    def try_acquire(self, origin: Origin) -> bool:
+        """ Занимает место для запроса к хосту; False — хост уже занят per_host запросами. """
+        with self._lock:
+            if self._busy.get(origin, 0) >= self.per_host:
+                return False
+            self._busy[origin] = self._busy.get(origin, 0) + 1
+            return True
+
+    def release(self, origin: Origin) -> None:
+        """ Освобождает место запроса к хосту. """
+        with self._lock:
+            self._busy[origin] -= 1
+
+    def post(self, origin: Origin, path: str, body: bytes,
+             headers: Dict[str, str]) -> Tuple[int, bytes]:
+        """
+        POST через свободное соединение с хостом (или новое); соединение возвращается
+        в пул, если сервер его не закрыл. Запрос по соединению из пула, закрытому
+        сервером, повторяется по новому соединению.
+
+        :return: Кортеж (код ответа, тело ответа)
+        :raises OSError, http.client.HTTPException: при ошибке сети или протокола
+        """
+        while True:
+            conn, reused = self._checkout(origin)
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                if reused:
+                    continue
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._checkin(origin, conn)
+            return response.status, data
+
+    def close(self) -> None:
+        """ Закрывает хранимые соединения. """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+    def _checkout(self, origin: Origin) -> Tuple[http.client.HTTPConnection, bool]:
+        """ Соединение с хостом из пула (True) или новое (False). """
+        with self._lock:
+            idle = self._idle.get(origin)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = origin
+        connection_class = http.client.HTTPSConnection if scheme == "https" \
+            else http.client.HTTPConnection
+        return connection_class(host, port, timeout=self.timeout), False
+
+    def _checkin(self, origin: Origin, conn: http.client.HTTPConnection) -> None:
+        """ Возвращает соединение в пул (лишние закрываются). """
+        with self._lock:
+            idle = self._idle.setdefault(origin, [])
+            if len(idle) < self.per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+
+class WebhookDispatcher:
+    """
+    Фоновая доставка webhook о завершении задач с повторами и dead-letter списком.
+    """
+
+    def __init__(self, queue: RedisQueue, secret: bytes, concurrency: int = 16,
+                 per_host: int = 4, timeout: float = 10.0, max_attempts: int = 8,
+                 backoff_base: float = 5.0, backoff_max: float = 3600.0,
+                 poll_interval: float = 1.0, lease: int = 60, dead_letter_max: int = 10000):
+        """
+        :param queue: Очередь задач (шарды Redis и чтение задач)
+        :param secret: Общий секрет, из которого выводятся ключи подписи клиентов
+        :param concurrency: Максимум одновременных доставок
+        :param per_host: Максимум одновременных запросов к одному хосту
+        :param timeout: Таймаут запроса к получателю (секунды)
+        :param max_attempts: Число попыток до переноса в dead-letter список
+        :param backoff_base: Задержка перед второй попыткой (секунды), далее удваивается
+        :param backoff_max: Максимальная задержка между попытками (секунды)
+        :param poll_interval: Период опроса наступивших доставок (секунды)
+        :param lease: Срок аренды забранной доставки (секунды) — больше timeout
+        :param dead_letter_max: Длина dead-letter списка на шард (старые записи удаляются)
+        """
+        self.queue = queue
+        self.secret = secret
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.lease = max(lease, int(timeout) + 1)
+        self.dead_letter_max = dead_letter_max
+        self.pool = HostConnectionPool(per_host=per_host, timeout=timeout)
+        self._scripts = [client.register_script(CLAIM_SCRIPT) for client in queue.shards.clients]
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def backoff(self, attempts: int) -> float:
+        """ Задержка перед следующей попыткой после attempts неудачных (секунды). """
+        return min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+
+    def dispatch_due(self) -> int:
+        """
+        Забирает наступившие доставки со всех шардов (в пределах свободных мест)
+        и передаёт их в пул потоков.
+
+        :return: Число начатых доставок
+        """
+        started = 0
+        for shard, claim in enumerate(self._scripts):
+            with self._in_flight_lock:
+                free = self.concurrency - self._in_flight
+            if free <= 0:
+                break
+            client = self.queue.shards.clients[shard]
+            now = time.time()
+            for raw_uuid, raw_url, raw_attempts, raw_client_id in claim(
+                    keys=[WEBHOOKS_DUE_KEY, WEBHOOKS_ATTEMPTS_KEY], args=[now, self.lease, free]):
+                task_uuid = raw_uuid.decode()
+                attempts = int(raw_attempts or 0)
+                if raw_url is None:
+                    # Задача удалена по TTL, пока ждала доставки
+                    self._finish(client, task_uuid)
+                    continue
+                url = json.loads(raw_url)
+                client_id = json.loads(raw_client_id) if raw_client_id is not None else None
+                if not client_id:
+                    # Без владельца нечем подписать: общий секрет получателям не выдаётся
+                    self._dead_letter(client, task_uuid, url, attempts, "Task has no client_id")
+                    continue
+                try:
+                    origin = origin_of(url)
+                except ValueError as e:
+                    self._dead_letter(client, task_uuid, url, attempts, str(e))
+                    continue
+                if not self.pool.try_acquire(origin):
+                    # Хост занят: доставка откладывается без учёта попытки
+                    client.zadd(WEBHOOKS_DUE_KEY, {task_uuid: now + self.poll_interval})
+                    continue
+                with self._in_flight_lock:
+                    self._in_flight += 1
+                self._executor.submit(self._deliver, shard, task_uuid, url, origin, attempts,
+                                      client_id)
+                started += 1
+        return started
+
+    def deliver(self, task_uuid: str, url: str, origin: Origin, client_id: str,
+                attempts: int = 0) -> Tuple[str, str]:
+        """
+        Одна попытка доставки: POST TaskInfo задачи на url с подписью ключом клиента.
+
+        :param task_uuid: UUID задачи
+        :param url: callback_url задачи
+        :param origin: Хост url (см. origin_of)
+        :param client_id: Клиент — владелец задачи (его ключом подписывается тело)
+        :param attempts: Число прошлых неудачных попыток
+        :return: Кортеж (DELIVERED, RETRY или REJECTED; описание ошибки или "")
+        """
+        info = self.queue.get_task(task_uuid)
+        if info is None:
+            return DELIVERED, ""
+        body = info.model_dump_json().encode()
+        timestamp = int(time.time())
+        parts = urlsplit(url)
+        headers = {
+            "Content-Type": "application/json",
+            "User-Agent": "ct-task-router-webhooks",
+            "X-Webhook-Id": task_uuid,
+            "X-Webhook-Attempt": str(attempts + 1),
+            "X-Webhook-Timestamp": str(timestamp),
+            "X-Webhook-Signature": sign_payload(client_secret(self.secret, client_id),
+                                                timestamp, body),
+        }
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        try:
+            status, _ = self.pool.post(origin, path, body, headers)
+        except (OSError, http.client.HTTPException) as e:
+            return RETRY, f"{type(e).__name__}: {e}"
+        if 200 <= status < 300:
+            return DELIVERED, ""
+        if status in RETRY_STATUSES or status >= 500:
+            return RETRY, f"HTTP {status}"
+        return REJECTED, f"HTTP {status}"
+
+    def start(self) -> None:
+        """ Запускает доставку в фоновом потоке. """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                            thread_name_prefix="webhook")
+        self._thread = threading.Thread(target=self._run, name="webhook-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ Останавливает доставку, дожидаясь начатых запросов. """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.pool.close()
+
+    def dead_letters(self, limit: int = 100) -> List[dict]:
+        """
+        Последние недоставленные webhook со всех шардов.
+
+        :param limit: Максимум записей с каждого шарда
+        :return: Записи dead-letter списка (новые — первыми в пределах шарда)
+        """
+        return [json.loads(raw) for client in self.queue.shards.clients
+                for raw in client.lrange(WEBHOOKS_DEAD_KEY, 0, limit - 1)]
+
+    def _run(self) -> None:
+        """ Цикл опроса наступивших доставок; ошибки Redis не останавливают диспетчер. """
+        while True:
+            try:
+                self.dispatch_due()
+            except RedisError as e:
+                logger.warning("Webhook dispatch failed: {error}", error=str(e))
+            if self._stop.wait(self.poll_interval):
+                return
+
+    def _deliver(self, shard: int, task_uuid: str, url: str, origin: Origin,
+                 attempts: int, client_id: str) -> None:
+        """ Попытка доставки и запись её итога в Redis. """
+        client = self.queue.shards.clients[shard]
+        started = time.perf_counter()
+        try:
+            try:
+                outcome, error = self.deliver(task_uuid, url, origin, client_id, attempts)
+            finally:
+                self.pool.release(origin)
+            latency_ms = round((time.perf_counter() - started) * 1000, 3)
+            if outcome == DELIVERED:
+                self._finish(client, task_uuid)
+                logger.info("Webhook for task {task_uuid} delivered to {host}",
+                            task_uuid=task_uuid, host=origin[1], attempt=attempts + 1,
+                            latency_ms=latency_ms, sampled=True)
+            elif outcome == REJECTED or attempts + 1 >= self.max_attempts:
+                self._dead_letter(client, task_uuid, url, attempts + 1, error)
+            else:
+                self._retry(client, task_uuid, attempts + 1)
+                logger.warning("Webhook for task {task_uuid} to {host} failed: {error}, "
+                               "attempt {attempt} of {max_attempts}", task_uuid=task_uuid,
+                               host=origin[1], error=error, attempt=attempts + 1,
+                               max_attempts=self.max_attempts, latency_ms=latency_ms)
+        except RedisError as e:
+            # Итог не записан: доставка повторится по истечении аренды
+            logger.error("Webhook state for task {task_uuid} was not saved: {error}",
+                         task_uuid=task_uuid, error=str(e))
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Webhook delivery for task {task_uuid} crashed", task_uuid=task_uuid)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight -= 1
+
+    def _retry(self, client, task_uuid: str, attempts: int) -> None:
+        """ Сохраняет число попыток и откладывает доставку на backoff(attempts). """
+        pipe = client.pipeline(transaction=True)
+        pipe.hset(WEBHOOKS_ATTEMPTS_KEY, task_uuid, attempts)
+        pipe.zadd(WEBHOOKS_DUE_KEY, {task_uuid: time.time() + self.backoff(attempts)})
+        pipe.execute()
+
+    @staticmethod
+    def _finish(client, task_uuid: str) -> None:
+        """ Удаляет доставку и её счётчик попыток. """
+        pipe = client.pipeline(transaction=True)
+        pipe.zrem(WEBHOOKS_DUE_KEY, task_uuid)
+        pipe.hdel(WEBHOOKS_ATTEMPTS_KEY, task_uuid)
+        pipe.execute()
+
+    def _dead_letter(self, client, task_uuid: str, url: str, attempts: int, error: str) -> None:
+        """ Переносит доставку в dead-letter список. """
+        entry = {"uuid": task_uuid, "url": url, "attempts": attempts, "error": error,
+                 "failed_at": datetime.now(timezone.utc).isoformat()}
+        pipe = client.pipeline(transaction=True)
+        pipe.zrem(WEBHOOKS_DUE_KEY, task_uuid)
+        pipe.hdel(WEBHOOKS_ATTEMPTS_KEY, task_uuid)
+        pipe.lpush(WEBHOOKS_DEAD_KEY, json.dumps(entry))
+        pipe.ltrim(WEBHOOKS_DEAD_KEY, 0, self.dead_letter_max - 1)
+        pipe.execute()
+        logger.error("Webhook for task {task_uuid} moved to dead letters after {attempts} "
+                     "attempt(s): {error}", task_uuid=task_uuid, attempts=attempts, error=error,
+                     url=url)
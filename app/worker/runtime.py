@@ -0,0 +1,410 @@
+"""
+Среда выполнения воркеров: обработчики по типам задач поверх RedisQueue.
+
+    queue = create_redis_queue(get_config(), get_secrets())  # app/queue/factory.py
+    runtime = WorkerRuntime(queue)
+
+    @runtime.handler("resize_image", pool="thread", concurrency=16)
+    def resize(upload: dict) -> dict:
+        ...
+        return {"width": 640}
+
+    runtime.register("calc_hash", calc_hash, pool="process", concurrency=4)
+    runtime.run()  # до SIGTERM/SIGINT
+
+Для каждого типа задач:
+- поток выборки забирает UUID пачками (RedisQueue.dequeue_batch) под идентификатором
+  воркера (аренда), читает задачи одним конвейером на шард (load_tasks) и одним
+  скриптом на шард ставит им статус pending (complete_tasks) — выполняются только
+  задачи, для которых переход принят;
+- задачи выполняются в пуле потоков (pool="thread", I/O) или процессов
+  (pool="process", CPU; обработчик должен быть функцией уровня модуля);
+- в работе и в очереди пула не больше concurrency + prefetch задач — остальные
+  ждут в Redis, где их могут забрать другие воркеры.
+
+Обработчик получает upload и возвращает result (dict или None, сериализуемый в JSON —
+иначе задача завершается ошибкой). Исключение TaskError задаёт code и message ответа,
+любое другое исключение — code 1 и текст ошибки.
+Итоговые статусы done/error с code, message, result и processed пишутся общим
+потоком записи пачками (complete_tasks): статус не меняется, если аренду задачи
+перехватил другой воркер или задача уже в конечном статусе.
+
+Отмена: поток опроса раз в cancel_poll_interval секунд одной командой на шард
+проверяет, не отменены ли задачи в работе (RedisQueue.cancelled). Задача, ещё
+ждущая в очереди пула, снимается с выполнения; у выполняющейся отбрасывается итог
+(прервать выполняющийся обработчик нельзя).
+
+Остановка (stop, SIGTERM, SIGINT): выборка прекращается, уже извлечённые задачи
+дорабатываются, их статусы записываются, затем пулы закрываются.
+"""
+
+import json
+import os
+import queue as queue_module
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.api.models import TaskStatus
+from app.queue.redis_queue import ACCEPTED, RedisQueue
+
+POOLS = ("thread", "process")
+
+# Код ошибки задачи, если обработчик завершился исключением, отличным от TaskError
+DEFAULT_ERROR_CODE = 1
+
+Handler = Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+class TaskError(Exception):
+    """
+    Ошибка обработки задачи с кодом и сообщением для клиента.
+    """
+
+    def __init__(self, message: str, code: int = DEFAULT_ERROR_CODE):
+        super().__init__(message, code)  # args передаются при возврате из пула процессов
+        self.message = message
+        self.code = code
+
+    def __str__(self) -> str:
+        return self.message
+
+
+class HandlerSpec:
+    """
+    Обработчик типа задачи и параметры его пула.
+    """
+
+    def __init__(self, task_type: str, queue_name: str, handler: Handler, pool: str,
+                 concurrency: int, prefetch: int):
+        """
+        :param task_type: Тип задачи
+        :param queue_name: Очередь типа задачи
+        :param handler: Функция upload → result
+        :param pool: thread или process
+        :param concurrency: Число потоков или процессов
+        :param prefetch: Сколько задач сверх concurrency может ждать в очереди пула
+        """
+        self.task_type = task_type
+        self.queue_name = queue_name
+        self.handler = handler
+        self.pool = pool
+        self.concurrency = concurrency
+        self.prefetch = prefetch
+        self.slots = threading.BoundedSemaphore(concurrency + prefetch)
+        self.executor: Optional[Executor] = None
+        self.thread: Optional[threading.Thread] = None
+
+
+class WorkerRuntime:
+    """
+    Выборка задач, выполнение в пулах и пакетная запись статусов.
+    """
+
+    def __init__(self, queue: RedisQueue, queues: Optional[Dict[str, str]] = None,
+                 batch_size: int = 16, poll_timeout: float = 1.0,
+                 flush_interval: float = 0.05, retry_interval: float = 1.0,
+                 worker_id: Optional[str] = None,
+                 cancel_poll_interval: Optional[float] = 1.0):
+        """
+        :param queue: Очередь задач
+        :param queues: Тип задачи → имя очереди (по умолчанию {type}_INPUT)
+        :param batch_size: Максимум задач в одной выборке и в одной записи статусов
+        :param poll_timeout: Ожидание задач в пустой очереди (секунды) — также задержка
+                             реакции выборки на остановку
+        :param flush_interval: Сколько ждать пополнения пачки статусов перед записью (секунды)
+        :param retry_interval: Пауза после ошибки Redis (секунды)
+        :param worker_id: Идентификатор воркера для аренды задач
+                          (по умолчанию хост:pid:случайный суффикс)
+        :param cancel_poll_interval: Период опроса отмены задач в работе
+                                     (секунды; None — не опрашивать)
+        """
+        self.queue = queue
+        self.queues = queues or {}
+        self.batch_size = batch_size
+        self.poll_timeout = poll_timeout
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{os.urandom(4).hex()}"
+        self.handlers: Dict[str, HandlerSpec] = {}
+        self._stopping = threading.Event()
+        # Итоговые статусы (UUID, поля, тип) для потока записи; None — маркер остановки
+        self._completed: "queue_module.Queue[Optional[Tuple[str, dict, str]]]" = \
+            queue_module.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self.cancel_poll_interval = cancel_poll_interval
+        # Задачи в работе и в очереди пулов; отменённые клиентом — их итог не записывается
+        self._in_flight: Dict[str, Future] = {}
+        self._cancelled: Set[str] = set()
+        self._in_flight_lock = threading.Lock()
+        self._canceller: Optional[threading.Thread] = None
+        self._drained = threading.Event()  # пулы остановлены — опрос отмены не нужен
+
+    def register(self, task_type: str, handler: Handler, pool: str = "thread",
+                 concurrency: int = 4, prefetch: Optional[int] = None) -> None:
+        """
+        Регистрирует обработчик типа задачи.
+
+        :param task_type: Тип задачи
+        :param handler: Функция upload → result
+        :param pool: thread (I/O) или process (CPU)
+        :param concurrency: Число потоков или процессов
+        :param prefetch: Задач сверх concurrency в очереди пула (по умолчанию concurrency)
+        :raises ValueError: если тип уже зарегистрирован или параметры пула неверны
+        """
+        if task_type in self.handlers:
+            raise ValueError(f"Handler for task type '{task_type}' is already registered")
+        if pool not in POOLS:
+            raise ValueError(f"Unknown pool '{pool}', expected one of {POOLS}")
+        if concurrency < 1:
+            raise ValueError("concurrency must be positive")
+        self.handlers[task_type] = HandlerSpec(
+            task_type, self.queues.get(task_type, f"{task_type}_INPUT"), handler, pool,
+            concurrency, concurrency if prefetch is None else prefetch)
+
+    def handler(self, task_type: str, **options: Any) -> Callable[[Handler], Handler]:
+        """ Декоратор: регистрирует функцию обработчиком типа задачи (см. register). """
+        def decorator(func: Handler) -> Handler:
+            self.register(task_type, func, **options)
+            return func
+        return decorator
+
+    def start(self) -> None:
+        """ Запускает пулы, потоки выборки и поток записи статусов. """
+        if not self.handlers:
+            raise RuntimeError("No task handlers registered")
+        if getattr(self.queue, "latency_stats", None) is None \
+                or getattr(self.queue, "ttl_policy", None) is None:
+            logger.warning("Worker queue has no latency_stats or ttl_policy: queue wait and "
+                           "processing time are not recorded and status TTLs are not applied "
+                           "(build the queue with create_redis_queue)")
+        self._stopping.clear()
+        self._drained.clear()
+        self._writer = threading.Thread(target=self._write_loop, name="worker-writer", daemon=True)
+        self._writer.start()
+        if self.cancel_poll_interval:
+            self._canceller = threading.Thread(target=self._cancel_loop, name="worker-cancel",
+                                               daemon=True)
+            self._canceller.start()
+        for spec in self.handlers.values():
+            executor_class = ThreadPoolExecutor if spec.pool == "thread" else ProcessPoolExecutor
+            spec.executor = executor_class(max_workers=spec.concurrency)
+            spec.thread = threading.Thread(target=self._fetch_loop, args=(spec,),
+                                           name=f"worker-fetch-{spec.task_type}", daemon=True)
+            spec.thread.start()
+            logger.info("Worker for '{type}' started: {pool} pool of {concurrency}, "
+                        "prefetch {prefetch}", type=spec.task_type, pool=spec.pool,
+                        concurrency=spec.concurrency, prefetch=spec.prefetch)
+
+    def stop(self) -> None:
+        """
+        Останавливает воркер без потери извлечённых задач: прекращает выборку,
+        дожидается выполнения задач в пулах и записи их статусов.
+        """
+        self._stopping.set()
+        for spec in self.handlers.values():
+            if spec.thread is not None:
+                spec.thread.join()
+                spec.thread = None
+        for spec in self.handlers.values():
+            if spec.executor is not None:
+                spec.executor.shutdown(wait=True)
+                spec.executor = None
+        self._drained.set()
+        if self._canceller is not None:
+            self._canceller.join()
+            self._canceller = None
+        if self._writer is not None:
+            self._completed.put(None)
+            self._writer.join()
+            self._writer = None
+        logger.info("Worker stopped")
+
+    def run(self) -> None:
+        """ Запускает воркер и блокирует поток до SIGTERM/SIGINT, затем останавливает его. """
+        stop_requested = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop_requested.set())
+        self.start()
+        stop_requested.wait()
+        logger.info("Worker shutdown requested, finishing in-flight tasks")
+        self.stop()
+
+    def _fetch_loop(self, spec: HandlerSpec) -> None:
+        """ Выборка задач типа пачками в пределах свободных мест пула. """
+        while not self._stopping.is_set():
+            # Ждём хотя бы одно свободное место, затем забираем все свободные (до batch_size)
+            if not spec.slots.acquire(timeout=self.poll_timeout):
+                continue
+            free = 1
+            while free < self.batch_size and spec.slots.acquire(blocking=False):
+                free += 1
+
+            task_uuids: List[str] = []
+            try:
+                task_uuids = self.queue.dequeue_batch(spec.queue_name, free,
+                                                      timeout=self.poll_timeout,
+                                                      worker_id=self.worker_id)
+                tasks = self.queue.load_tasks(task_uuids) if task_uuids else {}
+                if tasks:
+                    outcomes = self.queue.complete_tasks([
+                        (task_uuid, {"status": TaskStatus.PENDING.value, "message": "Processing"},
+                         spec.task_type) for task_uuid in tasks], worker_id=self.worker_id)
+                    tasks = {task_uuid: task for task_uuid, task in tasks.items()
+                             if outcomes.get(task_uuid) == ACCEPTED}
+            except Exception as e:  # pylint: disable=broad-except
+                # Ошибка Redis или чтения blob_store — поток выборки продолжает работу
+                logger.error("Worker for '{type}' failed to fetch tasks: {error}",
+                             type=spec.task_type, error=f"{type(e).__name__}: {e}")
+                self._requeue(spec, task_uuids)
+                self._release(spec, free)
+                self._stopping.wait(self.retry_interval)
+                continue
+
+            self._release(spec, free - len(tasks))
+            for task_uuid, task in tasks.items():
+                future = spec.executor.submit(spec.handler, task.get("upload") or {})
+                with self._in_flight_lock:
+                    self._in_flight[task_uuid] = future
+                future.add_done_callback(self._on_done(spec, task_uuid, time.perf_counter()))
+
+    def _cancel_loop(self) -> None:
+        """ Опрос отмены задач в работе до остановки пулов. """
+        while not self._drained.wait(self.cancel_poll_interval):
+            with self._in_flight_lock:
+                task_uuids = list(self._in_flight)
+            if not task_uuids:
+                continue
+            try:
+                cancelled = self.queue.cancelled(task_uuids)
+            except RedisError as e:
+                logger.warning("Worker failed to check task cancellation: {error}", error=str(e))
+                continue
+            with self._in_flight_lock:
+                futures = [self._in_flight[task_uuid] for task_uuid in cancelled
+                           if task_uuid in self._in_flight]
+                self._cancelled.update(cancelled & self._in_flight.keys())
+            # Вне блокировки: отмена ожидающей задачи сразу вызывает её callback
+            for future in futures:
+                future.cancel()  # сработает, если задача ещё не начала выполняться
+
+    def _requeue(self, spec: HandlerSpec, task_uuids: List[str]) -> None:
+        """ Возвращает в очередь задачи, извлечённые до ошибки выборки (по возможности). """
+        for task_uuid in task_uuids:
+            try:
+                self.queue.enqueue(spec.queue_name, task_uuid)
+            except RedisError as e:
+                logger.error("Task {task_uuid} could not be returned to {queue}: {error}",
+                             task_uuid=task_uuid, queue=spec.queue_name, error=str(e))
+
+    @staticmethod
+    def _release(spec: HandlerSpec, count: int) -> None:
+        """ Возвращает count мест пула. """
+        for _ in range(count):
+            spec.slots.release()
+
+    def _on_done(self, spec: HandlerSpec, task_uuid: str,
+                 started: float) -> Callable[[Future], None]:
+        """ Обработчик завершения задачи: итоговый статус передаётся потоку записи. """
+        def callback(future: Future) -> None:
+            with self._in_flight_lock:
+                self._in_flight.pop(task_uuid, None)
+                cancelled = task_uuid in self._cancelled
+                self._cancelled.discard(task_uuid)
+            if cancelled:
+                spec.slots.release()
+                logger.info("Task {task_uuid} of type '{type}' was cancelled, result dropped",
+                            task_uuid=task_uuid, type=spec.task_type,
+                            started=not future.cancelled())
+                return
+
+            processed = datetime.now(timezone.utc).isoformat()
+            try:
+                result = future.result()
+                json.dumps(result)  # итог записывается в Redis как JSON — проверяем заранее
+                updates = {"status": TaskStatus.DONE.value, "code": 0, "message": "OK",
+                           "result": result, "processed": processed}
+            except TaskError as e:
+                updates = {"status": TaskStatus.ERROR.value, "code": e.code,
+                           "message": e.message, "processed": processed}
+            except Exception as e:  # pylint: disable=broad-except
+                updates = {"status": TaskStatus.ERROR.value, "code": DEFAULT_ERROR_CODE,
+                           "message": f"{type(e).__name__}: {e}", "processed": processed}
+            finally:
+                spec.slots.release()
+
+            logger.info("Task {task_uuid} of type '{type}' finished with status '{status}'",
+                        task_uuid=task_uuid, type=spec.task_type, status=updates["status"],
+                        code=updates["code"],
+                        latency_ms=round((time.perf_counter() - started) * 1000, 3),
+                        sampled=True)
+            self._completed.put((task_uuid, updates, spec.task_type))
+        return callback
+
+    def _write_loop(self) -> None:
+        """ Запись итоговых статусов пачками до получения маркера остановки. """
+        batch: List[Tuple[str, dict, str]] = []
+        finished = False
+        while not finished or batch:
+            if not finished:
+                # Первая запись ждётся без ограничения, остальные — не дольше flush_interval
+                try:
+                    item = self._completed.get(timeout=self.flush_interval if batch else None)
+                    if item is None:
+                        finished = True
+                    else:
+                        batch.append(item)
+                        if len(batch) < self.batch_size:
+                            continue
+                except queue_module.Empty:
+                    pass
+            if not batch:
+                continue
+            try:
+                self.queue.complete_tasks(batch, worker_id=self.worker_id)
+                batch = []
+            except RedisError as e:
+                logger.error("Failed to write {count} task status(es): {error}",
+                             count=len(batch), error=str(e))
+                if finished:
+                    logger.error("Task statuses lost on shutdown: {tasks}",
+                                 tasks=[task_uuid for task_uuid, _, _ in batch])
+                    return
+                time.sleep(self.retry_interval)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("Failed to write {count} task status(es), writing one by one: "
+                             "{error}", count=len(batch), error=f"{type(e).__name__}: {e}")
+                batch = self._write_each(batch)
+
+    def _write_each(self, batch: List[Tuple[str, dict, str]]) -> List[Tuple[str, dict, str]]:
+        """
+        Записывает статусы по одному, чтобы ошибка одной задачи не задерживала остальные.
+        Итог, который не удалось записать не из-за Redis, заменяется статусом error
+        без result; если не записывается и он — статус теряется (пишется в лог).
+
+        :param batch: Итоговые статусы (UUID, поля, тип)
+        :return: Статусы для повторной записи
+        """
+        remaining = []
+        for task_uuid, updates, task_type in batch:
+            try:
+                self.queue.complete_tasks([(task_uuid, updates, task_type)],
+                                          worker_id=self.worker_id)
+            except RedisError:
+                remaining.append((task_uuid, updates, task_type))
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("Task {task_uuid} status could not be written: {error}",
+                             task_uuid=task_uuid, error=f"{type(e).__name__}: {e}")
+                if "result" not in updates:
+                    continue
+                remaining.append((task_uuid, {
+                    "status": TaskStatus.ERROR.value, "code": DEFAULT_ERROR_CODE,
+                    "message": f"Result could not be saved: {type(e).__name__}: {e}",
+                    "processed": updates.get("processed")}, task_type))
+        return remaining
@@ -0,0 +1,80 @@
+"""
+Бенчмарк сериализации и сжатия ответов /taskinfo.
+
+Сравниваются:
+- fastapi: путь FastAPI по умолчанию — повторная валидация модели по response_model,
+  преобразование в словарь (mode="json") и json.dumps в JSONResponse;
+- direct: сериализация модели сразу в байты (app.api.fast_json.dumps);
+- gzip: сжатие готового ответа (уровень --gzip-level), как в CompressionMiddleware.
+
+Полезные нагрузки: typical — TaskInfo с небольшим result, large — result ~1 МиБ.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_json [--iterations 2000] [--gzip-level 6]
+"""
+
+import argparse
+import json
+import time
+import zlib
+from uuid import uuid4
+from pydantic import TypeAdapter
+
+from app.api.fast_json import dumps
+from app.api.models import TaskInfo
+
+
+def make_task(result_items: int) -> TaskInfo:
+    """ Задача в статусе done с result из result_items записей. """
+    result = {"hash": "e3b0c44298fc1c149afbf4c8996fb924",
+              "items": [{"index": i, "name": f"file-{i}.png", "width": 1024, "height": 768,
+                         "checksum": "0123456789abcdef" * 2} for i in range(result_items)]}
+    return TaskInfo(uuid=uuid4(), type="resize_image", status="done",
+                    created="2024-01-01T00:00:00+00:00", code=0, message="OK", result=result)
+
+
+def run(func, iterations: int) -> float:
+    """ Среднее время одного вызова (мкс). """
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main() -> None:
+    """ Точка входа бенчмарка. """
+    parser = argparse.ArgumentParser(description="Response serialization and compression benchmark")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--gzip-level", type=int, default=6)
+    args = parser.parse_args()
+
+    adapter = TypeAdapter(TaskInfo)
+
+    def fastapi_path(task: TaskInfo) -> bytes:
+        value = adapter.validate_python(task)
+        content = adapter.dump_python(value, mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False,
+                          indent=None, separators=(",", ":")).encode("utf-8")
+
+    print(f"iterations={args.iterations} gzip_level={args.gzip_level}")
+    for name, items in (("typical", 3), ("large", 7000)):
+        task = make_task(items)
+        body = dumps(task)
+        iterations = args.iterations if items < 100 else max(args.iterations // 50, 20)
+
+        fastapi_us = run(lambda: fastapi_path(task), iterations)
+        direct_us = run(lambda: dumps(task), iterations)
+        gzip_us = run(lambda: zlib.compress(body, args.gzip_level), iterations)
+        compressed = len(zlib.compress(body, args.gzip_level))
+        mib = len(body) / (1024 * 1024)
+
+        print(f"{name}: {len(body)} bytes, gzip {compressed} bytes "
+              f"({compressed / len(body):.1%})")
+        print(f"  fastapi  {fastapi_us:10.1f} us  {mib / fastapi_us * 1e6:8.1f} MiB/s")
+        print(f"  direct   {direct_us:10.1f} us  {mib / direct_us * 1e6:8.1f} MiB/s  "
+              f"(x{fastapi_us / direct_us:.1f})")
+        print(f"  gzip     {gzip_us:10.1f} us  {mib / gzip_us * 1e6:8.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Бенчмарк накладных расходов логирования на один запрос /submit.
+
+Сравниваются:
+- before: f-строки, как было в TaskRouter/RedisQueue/VaultClient до перехода
+  на отложенное форматирование (сообщения строятся даже ниже порога уровня);
+- after: шаблоны с именованными аргументами (форматирование только для
+  выводимых записей) и выборка массовых событий (sampled=True).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_logging [--requests 20000] [--level INFO] [--format json]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from uuid import uuid4
+from loguru import logger
+
+from app.logging.setup import setup_logging
+
+
+def request_before(task_uuid: str, client_id: str, role: str, queue: str, started: float) -> None:
+    """ Логирование одного запроса /submit в прежнем стиле (f-строки). """
+    logger.debug("submit_task is being called")
+    logger.debug(f"JWT authentication succeeded for client_id {client_id} with role {role}")
+    logger.info(f"Received task of type 'calc_hash' from user '{client_id}' with role '{role}'")
+    logger.debug(f"Task {task_uuid} saved with TTL {3600} seconds")
+    logger.debug(f"Task {task_uuid} enqueued to {queue}")
+    logger.debug(f"Task {task_uuid}/{None} enqueued to {queue} "
+                 f"in {(time.perf_counter() - started) * 1000:.3f} ms")
+
+
+def request_after(task_uuid: str, client_id: str, role: str, queue: str, started: float) -> None:
+    """ Логирование одного запроса /submit в новом стиле (шаблоны, выборка). """
+    logger.debug("submit_task is being called")
+    logger.debug("JWT authentication succeeded for client_id {client_id} with role {role}",
+                 client_id=client_id, role=role)
+    logger.debug("Received task of type '{type}' from user '{client_id}' with role '{role}'",
+                 type="calc_hash", client_id=client_id, role=role)
+    logger.debug("Task {task_uuid} saved with TTL {ttl} seconds", task_uuid=task_uuid, ttl=3600)
+    logger.debug("Task {task_uuid} enqueued to {queue}", task_uuid=task_uuid, queue=queue)
+    logger.info("Task {task_uuid} of type '{type}' from '{client_id}' enqueued to {queue}",
+                task_uuid=task_uuid, external_id=None, type="calc_hash", client_id=client_id,
+                queue=queue, latency_ms=round((time.perf_counter() - started) * 1000, 3),
+                sampled=True)
+
+
+def run(scenario, requests: int) -> float:
+    """
+    Выполняет сценарий логирования и возвращает среднее время на запрос (нс).
+    """
+    task_uuids = [str(uuid4()) for _ in range(requests)]
+    started = time.perf_counter()
+    for task_uuid in task_uuids:
+        scenario(task_uuid, "client1", "service", "calc_hash_INPUT", time.perf_counter())
+    logger.complete()
+    return (time.perf_counter() - started) / requests * 1e9
+
+
+def main() -> None:
+    """ Точка входа бенчмарка. """
+    parser = argparse.ArgumentParser(description="Per-request logging overhead benchmark")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--level", default="INFO")
+    parser.add_argument("--format", default="text", choices=["text", "json"])
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def configure(**options) -> None:
+            config = {"level": args.level, "log_file": os.path.join(tmp, "bench.log"),
+                      "rotation": {"when": "1 day", "backupCount": 1}, "format": args.format}
+            config.update(options)
+            setup_logging({"logging": config})
+
+        results = {}
+        configure()
+        results["before"] = run(request_before, args.requests)
+        configure()
+        results["after"] = run(request_after, args.requests)
+        configure(sample_rate=args.sample_rate)
+        results[f"after, sample_rate={args.sample_rate}"] = run(request_after, args.requests)
+        logger.remove()
+
+    print(f"level={args.level} format={args.format} requests={args.requests}")
+    for name, ns in results.items():
+        print(f"{name:<32} {ns / 1000:10.2f} us/request")
+
+
+if __name__ == "__main__":
+    main()
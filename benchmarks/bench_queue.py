@@ -0,0 +1,160 @@
+"""
+Микробенчмарки CPU-части горячего пути: сериализация задач RedisQueue и построение моделей.
+
+Операции:
+- encode: RedisQueue._encode — json.dumps каждого поля задачи (save_task/submit_task);
+- save_task: encode + вызовы Redis-клиента (клиент — заглушка без сети);
+- get_task: HGETALL (заглушка) → json.loads каждого поля → TaskInfo.model_validate;
+- task_input: разбор тела /submit — json.loads + TaskInput.model_validate, как в FastAPI;
+- task_input_json: TaskInput.model_validate_json — разбор сразу из байтов;
+- create_task: TaskRouter._create_task — проверка upload по схеме, model_dump,
+  запись (заглушка) и построение TaskResponse;
+- task_response: построение TaskResponse.
+
+Полезные нагрузки upload/result: small (~100 Б), medium (~10 КиБ), large (~1 МиБ).
+Redis заменён заглушкой, логирование отключено — измеряется только собственный CPU.
+
+Для каждой операции выводится ns/op и память на операцию: пиковый объём, выделенный
+за одну операцию (tracemalloc), и число блоков, удерживаемых её результатом (прирост
+sys.getallocatedblocks). Счётчика всех выделений в CPython нет, поэтому временные
+объекты видны только через пиковый объём.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_queue [--iterations 2000] [--payloads small medium large]
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Tuple
+from uuid import uuid4
+from loguru import logger
+
+from app.api.models import TaskInput, TaskResponse
+from app.api.task_router import TaskRouter
+from app.queue.redis_queue import RedisQueue
+
+PAYLOAD_ITEMS = {"small": 1, "medium": 60, "large": 6500}  # ~100 Б, ~10 КиБ, ~1 МиБ
+
+
+class StubPipeline:
+    """ Конвейер Redis без сети: команды принимаются и ничего не делают. """
+
+    def __getattr__(self, name: str) -> Callable:
+        return lambda *args, **kwargs: self
+
+    def execute(self) -> list:
+        return []
+
+
+class StubRedis:
+    """ Redis-клиент без сети: HGETALL возвращает заранее подготовленный hash. """
+
+    def __init__(self, stored: Dict[bytes, bytes]):
+        self.stored = stored
+
+    def hset(self, *args, **kwargs) -> int:
+        return 1
+
+    def expire(self, *args, **kwargs) -> bool:
+        return True
+
+    def hgetall(self, key: str) -> Dict[bytes, bytes]:
+        return self.stored
+
+    def pipeline(self, transaction: bool = True) -> StubPipeline:
+        return StubPipeline()
+
+
+def make_payload(items: int) -> dict:
+    """ upload/result из items записей (~150 байт каждая). """
+    return {"files": [{"name": f"dir/file-{i}.png", "size": 1024 * i, "width": 1024,
+                       "height": 768, "checksum": "0123456789abcdef" * 4} for i in range(items)]}
+
+
+def make_task(payload: dict) -> dict:
+    """ Поля задачи в статусе done в том виде, в котором они пишутся в Redis. """
+    return {"ExternalId": "ext-1", "type": "calc_hash", "upload": payload, "uuid": str(uuid4()),
+            "status": "done", "created": "2024-01-01T00:00:00+00:00", "code": 0,
+            "message": "OK", "client_id": "client1", "result": payload}
+
+
+def measure(func: Callable[[], object], iterations: int) -> Tuple[float, float, float]:
+    """
+    Замер одной операции.
+
+    :return: (нс на операцию, пик байт на операцию, блоков на операцию)
+    """
+    for _ in range(min(iterations, 50)):
+        func()  # прогрев
+
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        func()
+    ns_per_op = (time.perf_counter_ns() - started) / iterations
+
+    samples = min(iterations, 20)
+    tracemalloc.start()
+    peak_total = 0
+    for _ in range(samples):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        func()
+        peak_total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    blocks_total = 0
+    for _ in range(samples):
+        result = None
+        before = sys.getallocatedblocks()
+        result = func()  # результат удерживается, чтобы учесть его блоки
+        blocks_total += sys.getallocatedblocks() - before
+        del result
+    return ns_per_op, peak_total / samples, blocks_total / samples
+
+
+def operations(size: str) -> Dict[str, Callable[[], object]]:
+    """ Набор операций для нагрузки указанного размера. """
+    payload = make_payload(PAYLOAD_ITEMS[size])
+    task = make_task(payload)
+    stored = {k.encode(): v.encode() for k, v in RedisQueue(StubRedis({}))._encode(task).items()}
+    queue = RedisQueue(StubRedis(stored))
+    body = json.dumps({"ExternalId": "ext-1", "type": "calc_hash", "upload": payload}).encode()
+    task_input = TaskInput.model_validate_json(body)
+    router = TaskRouter(queue, vault_client=None)
+    task_uuid = uuid4()
+
+    return {
+        "encode": lambda: queue._encode(task),  # pylint: disable=protected-access
+        "save_task": lambda: queue.save_task(task_uuid, task),
+        "get_task": lambda: queue.get_task(task_uuid),
+        "task_input": lambda: TaskInput.model_validate(json.loads(body)),
+        "task_input_json": lambda: TaskInput.model_validate_json(body),
+        "create_task": lambda: router._create_task(task_input, "client1"),  # pylint: disable=protected-access
+        "task_response": lambda: TaskResponse(ExternalId="ext-1", type="calc_hash",
+                                              uuid=task_uuid, created="2024-01-01T00:00:00+00:00"),
+    }
+
+
+def main() -> None:
+    """ Точка входа микробенчмарков. """
+    parser = argparse.ArgumentParser(description="RedisQueue and model microbenchmarks")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--payloads", nargs="+", choices=list(PAYLOAD_ITEMS),
+                        default=list(PAYLOAD_ITEMS))
+    args = parser.parse_args()
+
+    logger.remove()  # Логирование не входит в замер
+    print(f"{'payload':8s} {'operation':16s} {'ns/op':>12s} {'peak B/op':>12s} {'live blk/op':>12s}")
+    for size in args.payloads:
+        # Крупные нагрузки медленнее на порядки — число итераций уменьшается
+        iterations = max(args.iterations // (1 if size == "small" else 10 if size == "medium" else 200), 10)
+        for name, func in operations(size).items():
+            ns_per_op, peak_bytes, blocks = measure(func, iterations)
+            print(f"{size:8s} {name:16s} {ns_per_op:12.0f} {peak_bytes:12.0f} {blocks:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""
+Нагрузочный тест CT Task Router: один процесс uvicorn с настоящим create_app.
+
+Окружение поднимается локально:
+- Redis — --redis-url, иначе redis-server на свободном порту (если установлен),
+  иначе TCP-сервер fakeredis в процессе теста (pip install fakeredis);
+- Vault — заглушка benchmarks.vault_stub с задержкой --vault-latency-ms.
+
+Сценарии (--scenarios): submit, taskinfo, mixed (доля /submit — --submit-ratio).
+Каждый сценарий выполняется --duration секунд с --concurrency параллельными
+клиентами после прогрева. В отчёте: пропускная способность, p50/p95/p99,
+коды ответов и процессорное время сервера на запрос (по /proc, только Linux).
+
+Результат пишется в JSON (--output) вместе с коммитом, чтобы сравнивать прогоны:
+    python -m benchmarks.loadtest run [--concurrency 32] [--duration 10] [--auth apikey]
+    python -m benchmarks.loadtest compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.vault_stub import API_KEY_ID, API_KEY_SECRET, VaultStub
+
+SCENARIOS = ("submit", "taskinfo", "mixed")
+SEED_TASKS = 200  # Задач, создаваемых перед сценариями /taskinfo
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def free_port() -> int:
+    """ Свободный TCP-порт на localhost. """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """ Процентиль q (0..100) по отсортированному списку (ближайший ранг). """
+    if not values:
+        return 0.0
+    rank = max(int(round(q / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def process_cpu_seconds(pid: int) -> Optional[float]:
+    """ Процессорное время процесса (user + system) по /proc или None. """
+    try:
+        with open(f"/proc/{pid}/stat", encoding="ascii") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def git_commit() -> Optional[str]:
+    """ Текущий коммит репозитория (если доступен git). """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class RedisStandIn:
+    """
+    Redis для теста: внешний URL, локальный redis-server или fakeredis по TCP.
+    """
+
+    def __init__(self, url: Optional[str]):
+        self.url = url
+        self.kind = "external"
+        self._process: Optional[subprocess.Popen] = None
+        self._server = None
+
+    def start(self) -> None:
+        """ Поднимает Redis, если URL не задан. """
+        if self.url:
+            return
+        port = free_port()
+        self.url = f"redis://127.0.0.1:{port}/0"
+        if shutil.which("redis-server"):
+            self.kind = "redis-server"
+            self._process = subprocess.Popen(
+                ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+                stdout=subprocess.DEVNULL)
+            time.sleep(0.5)
+            return
+
+        try:
+            from fakeredis import TcpFakeServer  # pylint: disable=import-outside-toplevel
+        except ImportError as e:
+            raise SystemExit("No Redis available: pass --redis-url, install redis-server "
+                             "or pip install fakeredis") from e
+        self.kind = "fakeredis"
+        self._server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        """ Останавливает поднятый Redis. """
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def write_config(workdir: str, redis_url: str, vault_url: str, args) -> None:
+    """ Записывает config.json и .secrets.json для сервера. """
+    vault = {"url": vault_url}
+    if args.auth == "apikey":
+        vault["api_keys"] = {"enabled": True, "path": "task_router/api_keys"}
+    if args.auth_cache:
+        vault["auth_cache"] = {"enabled": True, "ttl": 300, "local_ttl": 30}
+    config = {
+        "queue": {"type": "redis", "url": redis_url},
+        "vault": vault,
+        "logging": {"level": args.log_level, "log_file": os.path.join(workdir, "bench.log"),
+                    "rotation": {"when": "1 day", "backupCount": 1}},
+    }
+    with open(os.path.join(workdir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    with open(os.path.join(workdir, ".secrets.json"), "w", encoding="utf-8") as f:
+        json.dump({"vault": {"token": "bench-token"}}, f)
+
+
+def serve(args) -> None:
+    """ Режим сервера: create_app с конфигурацией из --workdir в одном процессе uvicorn. """
+    import uvicorn  # pylint: disable=import-outside-toplevel
+    from app.config import loader  # pylint: disable=import-outside-toplevel
+
+    # Пути подменяются до импорта main: типы задач читаются из конфигурации при импорте
+    loader.CONFIG_PATH = os.path.join(args.workdir, "config.json")
+    loader.SECRETS_PATH = os.path.join(args.workdir, ".secrets.json")
+    import main  # pylint: disable=import-outside-toplevel
+    main.VAULT_CONNECTION_DELAY = 0  # Заглушка Vault готова сразу
+    uvicorn.run(main.create_app, factory=True, host="127.0.0.1", port=args.port,
+                log_level="warning", access_log=False)
+
+
+def authorization(kind: str) -> str:
+    """ Заголовок Authorization для выбранной схемы. """
+    if kind == "apikey":
+        return f"ApiKey {API_KEY_ID}.{API_KEY_SECRET}"
+    if kind == "basic":
+        import base64  # pylint: disable=import-outside-toplevel
+        return "Basic " + base64.b64encode(b"bench:bench").decode()
+    return "Bearer bench.jwt.token"
+
+
+async def drive(client: httpx.AsyncClient, operation: Callable, duration: float,
+                concurrency: int) -> Dict:
+    """
+    Выполняет operation из concurrency клиентов в течение duration секунд.
+
+    :return: Задержки (мс) и коды ответов
+    """
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status = str((await operation(client)).status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"latencies": latencies, "statuses": statuses}
+
+
+async def run_scenarios(base_url: str, server_pid: int, args) -> Dict[str, Dict]:
+    """ Прогоняет сценарии и собирает метрики. """
+    headers = {"Authorization": authorization(args.auth)}
+    task_ids: List[str] = []
+
+    async def submit(client: httpx.AsyncClient) -> httpx.Response:
+        response = await client.post("/submit", json={
+            "type": "calc_hash", "upload": {"filename": f"file-{random.random()}.bin"}})
+        if response.status_code == 200 and len(task_ids) < 10 * SEED_TASKS:
+            task_ids.append(response.json()["uuid"])
+        return response
+
+    async def taskinfo(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.get("/taskinfo", params={"taskid": random.choice(task_ids)})
+
+    async def mixed(client: httpx.AsyncClient) -> httpx.Response:
+        return await (submit(client) if random.random() < args.submit_ratio else taskinfo(client))
+
+    operations = {"submit": submit, "taskinfo": taskinfo, "mixed": mixed}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits,
+                                 timeout=30) as client:
+        for _ in range(SEED_TASKS):
+            await submit(client)
+        if not task_ids:
+            raise SystemExit("Seeding /submit failed: check the server log and auth settings")
+
+        for name in args.scenarios:
+            await drive(client, operations[name], args.warmup, args.concurrency)
+            cpu_before = process_cpu_seconds(server_pid)
+            started = time.perf_counter()
+            measured = await drive(client, operations[name], args.duration, args.concurrency)
+            elapsed = time.perf_counter() - started
+            cpu_after = process_cpu_seconds(server_pid)
+
+            latencies = sorted(measured["latencies"])
+            count = len(latencies)
+            ok = sum(n for status, n in measured["statuses"].items() if status.startswith("2"))
+            results[name] = {
+                "requests": count,
+                "errors": count - ok,
+                "statuses": measured["statuses"],
+                "duration_s": round(elapsed, 3),
+                "throughput_rps": round(count / elapsed, 1),
+                "latency_ms": {
+                    "mean": round(sum(latencies) / count, 3) if count else 0.0,
+                    "p50": round(percentile(latencies, 50), 3),
+                    "p95": round(percentile(latencies, 95), 3),
+                    "p99": round(percentile(latencies, 99), 3),
+                    "max": round(latencies[-1], 3) if count else 0.0,
+                },
+                "cpu_ms_per_request": round((cpu_after - cpu_before) * 1000 / count, 3)
+                if count and cpu_before is not None and cpu_after is not None else None,
+            }
+            print(f"{name:9s} {results[name]['throughput_rps']:9.1f} req/s  "
+                  f"p50 {results[name]['latency_ms']['p50']:8.2f}  "
+                  f"p95 {results[name]['latency_ms']['p95']:8.2f}  "
+                  f"p99 {results[name]['latency_ms']['p99']:8.2f} ms  "
+                  f"cpu {results[name]['cpu_ms_per_request']} ms/req  errors {count - ok}")
+    return results
+
+
+def wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    """ Ждёт, пока сервер начнёт отвечать на /health. """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.post(f"{base_url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit("Server did not start in time")
+
+
+def run(args) -> None:
+    """ Режим теста: окружение, сервер, сценарии, отчёт. """
+    redis = RedisStandIn(args.redis_url)
+    redis.start()
+    vault = VaultStub(latency=args.vault_latency_ms / 1000)
+    vault.start()
+    workdir = tempfile.mkdtemp(prefix="ct-loadtest-")
+    write_config(workdir, redis.url, vault.url, args)
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.loadtest", "serve",
+                               "--workdir", workdir, "--port", str(port)])
+    try:
+        wait_ready(base_url, server)
+        print(f"redis={redis.kind} vault_latency={args.vault_latency_ms} ms "
+              f"auth={args.auth} concurrency={args.concurrency} duration={args.duration} s")
+        scenarios = asyncio.run(run_scenarios(base_url, server.pid, args))
+    finally:
+        server.terminate()
+        server.wait()
+        vault.stop()
+        redis.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "redis": redis.kind,
+            "auth": args.auth,
+            "auth_cache": args.auth_cache,
+            "vault_latency_ms": args.vault_latency_ms,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "submit_ratio": args.submit_ratio,
+        },
+        "scenarios": scenarios,
+    }
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"loadtest-{report['meta']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Report written to {output}")
+
+
+def compare(args) -> None:
+    """ Сравнение двух отчётов: изменение пропускной способности и задержек. """
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+
+    print(f"{before['meta'].get('commit')} → {after['meta'].get('commit')}")
+    for name, new in after["scenarios"].items():
+        old = before["scenarios"].get(name)
+        if old is None:
+            continue
+        rows = [("throughput_rps", old["throughput_rps"], new["throughput_rps"])]
+        rows += [(f"{q} ms", old["latency_ms"][q], new["latency_ms"][q]) for q in ("p50", "p95", "p99")]
+        if old.get("cpu_ms_per_request") and new.get("cpu_ms_per_request"):
+            rows.append(("cpu ms/req", old["cpu_ms_per_request"], new["cpu_ms_per_request"]))
+        print(name)
+        for label, old_value, new_value in rows:
+            change = (new_value - old_value) / old_value if old_value else 0.0
+            print(f"  {label:15s} {old_value:10.2f} → {new_value:10.2f}  ({change:+.1%})")
+
+
+def main() -> None:
+    """ Точка входа нагрузочного теста. """
+    parser = argparse.ArgumentParser(description="CT Task Router load test")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run load test scenarios")
+    run_parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    run_parser.add_argument("--concurrency", type=int, default=32)
+    run_parser.add_argument("--duration", type=float, default=10.0)
+    run_parser.add_argument("--warmup", type=float, default=2.0)
+    run_parser.add_argument("--submit-ratio", type=float, default=0.2)
+    run_parser.add_argument("--auth", choices=("apikey", "basic", "jwt"), default="apikey")
+    run_parser.add_argument("--auth-cache", action="store_true")
+    run_parser.add_argument("--vault-latency-ms", type=float, default=5.0)
+    run_parser.add_argument("--redis-url")
+    run_parser.add_argument("--log-level", default="WARNING")
+    run_parser.add_argument("--output")
+
+    serve_parser = commands.add_parser("serve", help="Internal: run the server under test")
+    serve_parser.add_argument("--workdir", required=True)
+    serve_parser.add_argument("--port", type=int, required=True)
+
+    compare_parser = commands.add_parser("compare", help="Compare two JSON reports")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+
+    args = parser.parse_args()
+    {"run": run, "serve": serve, "compare": compare}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
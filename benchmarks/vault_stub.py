@@ -0,0 +1,137 @@
+"""
+Локальная замена Vault для нагрузочных тестов.
+
+Отвечает на запросы, которые делает CT Task Router:
+- GET  /v1/auth/token/lookup-self — проверка токена сервиса при старте;
+- GET  /v1/<mount>/data/<path> — реестр API-ключей (KV v2);
+- POST /v1/auth/<mount>/login — вход по JWT;
+- POST /v1/auth/userpass/login/<username> — вход по логину и паролю.
+
+Любой вход успешен и возвращает metadata с client_id и role. Каждый ответ
+задерживается на latency секунд — так имитируется сетевой вызов в Vault.
+
+Запуск отдельно из корня репозитория:
+    python -m benchmarks.vault_stub [--port 8200] [--latency-ms 5]
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from app.auth.api_keys import api_key_digest
+
+API_KEY_ID = "bench"
+API_KEY_SECRET = "bench-secret"
+
+
+class VaultStub:
+    """
+    HTTP-сервер, имитирующий Vault, в фоновом потоке.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 client_id: str = "bench_client", role: str = "admin"):
+        """
+        :param host: Адрес для прослушивания
+        :param port: Порт (0 — свободный)
+        :param latency: Задержка каждого ответа (секунды)
+        :param client_id: client_id в ответах входа и в реестре API-ключей
+        :param role: Роль клиента
+        """
+        self.latency = latency
+        self.client_id = client_id
+        self.role = role
+        self.requests = 0
+        self.api_keys: Dict[str, dict] = {API_KEY_ID: {
+            "client_id": client_id, "role": role,
+            "digest": api_key_digest(API_KEY_ID, API_KEY_SECRET)}}
+
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """ Базовый URL заглушки. """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> None:
+        """ Запускает сервер в фоновом потоке. """
+        self._thread = threading.Thread(target=self._server.serve_forever, name="vault-stub",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ Останавливает сервер. """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _auth(self) -> dict:
+        """ Ответ Vault на успешный вход. """
+        return {"auth": {"client_token": "bench-client-token", "lease_duration": 3600,
+                         "renewable": False, "policies": ["default"],
+                         "metadata": {"client_id": self.client_id, "role": self.role}}}
+
+    def _handler(self) -> type:
+        """ Класс обработчика запросов, привязанный к заглушке. """
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                if self.path.startswith("/v1/auth/token/lookup-self"):
+                    self._reply(200, {"data": {"id": "bench-token", "policies": ["root"]}})
+                elif "/data/" in self.path:
+                    self._reply(200, {"data": {"data": stub.api_keys,
+                                               "metadata": {"version": 1}}})
+                else:
+                    self._reply(404, {"errors": []})
+
+            def do_POST(self) -> None:  # pylint: disable=invalid-name
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                if self.path.startswith("/v1/auth/") and "/login" in self.path:
+                    self._reply(200, stub._auth())
+                else:
+                    self._reply(404, {"errors": []})
+
+            def _reply(self, status: int, payload: dict) -> None:
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args) -> None:  # pylint: disable=redefined-builtin
+                pass
+
+        return Handler
+
+
+def main() -> None:
+    """ Точка входа: заглушка Vault как отдельный процесс. """
+    parser = argparse.ArgumentParser(description="Local Vault stand-in for load tests")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = VaultStub(port=args.port, latency=args.latency_ms / 1000)
+    print(f"Vault stub listening on {stub.url} (API key: ApiKey {API_KEY_ID}.{API_KEY_SECRET})")
+    stub.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,31 @@
 main.py — точка входа для запуска FastAPI-приложения
 """
 
-from urllib.parse import urlparse, urlunparse
 import time
 from fastapi import FastAPI, HTTPException
-from redis import Redis
 from loguru import logger
 import hvac
 
 
-from app.queue.redis_queue import RedisQueue
+from app.queue.eta import CompletionEstimator
+from app.queue.factory import create_redis_queue
+from app.queue.memory_sampler import TaskMemorySampler
 from app.auth.security import VaultClient
+from app.auth.policy import get_access_policy
+from app.auth.auth_cache import AuthCache
+from app.auth.api_keys import ApiKeyRegistry
+from app.auth.circuit_breaker import CircuitBreaker
+from app.diagnostics.memory import ProcessSampler
 from app.api.task_router import TaskRouter
+from app.api.compression import CompressionMiddleware
+from app.api.task_types import get_task_registry
+from app.webhooks.dispatcher import CallbackAllowList, WebhookDispatcher
 from app.config.loader import get_config, get_secrets
 from app.logging.setup import setup_logging
 
 VAULT_CONNECTION_DELAY = 3  # Задержка для корректной инициализации Vault
 
+
 def create_app() -> FastAPI:
     """
     Создаёт и настраивает FastAPI-приложение.
@@ -51,27 +60,70 @@ def create_app() -> FastAPI:
         raise RuntimeError("Application initialization error") from e
 
     try:
-        # Redis
+        # Redis: шарды, пулы dequeue, blob_store, гистограммы задержек и TTL статусов —
+        # той же фабрикой, что и у воркеров
         logger.debug("Redis client is being created")
-        redis_url = config["queue"]["url"]
-        redis_password = secrets.get("redis", {}).get("password")
-
-        if redis_password:
-            parsed_url = urlparse(redis_url)
-            netloc = f":{redis_password}@{parsed_url.hostname}"
-            if parsed_url.port:
-                netloc += f":{parsed_url.port}"
-            redis_url_with_auth = urlunparse(parsed_url._replace(netloc=netloc))
-        else:
-            redis_url_with_auth = redis_url
-
-        redis_client = Redis.from_url(redis_url_with_auth)
-        if not redis_client.ping():
-            raise ConnectionError("Redis не отвечает на ping")
-
-        redis_queue = RedisQueue(client=redis_client)
-
-        logger.debug("Redis client was successfully created!")
+        redis_queue = create_redis_queue(config, secrets, get_task_registry(), task_cache=True)
+        redis_client, shards = redis_queue.client, redis_queue.shards
+        blob_store, latency_stats = redis_queue.blob_store, redis_queue.latency_stats
+        if redis_queue.task_cache is not None:
+            redis_queue.task_cache.start()
+            logger.debug("Terminal task cache enabled")
+        if blob_store is not None:
+            blob_store.start()
+            logger.debug("Blob store enabled")
+
+        # Оценка сроков задач и Retry-After по снимку очередей (нужны гистограммы задержек)
+        completion_estimator = None
+        eta_config = config["queue"].get("eta", {})
+        if eta_config.get("enabled", True):
+            if latency_stats is None:
+                logger.warning("Completion estimates require queue.latency_stats, disabled")
+            else:
+                registry = get_task_registry()
+                completion_estimator = CompletionEstimator(
+                    redis_queue, latency_stats,
+                    queues={name: registry.get(name).queue for name in registry.names()},
+                    interval=eta_config.get("interval", 15),
+                    window=eta_config.get("window", 900),
+                    min_retry_after=eta_config.get("min_retry_after", 1),
+                    max_retry_after=eta_config.get("max_retry_after", 60))
+                completion_estimator.start()
+                logger.debug("Completion estimator enabled")
+
+        # Выборочная оценка памяти задач по типам и статусам (опционально)
+        memory_sampler = None
+        sampler_config = config["queue"].get("memory_sampler", {})
+        if sampler_config.get("enabled", False):
+            memory_sampler = TaskMemorySampler(shards,
+                                               sample_size=sampler_config.get("sample_size", 200),
+                                               interval=sampler_config.get("interval", 300))
+            memory_sampler.start()
+            logger.debug("Task memory sampler enabled")
+
+        # Webhook о завершении задач (опционально)
+        callback_allowlist = None
+        webhooks_config = config.get("webhooks", {})
+        if webhooks_config.get("enabled", False):
+            webhook_secret = secrets.get("webhooks", {}).get("secret")
+            if not webhook_secret:
+                raise RuntimeError("Webhooks require webhooks.secret in secrets")
+            callback_allowlist = CallbackAllowList(webhooks_config.get("allowed_urls", {}))
+            webhook_dispatcher = WebhookDispatcher(
+                redis_queue, secret=webhook_secret.encode(),
+                concurrency=webhooks_config.get("concurrency", 16),
+                per_host=webhooks_config.get("per_host", 4),
+                timeout=webhooks_config.get("timeout", 10.0),
+                max_attempts=webhooks_config.get("max_attempts", 8),
+                backoff_base=webhooks_config.get("backoff_base", 5.0),
+                backoff_max=webhooks_config.get("backoff_max", 3600.0),
+                poll_interval=webhooks_config.get("poll_interval", 1.0),
+                lease=webhooks_config.get("lease", 60),
+                dead_letter_max=webhooks_config.get("dead_letter_max", 10000))
+            webhook_dispatcher.start()
+            logger.debug("Webhook dispatcher enabled")
+
+        logger.debug(f"Redis client was successfully created ({len(shards)} shard(s))!")
     except Exception as e:
         logger.exception("Redis connection error")
         raise RuntimeError("Redis connection error") from e
@@ -85,12 +137,57 @@ def create_app() -> FastAPI:
 
         time.sleep(VAULT_CONNECTION_DELAY)  # Задержка для корректной инициализации Vault
 
-        client = hvac.Client(url=vault_url, token=vault_token)
+        # Явные таймауты на подключение и чтение для всех вызовов Vault
+        vault_timeout = (config["vault"].get("connect_timeout", 2.0),
+                         config["vault"].get("timeout", 5.0))
+        client = hvac.Client(url=vault_url, token=vault_token, timeout=vault_timeout)
         if not client.is_authenticated():
             logger.error("Failed to authenticate with Vault using the provided token")
             raise HTTPException(status_code=401, detail="Vault authentication failed")
 
-        vault_client = VaultClient(client=client, vault_url = vault_url, auth_path=auth_path)
+        # Кэш результатов аутентификации (опционально, L2 — общий в Redis)
+        auth_cache = None
+        cache_config = config["vault"].get("auth_cache", {})
+        if cache_config.get("enabled", False):
+            shared = cache_config.get("shared", False)
+            cache_key = secrets.get("auth_cache", {}).get("key")
+            auth_cache = AuthCache(
+                secret=cache_key.encode() if cache_key else None,
+                ttl=cache_config.get("ttl", 300),
+                local_ttl=cache_config.get("local_ttl", 30),
+                max_entries=cache_config.get("max_entries", 10000),
+                redis_client=redis_client if shared else None,
+                lock_timeout=cache_config.get("lock_timeout", 5.0),
+                grace_ttl=cache_config.get("grace_ttl", 0)
+            )
+            logger.debug(f"Auth cache enabled (shared: {shared})")
+
+        # Реестр API-ключей (опционально, проверка ключей без запросов в Vault)
+        api_keys = None
+        api_keys_config = config["vault"].get("api_keys", {})
+        if api_keys_config.get("enabled", False):
+            api_keys = ApiKeyRegistry(
+                client=client,
+                path=api_keys_config["path"],
+                mount_point=api_keys_config.get("mount_point", "secret"),
+                refresh_interval=api_keys_config.get("refresh_interval", 60),
+                max_staleness=api_keys_config.get("max_staleness", 300)
+            )
+            if not api_keys.refresh():
+                raise RuntimeError("API key registry could not be loaded from Vault")
+            api_keys.start()
+            logger.debug("API key registry loaded")
+
+        # Автомат защиты: быстрый отказ, пока Vault недоступен
+        breaker_config = config["vault"].get("circuit_breaker", {})
+        breaker = CircuitBreaker(
+            failure_threshold=breaker_config.get("failure_threshold", 5),
+            reset_timeout=breaker_config.get("reset_timeout", 30.0)
+        )
+
+        vault_client = VaultClient(client=client, vault_url = vault_url, auth_path=auth_path,
+                                   policy=get_access_policy(), auth_cache=auth_cache,
+                                   api_keys=api_keys, breaker=breaker)
 
         logger.debug("Vault client was successfully created!")
     except HTTPException as e:
@@ -102,8 +199,39 @@ def create_app() -> FastAPI:
     try:
         logger.debug("TaskRouter is being initialized")
         # Инициализация маршрутизатора задач с Redis и Vault клиентами
-        task_router = TaskRouter(redis_queue=redis_queue, vault_client=vault_client)
+        http_config = config.get("http", {})
+
+        # Периодические замеры RSS и GC для /debug/memory (опционально)
+        process_sampler = None
+        process_config = config.get("diagnostics", {}).get("process_sampler", {})
+        if process_config.get("enabled", False):
+            process_sampler = ProcessSampler(interval=process_config.get("interval", 60),
+                                             history=process_config.get("history", 120))
+            process_sampler.start()
+            logger.debug("Process sampler enabled")
+
+        task_router = TaskRouter(redis_queue=redis_queue, vault_client=vault_client,
+                                 task_registry=get_task_registry(),
+                                 cache_max_age=http_config.get("cache_max_age", 60),
+                                 shared_cache=http_config.get("shared_cache", False),
+                                 blob_store=blob_store, memory_sampler=memory_sampler,
+                                 process_sampler=process_sampler,
+                                 latency_stats=latency_stats,
+                                 completion_estimator=completion_estimator,
+                                 callback_allowlist=callback_allowlist)
         app.include_router(task_router)
+
+        # Сжатие ответов и приём сжатых тел запросов
+        compression_config = http_config.get("compression", {})
+        if compression_config.get("enabled", True):
+            app.add_middleware(
+                CompressionMiddleware,
+                minimum_size=compression_config.get("minimum_size", 1024),
+                gzip_level=compression_config.get("gzip_level", 6),
+                zstd=compression_config.get("zstd", False),
+                zstd_level=compression_config.get("zstd_level", 3),
+                max_request_size=compression_config.get("max_request_size", 10 * 1024 * 1024)
+            )
         logger.debug("TaskRouter was successfully initialized!")
         return app
     except Exception as e:
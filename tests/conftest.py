@@ -35,16 +35,40 @@ def mock_redis_fixture(monkeypatch):
     redis_queue_module.redis.Redis.return_value = mock_instance
     return mock_instance
 
-@pytest.fixture(name="test_client")
-def test_client_fixture(mock_redis, vault_client):
+def make_router_client(redis_queue, vault_client, **router_options) -> TestClient:
     """
-    Фикстура для запуска FastAPI с TaskRouter и замоканным Redis и VaultClient.
-    Используется для интеграционного тестирования API.
+    Собирает приложение FastAPI с маршрутами TaskRouter и возвращает TestClient.
+
+    :param redis_queue: Очередь задач (мок)
+    :param vault_client: Клиент Vault (мок)
+    :param router_options: Дополнительные параметры TaskRouter
+    :return: Клиент для запросов к приложению
     """
     app = FastAPI()
-    router = TaskRouter(redis_queue=mock_redis, vault_client=vault_client)
+    router = TaskRouter(redis_queue=redis_queue, vault_client=vault_client, **router_options)
 
     for route in router.routes:
         app.router.routes.append(route)
 
     return TestClient(app)
+
+@pytest.fixture(name="test_client")
+def test_client_fixture(mock_redis, vault_client):
+    """
+    Фикстура для запуска FastAPI с TaskRouter и замоканным Redis и VaultClient.
+    Используется для интеграционного тестирования API.
+    """
+    return make_router_client(mock_redis, vault_client)
+
+@pytest.fixture(name="router_client")
+def router_client_fixture(redis_queue, vault_client):
+    """
+    Фабрика TestClient с маршрутами TaskRouter поверх моков redis_queue и vault_client.
+    router_client(user=("client-1", "service"), blob_store=store) задаёт результат
+    authenticate_user и передаёт остальные параметры в TaskRouter.
+    """
+    def make(user=None, **router_options):
+        if user is not None:
+            vault_client.authenticate_user.return_value = user
+        return make_router_client(redis_queue, vault_client, **router_options)
+    return make
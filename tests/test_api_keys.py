@@ -0,0 +1,95 @@
+# tests/test_api_keys.py
+
+"""
+Unit-тесты для реестра API-ключей и схемы ApiKey в VaultClient.
+Проверяются загрузка реестра одним запросом, локальная проверка ключей,
+отзыв ключа при обновлении и отказ при устаревшем реестре.
+"""
+
+from unittest.mock import MagicMock
+import pytest
+from fastapi import HTTPException
+from app.auth.api_keys import ApiKeyRegistry, api_key_digest
+from app.auth.security import VaultClient
+
+
+def kv_response(keys: dict) -> dict:
+    """Ответ Vault KV v2 с реестром ключей."""
+    return {"data": {"data": keys}}
+
+
+@pytest.fixture(name="hvac_client")
+def hvac_client_fixture():
+    """Мок hvac.Client с одним ключом svc1 в KV."""
+    client = MagicMock()
+    client.secrets.kv.v2.read_secret_version.return_value = kv_response({
+        "svc1": {"client_id": "client2", "role": "service",
+                 "digest": api_key_digest("svc1", "s3cret")}
+    })
+    return client
+
+
+@pytest.fixture(name="registry")
+def registry_fixture(hvac_client):
+    """Загруженный реестр API-ключей."""
+    registry = ApiKeyRegistry(client=hvac_client, path="task_router/api_keys")
+    assert registry.refresh() is True
+    return registry
+
+
+def test_verify_valid_key(registry):
+    """Верный ключ возвращает client_id и роль."""
+    assert registry.verify("svc1", "s3cret") == ("client2", "service")
+
+
+def test_verify_invalid_secret_and_unknown_key(registry):
+    """Неверный секрет и неизвестный key_id отклоняются."""
+    assert registry.verify("svc1", "wrong") is None
+    assert registry.verify("nobody", "s3cret") is None
+
+
+def test_revoked_key_rejected_after_refresh(registry, hvac_client):
+    """Удалённый из KV ключ перестаёт приниматься после обновления реестра."""
+    hvac_client.secrets.kv.v2.read_secret_version.return_value = kv_response({})
+    registry.refresh()
+    assert registry.verify("svc1", "s3cret") is None
+
+
+def test_failed_refresh_keeps_previous_registry(registry, hvac_client):
+    """Ошибка обновления не сбрасывает загруженный реестр."""
+    hvac_client.secrets.kv.v2.read_secret_version.side_effect = Exception("Vault down")
+    assert registry.refresh() is False
+    assert registry.verify("svc1", "s3cret") == ("client2", "service")
+
+
+def test_stale_registry_rejects_keys(registry):
+    """Реестр старше max_staleness не принимает ключи."""
+    registry.max_staleness = 0
+    registry._loaded_at -= 1  # pylint: disable=protected-access
+    assert registry.verify("svc1", "s3cret") is None
+
+
+def test_vault_client_api_key_no_vault_calls(registry, hvac_client):
+    """Схема ApiKey проверяется локально, без логина в Vault."""
+    vault = VaultClient(client=hvac_client, vault_url="x", auth_path="y", api_keys=registry)
+    assert vault.authenticate_user("ApiKey svc1.s3cret", "submit", "calc_hash") == \
+        ("client2", "service")
+    hvac_client.auth.jwt_login.assert_not_called()
+    hvac_client.userpass_login.assert_not_called()
+
+
+def test_vault_client_api_key_invalid(registry, hvac_client):
+    """Неверный или некорректно оформленный ключ даёт HTTP 401."""
+    vault = VaultClient(client=hvac_client, vault_url="x", auth_path="y", api_keys=registry)
+    for header in ("ApiKey svc1.wrong", "ApiKey malformed"):
+        with pytest.raises(HTTPException) as exc:
+            vault.authenticate_user(header, "submit", "calc_hash")
+        assert exc.value.status_code == 401
+
+
+def test_vault_client_api_key_disabled(hvac_client):
+    """Без реестра схема ApiKey отклоняется с HTTP 401."""
+    vault = VaultClient(client=hvac_client, vault_url="x", auth_path="y")
+    with pytest.raises(HTTPException) as exc:
+        vault.authenticate_user("ApiKey svc1.s3cret", "submit", "calc_hash")
+    assert exc.value.status_code == 401
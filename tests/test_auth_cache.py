@@ -0,0 +1,221 @@
+# tests/test_auth_cache.py
+
+"""
+Unit-тесты для двухуровневого кэша аутентификации.
+Проверяются L1/L2, хранение только HMAC учётных данных,
+объединение одновременных промахов, инвалидация при отзыве клиента
+и режим отсрочки при недоступности Vault.
+"""
+
+import threading
+import time
+from unittest.mock import MagicMock
+import pytest
+import requests.exceptions
+from app.auth.auth_cache import AuthCache
+from app.auth.circuit_breaker import CircuitBreaker, VaultUnavailableError
+from app.auth.security import VaultClient
+from fastapi import HTTPException
+
+
+@pytest.fixture(name="shared_redis")
+def shared_redis_fixture():
+    """Мок Redis для общего кэша: L2 пуст, блокировка логина свободна."""
+    client = MagicMock()
+    client.hgetall.return_value = {}
+    client.set.return_value = True
+    client.smembers.return_value = set()
+    return client
+
+
+def test_local_cache_hit():
+    """Повторная аутентификация берётся из L1 без обращения к Vault."""
+    cache = AuthCache()
+    loader = MagicMock(return_value=("c1", "service", None))
+    assert cache.get_or_load("Bearer t", loader) == ("c1", "service")
+    assert cache.get_or_load("Bearer t", loader) == ("c1", "service")
+    loader.assert_called_once()
+
+
+def test_expired_entry_reloaded():
+    """Запись с истёкшим сроком действия не используется."""
+    cache = AuthCache()
+    loader = MagicMock(return_value=("c1", "service", time.time() - 1))
+    cache.get_or_load("Bearer t", loader)
+    cache.get_or_load("Bearer t", loader)
+    assert loader.call_count == 2
+
+
+def test_shared_cache_stores_only_digest(shared_redis):
+    """В Redis записываются (client_id, role, expiry) под HMAC, без учётных данных."""
+    cache = AuthCache(secret=b"k", redis_client=shared_redis)
+    cache.get_or_load("Basic user:secret-password", lambda: ("c1", "service", None))
+
+    pipe = shared_redis.pipeline.return_value
+    key, = pipe.hset.call_args.args
+    mapping = pipe.hset.call_args.kwargs["mapping"]
+    assert key == f"authcache:{cache.digest('Basic user:secret-password')}"
+    assert "secret-password" not in key
+    assert set(mapping) == {"client_id", "role", "expiry", "stale_until"}
+
+
+def test_shared_cache_hit(shared_redis):
+    """Запись из L2 используется без логина в Vault."""
+    shared_redis.hgetall.return_value = {
+        b"client_id": b"c1", b"role": b"admin", b"expiry": str(time.time() + 60).encode()
+    }
+    cache = AuthCache(secret=b"k", redis_client=shared_redis)
+    loader = MagicMock()
+    assert cache.get_or_load("Bearer t", loader) == ("c1", "admin")
+    loader.assert_not_called()
+
+
+def test_concurrent_misses_coalesced_in_process():
+    """Одновременные промахи по одним учётным данным дают один логин."""
+    cache = AuthCache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return "c1", "service", None
+
+    threads = [threading.Thread(target=cache.get_or_load, args=("Bearer t", loader))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+
+
+def test_concurrent_misses_coalesced_in_cluster(shared_redis):
+    """Если логин выполняет другой процесс, ждём его результат в L2."""
+    shared_redis.set.return_value = False  # блокировка занята другим процессом
+    shared_redis.hgetall.side_effect = [
+        {}, {b"client_id": b"c1", b"role": b"service", b"expiry": str(time.time() + 60).encode()}
+    ]
+    cache = AuthCache(secret=b"k", redis_client=shared_redis)
+    loader = MagicMock()
+    assert cache.get_or_load("Bearer t", loader) == ("c1", "service")
+    loader.assert_not_called()
+
+
+def test_invalidate_client(shared_redis):
+    """Отзыв клиента удаляет его записи из L1 и L2."""
+    cache = AuthCache(secret=b"k", redis_client=shared_redis)
+    loader = MagicMock(return_value=("c1", "service", None))
+    cache.get_or_load("Bearer t", loader)
+    shared_redis.smembers.return_value = {b"abc"}
+
+    cache.invalidate_client("c1")
+    shared_redis.delete.assert_called_once_with("authcache:client:c1", "authcache:abc")
+    cache.get_or_load("Bearer t", loader)
+    assert loader.call_count == 2
+
+
+def test_revoke_during_login_not_cached():
+    """Логин, начатый до отзыва клиента, не записывает результат в кэш."""
+    cache = AuthCache()
+
+    def revoked_while_loading():
+        cache.invalidate_client("c1")  # отзыв, пока Vault отвечает на логин
+        return "c1", "service", None
+
+    loader = MagicMock(side_effect=revoked_while_loading)
+    assert cache.get_or_load("Bearer t", loader) == ("c1", "service")
+    loader.side_effect = None
+    loader.return_value = ("c1", "service", None)
+    cache.get_or_load("Bearer t", loader)
+    assert loader.call_count == 2
+
+
+def test_revoke_in_other_replica_during_login_not_cached():
+    """Отзыв в другой реплике во время логина: запись не остаётся в общем кэше."""
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis()
+    replica, other = (AuthCache(secret=b"k", redis_client=client) for _ in range(2))
+
+    def revoked_while_loading():
+        other.invalidate_client("c1")
+        return "c1", "service", None
+
+    replica.get_or_load("Bearer t", revoked_while_loading)
+    assert not client.exists(f"authcache:{replica.digest('Bearer t')}")
+
+    # Логин после отзыва кэшируется как обычно
+    replica.get_or_load("Bearer t", lambda: ("c1", "service", None))
+    loader = MagicMock()
+    assert other.get_or_load("Bearer t", loader) == ("c1", "service")
+    loader.assert_not_called()
+
+
+def test_shared_cache_requires_secret(shared_redis):
+    """Общий кэш без ключа HMAC не создаётся."""
+    with pytest.raises(ValueError):
+        AuthCache(redis_client=shared_redis)
+
+
+def test_vault_client_uses_cache_but_checks_policy_each_time():
+    """VaultClient логинится в Vault один раз, но права проверяет на каждый запрос."""
+    hvac_client = MagicMock()
+    hvac_client.auth.jwt_login.return_value = {
+        "metadata": {"client_id": "u1", "role": "copytrust_site"}
+    }
+    vault = VaultClient(client=hvac_client, vault_url="x", auth_path="y", auth_cache=AuthCache())
+
+    assert vault.authenticate_user("Bearer a.b.c", "submit", "calc_hash") == ("u1", "copytrust_site")
+    with pytest.raises(HTTPException) as exc:
+        vault.authenticate_user("Bearer a.b.c", "submit", "resize_image")
+    assert exc.value.status_code == 403
+    hvac_client.auth.jwt_login.assert_called_once()
+
+
+def test_grace_mode_honours_recent_decision_when_vault_down():
+    """При недоступности Vault запись с истёкшим TTL принимается в пределах grace_ttl."""
+    cache = AuthCache(ttl=1, local_ttl=1, grace_ttl=60)
+    cache.get_or_load("Bearer t", lambda: ("c1", "service", None))
+    key = cache.digest("Bearer t")
+    entry = cache._local[key]  # pylint: disable=protected-access
+    cache._local[key] = (entry[0], entry[1], time.time() - 1, entry[3])  # pylint: disable=protected-access
+
+    def vault_down():
+        raise VaultUnavailableError("Circuit breaker 'vault' is open")
+
+    assert cache.get_or_load("Bearer t", vault_down) == ("c1", "service")
+    assert cache.grace_decisions == 1
+
+
+def test_grace_mode_disabled_rejects():
+    """Без режима отсрочки недоступность Vault приводит к ошибке."""
+    cache = AuthCache(ttl=1, local_ttl=1)
+
+    def vault_down():
+        raise VaultUnavailableError("down")
+
+    with pytest.raises(VaultUnavailableError):
+        cache.get_or_load("Bearer t", vault_down)
+
+
+def test_grace_mode_respects_credential_expiry():
+    """Режим отсрочки не продлевает учётные данные дольше их собственного срока."""
+    cache = AuthCache(ttl=60, grace_ttl=600)
+    cache.get_or_load("Bearer t", lambda: ("c1", "service", time.time() - 1))
+
+    def vault_down():
+        raise VaultUnavailableError("down")
+
+    with pytest.raises(VaultUnavailableError):
+        cache.get_or_load("Bearer t", vault_down)
+
+
+def test_vault_client_unavailable_returns_503():
+    """Недоступность Vault без записи в кэше даёт HTTP 503, а не 401."""
+    hvac_client = MagicMock()
+    hvac_client.auth.jwt_login.side_effect = requests.exceptions.ConnectionError("refused")
+    vault = VaultClient(client=hvac_client, vault_url="x", auth_path="y",
+                        breaker=CircuitBreaker(failure_threshold=1))
+    with pytest.raises(HTTPException) as exc:
+        vault.authenticate_user("Bearer a.b.c", "submit", "calc_hash")
+    assert exc.value.status_code == 503
+    assert vault.status()["state"] == "open"
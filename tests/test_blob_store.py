@@ -0,0 +1,83 @@
+# tests/test_blob_store.py
+
+"""
+Unit-тесты для файлового хранилища blob-объектов.
+Проверяются адресация по содержимому, потоковая запись, ссылки и очистка.
+"""
+
+import hashlib
+import os
+import time
+import pytest
+from app.storage.blob_store import FileBlobStore, create_blob_store, parse_ref
+
+
+def test_put_is_content_addressed(tmp_path):
+    """Объект хранится по SHA-256 содержимого; одинаковые данные хранятся один раз."""
+    store = FileBlobStore(str(tmp_path))
+    ref = store.put(b"payload")
+    digest = hashlib.sha256(b"payload").hexdigest()
+
+    assert ref == {"$blob": f"sha256:{digest}", "size": 7, "content_type": "application/json"}
+    assert store.put(b"payload") == ref
+    assert store.read(digest) == b"payload"
+    assert os.path.exists(os.path.join(str(tmp_path), digest[:2], digest[2:4], digest))
+
+
+def test_put_stream_hashes_chunks(tmp_path):
+    """Потоковая запись хэширует блоки на лету и не оставляет временных файлов."""
+    store = FileBlobStore(str(tmp_path))
+    ref = store.put_stream([b"ab", b"cd"], content_type="image/png")
+    assert parse_ref(ref) == hashlib.sha256(b"abcd").hexdigest()
+    assert ref["size"] == 4
+    assert not [name for name in os.listdir(str(tmp_path)) if name.startswith(".upload-")]
+
+
+def test_writer_reports_created_and_delete(tmp_path):
+    """commit() отмечает, создан ли объект заново; delete() удаляет объект."""
+    store = FileBlobStore(str(tmp_path))
+    first, second = store.writer(), store.writer()
+    first.write(b"payload")
+    second.write(b"payload")
+    digest = parse_ref(first.commit())
+    second.commit()
+    assert first.created and not second.created
+
+    store.delete(digest)
+    store.delete(digest)  # повторное удаление — не ошибка
+    with pytest.raises(FileNotFoundError):
+        store.read(digest)
+
+
+def test_parse_ref_rejects_plain_values():
+    """Обычный результат задачи не считается ссылкой."""
+    assert parse_ref({"hash": "abc"}) is None
+    assert parse_ref({"$blob": "md5:abc"}) is None
+    assert parse_ref(None) is None
+
+
+def test_invalid_digest_rejected(tmp_path):
+    """Digest не может указывать за пределы хранилища."""
+    store = FileBlobStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.open("../" * 10 + "etc/passwd")
+
+
+def test_cleanup_removes_old_objects(tmp_path):
+    """Очистка удаляет объекты, которые не записывались дольше max_age."""
+    store = FileBlobStore(str(tmp_path), max_age=60)
+    old = parse_ref(store.put(b"old"))
+    fresh = parse_ref(store.put(b"fresh"))
+    past = time.time() - 120
+    os.utime(store.path(old), (past, past))
+
+    assert store.cleanup() == 1
+    assert not os.path.exists(store.path(old))
+    assert os.path.exists(store.path(fresh))
+
+
+def test_create_blob_store_unknown_type(tmp_path):
+    """Неизвестный тип хранилища — ошибка конфигурации."""
+    assert isinstance(create_blob_store({"root": str(tmp_path)}), FileBlobStore)
+    with pytest.raises(ValueError):
+        create_blob_store({"type": "s3", "root": str(tmp_path)})
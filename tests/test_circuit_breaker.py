@@ -0,0 +1,65 @@
+# tests/test_circuit_breaker.py
+
+"""
+Unit-тесты для автомата защиты вызовов Vault.
+Проверяются размыкание после сбоев, быстрый отказ, пробный вызов
+и то, что отказ в аутентификации не считается сбоем Vault.
+"""
+
+from unittest.mock import MagicMock
+import hvac.exceptions
+import pytest
+import requests.exceptions
+from app.auth.circuit_breaker import CircuitBreaker, VaultUnavailableError, CLOSED, OPEN, HALF_OPEN
+
+
+def failing_call():
+    """Вызов Vault, завершающийся таймаутом."""
+    raise requests.exceptions.Timeout("read timed out")
+
+
+def test_opens_after_threshold_and_fails_fast():
+    """После failure_threshold сбоев вызовы отклоняются без обращения к Vault."""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(VaultUnavailableError):
+            breaker.call(failing_call)
+    assert breaker.state == OPEN
+
+    call = MagicMock()
+    with pytest.raises(VaultUnavailableError):
+        breaker.call(call)
+    call.assert_not_called()
+
+
+def test_half_open_probe_closes_on_success():
+    """После reset_timeout пробный успешный вызов замыкает автомат."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    with pytest.raises(VaultUnavailableError):
+        breaker.call(failing_call)
+    assert breaker.state == HALF_OPEN
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["consecutive_failures"] == 0
+
+
+def test_half_open_probe_failure_reopens():
+    """Неудачный пробный вызов снова размыкает автомат."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    with pytest.raises(VaultUnavailableError):
+        breaker.call(failing_call)
+    with pytest.raises(VaultUnavailableError):
+        breaker.call(failing_call)
+    assert breaker.snapshot()["opened_at"] is not None
+
+
+def test_auth_rejection_is_not_a_failure():
+    """Отказ Vault в аутентификации не считается сбоем доступности."""
+    breaker = CircuitBreaker(failure_threshold=1)
+
+    def rejected():
+        raise hvac.exceptions.InvalidRequest("invalid credentials")
+
+    with pytest.raises(hvac.exceptions.InvalidRequest):
+        breaker.call(rejected)
+    assert breaker.state == CLOSED
@@ -0,0 +1,135 @@
+# tests/test_compression.py
+
+"""
+Тесты сжатия ответов, распаковки тел запросов и быстрой сериализации ответов TaskRouter.
+"""
+
+import gzip
+import json
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from app.api.compression import CompressionMiddleware, negotiate
+from app.api.fast_json import ModelJSONRoute, dumps
+from app.api.models import TaskInfo
+from app.api.task_router import TaskRouter
+
+
+def _app(**options) -> TestClient:
+    """Приложение с CompressionMiddleware и тестовыми маршрутами."""
+    app = FastAPI()
+
+    @app.get("/big")
+    def big():
+        return {"data": "x" * 5000}
+
+    @app.get("/small")
+    def small():
+        return {"data": "x"}
+
+    @app.get("/text")
+    def text():
+        return PlainTextResponse("y" * 5000, media_type="image/png")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((b'{"a":1}' for _ in range(3)), media_type="application/json")
+
+    @app.get("/tagged")
+    def tagged():
+        return JSONResponse({"data": "x" * 5000}, headers={"ETag": '"v1"'})
+
+    @app.get("/ranged")
+    def ranged():
+        return JSONResponse({"data": "x" * 5000},
+                            headers={"ETag": '"digest"', "Accept-Ranges": "bytes"})
+
+    @app.post("/submit")
+    def submit(payload: dict):
+        return {"size": len(payload["data"])}
+
+    app.add_middleware(CompressionMiddleware, **options)
+    return TestClient(app)
+
+
+def test_negotiate():
+    """Выбор кодировки учитывает q-значения и доступность zstd."""
+    assert negotiate("gzip, deflate", zstd_enabled=True) == "gzip"
+    assert negotiate("gzip;q=0, br", zstd_enabled=False) is None
+    assert negotiate("*", zstd_enabled=False) == "gzip"
+    assert negotiate("", zstd_enabled=False) is None
+
+
+def test_large_json_response_gzipped():
+    """JSON-ответ не меньше minimum_size сжимается gzip."""
+    client = _app(minimum_size=1000)
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < 5000
+    assert response.json() == {"data": "x" * 5000}
+
+
+def test_small_and_binary_responses_not_compressed():
+    """Маленькие ответы и несжимаемые типы содержимого передаются как есть."""
+    client = _app(minimum_size=1000)
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/text", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_compressed_response_etag_weakened():
+    """У сжатого ответа ETag слабый; без сжатия ETag не меняется."""
+    client = _app(minimum_size=1000)
+    assert client.get("/tagged", headers={"Accept-Encoding": "gzip"}).headers["etag"] == 'W/"v1"'
+    assert client.get("/tagged", headers={"Accept-Encoding": "identity"}).headers["etag"] == '"v1"'
+
+
+def test_ranged_response_not_compressed():
+    """Ответ с Accept-Ranges: bytes не сжимается: смещения Range — в несжатом теле."""
+    response = _app(minimum_size=1000).get("/ranged", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert (response.headers["etag"], response.headers["accept-ranges"]) == ('"digest"', "bytes")
+
+
+def test_streaming_response_compressed():
+    """Потоковый ответ сжимается по мере передачи."""
+    client = _app(minimum_size=1000)
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == b'{"a":1}' * 3
+
+
+def test_gzip_request_body_accepted():
+    """Сжатое тело запроса /submit распаковывается."""
+    client = _app()
+    body = gzip.compress(json.dumps({"data": "z" * 10000}).encode())
+    response = client.post("/submit", content=body,
+                           headers={"Content-Encoding": "gzip", "Content-Type": "application/json"})
+    assert response.status_code == 200
+    assert response.json() == {"size": 10000}
+
+
+def test_gzip_bomb_rejected():
+    """Распакованное тело больше max_request_size отклоняется с HTTP 413."""
+    client = _app(max_request_size=1000)
+    body = gzip.compress(json.dumps({"data": "z" * 100000}).encode())
+    response = client.post("/submit", content=body,
+                           headers={"Content-Encoding": "gzip", "Content-Type": "application/json"})
+    assert response.status_code == 413
+
+
+def test_unsupported_request_encoding():
+    """Неизвестная кодировка тела запроса — HTTP 415."""
+    response = _app().post("/submit", content=b"{}", headers={"Content-Encoding": "br"})
+    assert response.status_code == 415
+
+
+def test_task_router_uses_fast_json_route(redis_queue, vault_client):
+    """Маршруты TaskRouter сериализуют модели напрямую в байты."""
+    router = TaskRouter(redis_queue, vault_client)
+    assert all(isinstance(route, ModelJSONRoute) for route in router.routes)
+
+    info = TaskInfo(uuid="12345678-1234-5678-1234-567812345678", type="calc_hash",
+                    status="done", code=0, message="OK", result={"hash": "abc"}, version=2)
+    assert json.loads(dumps(info)) == json.loads(info.model_dump_json())
+    assert b"version" not in dumps(info)
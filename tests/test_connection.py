@@ -0,0 +1,79 @@
+# tests/test_connection.py
+
+"""
+Unit-тесты для пула соединений Redis со статистикой.
+"""
+
+import pytest
+from redis import ConnectionError as RedisConnectionError
+
+from app.queue.connection import InstrumentedConnectionPool, create_redis_client
+
+
+class FakeConnection:
+    """Соединение без сети: пул только выдаёт и принимает его обратно."""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.pid = None
+
+    def connect(self):
+        pass
+
+    def can_read(self):
+        return False
+
+    def disconnect(self):
+        pass
+
+
+def test_create_redis_client_applies_pool_config():
+    """Настройки пула и соединений берутся из конфигурации, отсутствующие — по умолчанию."""
+    client = create_redis_client("redis://localhost:6379/0",
+                                 {"max_connections": 7, "socket_timeout": 1.5})
+    pool = client.connection_pool
+    assert isinstance(pool, InstrumentedConnectionPool)
+    assert pool.max_connections == 7
+    assert pool.timeout == 2.0
+    assert pool.connection_kwargs["socket_timeout"] == 1.5
+    assert pool.connection_kwargs["socket_keepalive"] is True
+    assert pool.connection_kwargs["health_check_interval"] == 30
+
+
+@pytest.mark.parametrize("blocking", [False, True])
+def test_commands_not_retried_on_timeout(blocking):
+    """Повтор при таймауте выключен даже по настройке: запись задач не идемпотентна."""
+    client = create_redis_client("redis://localhost:6379/0", {"retry_on_timeout": True},
+                                 blocking=blocking)
+    assert client.connection_pool.connection_kwargs["retry_on_timeout"] is False
+    connection = client.connection_pool.make_connection()
+    assert connection.retry_on_error == []
+    assert connection.retry._retries == 0  # pylint: disable=protected-access
+
+
+def test_blocking_client_uses_separate_pool_without_read_timeout():
+    """Пул для BRPOP не ограничивает чтение и имеет собственный размер."""
+    client = create_redis_client("redis://localhost:6379/0", {"dequeue_max_connections": 3},
+                                 blocking=True)
+    pool = client.connection_pool
+    assert pool.max_connections == 3
+    assert pool.connection_kwargs["socket_timeout"] is None
+
+
+def test_pool_stats_count_usage_waits_and_timeouts():
+    """Статистика отражает занятые соединения, ожидания и отказы по wait_timeout."""
+    pool = InstrumentedConnectionPool(max_connections=1, timeout=0.01,
+                                      connection_class=FakeConnection)
+    connection = pool.get_connection("PING")
+    assert pool.stats()["in_use"] == 1
+    assert pool.stats()["utilization"] == 1.0
+
+    with pytest.raises(RedisConnectionError):
+        pool.get_connection("PING")
+
+    pool.release(connection)
+    stats = pool.stats()
+    assert stats["in_use"] == 0
+    assert stats["open"] == 1
+    assert stats["acquired"] == 1
+    assert stats["timeouts"] == 1
@@ -0,0 +1,70 @@
+# tests/test_eta.py
+
+"""
+Unit-тесты для оценки сроков задач.
+"""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from app.queue.eta import CompletionEstimator
+
+
+def _estimator(depth, wait_count, p50_ms, p90_ms=None, retention=86400):
+    """Оценщик со снимком по заданным глубине очереди и статистике задержек."""
+    queue = MagicMock()
+    queue.queue_depths.return_value = {"calc_hash_INPUT": depth}
+    latency = MagicMock(retention=retention)
+    latency.summary.return_value = {"calc_hash": {
+        "queue_wait": {"count": wait_count},
+        "processing": {"p50_ms": p50_ms, "p90_ms": p90_ms}}}
+    estimator = CompletionEstimator(queue, latency, {"calc_hash": "calc_hash_INPUT"}, window=100)
+    estimator.refresh()
+    return estimator
+
+
+def test_refresh_builds_snapshot():
+    """Снимок: глубина очереди, темп извлечения в секунду и время обработки в секундах."""
+    estimator = _estimator(depth=30, wait_count=50, p50_ms=4000, p90_ms=9000)
+    assert estimator.snapshot["calc_hash"] == {"depth": 30, "dequeue_rate": 0.5,
+                                               "processing_p50": 4.0, "processing_p90": 9.0}
+    estimator.queue.queue_depths.assert_called_once_with(["calc_hash_INPUT"])
+    estimator.latency_stats.summary.assert_called_once_with(["calc_hash"], 100)
+
+
+def test_refresh_window_capped_by_retention():
+    """Окно длиннее хранения гистограмм: темп считается по фактическому окну сводки."""
+    estimator = _estimator(depth=0, wait_count=50, p50_ms=None, retention=50)
+    assert estimator.snapshot["calc_hash"]["dequeue_rate"] == 1.0
+    estimator.latency_stats.summary.assert_called_once_with(["calc_hash"], 50)
+
+
+def test_queued_task_estimate():
+    """Задача в очереди начнётся через глубина/темп и завершится через медиану обработки."""
+    estimator = _estimator(depth=30, wait_count=50, p50_ms=4000)
+    now = datetime.now(timezone.utc)
+    estimate = estimator.estimate("calc_hash")
+
+    start = (estimate["estimated_start"] - now).total_seconds()
+    assert 59 < start < 61
+    assert (estimate["estimated_completion"] - estimate["estimated_start"]).total_seconds() == 4
+    assert estimate["retry_after"] == 60  # ограничено max_retry_after
+
+
+def test_running_task_past_median_uses_p90():
+    """Задача, обрабатываемая дольше медианы, ожидается к p90."""
+    estimator = _estimator(depth=0, wait_count=0, p50_ms=2000, p90_ms=20000)
+    dequeued_at = datetime.now(timezone.utc) - timedelta(seconds=5)
+    estimate = estimator.estimate("calc_hash", dequeued_at)
+
+    assert estimate["estimated_start"] == dequeued_at
+    assert estimate["estimated_completion"] == dequeued_at + timedelta(seconds=20)
+    assert 14 <= estimate["retry_after"] <= 15
+
+
+def test_no_estimate_without_workers():
+    """Очередь не разбирается — оценки нет, опрос раз в max_retry_after."""
+    estimator = _estimator(depth=10, wait_count=0, p50_ms=None)
+    estimate = estimator.estimate("calc_hash")
+    assert estimate == {"estimated_start": None, "estimated_completion": None, "retry_after": 60}
+    assert estimator.estimate("unknown")["retry_after"] == 60
@@ -28,9 +28,10 @@ def test_submit_task_invalid_data(test_client):
     )
     assert response.status_code == 422
 
-def test_task_info_success(test_client):
+def test_task_info_success(test_client, mock_redis):
     """Успешное получение информации о задаче через /taskinfo."""
     task_id = uuid4()
+    mock_redis.get_task.return_value = None  # RedisQueue.get_task: TaskInfo или None
     response = test_client.get(
         f"/taskinfo?taskid={task_id}",
         headers={"Authorization": "Bearer test"}
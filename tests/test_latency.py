@@ -0,0 +1,75 @@
+# tests/test_latency.py
+
+"""
+Unit-тесты для гистограмм задержек задач по типам.
+"""
+
+from unittest.mock import MagicMock
+
+from app.queue.latency import LatencyStats, latency_key
+from app.queue.sharding import ShardRing
+
+
+def test_record_increments_bucket_of_interval():
+    """Длительность попадает в корзину гистограммы интервала с TTL retention."""
+    client = MagicMock()
+    stats = LatencyStats(ShardRing([client]), bucket_seconds=60, retention=3600)
+    stats.record("calc_hash", "queue_wait", 0.2, at=1000.0)
+
+    key = latency_key("calc_hash", "queue_wait", 960)
+    pipe = client.pipeline.return_value
+    pipe.hincrby.assert_any_call(key, "count", 1)
+    pipe.hincrby.assert_any_call(key, "sum_ms", 200)
+    pipe.hincrby.assert_any_call(key, "le_250", 1)
+    pipe.expire.assert_called_once_with(key, 3660)
+
+
+def test_record_many_one_pipeline_per_shard():
+    """Замеры пачки пишутся одним конвейером; замеры одного интервала складываются."""
+    client = MagicMock()
+    stats = LatencyStats(ShardRing([client]), bucket_seconds=60, retention=3600)
+    stats.record_many([("calc_hash", "processing", 0.2, 1000.0),
+                       ("calc_hash", "processing", 0.04, 1010.0),
+                       ("calc_hash", "queue_wait", 1.5, 1010.0)])
+
+    client.pipeline.assert_called_once_with(transaction=False)
+    pipe = client.pipeline.return_value
+    pipe.execute.assert_called_once()
+    key = latency_key("calc_hash", "processing", 960)
+    pipe.hincrby.assert_any_call(key, "count", 2)
+    pipe.hincrby.assert_any_call(key, "sum_ms", 240)
+    pipe.hincrby.assert_any_call(key, "le_250", 1)
+    pipe.hincrby.assert_any_call(key, "le_50", 1)
+    assert pipe.expire.call_count == 2
+
+
+def test_summary_merges_intervals_and_estimates_percentiles():
+    """Сводка складывает интервалы окна; перцентили интерполируются внутри корзин."""
+    client = MagicMock()
+    interval = {b"count": b"50", b"sum_ms": b"5000", b"le_50": b"25", b"le_250": b"25"}
+    # Окно из двух интервалов: queue_wait (2 ключа), затем processing (2 ключа)
+    client.pipeline.return_value.execute.return_value = [interval, interval, {}, {}]
+    stats = LatencyStats(ShardRing([client]), bucket_seconds=60, retention=3600)
+
+    report = stats.summary(["calc_hash"], window=120)["calc_hash"]
+    wait = report["queue_wait"]
+    assert report["processing"]["count"] == 0
+    assert wait["count"] == 100
+    assert wait["rate_per_minute"] == 50.0
+    assert wait["mean_ms"] == 100.0
+    assert wait["p50_ms"] == 50.0
+    assert wait["p90_ms"] == 220.0  # корзина (100, 250]: 100 + 150 * (90 - 50) / 50
+    assert wait["histogram"]["50"] == 50
+    assert wait["histogram"]["250"] == 100
+    assert wait["histogram"]["+Inf"] == 100
+
+
+def test_summary_without_data():
+    """Без замеров показатели пустые, окно ограничено сроком хранения."""
+    client = MagicMock()
+    client.pipeline.return_value.execute.return_value = [{}] * 4
+    stats = LatencyStats(ShardRing([client]), bucket_seconds=60, retention=120)
+    processing = stats.summary(["calc_hash"], window=3600)["calc_hash"]["processing"]
+    assert processing["count"] == 0
+    assert processing["p99_ms"] is None and processing["mean_ms"] is None
+    assert client.pipeline.return_value.hgetall.call_count == 4
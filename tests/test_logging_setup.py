@@ -0,0 +1,80 @@
+# tests/test_logging_setup.py
+
+"""
+Unit-тесты для настройки логирования.
+Проверяются структурированный JSON-формат, выборка массовых событий
+и отложенное форматирование сообщений ниже порога уровня.
+"""
+
+import json
+from loguru import logger
+from app.logging.setup import setup_logging, make_sampling_filter
+
+
+def logging_config(tmp_path, **options) -> dict:
+    """Конфигурация логирования с файлом во временной директории."""
+    config = {
+        "level": "INFO",
+        "log_file": str(tmp_path / "app.log"),
+        "rotation": {"when": "1 day", "backupCount": 1}
+    }
+    config.update(options)
+    return {"logging": config}
+
+
+def read_lines(tmp_path) -> list:
+    """Дожидается записи очереди Loguru и читает строки лога."""
+    logger.complete()
+    return (tmp_path / "app.log").read_text(encoding="utf-8").splitlines()
+
+
+def test_json_format_contains_structured_fields(tmp_path):
+    """В режиме json поля события записываются отдельными ключами."""
+    setup_logging(logging_config(tmp_path, format="json"))
+    logger.info("Task {task_uuid} enqueued", task_uuid="u1", client_id="c1",
+                type="calc_hash", latency_ms=1.5)
+    logger.remove()
+
+    entry = json.loads(read_lines(tmp_path)[-1])
+    assert entry["message"] == "Task u1 enqueued"
+    assert entry["task_uuid"] == "u1"
+    assert entry["client_id"] == "c1"
+    assert entry["type"] == "calc_hash"
+    assert entry["latency_ms"] == 1.5
+
+
+def test_sampling_filter():
+    """Фильтр выборки пропускает обычные записи и отбрасывает массовые при rate=0."""
+    assert make_sampling_filter(1.0) is None
+    drop_all = make_sampling_filter(0.0)
+    assert drop_all({"extra": {}}) is True
+    assert drop_all({"extra": {"sampled": True}}) is False
+
+
+def test_sampled_events_dropped(tmp_path):
+    """Массовые события с sample_rate=0 не пишутся, остальные пишутся."""
+    setup_logging(logging_config(tmp_path, sample_rate=0.0))
+    logger.info("per-request event", sampled=True)
+    logger.info("regular event")
+    logger.remove()
+
+    lines = read_lines(tmp_path)
+    assert not any("per-request event" in line for line in lines)
+    assert any("regular event" in line for line in lines)
+
+
+def test_message_not_formatted_below_level(tmp_path):
+    """Аргументы сообщения ниже порога уровня не форматируются."""
+    setup_logging(logging_config(tmp_path))
+
+    class Expensive:
+        """Объект, фиксирующий попытку форматирования."""
+        formatted = False
+
+        def __format__(self, spec):
+            Expensive.formatted = True
+            return "expensive"
+
+    logger.debug("value {value}", value=Expensive())
+    logger.remove()
+    assert Expensive.formatted is False
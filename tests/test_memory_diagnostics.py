@@ -0,0 +1,99 @@
+# tests/test_memory_diagnostics.py
+
+"""
+Unit-тесты для диагностики памяти процесса.
+"""
+
+from datetime import datetime, timedelta, timezone
+import pytest
+from loguru import logger
+
+from app.api.models import TaskInput
+from app.diagnostics.memory import MAX_SNAPSHOTS, MemoryTracer, ProcessSampler
+from app.diagnostics.memory import live_model_counts, logger_backlog
+
+
+@pytest.fixture
+def tracer():
+    """Трассировщик, выключаемый после теста."""
+    memory_tracer = MemoryTracer()
+    yield memory_tracer
+    memory_tracer.stop()
+
+
+def test_snapshot_requires_tracing(tracer):
+    """Без включённой трассировки снимок не снимается."""
+    with pytest.raises(RuntimeError):
+        tracer.snapshot()
+
+
+def test_diff_shows_allocation_site(tracer):
+    """Разница снимков указывает на строку, удерживающую выделенную память."""
+    tracer.start()
+    first = tracer.snapshot()["id"]
+    retained = [bytearray(1024) for _ in range(200)]
+    result = tracer.diff(first, top=5)
+
+    assert result["first"] == first and result["second"] == first + 1
+    top = result["entries"][0]
+    assert top["location"].startswith(__file__)
+    assert top["size_diff"] >= 200 * 1024
+    assert top["count_diff"] >= 200
+    del retained
+
+
+def test_old_snapshots_are_evicted(tracer):
+    """Хранятся только MAX_SNAPSHOTS последних снимков; stop удаляет все."""
+    tracer.start()
+    ids = [tracer.snapshot()["id"] for _ in range(MAX_SNAPSHOTS + 1)]
+    assert tracer.snapshot_ids == ids[1:]
+    with pytest.raises(KeyError):
+        tracer.diff(ids[0], ids[-1])
+
+    tracer.stop()
+    assert not tracer.tracing
+    assert tracer.snapshot_ids == []
+
+
+def test_rss_growth_per_hour():
+    """Скорость роста RSS считается по первому и последнему замеру истории."""
+    sampler = ProcessSampler(history=3)
+    assert sampler.rss_growth_per_hour() is None
+
+    now = datetime.now(timezone.utc)
+    for minutes, rss in ((0, 100), (30, 150), (60, 400)):
+        sampler.history.append({"time": now + timedelta(minutes=minutes), "rss_bytes": rss})
+    assert sampler.rss_growth_per_hour() == 300
+
+    reading = sampler.sample()
+    assert reading["rss_bytes"] > 0
+    assert len(sampler.history) == 3
+
+
+def test_sampler_thread_records_readings():
+    """Фоновый поток сразу делает первый замер и останавливается по stop."""
+    sampler = ProcessSampler(interval=60)
+    sampler.start()
+    sampler.stop()
+    assert len(sampler.history) == 1
+
+
+def test_live_model_counts():
+    """Живые экземпляры моделей учитываются по имени класса."""
+    before = live_model_counts().get("TaskInput", 0)
+    inputs = [TaskInput(ExternalId=str(i), type="calc_hash", upload={}) for i in range(5)]
+    assert live_model_counts()["TaskInput"] - before == 5
+    del inputs
+
+
+def test_logger_backlog_reports_enqueue_handlers():
+    """Обработчик с enqueue=True попадает в отчёт, обычный — нет."""
+    plain = logger.add(lambda message: None, format="{message}")
+    queued = logger.add(lambda message: None, format="{message}", enqueue=True)
+    try:
+        backlog = logger_backlog()
+        assert len(backlog) == 1
+        assert all(size >= 0 for size in backlog.values())
+    finally:
+        logger.remove(queued)
+        logger.remove(plain)
@@ -0,0 +1,38 @@
+# tests/test_memory_sampler.py
+
+"""
+Unit-тесты для выборочной оценки памяти задач в Redis.
+"""
+
+from unittest.mock import MagicMock
+
+from app.queue.memory_sampler import TaskMemorySampler
+from app.queue.sharding import ShardRing
+
+
+def test_sample_estimates_memory_per_type_and_status():
+    """Доля группы в выборке масштабируется на DBSIZE, размер — по MEMORY USAGE."""
+    client = MagicMock()
+    pipe = client.pipeline.return_value
+    pipe.execute.side_effect = [
+        [1000, b"task:1", b"task:2", b"calc_hash_INPUT", b"task:3"],
+        [500, [b'"calc_hash"', b'"done"'],
+         700, [b'"calc_hash"', b'"done"'],
+         None, [None, None]],  # ключ удалён между RANDOMKEY и чтением
+    ]
+    sampler = TaskMemorySampler(ShardRing([client]), sample_size=4)
+    report = sampler.sample()
+
+    assert report["groups"] == [{"type": "calc_hash", "status": "done", "tasks": 500,
+                                 "bytes": 300000, "avg_bytes": 600}]
+    assert report["tasks"] == 500
+    assert sampler.report is report
+    pipe.memory_usage.assert_any_call(b"task:1")
+
+
+def test_sample_skips_empty_shard():
+    """Пустой шард не даёт вклада в оценку."""
+    client = MagicMock()
+    client.pipeline.return_value.execute.side_effect = [[0, None, None]]
+    report = TaskMemorySampler(ShardRing([client]), sample_size=2).sample()
+    assert report["tasks"] == 0 and report["groups"] == []
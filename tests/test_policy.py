@@ -0,0 +1,58 @@
+# tests/test_policy.py
+
+"""
+Unit-тесты для политики доступа (RBAC).
+Проверяются компиляция правил, шаблоны "*" и отклонение некорректных правил.
+"""
+
+import pytest
+from app.auth.policy import AccessPolicy, DEFAULT_POLICY
+
+
+@pytest.fixture(name="policy")
+def policy_fixture():
+    """Политика с точными и шаблонными правилами."""
+    return AccessPolicy({
+        "admin": {"*": ["*"]},
+        "service": {"submit": ["calc_hash"], "taskinfo": ["*"]},
+        "reader": {"*": ["resize_image"]}
+    }, task_types=["calc_hash", "resize_image"])
+
+
+def test_exact_rule(policy):
+    """Точное правило (роль, эндпоинт, тип) разрешает доступ."""
+    assert policy.is_allowed("service", "submit", "calc_hash") is True
+    assert policy.is_allowed("service", "submit", "resize_image") is False
+
+
+def test_wildcard_rules(policy):
+    """Шаблон "*" для эндпоинта или типа задачи разрешает любое значение."""
+    assert policy.is_allowed("admin", "taskinfo", "resize_image") is True
+    assert policy.is_allowed("service", "taskinfo", "resize_image") is True
+    assert policy.is_allowed("reader", "submit", "resize_image") is True
+    assert policy.is_allowed("reader", "submit", "calc_hash") is False
+
+
+def test_endpoint_level_check(policy):
+    """Без типа задачи проверяется доступ к эндпоинту хотя бы для одного типа."""
+    assert policy.is_allowed("service", "taskinfo") is True
+    assert policy.is_allowed("reader", "taskinfo") is True
+    assert policy.is_allowed("unknown", "submit") is False
+
+
+def test_unknown_endpoint_rejected():
+    """Правило для неизвестного эндпоинта отклоняется при компиляции."""
+    with pytest.raises(ValueError, match="Unknown endpoint"):
+        AccessPolicy({"service": {"submit_task": ["calc_hash"]}})
+
+
+def test_unknown_task_type_rejected():
+    """Правило для неизвестного типа задачи отклоняется при компиляции."""
+    with pytest.raises(ValueError, match="Unknown task type"):
+        AccessPolicy({"service": {"submit": ["water_marks"]}}, task_types=["calc_hash"])
+
+
+def test_default_policy_compiles():
+    """Политика по умолчанию совместима с типами задач по умолчанию."""
+    policy = AccessPolicy(DEFAULT_POLICY, task_types=["calc_hash", "resize_image"])
+    assert policy.is_allowed("copytrust_site", "submit", "calc_hash") is True
@@ -0,0 +1,59 @@
+# tests/test_profiler.py
+
+"""
+Unit-тесты для выборочного профилировщика CPU.
+"""
+
+import threading
+import pytest
+
+from app.diagnostics.profiler import ProfileInProgressError, SamplingProfiler
+
+
+def busy_loop(stop: threading.Event) -> None:
+    """Нагружает CPU до установки stop."""
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profile_finds_busy_function():
+    """Функция, занимающая CPU в другом потоке, попадает в top и collapsed stacks."""
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+    thread.start()
+    try:
+        report = SamplingProfiler(interval=0.001).profile(0.2, top=5)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert report["samples"] > 0
+    assert any(row["function"].startswith("busy_loop") for row in report["top"])
+    assert any(line.startswith("busy;") and "busy_loop" in line
+               for line in report["collapsed"].splitlines())
+
+
+def test_only_one_session_at_a_time():
+    """Второй сеанс во время первого отклоняется."""
+    profiler = SamplingProfiler(interval=0.001)
+    started = threading.Event()
+    original = profiler._sample
+
+    def slow_sample(seconds, include_idle):
+        started.set()
+        return original(seconds, include_idle)
+
+    profiler._sample = slow_sample
+    thread = threading.Thread(target=profiler.profile, args=(0.3,))
+    thread.start()
+    started.wait()
+    with pytest.raises(ProfileInProgressError):
+        profiler.profile(0.1)
+    thread.join()
+    assert not profiler.running
+
+
+def test_profile_rejects_too_long_session():
+    """Длительность больше max_seconds отклоняется."""
+    with pytest.raises(ValueError):
+        SamplingProfiler(max_seconds=10).profile(11)
@@ -0,0 +1,57 @@
+# tests/test_queue_factory.py
+
+"""
+Тесты сборки RedisQueue по конфигурации (общей для API и воркеров).
+"""
+
+import pytest
+
+from app.api.task_types import TaskTypeRegistry
+from app.queue import factory
+from app.queue.factory import create_redis_queue, with_password
+
+
+@pytest.fixture(name="clients")
+def clients_fixture(monkeypatch):
+    """create_redis_client подменён на fakeredis: URL → клиенты (запросы и dequeue)."""
+    fakeredis = pytest.importorskip("fakeredis")
+    clients = {}
+
+    def create_redis_client(url, pool_config=None, blocking=False):
+        client = fakeredis.FakeRedis()
+        clients.setdefault(url, []).append((client, blocking))
+        return client
+
+    monkeypatch.setattr(factory, "create_redis_client", create_redis_client)
+    return clients
+
+
+def test_with_password():
+    """Пароль из секретов подставляется в URL; пустой пароль URL не меняет."""
+    assert with_password("redis://redis:6379/0", "s3cret") == "redis://:s3cret@redis:6379/0"
+    assert with_password("redis://redis:6379/0", "") == "redis://redis:6379/0"
+
+
+def test_queue_from_config(clients):
+    """Очередь получает шарды, пулы dequeue, гистограммы задержек и TTL статусов типов."""
+    registry = TaskTypeRegistry({"calc_hash": {"ttl": 60, "status_ttl": {"done": 600}}})
+    config = {"queue": {"url": "redis://a:6379", "shards": ["redis://a:6379", "redis://b:6379"],
+                        "latency_stats": {"bucket_seconds": 30}}}
+    queue = create_redis_queue(config, {"redis": {"password": "pw"}}, registry)
+
+    assert sorted(clients) == ["redis://:pw@a:6379", "redis://:pw@b:6379"]
+    assert [blocking for _, blocking in clients["redis://:pw@a:6379"]] == [False, True]
+    assert len(queue.shards) == 2 and len(queue.dequeue_clients) == 2
+    assert queue.latency_stats.bucket_seconds == 30
+    assert queue.ttl_policy("calc_hash", "done") == 600
+    assert queue.task_cache is None and queue.blob_store is None
+
+
+def test_optional_components_disabled(clients):
+    """latency_stats отключаются настройкой; кэш задач создаётся только по запросу (API)."""
+    registry = TaskTypeRegistry({"calc_hash": {}})
+    config = {"queue": {"url": "redis://a:6379", "latency_stats": {"enabled": False},
+                        "task_cache": {"enabled": True}}}
+    assert create_redis_queue(config, {}, registry).latency_stats is None
+    assert create_redis_queue(config, {}, registry).task_cache is None
+    assert create_redis_queue(config, {}, registry, task_cache=True).task_cache is not None
@@ -5,10 +5,13 @@ Unit-тесты для RedisQueue.
 Проверяются сценарии сохранения, извлечения, обновления и работы с очередями Redis.
 """
 
+from unittest.mock import MagicMock
 from uuid import uuid4
 import json
 import pytest
-from app.queue.redis_queue import RedisQueue
+from app.queue.redis_queue import CANCELLED_KEY, RedisQueue
+from app.queue.task_cache import TerminalTaskCache
+from app.storage.blob_store import FileBlobStore, parse_ref
 from app.api.models import TaskStatus, TaskType
 
 
@@ -75,7 +78,7 @@ def test_update_task(mock_redis):
     """Проверка: обновление задачи вызывает hset с правильным mapping."""
     queue = RedisQueue(client=mock_redis)
     queue.update_task(uuid4(), {"status": "done"})
-    mock_redis.hset.assert_called_once()
+    mock_redis.pipeline.return_value.hset.assert_called_once()
 
 
 def test_update_task_multiple_fields(mock_redis):
@@ -84,26 +87,81 @@ def test_update_task_multiple_fields(mock_redis):
     task_id = uuid4()
     updates = {"status": "done", "message": "OK", "code": 0}
     queue.update_task(task_id, updates)
-    mock_redis.hset.assert_called_once()
-    _, kwargs = mock_redis.hset.call_args
+    pipe = mock_redis.pipeline.return_value
+    pipe.hset.assert_called_once()
+    _, kwargs = pipe.hset.call_args
     assert "mapping" in kwargs
     assert json.loads(kwargs["mapping"]["status"]) == "done"
 
 
 def test_enqueue(mock_redis):
-    """Проверка: UUID задачи помещается в очередь Redis."""
+    """Проверка: UUID задачи помещается в очередь Redis вместе с отметкой enqueued_at."""
     queue = RedisQueue(client=mock_redis)
     task_id = uuid4()
     queue.enqueue("queue_in", task_id)
-    mock_redis.lpush.assert_called_once_with("queue_in", task_id)
+    pipe = mock_redis.pipeline.return_value
+    pipe.lpush.assert_called_once_with("queue_in", str(task_id))
+    key, field, _ = pipe.hset.call_args.args
+    assert (key, field) == (f"task:{task_id}", "enqueued_at")
 
 
 def test_dequeue_returns_uuid(mock_redis):
-    """Проверка: brpop возвращает UUID задачи в виде строки."""
+    """Проверка: brpop возвращает UUID задачи в виде строки, задаче ставится dequeued_at."""
     queue = RedisQueue(client=mock_redis)
     mock_redis.brpop.return_value = ("queue", b"uuid-123")
+    mock_redis.pipeline.return_value.execute.return_value = [0, 1, [b'"calc_hash"', None]]
     uuid = queue.dequeue("queue")
     assert uuid == "uuid-123"
+    pipe = mock_redis.pipeline.return_value
+    assert pipe.hset.call_args.args[:2] == ("task:uuid-123", "dequeued_at")
+    mock_redis.delete.assert_not_called()
+
+
+def test_dequeue_expired_task_removes_stamp(mock_redis):
+    """Отметка dequeued_at задачи, удалённой по TTL, не оставляет пустой записи."""
+    queue = RedisQueue(client=mock_redis)
+    mock_redis.brpop.return_value = ("queue", b"uuid-123")
+    mock_redis.pipeline.return_value.execute.return_value = [0, 1, [None, None]]
+    assert queue.dequeue("queue") == "uuid-123"
+    mock_redis.delete.assert_called_once_with("task:uuid-123")
+
+
+def test_dequeue_records_queue_wait(mock_redis):
+    """Ожидание в очереди (от enqueued_at до dequeued_at) учитывается по типу задачи."""
+    stats = MagicMock()
+    queue = RedisQueue(client=mock_redis, latency_stats=stats)
+    mock_redis.brpop.return_value = ("queue", b"uuid-123")
+    enqueued = json.dumps("2024-01-01T00:00:00+00:00").encode()
+    mock_redis.pipeline.return_value.execute.return_value = [0, 1, [b'"calc_hash"', enqueued]]
+    queue.dequeue("queue")
+
+    (task_type, metric, seconds, _), = stats.record_many.call_args.args[0]
+    assert (task_type, metric) == ("calc_hash", "queue_wait")
+    assert seconds > 0
+
+
+def test_update_task_terminal_status_sets_processed_at(mock_redis):
+    """Переход в конечный статус ставит processed_at/processed и учитывает время обработки."""
+    stats = MagicMock()
+    queue = RedisQueue(client=mock_redis, latency_stats=stats)
+    dequeued = json.dumps("2024-01-01T00:00:00+00:00").encode()
+    pipe = mock_redis.pipeline.return_value
+    pipe.execute.return_value = [1, 2, 0, [b'"calc_hash"', dequeued]]
+    task_id = uuid4()
+    queue.update_task(task_id, {"status": TaskStatus.DONE, "message": "OK"})
+
+    mapping = pipe.hset.call_args.kwargs["mapping"]
+    assert mapping["processed"] == mapping["processed_at"]
+    # Доставка webhook ставится в той же транзакции
+    schedule = mock_redis.register_script.return_value
+    assert schedule.call_args.kwargs["keys"] == ["webhooks:due", f"task:{task_id}"]
+    assert schedule.call_args.kwargs["client"] is pipe
+    assert stats.record_many.call_args.args[0][0][:2] == ("calc_hash", "processing")
+
+    stats.reset_mock()
+    queue.update_task(uuid4(), {"status": "pending"})
+    assert "processed_at" not in pipe.hset.call_args.kwargs["mapping"]
+    stats.record_many.assert_not_called()
 
 
 def test_dequeue_empty_queue_returns_none(mock_redis):
@@ -112,3 +170,371 @@ def test_dequeue_empty_queue_returns_none(mock_redis):
     mock_redis.brpop.return_value = None
     uuid = queue.dequeue("queue")
     assert uuid is None
+
+
+def test_dequeue_uses_separate_client(mock_redis):
+    """Блокирующий BRPOP выполняется через отдельный клиент (пул) dequeue."""
+    dequeue_client = MagicMock()
+    dequeue_client.brpop.return_value = ("queue", b"uuid-123")
+    mock_redis.pipeline.return_value.execute.return_value = [0, 1, [b'"calc_hash"', None]]
+    queue = RedisQueue(client=mock_redis, dequeue_clients=[dequeue_client])
+    assert queue.dequeue("queue", timeout=5) == "uuid-123"
+    dequeue_client.brpop.assert_called_once_with("queue", timeout=5)
+    mock_redis.brpop.assert_not_called()
+
+
+def test_submit_task_writes_task_indexes_and_queue_in_one_transaction(mock_redis):
+    """Задача, индексы клиента и очередь записываются одним MULTI/EXEC."""
+    queue = RedisQueue(client=mock_redis)
+    task_id = uuid4()
+    data = {"uuid": str(task_id), "type": "calc_hash", "status": "created",
+            "created": "2024-01-01T00:00:00+00:00", "ExternalId": "X1", "client_id": "c1"}
+    queue.submit_task(task_id, data, "calc_hash_INPUT", ttl_seconds=100)
+
+    mock_redis.pipeline.assert_called_once_with(transaction=True)
+    pipe = mock_redis.pipeline.return_value
+    pipe.zadd.assert_called_once_with("tasks:client:c1:calc_hash", {str(task_id): 1704067200.0})
+    pipe.expire.assert_any_call("tasks:client:c1:calc_hash", 100)
+    pipe.set.assert_called_once_with("tasks:ext:c1:X1", str(task_id), ex=100)
+    pipe.lpush.assert_called_once_with("calc_hash_INPUT", str(task_id))
+    pipe.execute.assert_called_once()
+
+
+def test_submit_task_index_ttl_covers_longest_status_ttl(mock_redis):
+    """Записи индексов живут по наибольшему TTL статусов, а не по TTL created."""
+    queue = RedisQueue(client=mock_redis)
+    task_id = uuid4()
+    data = {"type": "calc_hash", "created": "2024-01-01T00:00:00+00:00", "ExternalId": "X1",
+            "client_id": "c1"}
+    queue.submit_task(task_id, data, "calc_hash_INPUT", ttl_seconds=100, index_ttl=900)
+
+    pipe = mock_redis.pipeline.return_value
+    pipe.expire.assert_any_call(f"task:{task_id}", 100)
+    pipe.expire.assert_any_call("tasks:client:c1:calc_hash", 900)
+    pipe.zremrangebyscore.assert_called_once_with("tasks:client:c1:calc_hash", "-inf",
+                                                  f"({1704067200.0 - 900}")
+    pipe.set.assert_called_once_with("tasks:ext:c1:X1", str(task_id), ex=900)
+
+
+def test_status_ttl_applied_by_stored_type():
+    """TTL статуса применяется и к обновлению без типа — по типу, сохранённому в задаче."""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    client = fakeredis.FakeRedis()
+    ttls = {("calc_hash", "done"): 600, ("calc_hash", "error"): 900}
+    queue = RedisQueue(client=client, ttl_policy=lambda task_type, status:
+                       ttls.get((task_type, status), 100), task_types=["calc_hash"])
+    for task_uuid in ("a", "b"):
+        queue.save_task(task_uuid, {"status": TaskStatus.CREATED, "type": "calc_hash"},
+                        ttl_seconds=100)
+
+    queue.update_task("a", {"status": TaskStatus.DONE})
+    queue.complete_tasks([("b", {"status": TaskStatus.ERROR}, None)])
+    assert 500 < client.ttl("task:a") <= 600
+    assert 800 < client.ttl("task:b") <= 900
+
+    queue.update_task("a", {"message": "re-checked"})
+    assert 500 < client.ttl("task:a") <= 600
+
+
+def _raw_task(task_id, status="done"):
+    """Hash задачи в том виде, в котором он хранится в Redis."""
+    return {b"uuid": json.dumps(str(task_id)).encode(), b"type": b'"calc_hash"',
+            b"status": json.dumps(status).encode(), b"code": b"0", b"message": b'"OK"'}
+
+
+def test_list_tasks_merges_indexes_and_paginates(mock_redis):
+    """Индексы типов объединяются по времени; курсор указывает на последнюю задачу страницы."""
+    first, second, third = uuid4(), uuid4(), uuid4()
+    pipe = mock_redis.pipeline.return_value
+    pipe.execute.side_effect = [
+        [[(str(first).encode(), 30.0), (str(third).encode(), 10.0)],
+         [(str(second).encode(), 20.0)]],
+        [_raw_task(first), _raw_task(second)],
+    ]
+    queue = RedisQueue(client=mock_redis)
+    tasks, cursor = queue.list_tasks("c1", ["calc_hash", "resize_image"], limit=2)
+
+    assert [task.uuid for task in tasks] == [first, second]
+    assert cursor == "20.0"
+    pipe.zrevrangebyscore.assert_any_call("tasks:client:c1:calc_hash", "+inf", "-inf",
+                                          start=0, num=2, withscores=True)
+
+
+def test_list_tasks_skips_expired_and_filters_status(mock_redis):
+    """Задачи, удалённые по TTL, и задачи с другим статусом пропускаются."""
+    done, pending, expired = uuid4(), uuid4(), uuid4()
+    pipe = mock_redis.pipeline.return_value
+    pipe.execute.side_effect = [
+        [[(str(done).encode(), 3.0), (str(expired).encode(), 2.0), (str(pending).encode(), 1.0)]],
+        [_raw_task(done), {}, _raw_task(pending, "pending")],
+    ]
+    queue = RedisQueue(client=mock_redis)
+    tasks, cursor = queue.list_tasks("c1", ["calc_hash"], limit=5, cursor="10", status="done")
+
+    assert [task.uuid for task in tasks] == [done]
+    assert cursor is None
+    pipe.zrevrangebyscore.assert_called_once_with("tasks:client:c1:calc_hash", "(10", "-inf",
+                                                  start=0, num=20, withscores=True)
+
+
+def test_find_by_external_id(mock_redis):
+    """UUID задачи находится по (client_id, ExternalId)."""
+    mock_redis.get.return_value = b"uuid-1"
+    queue = RedisQueue(client=mock_redis)
+    assert queue.find_by_external_id("c1", "X1") == "uuid-1"
+    mock_redis.get.assert_called_once_with("tasks:ext:c1:X1")
+
+
+def test_get_task_terminal_state_cached(mock_redis):
+    """Задача в конечном статусе читается из Redis один раз, затем из локального кэша."""
+    task_id = uuid4()
+    pipe = mock_redis.pipeline.return_value
+    pipe.execute.return_value = [_raw_task(task_id), 60000]
+    queue = RedisQueue(client=mock_redis, task_cache=TerminalTaskCache())
+
+    first = queue.get_task(task_id)
+    second = queue.get_task(task_id)
+    assert second is first
+    pipe.execute.assert_called_once()
+    assert queue.task_cache.hits == 1
+
+
+def test_get_task_non_terminal_state_not_cached(mock_redis):
+    """Задача в промежуточном статусе всегда читается из Redis."""
+    task_id = uuid4()
+    pipe = mock_redis.pipeline.return_value
+    pipe.execute.return_value = [_raw_task(task_id, "pending"), 60000]
+    queue = RedisQueue(client=mock_redis, task_cache=TerminalTaskCache())
+
+    queue.get_task(task_id)
+    queue.get_task(task_id)
+    assert pipe.execute.call_count == 2
+    assert len(queue.task_cache) == 0
+
+
+def test_update_task_invalidates_cache(mock_redis):
+    """Обновление задачи удаляет её из локального кэша."""
+    task_id = uuid4()
+    pipe = mock_redis.pipeline.return_value
+    pipe.execute.return_value = [_raw_task(task_id), 60000]
+    queue = RedisQueue(client=mock_redis, task_cache=TerminalTaskCache())
+
+    queue.get_task(task_id)
+    queue.update_task(task_id, {"message": "re-checked"})
+    queue.get_task(task_id)
+    assert pipe.hgetall.call_count == 2
+
+
+def test_update_task_increments_version(mock_redis):
+    """Обновление задачи атомарно увеличивает её счётчик версий (для ETag)."""
+    queue = RedisQueue(client=mock_redis)
+    task_id = uuid4()
+    queue.update_task(task_id, {"status": "done"})
+    mock_redis.pipeline.assert_called_once_with(transaction=True)
+    mock_redis.pipeline.return_value.hincrby.assert_called_once_with(f"task:{task_id}", "version", 1)
+
+
+def test_large_result_offloaded_to_blob_store(mock_redis, tmp_path):
+    """Крупный result сохраняется в хранилище blob-объектов, в hash остаётся ссылка."""
+    store = FileBlobStore(str(tmp_path))
+    queue = RedisQueue(client=mock_redis, blob_store=store, offload_threshold=100)
+    result = {"image": "x" * 200}
+    queue.update_task(uuid4(), {"status": "done", "result": result, "message": "OK"})
+
+    mapping = mock_redis.pipeline.return_value.hset.call_args.kwargs["mapping"]
+    ref = json.loads(mapping["result"])
+    assert json.loads(store.read(parse_ref(ref))) == result
+    assert json.loads(mapping["message"]) == "OK"
+
+
+def test_update_task_applies_status_ttl_in_same_transaction(mock_redis):
+    """При смене статуса TTL по политике типа задаётся в той же транзакции."""
+    policy = MagicMock(return_value=600)
+    queue = RedisQueue(client=mock_redis, ttl_policy=policy)
+    task_id = uuid4()
+    queue.update_task(task_id, {"status": TaskStatus.DONE}, task_type="calc_hash")
+
+    policy.assert_called_once_with("calc_hash", "done")
+    mock_redis.pipeline.assert_called_once_with(transaction=True)
+    pipe = mock_redis.pipeline.return_value
+    pipe.expire.assert_called_once_with(f"task:{task_id}", 600)
+    pipe.execute.assert_called_once()
+
+
+def test_update_task_without_status_keeps_ttl(mock_redis):
+    """Обновление без смены статуса не меняет TTL."""
+    policy = MagicMock(return_value=600)
+    queue = RedisQueue(client=mock_redis, ttl_policy=policy)
+    queue.update_task(uuid4(), {"message": "50%"}, task_type="calc_hash")
+    policy.assert_not_called()
+    mock_redis.pipeline.return_value.expire.assert_not_called()
+
+
+def test_dequeue_batch_pops_without_waiting(mock_redis):
+    """Пачка забирается RPOP с count; dequeued_at ставится одной транзакцией."""
+    queue = RedisQueue(client=mock_redis)
+    mock_redis.rpop.return_value = [b"u1", b"u2"]
+    pipe = mock_redis.pipeline.return_value
+    pipe.execute.return_value = [0, 1, [b'"calc_hash"', None], 1, [b'"calc_hash"', None]]
+
+    assert queue.dequeue_batch("queue", 5, timeout=1) == ["u1", "u2"]
+    mock_redis.rpop.assert_called_once_with("queue", 5)
+    mock_redis.pipeline.assert_called_once_with(transaction=True)
+    assert pipe.hset.call_count == 2
+    mock_redis.brpop.assert_not_called()
+
+
+def test_dequeue_batch_waits_when_empty(mock_redis):
+    """Пустая очередь — ожидание одной задачи через BRPOP."""
+    queue = RedisQueue(client=mock_redis)
+    mock_redis.rpop.return_value = None
+    mock_redis.brpop.return_value = None
+    assert queue.dequeue_batch("queue", 5, timeout=1) == []
+    mock_redis.brpop.assert_called_once_with("queue", timeout=1)
+
+
+def test_load_tasks_resolves_offloaded_upload(mock_redis, tmp_path):
+    """load_tasks читает задачи конвейером и подставляет upload из blob_store."""
+    store = FileBlobStore(str(tmp_path))
+    queue = RedisQueue(client=mock_redis, blob_store=store, offload_threshold=10)
+    upload = {"data": "x" * 50}
+    encoded = queue._encode({"upload": upload, "type": "calc_hash"})  # pylint: disable=protected-access
+    pipe = mock_redis.pipeline.return_value
+    pipe.execute.return_value = [{k.encode(): v.encode() for k, v in encoded.items()}, {}]
+
+    tasks = queue.load_tasks(["u1", "gone"])
+    assert tasks == {"u1": {"upload": upload, "type": "calc_hash"}}
+    mock_redis.pipeline.assert_called_once_with(transaction=False)
+
+
+def test_update_tasks_single_transaction(mock_redis):
+    """Несколько обновлений — одна транзакция на шард; время обработки учитывается по каждой."""
+    stats = MagicMock()
+    queue = RedisQueue(client=mock_redis, latency_stats=stats)
+    dequeued = json.dumps("2024-01-01T00:00:00+00:00").encode()
+    pipe = mock_redis.pipeline.return_value
+    pipe.execute.return_value = [1, 2, 1, 2, 0, [b'"calc_hash"', dequeued]]
+    queue.update_tasks([("u1", {"status": "pending"}, "calc_hash"),
+                        ("u2", {"status": "done", "result": {}}, "calc_hash")])
+
+    mock_redis.pipeline.assert_called_once_with(transaction=True)
+    pipe.execute.assert_called_once()
+    assert pipe.hset.call_count == 2
+    (sample,), = stats.record_many.call_args.args
+    stats.record_many.assert_called_once()
+    assert sample[:2] == ("calc_hash", "processing")
+
+
+def test_complete_tasks_single_script_call(mock_redis):
+    """Пакет обновлений — один вызов скрипта на шард; итоги возвращаются по задачам."""
+    stats = MagicMock()
+    queue = RedisQueue(client=mock_redis, latency_stats=stats)
+    dequeued = json.dumps("2024-01-01T00:00:00+00:00").encode()
+    script = mock_redis.register_script.return_value
+    script.return_value = [[b"accepted", b'"calc_hash"', dequeued], [b"lease_lost", b'"pending"']]
+
+    outcomes = queue.complete_tasks([("u1", {"status": TaskStatus.DONE, "result": {}}, "calc_hash"),
+                                     ("u2", {"status": "done"}, "calc_hash")], worker_id="w1")
+
+    assert outcomes == {"u1": "accepted", "u2": "lease_lost"}
+    mock_redis.register_script.assert_called_once()
+    keys, args = script.call_args.kwargs["keys"], script.call_args.kwargs["args"]
+    assert keys == ["webhooks:due", "task:u1", "task:u2"]
+    assert args[1] == '"w1"'
+    fields, ttl, finished = args[4:7]
+    assert json.loads(json.loads(fields)["status"]) == "done"
+    assert "processed_at" in json.loads(fields)
+    assert (ttl, finished) == (0, 1)
+    (sample,), = stats.record_many.call_args.args
+    stats.record_many.assert_called_once()
+    assert sample[:2] == ("calc_hash", "processing")
+
+
+def test_complete_tasks_requires_status(mock_redis):
+    """Обновление без статуса не может быть проверено по переходам."""
+    queue = RedisQueue(client=mock_redis)
+    with pytest.raises(ValueError):
+        queue.complete_tasks([("u1", {"message": "x"}, "calc_hash")])
+    mock_redis.register_script.assert_not_called()
+
+
+def test_complete_tasks_checks_transition_and_lease():
+    """Скрипт в Redis: переход по TaskStatus и аренда воркера проверяются атомарно."""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    client = fakeredis.FakeRedis()
+    queue = RedisQueue(client=client)
+    for task_uuid in ("mine", "stolen", "finished"):
+        queue.save_task(task_uuid, {"status": TaskStatus.CREATED, "type": "calc_hash"})
+        queue.enqueue("calc_hash_INPUT", task_uuid)
+    assert sorted(queue.dequeue_batch("calc_hash_INPUT", 3, worker_id="w1")) == \
+        ["finished", "mine", "stolen"]
+    queue.enqueue("calc_hash_INPUT", "stolen")
+    queue.dequeue("calc_hash_INPUT", timeout=1, worker_id="w2")
+    queue.complete_tasks([("finished", {"status": TaskStatus.DONE}, "calc_hash")], "w1")
+
+    outcomes = queue.complete_tasks([
+        ("mine", {"status": TaskStatus.DONE, "result": {"ok": True}}, "calc_hash"),
+        ("stolen", {"status": TaskStatus.DONE}, "calc_hash"),
+        ("finished", {"status": TaskStatus.PENDING}, "calc_hash"),
+        ("gone", {"status": TaskStatus.DONE}, "calc_hash"),
+    ], worker_id="w1")
+
+    assert outcomes == {"mine": "accepted", "stolen": "lease_lost",
+                        "finished": "invalid_transition", "gone": "not_found"}
+    tasks = queue.load_tasks(["mine", "stolen", "finished", "gone"])
+    assert (tasks["mine"]["status"], tasks["mine"]["result"]) == ("done", {"ok": True})
+    assert tasks["stolen"]["status"] == "created"
+    assert tasks["finished"]["status"] == "done"
+    assert "gone" not in tasks
+
+
+def test_cancel_tasks_tombstones_skipped_by_dequeue():
+    """Отмена — статус cancelled и надгробие; dequeue пропускает отменённую задачу."""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    client = fakeredis.FakeRedis()
+    queue = RedisQueue(client=client, ttl_policy=lambda task_type, status: 60)
+    for task_uuid, task_type in (("a", "calc_hash"), ("b", "calc_hash"), ("img", "resize_image")):
+        queue.save_task(task_uuid, {"status": TaskStatus.CREATED, "type": task_type})
+        queue.enqueue("INPUT", task_uuid)
+    queue.save_task("done", {"status": TaskStatus.DONE, "type": "calc_hash"})
+
+    outcomes = queue.cancel_tasks(["a", "img", "done", "gone"], task_types=["calc_hash"])
+
+    assert outcomes == {"a": "accepted", "img": "forbidden", "done": "invalid_transition",
+                        "gone": "not_found"}
+    assert queue.load_tasks(["a"])["a"]["status"] == "cancelled"
+    assert 0 < client.ttl("task:a") <= 60
+    assert queue.cancelled(["a", "b", "img"]) == {"a"}
+
+    # Очередь (LPUSH, извлечение с конца): a, b, img — a пропускается без ожидания
+    assert queue.dequeue("INPUT", timeout=1) == "b"
+    assert queue.dequeue_batch("INPUT", 5, timeout=1) == ["img"]
+    assert "dequeued_at" not in queue.load_tasks(["a"])["a"]
+    assert not client.zscore(CANCELLED_KEY, "a")
+
+
+def test_cancel_tasks_of_other_client_forbidden():
+    """Клиент не может отменить чужую задачу — даже с правом на её тип."""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    queue = RedisQueue(client=fakeredis.FakeRedis())
+    queue.save_task("a", {"status": TaskStatus.CREATED, "type": "calc_hash", "client_id": "A"})
+
+    assert queue.cancel_tasks(["a"], ["calc_hash"], client_id="B") == {"a": "forbidden"}
+    assert queue.load_tasks(["a"])["a"]["status"] == "created"
+    assert queue.cancel_tasks(["a"], ["calc_hash"], client_id="A") == {"a": "accepted"}
+
+
+def test_dequeue_skips_cancelled_task(mock_redis):
+    """Снятое в транзакции надгробие — задача не возвращается, ожидание продолжается."""
+    queue = RedisQueue(client=mock_redis)
+    mock_redis.brpop.side_effect = [("queue", b"cancelled"), ("queue", b"live")]
+    mock_redis.pipeline.return_value.execute.side_effect = [
+        [1, 1, [b'"calc_hash"', None]], [1], [0, 1, [b'"calc_hash"', None]]]
+    assert queue.dequeue("queue") == "live"
+    assert mock_redis.brpop.call_count == 2
+    mock_redis.pipeline.return_value.hdel.assert_called_once_with(
+        "task:cancelled", "dequeued_at", "worker")
@@ -62,11 +62,12 @@ def test_is_authorized():
     """
     v = VaultClient(client=MagicMock(), vault_url="x", auth_path="y")
 
-    assert v.is_authorized("admin", "anything") is True
-    assert v.is_authorized("service", "calc_hash") is True
-    assert v.is_authorized("service", "resize_image") is False
-    assert v.is_authorized("copytrust_site", "calc_hash") is True
-    assert v.is_authorized("copytrust_site", "other") is False
+    assert v.is_authorized("admin", "submit", "resize_image") is True
+    assert v.is_authorized("service", "submit", "calc_hash") is True
+    assert v.is_authorized("service", "taskinfo") is True
+    assert v.is_authorized("copytrust_site", "submit", "calc_hash") is True
+    assert v.is_authorized("copytrust_site", "submit", "resize_image") is False
+    assert v.is_authorized("unknown", "submit", "calc_hash") is False
 
 
 def test_authenticate_user_invalid_header(vault_client):
@@ -102,7 +103,7 @@ def test_verify_jwt_forbidden_action(vault_client):
         "metadata": {"client_id": "u1", "role": "copytrust_site"}
     }
     with pytest.raises(HTTPException) as exc:
-        vault_client.verify_jwt("token.jwt", "resize_image")
+        vault_client.verify_jwt("token.jwt", "submit", "resize_image")
     assert exc.value.status_code == 403
 
 
@@ -111,7 +112,7 @@ def test_verify_basic_success(vault_client):
     vault_client.client.userpass_login.return_value = {
         "metadata": {"client_id": "svc1", "role": "service"}
     }
-    client_id, role = vault_client.verify_basic("svc1", "secret", "water_marks")
+    client_id, role = vault_client.verify_basic("svc1", "secret", "submit", "calc_hash")
     assert client_id == "svc1"
     assert role == "service"
 
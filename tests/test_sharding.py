@@ -0,0 +1,150 @@
+# tests/test_sharding.py
+
+"""
+Unit-тесты для ShardRing и работы RedisQueue с несколькими шардами.
+"""
+
+from collections import Counter
+from unittest.mock import MagicMock
+from uuid import uuid4
+import json
+import pytest
+
+from app.queue.redis_queue import RedisQueue
+from app.queue.sharding import ShardRing, redact
+
+
+def _shards(count):
+    """Моки Redis-клиентов шардов (отметка dequeued_at находит задачу)."""
+    clients = [MagicMock(name=f"shard{i}") for i in range(count)]
+    for client in clients:
+        client.pipeline.return_value.execute.return_value = [0, 1, [b'"calc_hash"', None]]
+    return clients
+
+
+def test_ring_requires_unique_names():
+    """Пустой список шардов и повторяющиеся имена отклоняются."""
+    with pytest.raises(ValueError):
+        ShardRing([])
+    with pytest.raises(ValueError):
+        ShardRing(_shards(2), names=["redis://a", "redis://a"])
+
+
+@pytest.mark.parametrize("name, shown", [
+    ("redis://:secret@redis-a:6379/0", "redis://redis-a:6379/0"),
+    ("rediss://user:p@ss@redis-b:6380", "rediss://redis-b:6380"),
+    ("redis://redis-c:6379", "redis://redis-c:6379"),
+    ("0", "0"),
+])
+def test_redact_strips_credentials(name, shown):
+    """Из имени шарда для вывода удаляются пользователь и пароль."""
+    assert redact(name) == shown
+
+
+def test_ring_distributes_keys_evenly():
+    """Задачи распределяются по шардам примерно поровну."""
+    ring = ShardRing(_shards(4), names=[f"redis://r{i}:6379" for i in range(4)])
+    counts = Counter(ring.index_for(str(uuid4())) for _ in range(20000))
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > 20000 / 4 * 0.8
+
+
+def test_ring_adding_shard_moves_few_keys():
+    """При добавлении шарда переезжает примерно 1/N задач, остальные остаются на месте."""
+    names = [f"redis://r{i}:6379" for i in range(3)]
+    before = ShardRing(_shards(3), names=names)
+    after = ShardRing(_shards(4), names=names + ["redis://r3:6379"])
+    keys = [str(uuid4()) for _ in range(10000)]
+
+    moved = [key for key in keys if before.index_for(key) != after.index_for(key)]
+    assert all(after.index_for(key) == 3 for key in moved)
+    assert len(moved) < len(keys) * 0.35
+
+
+def test_submit_task_writes_to_single_shard():
+    """Задача, индексы и элемент очереди попадают на шард задачи одной транзакцией."""
+    clients = _shards(3)
+    ring = ShardRing(clients)
+    queue = RedisQueue(client=clients[0], shards=ring)
+    task_id = uuid4()
+    queue.submit_task(task_id, {"uuid": str(task_id), "type": "calc_hash",
+                                "created": "2024-01-01T00:00:00+00:00", "client_id": "c1"},
+                      "calc_hash_INPUT")
+
+    owner = clients[ring.index_for(str(task_id))]
+    owner.pipeline.assert_called_once_with(transaction=True)
+    owner.pipeline.return_value.lpush.assert_called_once_with("calc_hash_INPUT", str(task_id))
+    for client in clients:
+        if client is not owner:
+            client.pipeline.assert_not_called()
+
+
+def test_dequeue_rotates_partitions():
+    """Каждый вызов начинает обход партиций со следующего шарда."""
+    clients = _shards(2)
+    for i, client in enumerate(clients):
+        client.rpop.return_value = f"uuid-{i}".encode()
+    queue = RedisQueue(client=clients[0], shards=ShardRing(clients))
+
+    assert [queue.dequeue("q", timeout=1) for _ in range(4)] == \
+        ["uuid-0", "uuid-1", "uuid-0", "uuid-1"]
+
+
+def test_dequeue_waits_on_partitions_until_timeout():
+    """Пустые партиции ожидаются по очереди; по таймауту возвращается None."""
+    clients = _shards(2)
+    for client in clients:
+        client.rpop.return_value = None
+        client.brpop.return_value = None
+    clients[1].brpop.side_effect = [None, ("q", b"uuid-late")]
+    queue = RedisQueue(client=clients[0], shards=ShardRing(clients))
+
+    assert queue.dequeue("q", timeout=5) == "uuid-late"
+    clients[1].brpop.side_effect = None
+    assert queue.dequeue("q", timeout=0.01) is None
+
+
+def _raw_task(task_id):
+    """Hash задачи в том виде, в котором он хранится в Redis."""
+    return {b"uuid": json.dumps(str(task_id)).encode(), b"type": b'"calc_hash"',
+            b"status": b'"done"', b"code": b"0", b"message": b'"OK"'}
+
+
+def test_list_tasks_merges_shards():
+    """Партиции индекса со всех шардов объединяются по времени создания."""
+    clients = _shards(2)
+    first, second = uuid4(), uuid4()
+    clients[0].pipeline.return_value.execute.side_effect = [
+        [[(str(second).encode(), 10.0)]], [_raw_task(second)]]
+    clients[1].pipeline.return_value.execute.side_effect = [
+        [[(str(first).encode(), 20.0)]], [_raw_task(first)]]
+    queue = RedisQueue(client=clients[0], shards=ShardRing(clients))
+
+    tasks, cursor = queue.list_tasks("c1", ["calc_hash"])
+    assert [task.uuid for task in tasks] == [first, second]
+    assert cursor is None
+
+
+def test_find_by_external_id_checks_all_shards():
+    """Соответствие ExternalId ищется на всех шардах."""
+    clients = _shards(2)
+    clients[0].get.return_value = None
+    clients[1].get.return_value = b"uuid-1"
+    queue = RedisQueue(client=clients[0], shards=ShardRing(clients))
+    assert queue.find_by_external_id("c1", "X1") == "uuid-1"
+
+
+def test_find_by_external_id_prefers_newest_task():
+    """Повторная постановка с тем же ExternalId на другой шард: находится последняя задача."""
+    clients = _shards(3)
+    clients[0].get.return_value = b"new"
+    clients[1].get.return_value = b"old"
+    clients[2].get.return_value = None
+    clients[0].hget.return_value = json.dumps("2024-01-01T00:10:00+00:00").encode()
+    clients[1].hget.return_value = json.dumps("2024-01-01T00:00:00+00:00").encode()
+    queue = RedisQueue(client=clients[0], shards=ShardRing(clients))
+    assert queue.find_by_external_id("c1", "X1") == "new"
+    clients[0].hget.assert_called_once_with("task:new", "created")
+
+    clients[1].hget.return_value = json.dumps("2024-01-01T00:20:00+00:00").encode()
+    assert queue.find_by_external_id("c1", "X1") == "old"
@@ -0,0 +1,78 @@
+# tests/test_task_cache.py
+
+"""
+Unit-тесты для локального кэша задач в конечных статусах.
+Проверяются ограничения по числу записей и размеру, срок жизни записи
+и инвалидация по сообщениям Redis.
+"""
+
+import time
+from unittest.mock import MagicMock
+from uuid import uuid4
+from app.api.models import TaskInfo
+from app.queue.task_cache import TerminalTaskCache
+
+
+def _task(task_uuid):
+    """Задача в конечном статусе."""
+    return TaskInfo(uuid=task_uuid, type="calc_hash", status="done", code=0, message="OK")
+
+
+def test_entries_limit_evicts_least_recently_used():
+    """При превышении max_entries вытесняется давно не читанная задача."""
+    cache = TerminalTaskCache(max_entries=2)
+    first, second, third = (str(uuid4()) for _ in range(3))
+    cache.put(first, _task(first), 10, 60)
+    cache.put(second, _task(second), 10, 60)
+    cache.get(first)
+    cache.put(third, _task(third), 10, 60)
+
+    assert cache.get(second) is None
+    assert cache.get(first) is not None
+    assert len(cache) == 2
+
+
+def test_bytes_limit():
+    """Суммарный размер записей не превышает max_bytes; слишком большая задача не кэшируется."""
+    cache = TerminalTaskCache(max_bytes=100)
+    first, second, large = (str(uuid4()) for _ in range(3))
+    cache.put(first, _task(first), 60, 60)
+    cache.put(second, _task(second), 60, 60)
+    cache.put(large, _task(large), 101, 60)
+
+    assert cache.size_bytes == 60
+    assert cache.get(first) is None
+    assert cache.get(large) is None
+
+
+def test_entry_expires_with_redis_ttl():
+    """Запись не переживает ключ задачи в Redis."""
+    cache = TerminalTaskCache()
+    task_uuid = str(uuid4())
+    cache.put(task_uuid, _task(task_uuid), 10, 0.01)
+    time.sleep(0.02)
+    assert cache.get(task_uuid) is None
+    assert cache.size_bytes == 0
+
+
+def test_invalidation_message():
+    """Сообщение об инвалидации удаляет задачу; None (FLUSHALL) очищает кэш."""
+    cache = TerminalTaskCache()
+    first, second = str(uuid4()), str(uuid4())
+    cache.put(first, _task(first), 10, 60)
+    cache.put(second, _task(second), 10, 60)
+
+    cache._on_invalidate([f"task:{first}".encode()])  # pylint: disable=protected-access
+    assert cache.get(first) is None
+    assert cache.get(second) is not None
+
+    cache._on_invalidate(None)  # pylint: disable=protected-access
+    assert len(cache) == 0
+
+
+def test_tracking_cache_unused_until_subscribed():
+    """С точной инвалидацией кэш не используется, пока подписка не установлена."""
+    cache = TerminalTaskCache(redis_client=MagicMock())
+    task_uuid = str(uuid4())
+    cache.put(task_uuid, _task(task_uuid), 10, 60)
+    assert cache.get(task_uuid) is None
@@ -3,15 +3,23 @@
 """
 Тесты для TaskRouter: проверка отправки задач, получения информации и обработки ошибок.
 """
+import os
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
 from uuid import uuid4
 import pytest
 
 from fastapi import HTTPException
-from fastapi.testclient import TestClient
-from fastapi import FastAPI
-from app.api.task_router import TaskRouter
-from app.api.models import TaskInput, TaskType, TaskResponse
+from app.api.task_router import TaskRouter, parse_range
+from app.api.models import TaskInput, TaskInfo, TaskStatus, TaskType, TaskResponse
+from app.api.task_types import TaskTypeRegistry
+from app.storage.blob_store import FileBlobStore, parse_ref
+from app.diagnostics.profiler import ProfileInProgressError
+from app.webhooks.dispatcher import CallbackAllowList
 
+# Результаты authenticate_user для router_client: администратор и обычный клиент
+ADMIN = ("admin_user", "admin")
+CLIENT = ("client-1", "service")
 
 
 def test_submit_task_success(redis_queue, vault_client):
@@ -24,14 +32,9 @@ def test_submit_task_success(redis_queue, vault_client):
     assert response.type == TaskType.CALC_HASH
 
 
-def test_submit_task_invalid_data(redis_queue, vault_client):
+def test_submit_task_invalid_data(router_client):
     """Отправка некорректных данных через TestClient приводит к 422 Unprocessable Entity."""
-    app = FastAPI()
-    router = TaskRouter(redis_queue, vault_client)
-    for route in router.routes:
-        app.router.routes.append(route)
-
-    client = TestClient(app)
+    client = router_client()
     response = client.post("/submit", json={"invalid": "data"}, \
                            headers={"Authorization": "Bearer token"})
     assert response.status_code == 422
@@ -39,7 +42,7 @@ def test_submit_task_invalid_data(redis_queue, vault_client):
 
 def test_submit_task_internal_error(redis_queue, vault_client):
     """Исключение при сохранении задачи в Redis оборачивается в HTTP 500."""
-    redis_queue.save_task.side_effect = Exception("Redis error")
+    redis_queue.submit_task.side_effect = Exception("Redis error")
 
     router = TaskRouter(redis_queue, vault_client)
     sample_task = TaskInput(type=TaskType.CALC_HASH, upload={"key": "value"})
@@ -64,16 +67,16 @@ def test_task_info_success(redis_queue, vault_client):
     """Успешное получение информации о задаче по UUID."""
     task_uuid = uuid4()
     vault_client.authenticate_user.return_value = ("test_user", "test_role")
-    redis_queue.get_task.return_value = {
-        "uuid": str(task_uuid),
-        "type": "calc_hash",
-        "status": "done",
-        "created": "2024-01-01T00:00:00+00:00",
-        "ExternalId": "X123",
-        "code": 0,
-        "message": "OK",
-        "result": {"hash": "abc123"}
-    }
+    redis_queue.get_task.return_value = TaskInfo(
+        uuid=task_uuid,
+        type="calc_hash",
+        status="done",
+        created="2024-01-01T00:00:00+00:00",
+        ExternalId="X123",
+        code=0,
+        message="OK",
+        result={"hash": "abc123"}
+    )
     router = TaskRouter(redis_queue, vault_client)
     response = router.routes[1].endpoint(taskid=task_uuid, authorization="Bearer ok")
     assert response.uuid == task_uuid
@@ -86,12 +89,8 @@ def test_task_info_invalid_type_raises_valueerror(redis_queue, vault_client):
     """Некорректный тип задачи вызывает HTTP 400 с пояснением."""
     task_uuid = uuid4()
     vault_client.authenticate_user.return_value = ("test_user", "test_role")
-    redis_queue.get_task.return_value = {
-        "uuid": str(task_uuid),
-        "type": "invalid_type",
-        "status": "done",
-        "created": "2024-01-01T00:00:00+00:00"
-    }
+    # RedisQueue.get_task валидирует запись как TaskInfo и выбрасывает ValueError
+    redis_queue.get_task.side_effect = ValueError("type: Input should be 'calc_hash' or 'resize_image'")
     router = TaskRouter(redis_queue, vault_client)
     with pytest.raises(HTTPException) as exc:
         router.routes[1].endpoint(taskid=task_uuid, authorization="Bearer ok")
@@ -99,14 +98,601 @@ def test_task_info_invalid_type_raises_valueerror(redis_queue, vault_client):
     assert "Invalid task type" in str(exc.value.detail)
 
 
-def test_health_check_returns_ok(redis_queue, vault_client):
+def test_health_check_returns_ok(router_client):
     """Проверка доступности сервиса через endpoint /health с использованием TestClient."""
-    app = FastAPI()
-    router = TaskRouter(redis_queue, vault_client)
-    for route in router.routes:
-        app.router.routes.append(route)
-
-    client = TestClient(app)
+    client = router_client()
     response = client.post("/health")
     assert response.status_code == 200
     assert response.json() == {"code": 1, "message": "All right"}
+
+
+def test_submit_task_invalid_upload(redis_queue, vault_client):
+    """Upload, не прошедший проверку схемы типа задачи, приводит к HTTP 400 без записи в Redis."""
+    registry = TaskTypeRegistry({"calc_hash": {"schema": {"type": "object", "required": ["filename"]}}})
+    router = TaskRouter(redis_queue, vault_client, task_registry=registry)
+    sample_task = TaskInput(type=TaskType.CALC_HASH, upload={"key": "value"})
+    with pytest.raises(HTTPException) as exc:
+        router.routes[0].endpoint(sample_task, authorization="Bearer token")
+    assert exc.value.status_code == 400
+    redis_queue.submit_task.assert_not_called()
+
+
+def test_submit_task_uses_registry_queue_and_ttl(redis_queue, vault_client):
+    """Очередь и TTL задачи берутся из реестра типов задач."""
+    vault_client.authenticate_user.return_value = ("client-1", "service")
+    registry = TaskTypeRegistry({"calc_hash": {"queue": "hash_queue", "ttl": 120}})
+    router = TaskRouter(redis_queue, vault_client, task_registry=registry)
+    response = router.routes[0].endpoint(TaskInput(type=TaskType.CALC_HASH, upload={"a": 1}),
+                                         authorization="Bearer token")
+    redis_queue.submit_task.assert_called_once()
+    task_uuid, data, queue_name = redis_queue.submit_task.call_args.args
+    assert task_uuid == str(response.uuid)
+    assert queue_name == "hash_queue"
+    assert data["client_id"] == vault_client.authenticate_user.return_value[0]
+    assert redis_queue.submit_task.call_args.kwargs["ttl_seconds"] == 120
+
+
+def test_task_info_forbidden_task_type(redis_queue, vault_client):
+    """Роль без права на тип задачи получает HTTP 403 в /taskinfo."""
+    task_uuid = uuid4()
+    vault_client.authenticate_user.return_value = ("test_user", "copytrust_site")
+    vault_client.is_authorized.return_value = False
+    redis_queue.get_task.return_value = TaskInfo(
+        uuid=task_uuid,
+        type="resize_image",
+        status="done",
+        created="2024-01-01T00:00:00+00:00",
+        code=0,
+        message="OK"
+    )
+    router = TaskRouter(redis_queue, vault_client)
+    with pytest.raises(HTTPException) as exc:
+        router.routes[1].endpoint(taskid=task_uuid, authorization="Bearer ok")
+    assert exc.value.status_code == 403
+    vault_client.is_authorized.assert_called_once_with("copytrust_site", "taskinfo", "resize_image")
+
+
+def test_vault_health(router_client, vault_client):
+    """Endpoint /health/vault возвращает состояние автомата защиты Vault."""
+    vault_client.status.return_value = {
+        "state": "open", "consecutive_failures": 5, "opened_at": None, "grace_decisions": 3
+    }
+    client = router_client(ADMIN)
+
+    assert client.get("/health/vault").status_code == 422  # без Authorization
+    response = client.get("/health/vault", headers={"Authorization": "Bearer t"})
+    assert response.status_code == 200
+    assert response.json()["state"] == "open"
+    assert response.json()["grace_decisions"] == 3
+
+
+def test_redis_health(router_client, redis_queue, vault_client):
+    """Endpoint /health/redis возвращает статистику пулов соединений Redis."""
+    redis_queue.pool_stats.return_value = [{
+        "shard": "redis://redis:6379", "purpose": "requests", "max_connections": 50, "in_use": 2,
+        "open": 4, "utilization": 0.04, "acquired": 100, "waits": 1, "timeouts": 0,
+        "wait_ms_total": 1.5, "wait_ms_max": 1.5
+    }]
+    client = router_client(ADMIN)
+
+    response = client.get("/health/redis", headers={"Authorization": "Bearer t"})
+    assert response.status_code == 200
+    assert response.json()["pools"][0]["in_use"] == 2
+    vault_client.authenticate_user.assert_called_once_with("Bearer t", endpoint="debug")
+
+
+@pytest.mark.parametrize("path", ["/health/vault", "/health/redis", "/stats/latency"])
+def test_diagnostics_require_debug_right(router_client, redis_queue, vault_client, path):
+    """Диагностические endpoint-ы без права "debug" отвечают 403."""
+    vault_client.authenticate_user.side_effect = HTTPException(status_code=403, detail="Forbidden")
+    client = router_client(ADMIN)
+    assert client.get(path, headers={"Authorization": "Bearer t"}).status_code == 403
+    redis_queue.pool_stats.assert_not_called()
+    vault_client.status.assert_not_called()
+
+
+def test_debug_profile_returns_report(router_client, vault_client):
+    """/debug/profile проверяет право "debug" и возвращает отчёт профилировщика."""
+    profiler = MagicMock()
+    profiler.profile.return_value = {
+        "seconds": 1.0, "interval_ms": 5.0, "samples": 200, "stacks": 150,
+        "top": [{"function": "f (a.py:1)", "self_samples": 150, "self_pct": 100.0,
+                 "total_samples": 150, "total_pct": 100.0}],
+        "collapsed": "MainThread;f (a.py:1) 150"}
+    client = router_client(ADMIN, profiler=profiler)
+
+    response = client.post("/debug/profile?seconds=1&top=10", headers={"Authorization": "Bearer t"})
+    assert response.status_code == 200
+    assert response.json()["top"][0]["self_samples"] == 150
+    vault_client.authenticate_user.assert_called_once_with("Bearer t", endpoint="debug")
+    profiler.profile.assert_called_once_with(1.0, top=10, include_idle=False)
+
+    response = client.post("/debug/profile?seconds=1&format=collapsed",
+                           headers={"Authorization": "Bearer t"})
+    assert response.text == "MainThread;f (a.py:1) 150\n"
+
+
+def test_debug_profile_conflict_when_running(router_client):
+    """Параллельный сеанс профилирования → 409."""
+    profiler = MagicMock()
+    profiler.profile.side_effect = ProfileInProgressError("Another profile session is running")
+    client = router_client(ADMIN, profiler=profiler)
+    response = client.post("/debug/profile", headers={"Authorization": "Bearer t"})
+    assert response.status_code == 409
+
+
+def test_debug_profile_forbidden(router_client, vault_client):
+    """Роль без права "debug" получает 403 до начала профилирования."""
+    profiler = MagicMock()
+    client = router_client(ADMIN, profiler=profiler)
+    vault_client.authenticate_user.side_effect = HTTPException(status_code=403, detail="Not allowed")
+    response = client.post("/debug/profile", headers={"Authorization": "Bearer t"})
+    assert response.status_code == 403
+    profiler.profile.assert_not_called()
+
+
+def test_admin_revoke_client(router_client, vault_client):
+    """/admin/revoke требует право "admin" и удаляет записи кэша аутентификации клиента."""
+    vault_client.revoke_client.return_value = True
+    client = router_client(ADMIN)
+    response = client.post("/admin/revoke?client_id=c1", headers={"Authorization": "Bearer t"})
+    assert response.status_code == 200
+    assert response.json() == {"client_id": "c1", "auth_cache": True}
+    vault_client.authenticate_user.assert_called_once_with("Bearer t", endpoint="admin")
+    vault_client.revoke_client.assert_called_once_with("c1")
+
+
+def test_debug_memory_report(router_client, vault_client):
+    """/debug/memory возвращает замер процесса, живые модели и состояние трассировки."""
+    client = router_client(ADMIN)
+    response = client.get("/debug/memory", headers={"Authorization": "Bearer t"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["process"]["rss_bytes"] > 0
+    assert body["rss_growth_bytes_per_hour"] is None
+    assert isinstance(body["live_objects"], dict)
+    assert body["tracing"] is False
+    vault_client.authenticate_user.assert_called_once_with("Bearer t", endpoint="debug")
+
+    response = client.get("/debug/memory?objects=false", headers={"Authorization": "Bearer t"})
+    assert response.json()["live_objects"] is None
+
+
+def test_debug_memory_tracing_flow(router_client):
+    """Включение трассировки, снимки, их разница и выключение."""
+    client = router_client(ADMIN)
+    headers = {"Authorization": "Bearer t"}
+    assert client.post("/debug/memory/snapshot", headers=headers).status_code == 409
+    try:
+        response = client.post("/debug/memory/tracing", headers=headers)
+        assert response.json() == {"tracing": True, "snapshots": []}
+        first = client.post("/debug/memory/snapshot", headers=headers).json()["id"]
+
+        response = client.get(f"/debug/memory/diff?first={first}&top=5", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["first"] == first
+        assert len(response.json()["entries"]) <= 5
+        assert client.get("/debug/memory/diff?first=999", headers=headers).status_code == 404
+    finally:
+        response = client.post("/debug/memory/tracing?enabled=false", headers=headers)
+    assert response.json() == {"tracing": False, "snapshots": []}
+
+
+def test_latency_stats(router_client):
+    """/stats/latency отдаёт сводку по всем или одному типу задач; без гистограмм — 404."""
+    headers = {"Authorization": "Bearer t"}
+    assert router_client(ADMIN).get(
+        "/stats/latency", headers=headers).status_code == 404
+
+    stat = {"count": 3, "rate_per_minute": 0.05, "mean_ms": 120.0, "p50_ms": 80.0,
+            "p90_ms": 200.0, "p99_ms": 240.0, "histogram": {"250": 3, "+Inf": 3}}
+    latency = MagicMock(retention=86400, bucket_seconds=60)
+    latency.summary.return_value = {"calc_hash": {"queue_wait": stat, "processing": stat}}
+    client = router_client(ADMIN, latency_stats=latency)
+
+    response = client.get("/stats/latency?window=600&type=calc_hash", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["types"]["calc_hash"]["queue_wait"]["p90_ms"] == 200.0
+    latency.summary.assert_called_once_with(["calc_hash"], 600)
+    assert client.get("/stats/latency?type=unknown", headers=headers).status_code == 404
+
+
+def test_estimates_and_retry_after(router_client, redis_queue, vault_client):
+    """/submit и /taskinfo незавершённой задачи отдают оценку сроков и Retry-After."""
+    vault_client.authenticate_user.return_value = ("test_user", "test_role")
+    estimator = MagicMock()
+    estimator.estimate.side_effect = lambda *args: {
+        "estimated_start": datetime(2024, 1, 1, 0, 1, tzinfo=timezone.utc),
+        "estimated_completion": datetime(2024, 1, 1, 0, 1, 4, tzinfo=timezone.utc),
+        "retry_after": 7}
+    client = router_client(completion_estimator=estimator)
+
+    response = client.post("/submit", json={"type": "calc_hash", "upload": {"k": "v"}},
+                           headers={"Authorization": "Bearer t"})
+    assert response.headers["Retry-After"] == "7"
+    assert response.json()["estimated_completion"] == "2024-01-01T00:01:04Z"
+    estimator.estimate.assert_called_once_with("calc_hash", None)
+
+    task = TaskInfo(uuid=uuid4(), type="calc_hash", status="pending", code=0, message="",
+                    dequeued_at="2024-01-01T00:00:30+00:00")
+    redis_queue.get_task.return_value = task
+    response = client.get(f"/taskinfo?taskid={task.uuid}", headers={"Authorization": "Bearer t"})
+    assert response.headers["Retry-After"] == "7"
+    assert response.json()["estimated_start"] == "2024-01-01T00:01:00Z"
+    assert estimator.estimate.call_args.args == ("calc_hash", task.dequeued_at)
+    assert task.estimated_start is None  # исходная (возможно, кэшированная) задача не меняется
+
+    redis_queue.get_task.return_value = task.model_copy(update={"status": TaskStatus.DONE})
+    response = client.get(f"/taskinfo?taskid={task.uuid}", headers={"Authorization": "Bearer t"})
+    assert "Retry-After" not in response.headers
+    assert response.json()["estimated_completion"] is None
+
+
+def test_task_info_etag_follows_estimate(router_client, redis_queue):
+    """ETag ответа с оценкой меняется со сдвигом оценки: опрос с If-None-Match её видит."""
+    completion = {"value": datetime(2024, 1, 1, 0, 1, 4, tzinfo=timezone.utc)}
+    estimator = MagicMock()
+    estimator.estimate.side_effect = lambda *args: {
+        "estimated_start": None, "estimated_completion": completion["value"], "retry_after": 5}
+    task = TaskInfo(uuid=uuid4(), type="calc_hash", status="pending", code=0, message="",
+                    version=2)
+    redis_queue.get_task.return_value = task
+    client = router_client(ADMIN, completion_estimator=estimator)
+    url = f"/taskinfo?taskid={task.uuid}"
+
+    etag = client.get(url, headers={"Authorization": "Bearer t"}).headers["ETag"]
+    assert etag.startswith(f'W/"{task.uuid}.2.')
+    response = client.get(url, headers={"Authorization": "Bearer t", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["Retry-After"] == "5"
+
+    completion["value"] = datetime(2024, 1, 1, 0, 2, tzinfo=timezone.utc)
+    response = client.get(url, headers={"Authorization": "Bearer t", "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["estimated_completion"] == "2024-01-01T00:02:00Z"
+    assert response.headers["ETag"] != etag
+
+
+def test_list_tasks_uses_client_index(router_client, redis_queue, vault_client):
+    """GET /tasks читает индекс вызывающего клиента только по разрешённым типам."""
+    vault_client.authenticate_user.return_value = ("client-1", "copytrust_site")
+    vault_client.is_authorized.side_effect = lambda role, endpoint, task_type: task_type == "calc_hash"
+    redis_queue.list_tasks.return_value = ([], "1700000000.5")
+
+    response = router_client().get(
+        "/tasks", params={"status": "done", "limit": 10}, headers={"Authorization": "Bearer ok"})
+    assert response.status_code == 200
+    assert response.json() == {"items": [], "next_cursor": "1700000000.5"}
+    redis_queue.list_tasks.assert_called_once_with(
+        "client-1", ["calc_hash"], limit=10, cursor=None, status="done")
+
+
+def test_list_tasks_by_external_id(router_client, redis_queue, vault_client):
+    """GET /tasks?ExternalId= находит задачу через индекс внешних идентификаторов."""
+    task_uuid = uuid4()
+    vault_client.authenticate_user.return_value = ("client-1", "service")
+    vault_client.is_authorized.return_value = True
+    redis_queue.find_by_external_id.return_value = str(task_uuid)
+    redis_queue.get_task.return_value = TaskInfo(
+        ExternalId="X1", type=TaskType.CALC_HASH, uuid=task_uuid, status="done", code=0, message="OK")
+
+    response = router_client().get(
+        "/tasks", params={"ExternalId": "X1"}, headers={"Authorization": "Bearer ok"})
+    assert response.status_code == 200
+    assert response.json()["items"][0]["uuid"] == str(task_uuid)
+    redis_queue.find_by_external_id.assert_called_once_with("client-1", "X1")
+    redis_queue.list_tasks.assert_not_called()
+
+
+@pytest.mark.parametrize("cursor", ["abc", "nan", "inf", "-Infinity"])
+def test_list_tasks_invalid_cursor(router_client, redis_queue, vault_client, cursor):
+    """Некорректный или нечисловой (nan, inf) курсор приводит к HTTP 400 без обращения к Redis."""
+    vault_client.authenticate_user.return_value = ("client-1", "service")
+    vault_client.is_authorized.return_value = True
+    response = router_client().get(
+        "/tasks", params={"cursor": cursor}, headers={"Authorization": "Bearer ok"})
+    assert response.status_code == 400
+    redis_queue.list_tasks.assert_not_called()
+
+
+def _stored_task(redis_queue, vault_client, **fields):
+    """Задача, которую вернёт get_task, и доступ к ней у вызывающего клиента."""
+    task_uuid = uuid4()
+    vault_client.authenticate_user.return_value = ("test_user", "service")
+    vault_client.is_authorized.return_value = True
+    redis_queue.get_task.return_value = TaskInfo(uuid=task_uuid, code=0, message="OK", **fields)
+    return task_uuid
+
+def test_task_info_etag_and_not_modified(router_client, redis_queue, vault_client):
+    """ETag строится по версии задачи; совпадающий If-None-Match даёт 304 без тела."""
+    task_uuid = _stored_task(redis_queue, vault_client, type="calc_hash", status="done", version=3)
+    client = router_client()
+    response = client.get(f"/taskinfo?taskid={task_uuid}", headers={"Authorization": "Bearer ok"})
+    etag = response.headers["ETag"]
+    assert etag == f'"{task_uuid}.3"'
+    assert "version" not in response.json()
+
+    response = client.get(f"/taskinfo?taskid={task_uuid}",
+                          headers={"Authorization": "Bearer ok", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_task_info_changed_version_returns_body(router_client, redis_queue, vault_client):
+    """Устаревший ETag клиента приводит к полному ответу."""
+    task_uuid = _stored_task(redis_queue, vault_client, type="calc_hash", status="done", version=4)
+    client = router_client()
+    response = client.get(f"/taskinfo?taskid={task_uuid}",
+                          headers={"Authorization": "Bearer ok", "If-None-Match": f'"{task_uuid}.3"'})
+    assert response.status_code == 200
+
+
+def test_task_info_cache_control(router_client, redis_queue, vault_client):
+    """Завершённые задачи кэшируются на max-age, незавершённые требуют перепроверки."""
+    task_uuid = _stored_task(redis_queue, vault_client, type="calc_hash", status="done", version=3)
+    client = router_client(cache_max_age=120, shared_cache=True)
+    response = client.get(f"/taskinfo?taskid={task_uuid}", headers={"Authorization": "Bearer ok"})
+    assert response.headers["Cache-Control"] == "public, max-age=120"
+    assert response.headers["Vary"] == "Authorization"
+
+    task_uuid = _stored_task(redis_queue, vault_client, type="calc_hash", status="pending", version=3)
+    client = router_client()
+    response = client.get(f"/taskinfo?taskid={task_uuid}", headers={"Authorization": "Bearer ok"})
+    assert response.headers["Cache-Control"] == "no-cache"
+
+
+def test_task_result_streams_blob_with_range(router_client, redis_queue, vault_client, tmp_path):
+    """Результат из хранилища отдаётся целиком и по диапазону байтов."""
+    store = FileBlobStore(str(tmp_path))
+    ref = store.put(b"0123456789", content_type="image/png")
+    task_uuid = _stored_task(redis_queue, vault_client, type="resize_image", status="done", result=ref)
+    client = router_client(blob_store=store)
+
+    response = client.get(f"/taskresult/{task_uuid}", headers={"Authorization": "Bearer ok"})
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["accept-ranges"] == "bytes"
+
+    response = client.get(f"/taskresult/{task_uuid}",
+                          headers={"Authorization": "Bearer ok", "Range": "bytes=2-5"})
+    assert response.status_code == 206
+    assert response.content == b"2345"
+    assert response.headers["content-range"] == "bytes 2-5/10"
+
+    response = client.get(f"/taskresult/{task_uuid}",
+                          headers={"Authorization": "Bearer ok", "Range": "bytes=-3"})
+    assert response.content == b"789"
+
+
+def test_task_result_range_not_satisfiable(router_client, redis_queue, vault_client, tmp_path):
+    """Диапазон за пределами результата приводит к HTTP 416."""
+    store = FileBlobStore(str(tmp_path))
+    task_uuid = _stored_task(redis_queue, vault_client, type="resize_image", status="done",
+                             result=store.put(b"abc"))
+    client = router_client(blob_store=store)
+    response = client.get(f"/taskresult/{task_uuid}",
+                          headers={"Authorization": "Bearer ok", "Range": "bytes=10-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */3"
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=2-5", (2, 5)),
+    ("bytes=2-", (2, 9)),
+    ("bytes=8-20", (8, 9)),
+    ("bytes=-3", (7, 9)),
+    ("bytes=-20", (0, 9)),
+    ("bytes=abc-", None),
+    ("bytes=5-3", None),
+    ("bytes=-", None),
+    ("bytes=+1-2", None),
+    ("bytes=0-1,4-5", None),
+    ("items=0-1", None),
+])
+def test_parse_range(header, expected):
+    """Неверный синтаксис (в том числе last < first) игнорируется — отдаётся весь объект."""
+    assert parse_range(header, 10) == expected
+
+
+@pytest.mark.parametrize("header, size", [("bytes=10-", 10), ("bytes=-0", 10), ("bytes=-5", 0)])
+def test_parse_range_not_satisfiable(header, size):
+    """Диапазон, не пересекающийся с объектом, — ValueError (HTTP 416)."""
+    with pytest.raises(ValueError):
+        parse_range(header, size)
+
+
+def test_task_result_malformed_range_returns_full_body(router_client, redis_queue, vault_client,
+                                                       tmp_path):
+    """Синтаксически неверный Range игнорируется: ответ 200 со всем результатом."""
+    store = FileBlobStore(str(tmp_path))
+    task_uuid = _stored_task(redis_queue, vault_client, type="resize_image", status="done",
+                             result=store.put(b"abc"))
+    client = router_client(blob_store=store)
+    for value in ("bytes=abc-", "bytes=2-1"):
+        response = client.get(f"/taskresult/{task_uuid}",
+                              headers={"Authorization": "Bearer ok", "Range": value})
+        assert response.status_code == 200
+        assert response.content == b"abc"
+
+
+def test_task_result_inline(router_client, redis_queue, vault_client):
+    """Небольшой результат, хранящийся в задаче, отдаётся как JSON."""
+    task_uuid = _stored_task(redis_queue, vault_client, type="resize_image", status="done",
+                             result={"hash": "abc"})
+    client = router_client()
+    response = client.get(f"/taskresult/{task_uuid}", headers={"Authorization": "Bearer ok"})
+    assert response.status_code == 200
+    assert response.json() == {"hash": "abc"}
+
+
+def test_task_result_not_ready(router_client, redis_queue, vault_client):
+    """Задача без результата — HTTP 404."""
+    task_uuid = _stored_task(redis_queue, vault_client, type="resize_image", status="done")
+    client = router_client()
+    response = client.get(f"/taskresult/{task_uuid}", headers={"Authorization": "Bearer ok"})
+    assert response.status_code == 404
+
+
+def test_submit_stream_raw_body(router_client, redis_queue, tmp_path):
+    """Сырое тело записывается в хранилище, в upload задачи — ссылка на файл."""
+    store = FileBlobStore(str(tmp_path))
+    client = router_client(CLIENT, blob_store=store)
+    response = client.post("/submit/stream?type=resize_image&ExternalId=X1&filename=a.png",
+                           content=b"\x89PNG" + b"0" * 100000,
+                           headers={"Authorization": "Bearer ok", "Content-Type": "image/png"})
+    assert response.status_code == 200
+
+    data = redis_queue.submit_task.call_args.args[1]
+    assert data["ExternalId"] == "X1"
+    assert data["upload"]["filename"] == "a.png"
+    assert data["upload"]["blob"]["size"] == 100004
+    assert data["upload"]["blob"]["content_type"] == "image/png"
+    assert store.read(parse_ref(data["upload"]["blob"])).startswith(b"\x89PNG")
+
+
+def test_submit_stream_multipart(router_client, redis_queue, tmp_path):
+    """Из multipart сохраняется файловая часть, прочие поля пропускаются."""
+    store = FileBlobStore(str(tmp_path))
+    client = router_client(CLIENT, blob_store=store)
+    response = client.post("/submit/stream?type=resize_image",
+                           data={"comment": "ignored"},
+                           files={"file": ("photo.jpg", b"jpeg-bytes" * 1000, "image/jpeg")},
+                           headers={"Authorization": "Bearer ok"})
+    assert response.status_code == 200
+
+    upload = redis_queue.submit_task.call_args.args[1]["upload"]
+    assert upload["filename"] == "photo.jpg"
+    assert upload["blob"]["content_type"] == "image/jpeg"
+    assert store.read(parse_ref(upload["blob"])) == b"jpeg-bytes" * 1000
+
+
+def test_submit_stream_too_large(router_client, redis_queue, tmp_path):
+    """Файл больше max_upload_size отклоняется с HTTP 413 и не остаётся в хранилище."""
+    store = FileBlobStore(str(tmp_path))
+    registry = TaskTypeRegistry({"resize_image": {"max_upload_size": 10}})
+    client = router_client(CLIENT, blob_store=store, task_registry=registry)
+
+    def body():
+        yield b"0" * 8
+        yield b"0" * 8
+
+    response = client.post("/submit/stream?type=resize_image", content=body(),
+                           headers={"Authorization": "Bearer ok"})
+    assert response.status_code == 413
+    redis_queue.submit_task.assert_not_called()
+    assert not os.listdir(str(tmp_path))
+
+
+def test_submit_stream_invalid_upload_removes_blob(router_client, redis_queue, tmp_path):
+    """Upload, не прошедший схему типа, отклоняется с HTTP 400, новый файл удаляется."""
+    store = FileBlobStore(str(tmp_path))
+    registry = TaskTypeRegistry({"resize_image": {
+        "schema": {"type": "object", "required": ["filename"]}}})
+    client = router_client(CLIENT, blob_store=store, task_registry=registry)
+    response = client.post("/submit/stream?type=resize_image", content=b"payload",
+                           headers={"Authorization": "Bearer ok"})
+    assert response.status_code == 400
+    redis_queue.submit_task.assert_not_called()
+    assert not [name for _, _, files in os.walk(str(tmp_path)) for name in files]
+
+
+def test_submit_stream_invalid_upload_keeps_existing_blob(router_client, tmp_path):
+    """Объект, который уже был в хранилище до запроса, при отказе не удаляется."""
+    store = FileBlobStore(str(tmp_path))
+    ref = store.put(b"payload")
+    registry = TaskTypeRegistry({"resize_image": {
+        "schema": {"type": "object", "required": ["filename"]}}})
+    client = router_client(CLIENT, blob_store=store, task_registry=registry)
+    response = client.post("/submit/stream?type=resize_image", content=b"payload",
+                           headers={"Authorization": "Bearer ok"})
+    assert response.status_code == 400
+    assert store.read(parse_ref(ref)) == b"payload"
+
+
+def test_submit_stream_not_enabled(router_client):
+    """Без хранилища blob-объектов потоковая загрузка недоступна."""
+    client = router_client(CLIENT)
+    response = client.post("/submit/stream?type=resize_image", content=b"x",
+                           headers={"Authorization": "Bearer ok"})
+    assert response.status_code == 501
+
+
+def test_cancel_batch_returns_outcomes(router_client, redis_queue, vault_client):
+    """Пакетная отмена: задачи разрешённых роли типов, итог по каждой задаче."""
+    first, second = uuid4(), uuid4()
+    redis_queue.cancel_tasks.return_value = {str(first): "accepted", str(second): "forbidden"}
+    vault_client.is_authorized.side_effect = lambda role, endpoint, task_type: \
+        task_type == "calc_hash"
+    client = router_client(ADMIN)
+
+    response = client.post("/cancel", json={"uuids": [str(first), str(second)]},
+                           headers={"Authorization": "Bearer t"})
+    assert response.status_code == 200
+    assert response.json() == {"cancelled": 1, "results": [
+        {"uuid": str(first), "outcome": "accepted"},
+        {"uuid": str(second), "outcome": "forbidden"}]}
+    vault_client.authenticate_user.assert_called_once_with("Bearer t", endpoint="cancel")
+    redis_queue.cancel_tasks.assert_called_once_with([first, second], ["calc_hash"],
+                                                     client_id="admin_user")
+
+
+def test_cancel_any_owner_with_wildcard_right(router_client, redis_queue, vault_client):
+    """Роль с правом "cancel" на любой тип отменяет задачи любых клиентов."""
+    task_id = uuid4()
+    redis_queue.cancel_tasks.return_value = {str(task_id): "accepted"}
+    vault_client.is_authorized.return_value = True
+    client = router_client(ADMIN)
+    response = client.post(f"/cancel?taskid={task_id}", headers={"Authorization": "Bearer t"})
+    assert response.status_code == 200
+    assert redis_queue.cancel_tasks.call_args.kwargs["client_id"] is None
+
+
+@pytest.mark.parametrize("outcome, status_code", [
+    ("accepted", 200), ("not_found", 400), ("forbidden", 403), ("invalid_transition", 409)])
+def test_cancel_single_maps_outcome_to_status(router_client, redis_queue, outcome, status_code):
+    """Отмена одной задачи по taskid отвечает кодом ошибки для отклонённой отмены."""
+    task_id = uuid4()
+    redis_queue.cancel_tasks.return_value = {str(task_id): outcome}
+    client = router_client(ADMIN)
+    response = client.post(f"/cancel?taskid={task_id}", headers={"Authorization": "Bearer t"})
+    assert response.status_code == status_code
+
+
+def test_cancel_without_ids(router_client, redis_queue):
+    """Запрос без taskid и тела → 400."""
+    client = router_client(ADMIN)
+    response = client.post("/cancel", headers={"Authorization": "Bearer t"})
+    assert response.status_code == 400
+    redis_queue.cancel_tasks.assert_not_called()
+
+
+@pytest.mark.parametrize("allowlist, url, status_code", [
+    (None, "https://site.example/hooks/1", 400),
+    (CallbackAllowList({"admin_user": ["https://site.example/hooks/"]}),
+     "https://evil.example/hooks/1", 400),
+    (CallbackAllowList({"admin_user": ["https://site.example/hooks/"]}),
+     "https://site.example/hooks/1", 200),
+])
+def test_submit_callback_url_checked(router_client, redis_queue, allowlist, url, status_code):
+    """callback_url принимается только при включённых webhook и из префиксов клиента."""
+    client = router_client(ADMIN, callback_allowlist=allowlist)
+    response = client.post("/submit", json={"type": "calc_hash", "upload": {"a": 1},
+                                            "callback_url": url},
+                           headers={"Authorization": "Bearer t"})
+    assert response.status_code == status_code
+    if status_code == 200:
+        saved = redis_queue.submit_task.call_args.args[1]
+        assert saved["callback_url"] == url
+    else:
+        redis_queue.submit_task.assert_not_called()
+
+
+def test_submit_without_callback_url_stores_no_field(router_client, redis_queue):
+    """Без callback_url поле в задаче не сохраняется (доставка не планируется)."""
+    client = router_client(ADMIN)
+    response = client.post("/submit", json={"type": "calc_hash", "upload": {"a": 1}},
+                           headers={"Authorization": "Bearer t"})
+    assert response.status_code == 200
+    assert "callback_url" not in redis_queue.submit_task.call_args.args[1]
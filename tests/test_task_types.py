@@ -0,0 +1,98 @@
+# tests/test_task_types.py
+
+"""
+Unit-тесты для реестра типов задач.
+Проверяются компиляция схем, проверка upload, лимит размера и построение TaskType.
+"""
+
+import pytest
+from app.api.task_types import TaskTypeRegistry, DEFAULT_TASK_TYPES, load_task_types
+from app.config import loader
+
+
+@pytest.fixture(name="registry")
+def registry_fixture():
+    """Реестр с одним строго описанным типом задачи."""
+    return TaskTypeRegistry({
+        "calc_hash": {
+            "queue": "hash_queue",
+            "ttl": 60,
+            "max_payload_size": 64,
+            "schema": {
+                "type": "object",
+                "required": ["filename"],
+                "properties": {"filename": {"type": "string"}},
+                "additionalProperties": False
+            }
+        }
+    })
+
+
+def test_registry_spec_fields(registry):
+    """Параметры типа задачи берутся из конфигурации."""
+    spec = registry.get("calc_hash")
+    assert spec.queue == "hash_queue"
+    assert spec.ttl == 60
+    assert spec.max_payload_size == 64
+
+
+def test_registry_spec_defaults():
+    """Очередь и TTL по умолчанию выводятся из имени типа."""
+    spec = TaskTypeRegistry({"resize_image": {}}).get("resize_image")
+    assert spec.queue == "resize_image_INPUT"
+    assert spec.ttl == 3600
+
+
+def test_validate_upload_success(registry):
+    """Корректный upload проходит проверку."""
+    spec = registry.validate_upload("calc_hash", {"filename": "file.txt"})
+    assert spec.name == "calc_hash"
+
+
+def test_validate_upload_schema_error(registry):
+    """Upload, не соответствующий схеме, отклоняется с ValueError."""
+    with pytest.raises(ValueError, match="Upload validation error"):
+        registry.validate_upload("calc_hash", {"filename": 42})
+
+
+def test_validate_upload_too_large(registry):
+    """Upload больше max_payload_size отклоняется с ValueError."""
+    with pytest.raises(ValueError, match="too large"):
+        registry.validate_upload("calc_hash", {"filename": "x" * 100})
+
+
+def test_validate_upload_unknown_type(registry):
+    """Неизвестный тип задачи отклоняется с ValueError."""
+    with pytest.raises(ValueError, match="Unknown task type"):
+        registry.validate_upload("resize_image", {"filename": "file.txt"})
+
+
+def test_invalid_schema_rejected_at_load():
+    """Некорректная JSON-схема обнаруживается при создании реестра."""
+    with pytest.raises(ValueError, match="Invalid upload schema"):
+        TaskTypeRegistry({"calc_hash": {"schema": {"type": "not-a-type"}}})
+
+
+def test_build_enum(registry):
+    """TaskType строится по именам зарегистрированных типов."""
+    task_type = registry.build_enum()
+    assert task_type("calc_hash") == task_type.CALC_HASH
+    assert task_type.CALC_HASH == "calc_hash"
+    assert len(list(task_type)) == 1
+
+
+def test_load_task_types_defaults_without_config(tmp_path):
+    """Без config.json используются типы задач по умолчанию."""
+    loader.CONFIG_PATH = str(tmp_path / "missing.json")
+    loader.get_config.cache_clear()
+    assert load_task_types() == DEFAULT_TASK_TYPES
+
+
+def test_ttl_for_status():
+    """TTL по статусу берётся из status_ttl, для остальных статусов — ttl типа."""
+    registry = TaskTypeRegistry({"calc_hash": {"ttl": 3600,
+                                               "status_ttl": {"done": 600, "error": 86400}}})
+    assert registry.ttl_for("calc_hash", "done") == 600
+    assert registry.ttl_for("calc_hash", "pending") == 3600
+    assert registry.ttl_for("unknown", "done") is None
+    assert registry.get("calc_hash").max_ttl() == 86400
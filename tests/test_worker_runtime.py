@@ -0,0 +1,264 @@
+# tests/test_worker_runtime.py
+
+"""
+Unit-тесты для среды выполнения воркеров.
+"""
+
+import hashlib
+import threading
+from unittest.mock import MagicMock
+from uuid import uuid4
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.queue.redis_queue import RedisQueue
+from app.worker.runtime import TaskError, WorkerRuntime
+
+
+def calc_hash(upload: dict) -> dict:
+    """Обработчик для пула процессов (функция уровня модуля)."""
+    if not upload.get("data"):
+        raise TaskError("Nothing to hash", code=422)
+    return {"sha256": hashlib.sha256(upload["data"].encode()).hexdigest()}
+
+
+def _queue(batches, tasks, rejected=()):
+    """Мок RedisQueue: dequeue_batch отдаёт batches, затем пусто; complete_tasks
+    отклоняет переходы задач из rejected (аренда потеряна)."""
+    queue = MagicMock(spec=RedisQueue)
+    pending = list(batches)
+
+    def dequeue_batch(queue_name, count, timeout=0, worker_id=None):
+        if pending:
+            batch = pending.pop(0)
+            if len(batch) > count:
+                pending.insert(0, batch[count:])
+            return batch[:count]
+        threading.Event().wait(0.01)
+        return []
+
+    queue.dequeue_batch.side_effect = dequeue_batch
+    queue.load_tasks.side_effect = lambda uuids: {u: tasks[u] for u in uuids if u in tasks}
+    queue.complete_tasks.side_effect = lambda items, worker_id=None: {
+        u: "lease_lost" if u in rejected else "accepted" for u, _, _ in items}
+    queue.cancelled.return_value = set()
+    return queue
+
+
+def _statuses(queue):
+    """Итоговые поля задач по всем вызовам complete_tasks (последняя запись побеждает)."""
+    result = {}
+    for call in queue.complete_tasks.call_args_list:
+        for task_uuid, updates, _ in call.args[0]:
+            result[task_uuid] = updates
+    return result
+
+
+def _run_until(runtime, queue, count):
+    """Запускает воркер до записи count итоговых статусов и останавливает его."""
+    runtime.start()
+    for _ in range(500):
+        finished = [u for u, s in _statuses(queue).items() if s["status"] in ("done", "error")]
+        if len(finished) >= count:
+            break
+        threading.Event().wait(0.01)
+    runtime.stop()
+
+
+def test_thread_pool_processes_batch():
+    """Пачка задач помечается pending одной записью, результаты записываются со статусами."""
+    tasks = {"t1": {"upload": {"n": 1}}, "t2": {"upload": {"n": 2}}, "t3": {"upload": {"n": 0}}}
+    queue = _queue([["t1", "t2", "t3"]], tasks)
+    runtime = WorkerRuntime(queue, batch_size=8, poll_timeout=0.01, worker_id="w1")
+
+    @runtime.handler("calc_hash", concurrency=2)
+    def divide(upload):
+        return {"value": 10 // upload["n"]}
+
+    _run_until(runtime, queue, 3)
+
+    pending = queue.complete_tasks.call_args_list[0].args[0]
+    assert [(u, s["status"], t) for u, s, t in pending] == \
+        [("t1", "pending", "calc_hash"), ("t2", "pending", "calc_hash"),
+         ("t3", "pending", "calc_hash")]
+    statuses = _statuses(queue)
+    assert statuses["t1"]["result"] == {"value": 10}
+    assert statuses["t1"]["code"] == 0 and statuses["t1"]["processed"]
+    assert statuses["t3"]["status"] == "error"
+    assert statuses["t3"]["message"].startswith("ZeroDivisionError")
+    queue.dequeue_batch.assert_any_call("calc_hash_INPUT", 4, timeout=0.01, worker_id="w1")
+    assert all(call.kwargs["worker_id"] == "w1" for call in queue.complete_tasks.call_args_list)
+
+
+def test_rejected_pending_transition_is_not_executed():
+    """Задача, аренду которой перехватил другой воркер, не выполняется."""
+    executed = []
+    queue = _queue([["mine", "stolen"]],
+                   {"mine": {"upload": {}}, "stolen": {"upload": {}}}, rejected={"stolen"})
+    runtime = WorkerRuntime(queue, poll_timeout=0.01)
+    runtime.register("calc_hash", lambda upload: executed.append(upload) or {})
+    _run_until(runtime, queue, 1)
+
+    assert len(executed) == 1
+    final = [u for u, s, _ in queue.complete_tasks.call_args_list[-1].args[0]]
+    assert final == ["mine"]
+
+
+def test_process_pool_and_task_error():
+    """Обработчик в пуле процессов; TaskError задаёт код ответа."""
+    tasks = {"a": {"upload": {"data": "abc"}}, "b": {"upload": {}}}
+    queue = _queue([["a", "b"]], tasks)
+    runtime = WorkerRuntime(queue, poll_timeout=0.01)
+    runtime.register("calc_hash", calc_hash, pool="process", concurrency=2)
+    _run_until(runtime, queue, 2)
+
+    statuses = _statuses(queue)
+    assert statuses["a"]["result"] == {"sha256": hashlib.sha256(b"abc").hexdigest()}
+    assert (statuses["b"]["status"], statuses["b"]["code"], statuses["b"]["message"]) == \
+        ("error", 422, "Nothing to hash")
+
+
+def test_prefetch_bounds_in_flight_tasks():
+    """В работе и в очереди пула не больше concurrency + prefetch задач."""
+    release = threading.Event()
+    tasks = {f"t{i}": {"upload": {}} for i in range(6)}
+    queue = _queue([["t0", "t1", "t2"], ["t3", "t4", "t5"]], tasks)
+    runtime = WorkerRuntime(queue, batch_size=16, poll_timeout=0.01)
+    runtime.register("calc_hash", lambda upload: release.wait(5) and {}, concurrency=1,
+                     prefetch=2)
+    runtime.start()
+    threading.Event().wait(0.1)
+    # Все 3 места заняты первой пачкой — новые задачи не запрашиваются
+    assert queue.dequeue_batch.call_count == 1
+    assert queue.dequeue_batch.call_args.args[1] == 3
+    release.set()
+    runtime.stop()
+    assert {u for u, s in _statuses(queue).items() if s["status"] == "done"} >= {"t0", "t1", "t2"}
+
+
+def test_cancelled_task_is_skipped_and_result_dropped():
+    """Отменённая задача в очереди пула не выполняется, итог выполняющейся не пишется."""
+    release = threading.Event()
+    executed = []
+    queue = _queue([["running", "queued"]], {"running": {"upload": {"n": 1}},
+                                             "queued": {"upload": {"n": 2}}})
+    queue.cancelled.side_effect = lambda uuids: set(uuids)
+    runtime = WorkerRuntime(queue, poll_timeout=0.01, cancel_poll_interval=0.01)
+    runtime.register("calc_hash", lambda upload: executed.append(upload["n"]) or release.wait(5),
+                     concurrency=1)
+    runtime.start()
+    for _ in range(200):
+        if queue.cancelled.called and executed:
+            break
+        threading.Event().wait(0.01)
+    threading.Event().wait(0.05)
+    release.set()
+    runtime.stop()
+
+    assert executed == [1]
+    finished = {u for u, s in _statuses(queue).items() if s["status"] != "pending"}
+    assert not finished
+
+
+def test_stop_finishes_in_flight_tasks():
+    """Остановка дожидается выполняющихся задач и записывает их статусы."""
+    started = threading.Event()
+    queue = _queue([["slow"]], {"slow": {"upload": {}}})
+    runtime = WorkerRuntime(queue, poll_timeout=0.01)
+
+    def slow(upload):
+        started.set()
+        threading.Event().wait(0.2)
+        return {"ok": True}
+
+    runtime.register("calc_hash", slow)
+    runtime.start()
+    assert started.wait(2)
+    runtime.stop()
+    assert _statuses(queue)["slow"]["status"] == "done"
+
+
+def test_fetch_error_returns_tasks_to_queue():
+    """Ошибка Redis после извлечения возвращает задачи в очередь."""
+    queue = _queue([["t1"]], {})
+    queue.load_tasks.side_effect = RedisConnectionError("down")
+    runtime = WorkerRuntime(queue, poll_timeout=0.01, retry_interval=0.01)
+    runtime.register("calc_hash", lambda upload: {})
+    runtime.start()
+    threading.Event().wait(0.1)
+    runtime.stop()
+    queue.enqueue.assert_any_call("calc_hash_INPUT", "t1")
+
+
+def test_fetch_error_other_than_redis_keeps_fetching():
+    """Ошибка чтения upload (не Redis) возвращает задачи в очередь, выборка продолжается."""
+    queue = _queue([["t1"], ["t2"]], {"t2": {"upload": {}}})
+    load_tasks = queue.load_tasks.side_effect
+    queue.load_tasks.side_effect = lambda uuids: load_tasks(uuids) if uuids != ["t1"] \
+        else (_ for _ in ()).throw(FileNotFoundError("blob is gone"))
+    runtime = WorkerRuntime(queue, poll_timeout=0.01, retry_interval=0.01)
+    runtime.register("calc_hash", lambda upload: {})
+    _run_until(runtime, queue, 1)
+    queue.enqueue.assert_any_call("calc_hash_INPUT", "t1")
+    assert _statuses(queue)["t2"]["status"] == "done"
+
+
+def test_status_write_error_does_not_stop_writer():
+    """Ошибка записи итога одной задачи (не Redis) не останавливает поток записи."""
+    queue = _queue([["bad", "good"]], {"bad": {"upload": {}}, "good": {"upload": {}}})
+    complete_tasks = queue.complete_tasks.side_effect
+
+    def failing(items, worker_id=None):
+        if any(u == "bad" and "result" in s for u, s, _ in items):
+            raise OSError("blob store is full")
+        return complete_tasks(items, worker_id)
+
+    queue.complete_tasks.side_effect = failing
+    runtime = WorkerRuntime(queue, poll_timeout=0.01)
+    runtime.register("calc_hash", lambda upload: {"ok": True})
+    _run_until(runtime, queue, 2)
+
+    statuses = _statuses(queue)
+    assert statuses["good"]["status"] == "done"
+    assert statuses["bad"]["status"] == "error"
+    assert statuses["bad"]["message"] == "Result could not be saved: OSError: blob store is full"
+
+
+def test_unserializable_result_becomes_error():
+    """Итог, не сериализуемый в JSON, записывается статусом error; следующие задачи — done."""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    queue = RedisQueue(client=fakeredis.FakeRedis())
+    raw_uuid, fine_uuid = str(uuid4()), str(uuid4())
+    for task_uuid, raw in ((raw_uuid, True), (fine_uuid, False)):
+        queue.save_task(task_uuid, {"uuid": task_uuid, "type": "calc_hash", "status": "created",
+                                    "created": "2024-01-01T00:00:00+00:00", "code": 0,
+                                    "message": "Created", "upload": {"raw": raw}})
+        queue.enqueue("calc_hash_INPUT", task_uuid)
+
+    runtime = WorkerRuntime(queue, poll_timeout=0.01)
+    runtime.register("calc_hash",
+                     lambda upload: {"digest": b"raw" if upload["raw"] else "hex"})
+    runtime.start()
+    for _ in range(200):
+        if all(queue.get_task(u).status.value in ("done", "error") for u in (raw_uuid, fine_uuid)):
+            break
+        threading.Event().wait(0.01)
+    runtime.stop()
+
+    raw, fine = queue.get_task(raw_uuid), queue.get_task(fine_uuid)
+    assert (raw.status.value, raw.code) == ("error", 1)
+    assert raw.message.startswith("TypeError")
+    assert (fine.status.value, fine.result) == ("done", {"digest": "hex"})
+
+
+def test_register_validation():
+    """Повторная регистрация и неизвестный пул отклоняются."""
+    runtime = WorkerRuntime(MagicMock(spec=RedisQueue))
+    runtime.register("calc_hash", calc_hash)
+    with pytest.raises(ValueError):
+        runtime.register("calc_hash", calc_hash)
+    with pytest.raises(ValueError):
+        runtime.register("resize_image", calc_hash, pool="fiber")
+    with pytest.raises(RuntimeError):
+        WorkerRuntime(MagicMock(spec=RedisQueue)).start()